@@ -1,9 +1,11 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Header
 from pydantic import BaseModel
 from typing import List, Optional
 
 from database.universal_manager import universal_db_manager as db
 from services.ai_quota_manager import ai_quota_manager
+from services.conversation_buffer import conversation_buffer
+from services.idempotency import chat_idempotency, derive_key
 from utils.api_client import ask_gpt_chat
 from handlers.ai_assistant import parse_ai_response
 
@@ -88,6 +90,8 @@ class ChatMessageRequest(BaseModel):
     user_id: int
     conversation_id: str
     message: str
+    # ключ повтора (или заголовок Idempotency-Key); без него каждое сообщение - новый ход
+    idempotency_key: Optional[str] = None
 
 
 class ChatMessageResponse(BaseModel):
@@ -97,7 +101,19 @@ class ChatMessageResponse(BaseModel):
 
 
 @router.post("/message", response_model=ChatMessageResponse)
-async def chat_message(req: ChatMessageRequest):
+async def chat_message(req: ChatMessageRequest,
+                       idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
+    # Повтор с тем же ключом (таймаут клиента) не списывает квоту и не вызывает модель снова.
+    # Без ключа одинаковый текст может быть намеренным ("да", "продолжай") - это новый ход
+    key = idempotency_key or req.idempotency_key
+    if not key:
+        return await _generate_reply(req)
+    key = derive_key(req.user_id, req.conversation_id, key)
+    response, _ = await chat_idempotency.run(key, lambda: _generate_reply(req))
+    return response
+
+
+async def _generate_reply(req: ChatMessageRequest) -> ChatMessageResponse:
     # квоты
     can_use, ai_type = await ai_quota_manager.check_and_increment_usage(req.user_id)
     if not can_use:
@@ -106,21 +122,21 @@ async def chat_message(req: ChatMessageRequest):
             f"AI limit exceeded: used={info['used_today']}/{info['daily_limit']}"
         )
 
+    # контекст последних сообщений (из буфера, БД читается только при первом ходе)
+    history = await conversation_buffer.history(req.conversation_id)
+
     # сохранить пользовательское сообщение
-    await db.add_message(req.conversation_id, 'user', req.message)
+    await conversation_buffer.add(req.conversation_id, 'user', req.message)
 
-    # собрать контекст последних сообщений
-    history = await db.list_messages(req.conversation_id, limit=20)
     messages = [{"role": "system", "content": _system_prompt()}]
-    for m in history:
-        messages.append({"role": m.get('role', 'user'),
-                        "content": m.get('content', '')})
+    messages += history
+    messages.append({"role": "user", "content": req.message})
 
     # запрос к модели
     reply = await ask_gpt_chat(messages)
 
     # сохранить ответ ассистента
-    await db.add_message(req.conversation_id, 'assistant', reply)
+    await conversation_buffer.add(req.conversation_id, 'assistant', reply)
 
     # извлечь ссылки
     refs = parse_ai_response(reply) or []
@@ -128,9 +144,14 @@ async def chat_message(req: ChatMessageRequest):
 
 
 @router.get("/history")
-async def chat_history(conversation_id: str, limit: int = 20):
-    items = await db.list_messages(conversation_id, limit=limit)
-    return {"conversation_id": conversation_id, "messages": items}
+async def chat_history(conversation_id: str, limit: int = 20, before: Optional[str] = None):
+    # before - id самого раннего полученного сообщения (следующая страница)
+    items = await db.list_messages(conversation_id, limit=limit, before=before)
+    return {
+        "conversation_id": conversation_id,
+        "messages": items,
+        "next_before": items[0]['id'] if len(items) == limit else None,
+    }
 
 
 # ===== Совместимые эндпоинты =====
@@ -141,22 +162,25 @@ async def compat_create_conversation(req: StartRequest):
 
 
 @router_compat.get("/conversations/{conversation_id}")
-async def compat_get_conversation(conversation_id: str, limit: int = 20):
-    return await chat_history(conversation_id, limit)
+async def compat_get_conversation(conversation_id: str, limit: int = 20, before: Optional[str] = None):
+    return await chat_history(conversation_id, limit, before)
 
 
 class CompatMessage(BaseModel):
     user_id: int
     message: str
+    idempotency_key: Optional[str] = None
 
 
 @router_compat.post("/conversations/{conversation_id}/messages")
-async def compat_post_message(conversation_id: str, payload: CompatMessage):
+async def compat_post_message(conversation_id: str, payload: CompatMessage,
+                              idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key")):
     resp = await chat_message(ChatMessageRequest(
         user_id=payload.user_id,
         conversation_id=conversation_id,
         message=payload.message,
-    ))
+        idempotency_key=payload.idempotency_key,
+    ), idempotency_key)
     return resp
 
 
@@ -167,6 +191,7 @@ class ResetRequest(BaseModel):
 
 @router.post("/reset")
 async def reset_chat(req: ResetRequest):
+    conversation_buffer.drop(req.conversation_id)
     try:
         await db.delete_conversation(req.conversation_id, req.user_id)
     except Exception:
@@ -0,0 +1,18 @@
+from fastapi import APIRouter, Query
+from typing import Optional
+from utils.lopukhin_search import lopukhin_search
+
+router = APIRouter(prefix="/api/v1/commentary", tags=["commentary"])
+
+
+@router.get("/search")
+async def search_commentary(q: str = Query(..., min_length=1),
+                            limit: int = Query(10, ge=1, le=50),
+                            offset: int = Query(0, ge=0),
+                            book: Optional[str] = None):
+    """Полнотекстовый поиск по толкованиям Лопухина (snippet - HTML с <b>)"""
+    if not lopukhin_search.available:
+        return {"error": "index_not_built"}
+    # Лишний результат показывает, есть ли следующая страница
+    results = await lopukhin_search.search(q, limit=limit + 1, offset=offset, book=book)
+    return {"results": results[:limit], "has_more": len(results) > limit}
@@ -1,18 +1,36 @@
 from fastapi import APIRouter, Query
 from typing import Optional
 from database.universal_manager import universal_db_manager as db
+from services.topic_service import topic_service
 
 router = APIRouter(prefix="/api/v1/topics", tags=["topics"])
 
 
+def _topic_row(topic: dict) -> dict:
+    """Тема из памяти в формате строки bible_topics"""
+    row = {"id": topic.get("id"), "topic_name": topic["topic"], "verses": "; ".join(topic["verses"])}
+    if "score" in topic:
+        row["score"] = topic["score"]
+    return row
+
+
 @router.get("")
 async def list_topics(query: Optional[str] = Query(""), limit: int = 50):
+    """Темы из памяти; с query - поиск по названиям и тексту стихов (с опечатками)"""
+    await topic_service.ensure_loaded()
+    if topic_service.topics():
+        topics = topic_service.search(query, limit) if query else topic_service.topics()[:limit]
+        return [_topic_row(topic) for topic in topics]
     items = await db.get_bible_topics(query or "", limit)
     return items
 
 
 @router.get("/{topic_id}")
 async def get_topic(topic_id: int):
+    await topic_service.ensure_loaded()
+    for topic in topic_service.topics():
+        if topic.get("id") == topic_id:
+            return _topic_row(topic)
     item = await db.get_topic_by_id(topic_id)
     if not item:
         return {"error": "not_found"}
@@ -1,6 +1,6 @@
 import logging
 from fastapi import FastAPI
-from fastapi.responses import HTMLResponse
+from fastapi.responses import HTMLResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 # ВАЖНО: загружаем .env до импорта менеджеров БД
 from config import settings as _settings  # noqa: F401
@@ -12,6 +12,7 @@ from app.api.chat import router_compat as chat_router_compat
 from app.api.bookmarks import router as bookmarks_router
 from app.api.plans import router as plans_router
 from app.api.topics import router as topics_router
+from app.api.commentary import router as commentary_router
 from app.api.local_bible import router as local_bible_router
 from app.api.payments import router as payments_router
 
@@ -53,6 +54,13 @@ def create_app() -> FastAPI:
     async def health_root():
         return {"status": "ok"}
 
+    @app.get("/metrics", response_class=PlainTextResponse)
+    async def metrics():
+        """Метрики вызовов БД в формате Prometheus (DB_METRICS_ENABLED=true)"""
+        from database.universal_manager import universal_db_manager as db
+        return PlainTextResponse(db.get_metrics_prometheus(),
+                                 media_type="text/plain; version=0.0.4")
+
     @app.on_event("startup")
     async def on_startup():
         """Инициализация менеджера БД и лог типа подключения"""
@@ -67,6 +75,39 @@ def create_app() -> FastAPI:
             logging.getLogger(__name__).error(
                 f"[Backend] Ошибка инициализации БД: {e}")
 
+        try:
+            from services.ai_settings_manager import ai_settings_manager
+            await ai_settings_manager.start_watcher()
+        except Exception as e:
+            logging.getLogger(__name__).error(
+                f"[Backend] Ошибка запуска отслеживания настроек ИИ: {e}")
+
+        # Темы в памяти: изменения из бота приходят с периодическим обновлением.
+        # Тексты стихов для Telegram API не нужны - только индекс для поиска
+        try:
+            from services.topic_service import topic_service
+            await topic_service.start(render=False)
+        except Exception as e:
+            logging.getLogger(__name__).error(
+                f"[Backend] Ошибка загрузки тем: {e}")
+
+    @app.on_event("shutdown")
+    async def on_shutdown():
+        """Остановка фоновых задач"""
+        try:
+            from services.ai_settings_manager import ai_settings_manager
+            await ai_settings_manager.stop_watcher()
+        except Exception as e:
+            logging.getLogger(__name__).error(
+                f"[Backend] Ошибка остановки отслеживания настроек ИИ: {e}")
+
+        try:
+            from services.topic_service import topic_service
+            await topic_service.stop()
+        except Exception as e:
+            logging.getLogger(__name__).error(
+                f"[Backend] Ошибка остановки обновления тем: {e}")
+
     # Routers
     app.include_router(limits_router)
     app.include_router(bible_router)
@@ -76,6 +117,7 @@ def create_app() -> FastAPI:
     app.include_router(bookmarks_router)
     app.include_router(plans_router)
     app.include_router(topics_router)
+    app.include_router(commentary_router)
     app.include_router(local_bible_router)
     app.include_router(payments_router)
 
@@ -214,8 +256,12 @@ def _home_html() -> str:
   async function send(){
     const text=msgInput.value.trim(); if(!text||!conversationId||!userId) return;
     msgInput.value=''; appendMessage('user',text); sendBtn.disabled=true;
+    // Один ключ на сообщение: повтор после сбоя сети не спишет квоту второй раз
+    const key=(crypto.randomUUID?crypto.randomUUID():Date.now()+'-'+Math.random());
+    const post=()=>fetch(`${API}/v1/ai/chat/message`,{method:'POST',headers:{'Content-Type':'application/json','Idempotency-Key':key},body:JSON.stringify({user_id:userId,conversation_id:conversationId,message:text})});
     try{
-      const r=await fetch(`${API}/v1/ai/chat/message`,{method:'POST',headers:{'Content-Type':'application/json'},body:JSON.stringify({user_id:userId,conversation_id:conversationId,message:text})});
+      let r;
+      try{ r=await post(); }catch(e){ console.warn('retry',e); r=await post(); }
       const data=await r.json();
       appendMessage('assistant',data.text||'',data.verse_refs||[]);
     }catch(e){console.error(e); appendMessage('assistant','Ошибка при обращении к ИИ. Попробуйте позже.');}
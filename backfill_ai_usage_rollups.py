@@ -0,0 +1,41 @@
+#!/usr/bin/env python3
+"""
+Скрипт для пересчета агрегатов использования ИИ (ai_usage_totals, ai_usage_daily)
+из дневных счетчиков. Запускается один раз после обновления и при расхождениях.
+"""
+import asyncio
+import logging
+from database.universal_manager import universal_db_manager
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def backfill_ai_usage_rollups():
+    """Пересчитывает агрегаты ИИ"""
+    try:
+        logger.info("🚀 Пересчет агрегатов ИИ...")
+
+        await universal_db_manager.initialize()
+
+        if await universal_db_manager.backfill_ai_usage_rollups():
+            summary = await universal_db_manager.get_ai_usage_summary()
+            top = await universal_db_manager.get_ai_stats_alltime(limit=5)
+
+            logger.info("✅ Агрегаты ИИ пересчитаны")
+            logger.info(f"   • Всего запросов: {summary['total_requests']}")
+            logger.info(f"   • Дней с запросами: {summary['active_days']}")
+            logger.info(f"   • Пользователей: {summary['total_users']}")
+            for user_id, count in top:
+                logger.info(f"   • {user_id}: {count}")
+        else:
+            logger.error("❌ Ошибка пересчета агрегатов ИИ")
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка пересчета: {e}")
+    finally:
+        await universal_db_manager.close()
+
+if __name__ == "__main__":
+    asyncio.run(backfill_ai_usage_rollups())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Тест скорости и результата разбора страниц православного календаря.
+
+В data/calendar_pages лежат страницы календаря (.html) и эталонный
+результат их разбора (.json рядом со страницей). Эталоны получены
+парсером до перехода на разбор за один проход (870cccc), поэтому
+сверка показывает любое изменение поведения. Сверка работает без сети:
+
+    python benchmark_calendar_parser.py --repeat 500
+
+Новые страницы записываются с сайта (только .html, эталоны не трогаются):
+
+    python benchmark_calendar_parser.py --record 30
+
+Страница без эталона считается расхождением. Эталон для нее пишется
+явно и только ДО изменения парсера, существующие эталоны не перезаписываются:
+
+    python benchmark_calendar_parser.py --accept
+"""
+import argparse
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from datetime import datetime, timedelta
+from typing import List
+
+from utils.orthodox_calendar import DEFAULT_CALENDAR_SETTINGS, orthodox_calendar
+
+# Настройка логирования
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+PAGES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'calendar_pages')
+
+# Ссылки на Писание строит общий разбор ссылок, его поведение менялось
+# намеренно (см. data/reference_corpus.json), с эталоном страниц не сверяются
+IGNORED_KEYS = ('raw_content', 'scripture_references')
+
+
+def parse_page(html: str) -> dict:
+    """Результат разбора страницы в виде после JSON (кортежи -> списки)"""
+    return json.loads(json.dumps(orthodox_calendar.parse_calendar_content(html), ensure_ascii=False))
+
+
+def read_page(path: str) -> str:
+    with open(path, encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def golden_path(path: str) -> str:
+    return path[:-len('.html')] + '.json'
+
+
+def compare_with_golden(pages_dir: str = PAGES_DIR) -> List[str]:
+    """Сверяет разбор записанных страниц с эталоном, возвращает список расхождений"""
+    problems = []
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        name = os.path.basename(path)
+        if not os.path.exists(golden_path(path)):
+            problems.append(f"{name}: нет эталона (--accept до изменения парсера)")
+            continue
+        with open(golden_path(path), encoding='utf-8') as f:
+            golden = json.load(f)
+        parsed = parse_page(read_page(path))
+        for key in sorted((set(golden) | set(parsed)) - set(IGNORED_KEYS)):
+            if golden.get(key) != parsed.get(key):
+                problems.append(f"{name}: {key}\n   эталон: {golden.get(key)!r}\n   сейчас: {parsed.get(key)!r}")
+    return problems
+
+
+def accept(pages_dir: str):
+    """Записывает эталон для страниц, у которых его еще нет"""
+    for path in sorted(glob.glob(os.path.join(pages_dir, '*.html'))):
+        if os.path.exists(golden_path(path)):
+            continue
+        golden = parse_page(read_page(path))
+        for key in IGNORED_KEYS:
+            golden.pop(key, None)
+        with open(golden_path(path), 'w', encoding='utf-8') as f:
+            json.dump(golden, f, ensure_ascii=False, indent=1)
+            f.write('\n')
+        print(f"Эталон записан: {golden_path(path)}")
+
+
+async def record(pages_dir: str, days: int):
+    """Записывает страницы календаря с сайта, уже записанные не трогает"""
+    os.makedirs(pages_dir, exist_ok=True)
+    today = datetime.now()
+    try:
+        for delta in range(days):
+            day = today + timedelta(days=delta)
+            html = await orthodox_calendar.get_calendar_data(day, DEFAULT_CALENDAR_SETTINGS)
+            if not html:
+                logger.error(f"Страница на {day:%Y-%m-%d} не получена")
+                continue
+            path = os.path.join(pages_dir, day.strftime('%Y-%m-%d') + '.html')
+            if os.path.exists(path):
+                continue
+            with open(path, 'w', encoding='utf-8', newline='') as f:
+                f.write(html)
+            print(f"Записано: {path}")
+    finally:
+        await orthodox_calendar.close()
+
+
+def benchmark(pages_dir: str, repeat: int) -> bool:
+    """Сверяет разбор с эталоном и замеряет время, возвращает True без расхождений"""
+    paths = sorted(glob.glob(os.path.join(pages_dir, '*.html')))
+    if not paths:
+        print(f"Нет страниц в {pages_dir}, запишите их: --record 30")
+        return False
+
+    problems = compare_with_golden(pages_dir)
+    for problem in problems:
+        print(f"❌ {problem}")
+
+    pages = [read_page(path) for path in paths]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            orthodox_calendar.parse_calendar_content(html)
+    elapsed = time.perf_counter() - started
+    size = sum(len(html) for html in pages) // len(pages)
+    print(f"Страниц: {len(pages)} (в среднем {size} символов), "
+          f"разбор: {elapsed / (repeat * len(pages)) * 1000:.3f} мс/страница")
+    print("❌ Есть расхождения с эталоном" if problems else "✅ Результат совпадает с эталоном")
+    return not problems
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Тест разбора страниц календаря")
+    parser.add_argument('--pages', default=PAGES_DIR, help="каталог записанных страниц")
+    parser.add_argument('--record', type=int, default=0, help="записать страницы на N дней вперед")
+    parser.add_argument('--accept', action='store_true', help="записать эталон для страниц без него")
+    parser.add_argument('--repeat', type=int, default=200, help="повторов разбора каждой страницы")
+    args = parser.parse_args()
+
+    if args.record:
+        asyncio.run(record(args.pages, args.record))
+    elif args.accept:
+        accept(args.pages)
+    else:
+        raise SystemExit(0 if benchmark(args.pages, args.repeat) else 1)
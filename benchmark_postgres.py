@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Нагрузочный тест PostgreSQLManager: запросов в секунду на частых запросах
+(пользователи, закладки, лимиты ИИ, прогресс чтения) без подготовленных
+запросов и с ними, плюс состояние пула соединений.
+
+Использует те же переменные окружения, что и бот (POSTGRES_HOST, POSTGRES_DB, ...).
+Тестовые пользователи создаются в отдельном диапазоне ID и удаляются в конце.
+
+    python benchmark_postgres.py --workers 20 --seconds 10
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import time
+from datetime import datetime
+
+from database.postgres_manager import PostgreSQLManager
+
+# Настройка логирования
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+# Диапазон ID тестовых пользователей
+BENCH_USER_BASE = 9_000_000_000
+TODAY = datetime.now().strftime('%Y-%m-%d')
+
+
+async def seed(manager: PostgreSQLManager, users: int):
+    """Создает тестовых пользователей с закладками"""
+    for i in range(users):
+        user_id = BENCH_USER_BASE + i
+        await manager.add_user(user_id, f"bench{i}", "Bench")
+        for chapter in range(1, 6):
+            await manager.add_bookmark(user_id, 43, chapter, display_text=f"Ин {chapter}")
+
+
+async def cleanup(manager: PostgreSQLManager, users: int):
+    """Удаляет тестовых пользователей (закладки удаляются каскадно)"""
+    await manager.pool.execute(
+        "DELETE FROM users WHERE user_id >= $1 AND user_id < $2",
+        BENCH_USER_BASE, BENCH_USER_BASE + users)
+
+
+async def worker(manager: PostgreSQLManager, users: int, deadline: float) -> int:
+    """Выполняет смесь частых запросов до deadline, возвращает число запросов"""
+    done = 0
+    while time.perf_counter() < deadline:
+        user_id = BENCH_USER_BASE + random.randrange(users)
+        await manager.get_user(user_id)
+        await manager.get_user_translation(user_id)
+        await manager.get_bookmarks(user_id)
+        await manager.is_bookmarked(user_id, 43, random.randint(1, 10))
+        await manager.get_ai_limit(user_id, TODAY)
+        await manager.get_reading_progress(user_id, 'bench')
+        await manager.is_reading_day_completed(user_id, 'bench', 1)
+        await manager.update_user_activity(user_id)
+        done += 8
+    return done
+
+
+async def run_phase(manager: PostgreSQLManager, title: str, workers: int, seconds: float, users: int):
+    """Один прогон нагрузки и отчет по нему"""
+    pool = manager.pool
+    pool.acquired_total = pool.timeouts = pool.max_waiting = 0
+    pool.wait_sum = pool.wait_max = 0.0
+
+    started = time.perf_counter()
+    deadline = started + seconds
+    counts = await asyncio.gather(*(worker(manager, users, deadline) for _ in range(workers)))
+    elapsed = time.perf_counter() - started
+
+    stats = manager.get_pool_stats()
+    total = sum(counts)
+    print(f"{title}: {total} запросов за {elapsed:.1f}с = {total / elapsed:.0f} запросов/с")
+    print(f"   пул: {stats['size']}/{stats['max_size']} соединений, "
+          f"ожидание соединения ср. {stats['wait_avg'] * 1000:.2f} мс, "
+          f"макс. {stats['wait_max'] * 1000:.2f} мс, "
+          f"макс. ожидающих {stats['max_waiting']}, таймаутов {stats['timeouts']}")
+    return total / elapsed
+
+
+async def measure(prepared: bool, title: str, workers: int, seconds: float, users: int) -> float:
+    """Прогон на отдельном пуле с подготовленными запросами или без них"""
+    os.environ['POSTGRES_PREPARED_STATEMENTS'] = 'true' if prepared else 'false'
+    manager = PostgreSQLManager()
+    await manager.initialize()
+    try:
+        # Прогрев: открываем соединения пула
+        await run_phase(manager, f"Прогрев ({title.lower()})", workers, 1, users)
+        return await run_phase(manager, title, workers, seconds, users)
+    finally:
+        await manager.close()
+
+
+async def benchmark(workers: int, seconds: float, users: int):
+    """Сравнивает запросы без кэша подготовленных запросов и с ним"""
+    manager = PostgreSQLManager()
+    await manager.initialize()
+    try:
+        print(f"🚀 Нагрузка: {workers} параллельных задач, {seconds}с на прогон, "
+              f"{users} пользователей, пул до {manager.max_connections} соединений")
+        await seed(manager, users)
+
+        before = await measure(False, "Без подготовленных запросов", workers, seconds, users)
+        after = await measure(True, "С подготовленными запросами", workers, seconds, users)
+
+        print(f"✅ Изменение: {(after / before - 1) * 100:+.1f}%")
+    finally:
+        await cleanup(manager, users)
+        await manager.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Нагрузочный тест PostgreSQL")
+    parser.add_argument('--workers', type=int, default=20, help="параллельных задач")
+    parser.add_argument('--seconds', type=float, default=10, help="длительность прогона")
+    parser.add_argument('--users', type=int, default=200, help="тестовых пользователей")
+    args = parser.parse_args()
+
+    asyncio.run(benchmark(args.workers, args.seconds, args.users))
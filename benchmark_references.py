@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+Эталонные ссылки и тест скорости парсера ссылок (utils/reference_parser.py).
+
+Эталон - data/reference_corpus.json: ссылка и ожидаемые части
+[ID книги, глава, первый стих, последняя глава, последний стих] или null,
+если ссылка не должна разбираться (в том числе названия книг с
+опечатками: "Матвея 5:3"). Все парсеры бота (планы чтения,
+bible_data.parse_reference, handlers/verse_reference.py, календарь)
+используют один движок, поэтому эталон общий.
+
+    python benchmark_references.py --repeat 2000
+"""
+import argparse
+import json
+import logging
+import time
+
+from utils.reference_parser import BookTrie, max_typos, reference_engine
+
+# Настройка логирования
+logging.basicConfig(level=logging.WARNING)
+logger = logging.getLogger(__name__)
+
+
+def _spans(reference: str):
+    spans = reference_engine.parse(reference)
+    if spans is None:
+        return None
+    return [[span.book_id, span.chapter, span.verse_start, span.end_chapter, span.verse_end]
+            for span in spans]
+
+
+def benchmark(corpus_path: str, repeat: int) -> bool:
+    """Сверяет разбор с эталоном и замеряет время, возвращает True без расхождений"""
+    with open(corpus_path, encoding='utf-8') as f:
+        corpus = json.load(f)
+
+    # Первый вызов строит дерево названий книг - замеряется отдельно
+    started = time.perf_counter()
+    reference_engine.books
+    build = time.perf_counter() - started
+
+    ok = True
+    for reference, expected in corpus:
+        parsed = _spans(reference)
+        if parsed != expected:
+            ok = False
+            print(f"❌ {reference!r}\n   эталон: {expected!r}\n   сейчас: {parsed!r}")
+
+    references = [reference for reference, _ in corpus]
+    started = time.perf_counter()
+    for _ in range(repeat):
+        for reference in references:
+            reference_engine.parse(reference)
+    elapsed = time.perf_counter() - started
+    print(f"Ссылок: {len(references)}, названий книг: {reference_engine.books.names}, "
+          f"построение: {build * 1000:.1f} мс, "
+          f"разбор: {elapsed / (repeat * len(references)) * 1e6:.1f} мкс/ссылка")
+
+    # Поиск книг с опечатками без кэша (названия, которых нет в дереве)
+    names = {BookTrie._key(reference.split()[0]) for reference in references}
+    typos = [name for name in sorted(names)
+             if max_typos(len(name)) and reference_engine.books.book_id(name) is None]
+    if typos:
+        started = time.perf_counter()
+        for _ in range(max(repeat // 10, 1)):
+            for name in typos:
+                reference_engine.books.similar(name, max_typos(len(name)))
+        elapsed = time.perf_counter() - started
+        print(f"Опечатки без кэша: {len(typos)} названий, "
+              f"{elapsed / (max(repeat // 10, 1) * len(typos)) * 1e6:.1f} мкс/название")
+    print("✅ Результат совпадает с эталоном" if ok else "❌ Есть расхождения с эталоном")
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Тест парсера библейских ссылок")
+    parser.add_argument('--corpus', default='data/reference_corpus.json', help="файл эталонных ссылок")
+    parser.add_argument('--repeat', type=int, default=1000, help="повторов разбора каждой ссылки")
+    args = parser.parse_args()
+
+    raise SystemExit(0 if benchmark(args.corpus, args.repeat) else 1)
@@ -133,6 +133,10 @@ async def main() -> None:
     dp.include_router(admin.admin_router)  # Административные команды первыми
     dp.include_router(commands.router)
 
+    # Поиск по толкованиям Лопухина (до text_messages: ждет текст запроса)
+    from handlers import commentary_search
+    dp.include_router(commentary_search.router)
+
     # Новые обработчики закладок (ВАЖНО: регистрируем ДО старых!)
     from handlers import bookmarks_new, bookmark_handlers
     dp.include_router(bookmarks_new.router)
@@ -169,6 +173,30 @@ async def main() -> None:
         logger.error("❌ Ошибка запуска планировщика квот: %s",
                      e, exc_info=True)
 
+    # Загружаем настройки ИИ и следим за их изменениями из других процессов
+    try:
+        from services.ai_settings_manager import ai_settings_manager
+        await ai_settings_manager.start_watcher()
+    except Exception as e:
+        logger.error("❌ Ошибка запуска отслеживания настроек ИИ: %s",
+                     e, exc_info=True)
+
+    # Кэш календаря с диска и фоновая загрузка дней вокруг сегодняшнего
+    try:
+        from services.calendar_service import calendar_service
+        await calendar_service.start()
+    except Exception as e:
+        logger.error("❌ Ошибка запуска фоновой загрузки календаря: %s",
+                     e, exc_info=True)
+
+    # Темы в памяти: загрузка, подготовка текстов стихов и фоновое обновление
+    try:
+        from services.topic_service import topic_service
+        await topic_service.start()
+    except Exception as e:
+        logger.error("❌ Ошибка загрузки тем: %s",
+                     e, exc_info=True)
+
     # Запускаем бота
     try:
         logger.info("Бот запущен")
@@ -188,6 +216,27 @@ async def main() -> None:
             logger.error(
                 "❌ Ошибка остановки планировщика квот: %s", e, exc_info=True)
 
+        try:
+            from services.ai_settings_manager import ai_settings_manager
+            await ai_settings_manager.stop_watcher()
+        except Exception as e:
+            logger.error(
+                "❌ Ошибка остановки отслеживания настроек ИИ: %s", e, exc_info=True)
+
+        try:
+            from services.calendar_service import calendar_service
+            await calendar_service.stop()
+        except Exception as e:
+            logger.error(
+                "❌ Ошибка остановки фоновой загрузки календаря: %s", e, exc_info=True)
+
+        try:
+            from services.topic_service import topic_service
+            await topic_service.stop()
+        except Exception as e:
+            logger.error(
+                "❌ Ошибка остановки обновления тем: %s", e, exc_info=True)
+
         # Закрываем соединения с базой данных
         await db_manager.close()
         logger.info("Завершение работы")
@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+"""
+Скрипт для построения полнотекстового индекса по Толковой Библии Лопухина.
+Запускается один раз после установки или обновления базы толкований,
+после построения бот нужно перезапустить.
+"""
+import argparse
+import logging
+
+from utils.lopukhin_search import LOPUKHIN_DB_PATH, LOPUKHIN_FTS_PATH, build_index
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Индекс FTS5 по толкованиям Лопухина")
+    parser.add_argument('--source', default=LOPUKHIN_DB_PATH, help="база толкований (SQLite)")
+    parser.add_argument('--output', default=LOPUKHIN_FTS_PATH, help="файл индекса")
+    args = parser.parse_args()
+
+    try:
+        logger.info(f"🚀 Построение индекса: {args.source} -> {args.output}")
+        count = build_index(args.source, args.output)
+        logger.info(f"✅ Проиндексировано толкований: {count}")
+    except Exception as e:
+        logger.error(f"❌ Ошибка построения индекса: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
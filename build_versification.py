@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Скрипт для построения таблицы стихов (число стихов в каждой главе) по
+локальным JSON-файлам Библии. Запускается после установки или обновления
+файлов переводов, после построения бот нужно перезапустить.
+"""
+import argparse
+import logging
+
+from config.settings import AVAILABLE_TRANSLATIONS, VERSIFICATION_FILE
+from utils.versification import versification
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Таблица стихов по локальным файлам Библии")
+    parser.add_argument('--output', default=VERSIFICATION_FILE, help="файл таблицы")
+    parser.add_argument('--translations', nargs='+', default=list(AVAILABLE_TRANSLATIONS),
+                        help="коды переводов")
+    args = parser.parse_args()
+
+    try:
+        logger.info(f"🚀 Построение таблицы стихов: {', '.join(args.translations)} -> {args.output}")
+        chapters = versification.save(args.translations, args.output)
+        for translation, count in chapters.items():
+            logger.info(f"✅ {translation}: глав {count}")
+    except Exception as e:
+        logger.error(f"❌ Ошибка построения таблицы стихов: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Пакетный импорт планов чтения, библейских тем и закладок в текущую базу
+(SQLite, PostgreSQL или Supabase - по USE_SUPABASE / USE_POSTGRES).
+
+    python bulk_import.py plans data/plans_csv_final/*.csv
+    python bulk_import.py plans plan.xlsx --plan-id my-plan --title "Мой план"
+    python bulk_import.py topics bible_verses_by_topic_fixed.csv
+    python bulk_import.py bookmarks data/bible_bot_backup.db
+    python bulk_import.py topics bible_verses_by_topic.xlsx --dry-run
+
+Повторный запуск безопасен: уже загруженные строки не дублируются.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from database.bulk_import import (
+    DEFAULT_BATCH_SIZE, BulkImporter, create_writer,
+    import_bookmarks, import_reading_plan, import_topics)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(message)s')
+logger = logging.getLogger(__name__)
+
+
+def plan_id_from_path(path: str) -> str:
+    """ID плана из имени файла"""
+    return os.path.splitext(os.path.basename(path))[0].replace(' ', '_')
+
+
+async def run_import(args) -> bool:
+    """Выполняет импорт по аргументам командной строки"""
+    from database.universal_manager import universal_db_manager
+
+    await universal_db_manager.initialize()
+    try:
+        writer = create_writer(universal_db_manager.manager, dry_run=args.dry_run)
+        importer = BulkImporter(writer, batch_size=args.batch_size)
+        mode = "проверка без записи" if args.dry_run else writer.name
+        logger.info(f"🚀 Импорт ({mode}), пачки по {args.batch_size} строк")
+
+        async with writer.transaction():
+            if args.command == 'plans':
+                if len(args.files) > 1 and (args.plan_id or args.title):
+                    raise ValueError("--plan-id и --title задаются только для одного файла")
+                for path in args.files:
+                    await import_reading_plan(
+                        importer, path, args.plan_id or plan_id_from_path(path),
+                        title=args.title, description=args.description)
+            elif args.command == 'topics':
+                await import_topics(importer, args.file)
+            elif args.command == 'bookmarks':
+                await import_bookmarks(importer, args.source)
+
+        logger.info("📊 Итоги:")
+        for result in importer.results:
+            logger.info(f"   • {result}")
+        return True
+
+    except Exception as e:
+        logger.error(f"❌ Ошибка импорта (изменения отменены): {e}")
+        return False
+    finally:
+        await universal_db_manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный импорт данных бота")
+    parser.add_argument('--dry-run', action='store_true', help="только прочитать и проверить источник")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help="строк в пачке")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    plans = commands.add_parser('plans', help="планы чтения из CSV/XLSX")
+    plans.add_argument('files', nargs='+', help="файлы планов (день, чтение)")
+    plans.add_argument('--plan-id', help="ID плана (по умолчанию - имя файла)")
+    plans.add_argument('--title', help="название (по умолчанию - строка plan_title файла)")
+    plans.add_argument('--description', help="описание плана")
+
+    topics = commands.add_parser('topics', help="библейские темы из CSV/XLSX")
+    topics.add_argument('file', help="файл тем (тема, стихи)")
+
+    bookmarks = commands.add_parser('bookmarks', help="пользователи и закладки из SQLite")
+    bookmarks.add_argument('source', help="файл SQLite бота")
+
+    args = parser.parse_args()
+    sys.exit(0 if asyncio.run(run_import(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -84,6 +84,8 @@ API_TIMEOUT = 10  # секунды
 # True - использовать локальные JSON файлы, False - использовать API
 USE_LOCAL_FILES = True
 LOCAL_FILES_PATH = "./local"  # путь к папке с локальными JSON файлами
+# Число стихов в главах по переводам (строится build_versification.py)
+VERSIFICATION_FILE = os.getenv("VERSIFICATION_FILE", "data/versification.json")
 
 # Параметры сообщений Telegram
 MESS_MAX_LENGTH = 4096  # максимальная длина сообщения
@@ -134,3 +136,51 @@ MARKDOWN_MODE = "MarkdownV2"  # Режим: Markdown, MarkdownV2, HTML
 MARKDOWN_BOLD_TITLE = True  # Делать заголовки жирными
 MARKDOWN_QUOTE = True  # Выводить текст как цитату (blockquote)
 MARKDOWN_ESCAPE = True  # Экранировать спецсимволы для MarkdownV2
+
+# --- НАСТРОЙКИ КАЛЕНДАРЯ ---
+
+# Разобранные дни календаря в памяти (services/calendar_service.py) и на диске
+CALENDAR_CACHE_MAX_ENTRIES = int(os.getenv("CALENDAR_CACHE_MAX_ENTRIES", "256"))
+CALENDAR_CACHE_FILE = os.getenv("CALENDAR_CACHE_FILE", "data/calendar_cache.json")
+# Через сколько секунд день перезагружается с сайта (в фоне, показывается прежний)
+CALENDAR_CACHE_TTL_SECONDS = int(os.getenv("CALENDAR_CACHE_TTL_SECONDS", "21600"))
+# Фоновая загрузка дней вокруг сегодняшнего: сколько дней в каждую сторону и как часто
+CALENDAR_PREFETCH_DAYS = int(os.getenv("CALENDAR_PREFETCH_DAYS", "7"))
+CALENDAR_PREFETCH_INTERVAL = int(os.getenv("CALENDAR_PREFETCH_INTERVAL", "3600"))
+# Готовые тексты чтений дней календаря (services/scripture_bundles.py):
+# ключ - кнопка чтения, перевод и режим разметки
+SCRIPTURE_BUNDLES_MAX_ENTRIES = int(os.getenv("SCRIPTURE_BUNDLES_MAX_ENTRIES", "512"))
+
+# --- НАСТРОЙКИ ТЕМ ---
+
+# Как часто темы перезагружаются из базы в фоне (services/topic_service.py), секунд
+TOPICS_REFRESH_INTERVAL = int(os.getenv("TOPICS_REFRESH_INTERVAL", "1800"))
+
+# --- НАСТРОЙКИ ИИ-ПОМОЩНИКА ---
+
+# Сколько кнопок со стихами из ответа ИИ показывать (handlers/ai_assistant.py)
+AI_VERSE_BUTTONS_LIMIT = int(os.getenv("AI_VERSE_BUTTONS_LIMIT", "5"))
+
+# --- НАСТРОЙКИ ОБСЛУЖИВАНИЯ БД ---
+
+# Сколько дней хранить дневные счетчики ИИ (старые сворачиваются в агрегаты)
+AI_USAGE_RETENTION_DAYS = int(os.getenv("AI_USAGE_RETENTION_DAYS", "90"))
+# Сколько дней хранить сообщения бесед с ИИ-помощником
+CONVERSATION_RETENTION_DAYS = int(
+    os.getenv("CONVERSATION_RETENTION_DAYS", "180"))
+# Последние сообщения активных бесед в памяти процесса (services/conversation_buffer.py)
+CONVERSATION_BUFFER_SIZE = int(os.getenv("CONVERSATION_BUFFER_SIZE", "20"))
+CONVERSATION_BUFFER_MAX_CONVERSATIONS = int(
+    os.getenv("CONVERSATION_BUFFER_MAX_CONVERSATIONS", "1000"))
+# Через сколько секунд без сообщений беседа выгружается из памяти
+CONVERSATION_BUFFER_IDLE_SECONDS = int(
+    os.getenv("CONVERSATION_BUFFER_IDLE_SECONDS", "3600"))
+# Сколько секунд помнить ответ на сообщение для повторов с тем же ключом
+# (services/idempotency.py)
+CHAT_IDEMPOTENCY_TTL_SECONDS = int(os.getenv("CHAT_IDEMPOTENCY_TTL_SECONDS", "600"))
+CHAT_IDEMPOTENCY_MAX_ENTRIES = int(os.getenv("CHAT_IDEMPOTENCY_MAX_ENTRIES", "2000"))
+# Размер порции удаления и пауза между порциями (чтобы не блокировать бота)
+MAINTENANCE_CHUNK_SIZE = int(os.getenv("MAINTENANCE_CHUNK_SIZE", "1000"))
+MAINTENANCE_CHUNK_PAUSE = float(os.getenv("MAINTENANCE_CHUNK_PAUSE", "0.05"))
+# Максимум порций за один запуск (остаток обработается на следующий день)
+MAINTENANCE_MAX_CHUNKS = int(os.getenv("MAINTENANCE_MAX_CHUNKS", "500"))
@@ -0,0 +1,574 @@
+"""
+Потоковая миграция данных между бэкендами (SQLite, PostgreSQL, Supabase).
+
+Каждая таблица читается из источника порциями по ключу пагинации (keyset,
+без OFFSET и без загрузки таблицы в память) и пишется в приемник пачками
+через писателей пакетного импорта (database/bulk_import.py). Таблицы одного
+этапа переносятся параллельно; этапы идут по порядку, чтобы пользователи
+и планы появились раньше ссылающихся на них строк.
+
+После каждой таблицы число строк и контрольная сумма источника сверяются
+с приемником. Позиция каждой таблицы сохраняется в файл состояния после
+каждой порции, поэтому прерванную миграцию можно продолжить с места остановки.
+Запись в приемник идемпотентна (по ключу таблицы), так что повтор
+последней порции после сбоя ничего не дублирует.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import time
+import uuid
+from contextlib import closing
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from .bulk_import import (
+    SQLITE_COLUMN_ALIASES, SUPABASE_COLUMN_ALIASES, ImportTarget, create_writer, decode_supabase_row)
+
+logger = logging.getLogger(__name__)
+
+# Размер порции по умолчанию
+DEFAULT_CHUNK_SIZE = 1000
+
+
+@dataclass(frozen=True)
+class MigrationTable:
+    """Таблица миграции (имена колонок - как в схеме PostgreSQL)"""
+    target: ImportTarget
+    # Колонки пагинации в источнике: уникальные и упорядочиваемые
+    order_by: Tuple[str, ...]
+    # Этап: таблицы этапа переносятся параллельно, этапы - по порядку
+    stage: int = 1
+    # Служебные колонки источника, которые нужны только для пагинации
+    extra: Tuple[str, ...] = field(default=())
+
+    @property
+    def name(self) -> str:
+        return self.target.table
+
+
+def _table(table: str, columns: Tuple[str, ...], key: Tuple[str, ...], order_by: Tuple[str, ...] = None,
+           stage: int = 1, nullable: Tuple[str, ...] = (), unique: bool = True) -> MigrationTable:
+    order_by = order_by or key
+    return MigrationTable(
+        ImportTarget(table, columns, key, nullable=nullable, unique=unique),
+        order_by, stage, tuple(c for c in order_by if c not in columns))
+
+
+# Строки с суррогатным id (закладки, толкования, платежи) сопоставляются по
+# естественному ключу - id в приемнике выдает его собственная последовательность
+MIGRATION_TABLES: List[MigrationTable] = [
+    _table('users', ('user_id', 'username', 'first_name', 'current_translation', 'response_length',
+                     'last_activity', 'created_at'), ('user_id',), stage=0),
+    _table('reading_plans', ('plan_id', 'title', 'description', 'total_days', 'created_at'),
+           ('plan_id',), stage=0),
+    _table('bible_topics', ('topic_name', 'verses', 'created_at', 'updated_at'), ('topic_name',), stage=0),
+    _table('ai_usage_daily', ('date', 'total_count', 'active_users'), ('date',), stage=0),
+    _table('text_blobs', ('hash', 'data', 'size', 'created_at'), ('hash',), stage=0),
+    _table('reading_plan_days', ('plan_id', 'day_number', 'reading_text'), ('plan_id', 'day_number')),
+    _table('user_reading_plans', ('user_id', 'plan_id', 'current_day', 'started_at', 'updated_at'),
+           ('user_id', 'plan_id')),
+    _table('bookmarks', ('user_id', 'book_id', 'chapter_start', 'chapter_end', 'verse_start', 'verse_end',
+                         'display_text', 'note', 'created_at'),
+           ('user_id', 'book_id', 'chapter_start', 'chapter_end', 'verse_start', 'verse_end'),
+           order_by=('id',), nullable=('chapter_end', 'verse_start', 'verse_end'), unique=False),
+    _table('saved_commentaries', ('user_id', 'book_id', 'chapter_start', 'chapter_end', 'verse_start',
+                                  'verse_end', 'reference_text', 'commentary_text', 'commentary_type',
+                                  'text_hash', 'created_at', 'updated_at'),
+           ('user_id', 'book_id', 'chapter_start', 'chapter_end', 'verse_start', 'verse_end',
+            'commentary_type'),
+           order_by=('id',), nullable=('chapter_end', 'verse_start', 'verse_end'), unique=False),
+    _table('ai_conversations', ('id', 'user_id', 'title', 'created_at', 'updated_at'), ('id',)),
+    _table('ai_messages', ('id', 'conversation_id', 'role', 'content', 'content_hash', 'meta',
+                           'created_at'), ('id',), stage=2),
+    _table('ai_limits', ('user_id', 'date', 'count'), ('user_id', 'date')),
+    _table('ai_usage_totals', ('user_id', 'total_count', 'archived_count', 'first_date', 'last_date'),
+           ('user_id',)),
+    _table('reading_progress', ('user_id', 'plan_id', 'day_number', 'completed', 'completed_at'),
+           ('user_id', 'plan_id', 'day_number')),
+    _table('reading_parts_progress', ('user_id', 'plan_id', 'day_number', 'part_idx', 'completed',
+                                      'completed_at'),
+           ('user_id', 'plan_id', 'day_number', 'part_idx')),
+    _table('premium_requests', ('user_id', 'requests_count', 'total_purchased', 'total_used',
+                                'created_at', 'updated_at'), ('user_id',)),
+    _table('premium_purchases', ('user_id', 'requests_count', 'amount_rub', 'payment_id', 'payment_status',
+                                 'created_at', 'completed_at'),
+           ('user_id', 'created_at', 'payment_id'), order_by=('id',),
+           nullable=('created_at', 'payment_id'), unique=False),
+    _table('donations', ('user_id', 'amount_rub', 'payment_id', 'payment_status', 'message',
+                         'created_at', 'completed_at'),
+           ('user_id', 'created_at', 'payment_id'), order_by=('id',),
+           nullable=('created_at', 'payment_id'), unique=False),
+]
+
+
+# ---------------------------------------------------------------------------
+# Чтение бэкендов
+# ---------------------------------------------------------------------------
+
+class BackendReader:
+    """Чтение таблицы порциями по ключу пагинации"""
+
+    name = ''
+    COLUMN_ALIASES: Dict[Tuple[str, str], str] = {}
+
+    def _column(self, table: str, column: str) -> str:
+        return self.COLUMN_ALIASES.get((table, column), column)
+
+    async def columns(self, table: str) -> Optional[List[str]]:
+        """Колонки таблицы (имена PostgreSQL); None - таблицы нет"""
+        raise NotImplementedError
+
+    async def count(self, table: str) -> int:
+        raise NotImplementedError
+
+    async def read_chunk(self, table: MigrationTable, columns: Tuple[str, ...],
+                         cursor: Any, limit: int) -> Tuple[List[Dict[str, Any]], Any]:
+        """
+        Следующая порция строк после cursor.
+
+        Returns:
+            (строки с колонками columns и table.order_by, новый cursor)
+        """
+        raise NotImplementedError
+
+    def _canonical(self, table: str, names: List[str]) -> List[str]:
+        reverse = {alias: column for (t, column), alias in self.COLUMN_ALIASES.items() if t == table}
+        return [reverse.get(name, name) for name in names]
+
+
+class SQLiteReader(BackendReader):
+    name = 'SQLite'
+    COLUMN_ALIASES = SQLITE_COLUMN_ALIASES
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(f"file:{self.db_file}?mode=ro", uri=True, timeout=30)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    async def columns(self, table: str) -> Optional[List[str]]:
+        def _columns():
+            with closing(self._connect()) as conn:
+                return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+
+        names = await asyncio.to_thread(_columns)
+        return self._canonical(table, names) if names else None
+
+    async def count(self, table: str) -> int:
+        def _count():
+            with closing(self._connect()) as conn:
+                return conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+        return await asyncio.to_thread(_count)
+
+    async def read_chunk(self, table, columns, cursor, limit):
+        select = ', '.join(f"{self._column(table.name, c)} AS {c}" for c in columns + table.extra)
+        order = ', '.join(self._column(table.name, c) for c in table.order_by)
+        where = ''
+        params: list = []
+        if cursor is not None:
+            where = f"WHERE ({order}) > ({', '.join('?' for _ in table.order_by)})"
+            params = list(cursor)
+
+        def _read():
+            with closing(self._connect()) as conn:
+                rows = conn.execute(
+                    f"SELECT {select} FROM {table.name} {where} ORDER BY {order} LIMIT ?",
+                    (*params, limit)).fetchall()
+                return [dict(row) for row in rows]
+
+        rows = await asyncio.to_thread(_read)
+        next_cursor = [rows[-1][c] for c in table.order_by] if rows else cursor
+        return rows, next_cursor
+
+
+class PostgresReader(BackendReader):
+    name = 'PostgreSQL'
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    async def columns(self, table: str) -> Optional[List[str]]:
+        rows = await self.pool.fetch(
+            "SELECT column_name FROM information_schema.columns "
+            "WHERE table_schema = current_schema() AND table_name = $1 ORDER BY ordinal_position", table)
+        return [row['column_name'] for row in rows] or None
+
+    async def count(self, table: str) -> int:
+        return await self.pool.fetchval(f"SELECT COUNT(*) FROM {table}")
+
+    async def read_chunk(self, table, columns, cursor, limit):
+        order = ', '.join(table.order_by)
+        params: list = []
+        where = ''
+        if cursor is not None:
+            params = list(cursor)
+            where = f"WHERE ({order}) > ({', '.join(f'${i}' for i in range(1, len(params) + 1))})"
+        rows = await self.pool.fetch(
+            f"SELECT {', '.join(columns + table.extra)} FROM {table.name} {where} "
+            f"ORDER BY {order} LIMIT ${len(params) + 1}", *params, limit)
+        rows = [dict(row) for row in rows]
+        next_cursor = [rows[-1][c] for c in table.order_by] if rows else cursor
+        return rows, next_cursor
+
+
+class SupabaseReader(BackendReader):
+    """
+    Чтение через REST API Supabase.
+
+    Составной ключ пагинации REST не сравнивает целиком, поэтому для него
+    cursor - это смещение (упорядоченное по ключу), для простого - последнее значение.
+    """
+
+    name = 'Supabase'
+    COLUMN_ALIASES = SUPABASE_COLUMN_ALIASES
+
+    def __init__(self, client):
+        self.client = client
+
+    async def columns(self, table: str) -> Optional[List[str]]:
+        def _probe():
+            return self.client.table(table).select('*').limit(1).execute()
+
+        try:
+            result = await asyncio.to_thread(_probe)
+        except Exception:
+            return None
+        # Пустая таблица не показывает колонки - считаем, что схема совпадает
+        return self._canonical(table, list(result.data[0])) if result.data else []
+
+    async def count(self, table: str) -> int:
+        result = await asyncio.to_thread(
+            lambda: self.client.table(table).select('*', count='exact').limit(1).execute())
+        return result.count or 0
+
+    async def read_chunk(self, table, columns, cursor, limit):
+        names = [self._column(table.name, c) for c in columns + table.extra]
+        order = [self._column(table.name, c) for c in table.order_by]
+
+        def _read():
+            query = self.client.table(table.name).select(','.join(dict.fromkeys(names)))
+            for column in order:
+                query = query.order(column)
+            if len(order) == 1:
+                if cursor is not None:
+                    query = query.gt(order[0], cursor)
+                return query.limit(limit).execute()
+            offset = cursor or 0
+            return query.range(offset, offset + limit - 1).execute()
+
+        result = await asyncio.to_thread(_read)
+        canonical = dict(zip(names, columns + table.extra))
+        rows = [{canonical.get(k, k): v for k, v in decode_supabase_row(table.name, row).items()}
+                for row in result.data or []]
+        if len(order) == 1:
+            next_cursor = rows[-1][table.order_by[0]] if rows else cursor
+        else:
+            next_cursor = (cursor or 0) + len(rows)
+        return rows, next_cursor
+
+
+def create_reader(manager) -> BackendReader:
+    """Читатель для менеджера БД"""
+    manager = getattr(manager, 'wrapped_manager', manager)
+    if getattr(manager, 'client', None) is not None:
+        return SupabaseReader(manager.client)
+    if getattr(manager, 'pool', None) is not None:
+        return PostgresReader(manager.pool)
+    if getattr(manager, 'db_file', None):
+        return SQLiteReader(manager.db_file)
+    raise ValueError(f"Миграция не поддерживается для {type(manager).__name__}")
+
+
+def create_manager(backend: str, sqlite_path: str = None):
+    """Менеджер БД по имени бэкенда: sqlite, postgres или supabase"""
+    if backend == 'sqlite':
+        from .db_manager import DatabaseManager
+        return DatabaseManager(sqlite_path) if sqlite_path else DatabaseManager()
+    if backend == 'postgres':
+        from .postgres_manager import PostgreSQLManager
+        return PostgreSQLManager()
+    if backend == 'supabase':
+        from .supabase_manager import SupabaseManager
+        return SupabaseManager()
+    raise ValueError(f"Неизвестный бэкенд: {backend}")
+
+
+# ---------------------------------------------------------------------------
+# Контрольные суммы
+# ---------------------------------------------------------------------------
+
+_TIMESTAMP_RE = re.compile(r'^\d{4}-\d{2}-\d{2}[ T]\d{2}:\d{2}')
+
+
+def _normalize(value: Any) -> str:
+    """Значение в виде, одинаковом для всех бэкендов"""
+    if value is None:
+        return ''
+    if isinstance(value, bool):
+        return str(int(value))
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None).isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return bytes(value).hex()
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False, sort_keys=True)
+    if isinstance(value, str) and value[:1] in ('{', '['):
+        # JSON: текст SQLite, jsonb PostgreSQL и объект Supabase
+        try:
+            return _normalize(json.loads(value))
+        except ValueError:
+            pass
+    if isinstance(value, str) and _TIMESTAMP_RE.match(value):
+        # '2025-01-01T10:00:00.5+00:00' (Supabase), '2025-01-01 10:00:00.5' (SQLite)
+        # и datetime из PostgreSQL приводятся к одному виду
+        try:
+            return _normalize(datetime.fromisoformat(value.replace('Z', '+00:00')))
+        except ValueError:
+            pass
+    return str(value)
+
+
+class TableChecksum:
+    """Контрольная сумма набора строк, не зависящая от порядка строк"""
+
+    def __init__(self, rows: int = 0, digest: int = 0):
+        self.rows = rows
+        self.digest = digest
+
+    def add(self, row: Dict[str, Any], columns: Tuple[str, ...]):
+        payload = '\x1f'.join(_normalize(row.get(c)) for c in columns).encode('utf-8')
+        self.rows += 1
+        self.digest = (self.digest + int.from_bytes(
+            hashlib.blake2b(payload, digest_size=8).digest(), 'big')) % (1 << 64)
+
+    def __eq__(self, other) -> bool:
+        return self.rows == other.rows and self.digest == other.digest
+
+    def __str__(self) -> str:
+        return f"{self.rows} строк, сумма {self.digest:016x}"
+
+
+# ---------------------------------------------------------------------------
+# Состояние миграции
+# ---------------------------------------------------------------------------
+
+def _dump_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {'datetime': value.isoformat()}
+    if isinstance(value, date):
+        return {'date': value.isoformat()}
+    if isinstance(value, uuid.UUID):
+        # PostgreSQL примет текст uuid в сравнении ключа пагинации
+        return str(value)
+    return value
+
+
+def _load_value(value: Any) -> Any:
+    if isinstance(value, dict):
+        if 'datetime' in value:
+            return datetime.fromisoformat(value['datetime'])
+        if 'date' in value:
+            return date.fromisoformat(value['date'])
+    return value
+
+
+class MigrationState:
+    """Позиция и итоги каждой таблицы, сохраняемые в JSON файл"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.tables: Dict[str, Dict[str, Any]] = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                self.tables = json.load(file).get('tables', {})
+
+    def table(self, name: str) -> Dict[str, Any]:
+        return self.tables.setdefault(name, {'status': 'pending', 'cursor': None, 'copied': 0})
+
+    def cursor(self, name: str) -> Any:
+        cursor = self.table(name)['cursor']
+        if isinstance(cursor, list):
+            return [_load_value(v) for v in cursor]
+        return _load_value(cursor)
+
+    def save(self, name: str, **values):
+        state = self.table(name)
+        state.update(values)
+        if 'cursor' in values:
+            cursor = values['cursor']
+            state['cursor'] = [_dump_value(v) for v in cursor] if isinstance(cursor, list) \
+                else _dump_value(cursor)
+        if not self.path:
+            return
+        # Пишем во временный файл и заменяем - прерывание не оставит битый JSON
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            json.dump({'updated_at': datetime.now().isoformat(), 'tables': self.tables},
+                      file, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, self.path)
+
+
+# ---------------------------------------------------------------------------
+# Миграция
+# ---------------------------------------------------------------------------
+
+@dataclass
+class TableResult:
+    """Итоги переноса одной таблицы"""
+    table: str
+    status: str = 'pending'
+    copied: int = 0
+    source: Optional[TableChecksum] = None
+    target: Optional[TableChecksum] = None
+    seconds: float = 0.0
+    error: str = ''
+
+    def __str__(self) -> str:
+        if self.status == 'skipped':
+            return f"{self.table}: пропущена ({self.error})"
+        if self.status == 'failed':
+            return f"{self.table}: ошибка - {self.error}"
+        check = ''
+        if self.source is not None:
+            check = f"; источник {self.source}, приемник {self.target}"
+        return f"{self.table}: {self.status}, перенесено {self.copied} за {self.seconds:.1f}с{check}"
+
+
+class BackendMigration:
+    """Перенос таблиц MIGRATION_TABLES из одного менеджера БД в другой"""
+
+    def __init__(self, source_manager, target_manager, state_path: str = None,
+                 chunk_size: int = DEFAULT_CHUNK_SIZE, workers: int = 4,
+                 tables: List[str] = None, verify: bool = True):
+        self.source = create_reader(source_manager)
+        self.target_reader = create_reader(target_manager)
+        self.target_manager = target_manager
+        self.state = MigrationState(state_path)
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.verify = verify
+        self.tables = [t for t in MIGRATION_TABLES if not tables or t.name in tables]
+        self.results: List[TableResult] = []
+
+    async def run(self) -> bool:
+        """Переносит все таблицы; True - все перенесены и сверены"""
+        semaphore = asyncio.Semaphore(self.workers)
+
+        async def _worker(table: MigrationTable) -> TableResult:
+            async with semaphore:
+                return await self.migrate_table(table)
+
+        for stage in sorted({t.stage for t in self.tables}):
+            stage_tables = [t for t in self.tables if t.stage == stage]
+            logger.info(f"🔄 Этап {stage}: {', '.join(t.name for t in stage_tables)}")
+            self.results += await asyncio.gather(*(_worker(t) for t in stage_tables))
+
+        return all(r.status in ('verified', 'copied', 'skipped') for r in self.results)
+
+    async def _columns(self, table: MigrationTable) -> Optional[Tuple[str, ...]]:
+        """Колонки, которые есть и в источнике, и в приемнике"""
+        source_columns = await self.source.columns(table.name)
+        if source_columns is None:
+            return None
+        target_columns = await self.target_reader.columns(table.name)
+        if target_columns is None:
+            return None
+        # Пустой список - колонки неизвестны (пустая таблица Supabase), считаем полными
+        available = set(table.target.columns + table.order_by)
+        for known in (source_columns, target_columns):
+            if known:
+                available &= set(known)
+        missing = [c for c in table.target.key + table.order_by if c not in available]
+        if missing:
+            raise ValueError(f"нет ключевых колонок {missing}")
+        return tuple(c for c in table.target.columns if c in available)
+
+    async def migrate_table(self, table: MigrationTable) -> TableResult:
+        """Переносит одну таблицу порциями и сверяет результат"""
+        result = TableResult(table.name)
+        state = self.state.table(table.name)
+        if state['status'] == 'verified':
+            result.status, result.copied = 'verified', state['copied']
+            logger.info(f"⏭️ {table.name}: уже перенесена и сверена")
+            return result
+
+        started = time.perf_counter()
+        try:
+            columns = await self._columns(table)
+            if columns is None:
+                result.status, result.error = 'skipped', "таблицы нет в источнике или приемнике"
+                logger.warning(f"⚠️ {table.name}: {result.error}")
+                return result
+
+            target = replace(table.target, columns=columns)
+            total = await self.source.count(table.name)
+            cursor = self.state.cursor(table.name)
+            copied = state['copied'] if cursor is not None else 0
+            if cursor is not None:
+                logger.info(f"▶️ {table.name}: продолжаем с {copied} из {total}")
+
+            writer = create_writer(self.target_manager)
+            while True:
+                rows, next_cursor = await self.source.read_chunk(table, columns, cursor, self.chunk_size)
+                if not rows:
+                    break
+                async with writer.transaction():
+                    await writer.write(target, _dedupe(target, rows))
+                copied += len(rows)
+                cursor = next_cursor
+                self.state.save(table.name, status='copying', cursor=cursor, copied=copied)
+                logger.info(f"📦 {table.name}: {copied}/{total}")
+
+            result.copied = copied
+            result.status = 'copied'
+            self.state.save(table.name, status='copied', cursor=cursor, copied=copied)
+
+            if self.verify:
+                result.source = await self._checksum(self.source, table, columns)
+                result.target = await self._checksum(self.target_reader, table, columns)
+                result.status = 'verified' if result.source == result.target else 'mismatch'
+                self.state.save(table.name, status=result.status)
+                if result.status == 'mismatch':
+                    logger.warning(
+                        f"⚠️ {table.name}: данные не совпадают - в приемнике могли быть свои строки "
+                        f"или в источнике есть повторы ключа {table.target.key}")
+        except Exception as e:
+            result.status, result.error = 'failed', str(e)
+            logger.error(f"Ошибка миграции таблицы {table.name}: {e}")
+        finally:
+            result.seconds = time.perf_counter() - started
+
+        logger.info(f"{'✅' if result.status in ('verified', 'copied') else '❌'} {result}")
+        return result
+
+    async def _checksum(self, reader: BackendReader, table: MigrationTable,
+                        columns: Tuple[str, ...]) -> TableChecksum:
+        """Контрольная сумма колонок миграции (суррогатные id не учитываются)"""
+        checksum = TableChecksum()
+        cursor = None
+        while True:
+            rows, cursor = await reader.read_chunk(table, columns, cursor, self.chunk_size)
+            if not rows:
+                return checksum
+            for row in rows:
+                checksum.add(row, columns)
+
+
+def _dedupe(target: ImportTarget, rows: List[Dict[str, Any]]) -> List[tuple]:
+    """Строки порции без повторов ключа (последняя побеждает)"""
+    unique = {}
+    for row in rows:
+        values = tuple(row.get(c) for c in target.columns)
+        unique[tuple(row.get(c) for c in target.key)] = values
+    return list(unique.values())
@@ -0,0 +1,736 @@
+"""
+Пакетный импорт данных (планы чтения, темы, закладки) в любой бэкенд.
+
+Источники (CSV, XLSX, SQLite) читаются потоково и пишутся пачками:
+- PostgreSQL: COPY во временную таблицу и одно слияние с целевой таблицей;
+- Supabase: многострочные upsert по batch_size строк;
+- SQLite: executemany в одной транзакции.
+
+Строки сопоставляются с уже загруженными по ключу ImportTarget.key, поэтому
+повторный запуск ничего не дублирует и меняет только отличающиеся строки.
+В PostgreSQL и SQLite весь импорт идет в одной транзакции и при ошибке
+откатывается целиком; в Supabase транзакций нет, и после сбоя импорт
+достаточно запустить еще раз. Режим dry_run только читает и проверяет источник.
+"""
+import asyncio
+import csv
+import json
+import logging
+import os
+import sqlite3
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from .text_store import decode_blob, encode_blob
+
+logger = logging.getLogger(__name__)
+
+# Размер пачки по умолчанию
+DEFAULT_BATCH_SIZE = 500
+
+
+@dataclass(frozen=True)
+class ImportTarget:
+    """Целевая таблица импорта"""
+    table: str
+    columns: Tuple[str, ...]
+    # Колонки, по которым строка источника находит свою строку в таблице
+    key: Tuple[str, ...]
+    # Колонки ключа, которые могут быть NULL (сравниваются как IS NOT DISTINCT FROM)
+    nullable: Tuple[str, ...] = ()
+    # Обновлять неключевые колонки уже существующих строк
+    update: bool = True
+    # Ключ закреплен уникальным ограничением (нужно для upsert в Supabase)
+    unique: bool = True
+
+    @property
+    def values(self) -> Tuple[str, ...]:
+        """Неключевые колонки"""
+        return tuple(c for c in self.columns if c not in self.key)
+
+
+READING_PLANS = ImportTarget(
+    'reading_plans', ('plan_id', 'title', 'description', 'total_days'), ('plan_id',))
+READING_PLAN_DAYS = ImportTarget(
+    'reading_plan_days', ('plan_id', 'day_number', 'reading_text'), ('plan_id', 'day_number'))
+BIBLE_TOPICS = ImportTarget(
+    'bible_topics', ('topic_name', 'verses'), ('topic_name',))
+USERS = ImportTarget(
+    'users', ('user_id', 'username', 'first_name'), ('user_id',), update=False)
+BOOKMARKS = ImportTarget(
+    'bookmarks',
+    ('user_id', 'book_id', 'chapter_start', 'chapter_end', 'verse_start', 'verse_end',
+     'display_text', 'note', 'created_at'),
+    ('user_id', 'book_id', 'chapter_start', 'chapter_end', 'verse_start', 'verse_end'),
+    nullable=('chapter_end', 'verse_start', 'verse_end'),
+    update=False, unique=False)
+
+
+@dataclass
+class ImportResult:
+    """Итоги импорта одной таблицы"""
+    table: str
+    read: int = 0
+    skipped: int = 0
+    written: int = 0
+    seconds: float = 0.0
+    dry_run: bool = False
+
+    def __str__(self) -> str:
+        action = "проверено" if self.dry_run else f"записано {self.written}"
+        return (f"{self.table}: прочитано {self.read}, пропущено {self.skipped}, "
+                f"{action} за {self.seconds:.1f}с")
+
+
+# ---------------------------------------------------------------------------
+# Чтение источников
+# ---------------------------------------------------------------------------
+
+def iter_csv_rows(path: str) -> Iterator[List[str]]:
+    """Строки CSV файла по одной"""
+    with open(path, 'r', encoding='utf-8-sig', newline='') as file:
+        yield from csv.reader(file)
+
+
+def iter_xlsx_rows(path: str, sheet: str = None) -> Iterator[List[Any]]:
+    """Строки листа XLSX по одной (без загрузки книги в память целиком)"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        worksheet = workbook[sheet] if sheet else workbook.active
+        for row in worksheet.iter_rows(values_only=True):
+            yield list(row)
+    finally:
+        workbook.close()
+
+
+def iter_table_rows(path: str) -> Iterator[List[Any]]:
+    """Строки CSV или XLSX файла в зависимости от расширения"""
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        return iter_xlsx_rows(path)
+    return iter_csv_rows(path)
+
+
+def iter_sqlite_rows(path: str, query: str, params: tuple = (),
+                     chunk_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Dict[str, Any]]:
+    """Строки запроса к файлу SQLite по одной (читаются порциями)"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    try:
+        cursor = conn.execute(query, params)
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            for row in rows:
+                yield dict(row)
+    finally:
+        conn.close()
+
+
+def _sqlite_columns(path: str, table: str) -> List[str]:
+    """Колонки таблицы SQLite (пусто, если таблицы нет)"""
+    conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    try:
+        return [row[1] for row in conn.execute(f"PRAGMA table_info({table})")]
+    finally:
+        conn.close()
+
+
+def _as_text(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    text = str(value).strip()
+    return text or None
+
+
+def _as_datetime(value: Any) -> Optional[datetime]:
+    if value is None or isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value))
+    except ValueError:
+        return None
+
+
+def read_plan_title(path: str) -> Optional[str]:
+    """Название плана из первой строки файла (plan_title,Название)"""
+    for row in _iter_plan_rows(path):
+        if len(row) == 2 and str(row[0]).strip() == 'plan_title':
+            return _as_text(row[1])
+        return None
+    return None
+
+
+def _iter_plan_rows(path: str) -> Iterator[List[Any]]:
+    if path.lower().endswith(('.xlsx', '.xlsm')):
+        yield from iter_xlsx_rows(path)
+        return
+    # Текст чтения в CSV планов не экранируется и может содержать запятые -
+    # делим строку только по первой запятой, как ReadingPlansService
+    with open(path, 'r', encoding='utf-8-sig') as file:
+        for line in file:
+            line = line.strip()
+            if line:
+                yield line.split(',', 1)
+
+
+def read_plan_days(path: str, plan_id: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Дни плана чтения из CSV или XLSX файла (колонки: день, чтение).
+
+    Строка заголовка и строка с названием плана пропускаются молча,
+    некорректные строки выдаются как None (считаются пропущенными).
+    """
+    for row in _iter_plan_rows(path):
+        if len(row) < 2 or str(row[0]).strip() in ('plan_title', 'day'):
+            continue
+        try:
+            day = int(str(row[0]).strip())
+        except ValueError:
+            yield None
+            continue
+        reading = _as_text(row[1])
+        if not reading:
+            yield None
+            continue
+        yield {'plan_id': plan_id, 'day_number': day, 'reading_text': reading}
+
+
+def read_topics(path: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """Темы из CSV или XLSX файла (колонки: тема, стихи; первая строка - заголовок)"""
+    rows = iter_table_rows(path)
+    next(rows, None)
+    for row in rows:
+        topic_name = _as_text(row[0]) if len(row) > 0 else None
+        verses = _as_text(row[1]) if len(row) > 1 else None
+        if not topic_name or not verses:
+            yield None
+            continue
+        yield {'topic_name': topic_name, 'verses': verses}
+
+
+def read_sqlite_users(path: str) -> Iterator[Dict[str, Any]]:
+    """Пользователи из файла SQLite бота"""
+    for row in iter_sqlite_rows(path, "SELECT user_id, username, first_name FROM users"):
+        yield row
+
+
+def read_sqlite_bookmarks(path: str) -> Iterator[Optional[Dict[str, Any]]]:
+    """
+    Закладки из файла SQLite бота.
+
+    Поддерживает и старую структуру таблицы (chapter, comment),
+    и новую (chapter_start ... verse_end, note).
+    """
+    columns = _sqlite_columns(path, 'bookmarks')
+    if 'chapter_start' in columns:
+        query = """
+            SELECT user_id, book_id, chapter_start, chapter_end, verse_start, verse_end,
+                   display_text, note, created_at
+            FROM bookmarks
+        """
+    else:
+        query = """
+            SELECT user_id, book_id, chapter AS chapter_start, NULL AS chapter_end,
+                   NULL AS verse_start, NULL AS verse_end,
+                   display_text, comment AS note, created_at
+            FROM bookmarks
+        """
+    for row in iter_sqlite_rows(path, query):
+        if row['user_id'] is None or row['book_id'] is None or row['chapter_start'] is None:
+            yield None
+            continue
+        row['created_at'] = _as_datetime(row['created_at'])
+        yield row
+
+
+# ---------------------------------------------------------------------------
+# Запись в бэкенды
+# ---------------------------------------------------------------------------
+
+# Колонки, которые в схемах SQLite и Supabase называются иначе, чем в PostgreSQL
+SQLITE_COLUMN_ALIASES = {
+    ('reading_progress', 'day_number'): 'day',
+    ('reading_parts_progress', 'day_number'): 'day',
+}
+SUPABASE_COLUMN_ALIASES = {
+    ('reading_plan_days', 'day_number'): 'day',
+    ('reading_progress', 'day_number'): 'day',
+    ('reading_parts_progress', 'day_number'): 'day',
+}
+# Бинарные колонки, которые Supabase хранит в base64 (database/text_store.py)
+SUPABASE_BLOB_COLUMNS = {('text_blobs', 'data')}
+# JSON-колонки: SQLite хранит их текстом, PostgreSQL и Supabase - в jsonb
+JSON_COLUMNS = {('ai_messages', 'meta')}
+
+
+def _supabase_value(value: Any) -> Any:
+    """Значение для JSON-запроса Supabase"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    if isinstance(value, (bytes, memoryview)):
+        return encode_blob(bytes(value))
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    return value
+
+
+def _sqlite_value(value: Any) -> Any:
+    """Значение для колонки SQLite (даты и JSON хранятся текстом)"""
+    if isinstance(value, datetime):
+        return value.isoformat(' ')
+    if isinstance(value, date):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (dict, list)):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _to_json(value: Any) -> str:
+    return value if isinstance(value, str) else json.dumps(value, ensure_ascii=False)
+
+
+def decode_supabase_row(table: str, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Строка Supabase с бинарными колонками, раскодированными из base64"""
+    for column in row:
+        if (table, column) in SUPABASE_BLOB_COLUMNS and row[column] is not None:
+            row[column] = decode_blob(row[column])
+    return row
+
+
+class BulkWriter:
+    """Базовый писатель: пачка строк -> таблица"""
+
+    name = 'dry-run'
+    COLUMN_ALIASES: Dict[Tuple[str, str], str] = {}
+
+    def _column(self, target: ImportTarget, column: str) -> str:
+        """Имя колонки в схеме бэкенда"""
+        return self.COLUMN_ALIASES.get((target.table, column), column)
+
+    @asynccontextmanager
+    async def transaction(self):
+        """Транзакция на весь импорт (там, где бэкенд ее поддерживает)"""
+        yield self
+
+    async def has_table(self, table: str) -> bool:
+        return True
+
+    async def write(self, target: ImportTarget, rows: List[tuple]) -> int:
+        """Записывает пачку, возвращает число вставленных или измененных строк"""
+        return 0
+
+    async def delete_stale(self, target: ImportTarget, scope: Dict[str, Any], keep: List[Any]):
+        """
+        Удаляет строки области scope, которых нет в источнике.
+
+        Ключ target должен состоять из колонок scope и еще одной колонки,
+        значения которой перечислены в keep.
+        """
+
+
+def _stale_column(target: ImportTarget, scope: Dict[str, Any]) -> str:
+    rest = [c for c in target.key if c not in scope]
+    if len(rest) != 1:
+        raise ValueError(f"Ключ {target.key} не сводится к области {list(scope)} и одной колонке")
+    return rest[0]
+
+
+def _to_date(value: Any) -> date:
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return date.fromisoformat(str(value)[:10])
+
+
+def _to_datetime(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        return value.replace(tzinfo=None)
+    if isinstance(value, date):
+        return datetime(value.year, value.month, value.day)
+    return datetime.fromisoformat(str(value).replace('Z', '+00:00')).replace(tzinfo=None)
+
+
+def _to_bool(value: Any) -> bool:
+    if isinstance(value, str):
+        return value.strip().lower() in ('1', 'true', 't', 'yes')
+    return bool(value)
+
+
+# Преобразование значений под тип колонки PostgreSQL (data_type из information_schema)
+_PG_CONVERTERS = {
+    'boolean': _to_bool,
+    'date': _to_date,
+    'timestamp': _to_datetime,
+    'integer': int,
+    'bigint': int,
+    'smallint': int,
+    'text': str,
+    'character': str,
+    'bytea': bytes,
+    'uuid': str,
+    'jsonb': _to_json,
+}
+
+
+class PostgresBulkWriter(BulkWriter):
+    """COPY во временную таблицу и слияние с целевой в одной транзакции"""
+
+    name = 'PostgreSQL'
+
+    def __init__(self, pool):
+        self.pool = pool
+        self.conn = None
+        self._staging = set()
+        self._types: Dict[str, Dict[str, str]] = {}
+
+    @asynccontextmanager
+    async def transaction(self):
+        async with self.pool.acquire() as conn:
+            async with conn.transaction():
+                self.conn = conn
+                self._staging = set()
+                try:
+                    yield self
+                finally:
+                    self.conn = None
+
+    async def _stage(self, target: ImportTarget) -> str:
+        staging = f"_import_{target.table}"
+        if staging not in self._staging:
+            # Без ограничений целевой таблицы (id и значения по умолчанию не нужны)
+            await self.conn.execute(
+                f"CREATE TEMP TABLE {staging} ON COMMIT DROP AS "
+                f"SELECT {', '.join(target.columns)} FROM {target.table} WITH NO DATA")
+            self._staging.add(staging)
+        else:
+            await self.conn.execute(f"TRUNCATE {staging}")
+        return staging
+
+    @staticmethod
+    def _match(target: ImportTarget) -> str:
+        return ' AND '.join(
+            f"t.{c} IS NOT DISTINCT FROM s.{c}" if c in target.nullable else f"t.{c} = s.{c}"
+            for c in target.key)
+
+    async def _coerce(self, target: ImportTarget, rows: List[tuple]) -> List[tuple]:
+        """Приводит значения к типам колонок (COPY не преобразует '2025-01-01' в date)"""
+        types = self._types.get(target.table)
+        if types is None:
+            records = await self.conn.fetch(
+                "SELECT column_name, data_type FROM information_schema.columns "
+                "WHERE table_schema = current_schema() AND table_name = $1", target.table)
+            types = self._types[target.table] = {r['column_name']: r['data_type'] for r in records}
+        converters = [_PG_CONVERTERS.get(types.get(c, '').split(' ')[0]) for c in target.columns]
+        if not any(converters):
+            return rows
+        return [
+            tuple(value if value is None or convert is None else convert(value)
+                  for value, convert in zip(row, converters))
+            for row in rows
+        ]
+
+    async def write(self, target: ImportTarget, rows: List[tuple]) -> int:
+        staging = await self._stage(target)
+        rows = await self._coerce(target, rows)
+        await self.conn.copy_records_to_table(staging, records=rows, columns=list(target.columns))
+
+        match = self._match(target)
+        written = 0
+        if target.update and target.values:
+            status = await self.conn.execute(f"""
+                UPDATE {target.table} t SET {', '.join(f'{c} = s.{c}' for c in target.values)}
+                FROM {staging} s
+                WHERE {match}
+                AND ({' OR '.join(f't.{c} IS DISTINCT FROM s.{c}' for c in target.values)})
+            """)
+            written += int(status.split()[-1])
+
+        columns = ', '.join(target.columns)
+        status = await self.conn.execute(f"""
+            INSERT INTO {target.table} ({columns})
+            SELECT {', '.join(f's.{c}' for c in target.columns)} FROM {staging} s
+            WHERE NOT EXISTS (SELECT 1 FROM {target.table} t WHERE {match})
+        """)
+        written += int(status.split()[-1])
+        return written
+
+    async def delete_stale(self, target: ImportTarget, scope: Dict[str, Any], keep: List[Any]):
+        column = _stale_column(target, scope)
+        conditions = [f"{c} = ${i}" for i, c in enumerate(scope, start=1)]
+        await self.conn.execute(
+            f"DELETE FROM {target.table} WHERE {' AND '.join(conditions)} "
+            f"AND NOT ({column} = ANY(${len(scope) + 1}))",
+            *scope.values(), list(keep))
+
+
+class SQLiteBulkWriter(BulkWriter):
+    """executemany в одной транзакции"""
+
+    name = 'SQLite'
+    COLUMN_ALIASES = SQLITE_COLUMN_ALIASES
+
+    def __init__(self, db_file: str):
+        self.db_file = db_file
+        self.conn: Optional[sqlite3.Connection] = None
+
+    @asynccontextmanager
+    async def transaction(self):
+        # Ждем, пока другая транзакция (например, соседняя таблица миграции) отпустит файл
+        conn = sqlite3.connect(self.db_file, timeout=30, check_same_thread=False)
+        self.conn = conn
+        try:
+            yield self
+            await asyncio.to_thread(conn.commit)
+        except BaseException:
+            await asyncio.to_thread(conn.rollback)
+            raise
+        finally:
+            self.conn = None
+            conn.close()
+
+    async def has_table(self, table: str) -> bool:
+        def _has_table():
+            row = self.conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()
+            return row is not None
+
+        return await asyncio.to_thread(_has_table)
+
+    async def write(self, target: ImportTarget, rows: List[tuple]) -> int:
+        positions = {c: i for i, c in enumerate(target.columns)}
+        name = {c: self._column(target, c) for c in target.columns}
+        match = ' AND '.join(
+            f"{name[c]} IS ?" if c in target.nullable else f"{name[c]} = ?" for c in target.key)
+        rows = [tuple(_sqlite_value(v) for v in row) for row in rows]
+        key_params = [[row[positions[c]] for c in target.key] for row in rows]
+
+        def _write():
+            written = 0
+            cursor = self.conn.cursor()
+            if target.update and target.values:
+                cursor.executemany(f"""
+                    UPDATE {target.table} SET {', '.join(f'{name[c]} = ?' for c in target.values)}
+                    WHERE {match} AND ({' OR '.join(f'{name[c]} IS NOT ?' for c in target.values)})
+                """, [
+                    [row[positions[c]] for c in target.values] + keys
+                    + [row[positions[c]] for c in target.values]
+                    for row, keys in zip(rows, key_params)
+                ])
+                written += cursor.rowcount
+
+            cursor.executemany(f"""
+                INSERT INTO {target.table} ({', '.join(name.values())})
+                SELECT {', '.join('?' for _ in target.columns)}
+                WHERE NOT EXISTS (SELECT 1 FROM {target.table} WHERE {match})
+            """, [list(row) + keys for row, keys in zip(rows, key_params)])
+            written += cursor.rowcount
+            return written
+
+        return await asyncio.to_thread(_write)
+
+    async def delete_stale(self, target: ImportTarget, scope: Dict[str, Any], keep: List[Any]):
+        column = self._column(target, _stale_column(target, scope))
+        conditions = ' AND '.join(f"{self._column(target, c)} = ?" for c in scope)
+        placeholders = ', '.join('?' for _ in keep) or 'NULL'
+        await asyncio.to_thread(
+            self.conn.execute,
+            f"DELETE FROM {target.table} WHERE {conditions} AND {column} NOT IN ({placeholders})",
+            (*scope.values(), *keep))
+
+
+class SupabaseBulkWriter(BulkWriter):
+    """Многострочные upsert через REST API Supabase"""
+
+    name = 'Supabase'
+    COLUMN_ALIASES = SUPABASE_COLUMN_ALIASES
+
+    def __init__(self, client):
+        self.client = client
+
+    def _payload(self, target: ImportTarget, rows: List[tuple]) -> List[Dict[str, Any]]:
+        columns = [self._column(target, c) for c in target.columns]
+        # JSON из SQLite/PostgreSQL приходит текстом - в jsonb Supabase пишем объект
+        parse = [(target.table, c) in JSON_COLUMNS for c in target.columns]
+        return [
+            {c: json.loads(v) if p and isinstance(v, str) else _supabase_value(v)
+             for c, v, p in zip(columns, row, parse)}
+            for row in rows
+        ]
+
+    async def write(self, target: ImportTarget, rows: List[tuple]) -> int:
+        payload = self._payload(target, rows)
+        key = [self._column(target, c) for c in target.key]
+
+        if target.unique:
+            # Число вставленных или измененных строк считает PostgREST (без дубликатов
+            # при ignore_duplicates); сами строки обратно не передаются
+            response = await asyncio.to_thread(
+                lambda: self.client.table(target.table).upsert(
+                    payload, on_conflict=','.join(key), ignore_duplicates=not target.update,
+                    count='exact', returning='minimal').execute())
+            return response.count or 0
+
+        # Нет уникального ограничения - вставляем только отсутствующие строки,
+        # сверяясь с уже загруженными строкам по первой колонке ключа
+        scope_values = sorted({row[key[0]] for row in payload})
+        existing = await asyncio.to_thread(
+            lambda: self.client.table(target.table).select(','.join(key))
+            .in_(key[0], scope_values).execute())
+        seen = {tuple(row[c] for c in key) for row in existing.data or []}
+        new_rows = []
+        for row in payload:
+            row_key = tuple(row[c] for c in key)
+            if row_key not in seen:
+                seen.add(row_key)
+                new_rows.append(row)
+        if not new_rows:
+            return 0
+        response = await asyncio.to_thread(
+            lambda: self.client.table(target.table).insert(
+                new_rows, count='exact', returning='minimal').execute())
+        return response.count or 0
+
+    async def delete_stale(self, target: ImportTarget, scope: Dict[str, Any], keep: List[Any]):
+        column = self._column(target, _stale_column(target, scope))
+
+        def _delete():
+            query = self.client.table(target.table).delete()
+            for c, value in scope.items():
+                query = query.eq(self._column(target, c), value)
+            return query.not_.in_(column, list(keep)).execute()
+
+        await asyncio.to_thread(_delete)
+
+
+def create_writer(manager, dry_run: bool = False) -> BulkWriter:
+    """Писатель для менеджера БД (universal_db_manager.manager или конкретного бэкенда)"""
+    if dry_run:
+        return BulkWriter()
+    manager = getattr(manager, 'wrapped_manager', manager)
+    if getattr(manager, 'client', None) is not None:
+        return SupabaseBulkWriter(manager.client)
+    if getattr(manager, 'pool', None) is not None:
+        return PostgresBulkWriter(manager.pool)
+    if getattr(manager, 'db_file', None):
+        return SQLiteBulkWriter(manager.db_file)
+    raise ValueError(f"Пакетный импорт не поддерживается для {type(manager).__name__}")
+
+
+# ---------------------------------------------------------------------------
+# Импорт
+# ---------------------------------------------------------------------------
+
+@dataclass
+class BulkImporter:
+    """Читает записи потоком и пишет их пачками через BulkWriter"""
+    writer: BulkWriter
+    batch_size: int = DEFAULT_BATCH_SIZE
+    # Интервал между сообщениями о прогрессе (секунды)
+    progress_interval: float = 2.0
+    results: List[ImportResult] = field(default_factory=list)
+
+    @property
+    def dry_run(self) -> bool:
+        return type(self.writer) is BulkWriter
+
+    async def run(self, target: ImportTarget,
+                  records: Iterable[Optional[Dict[str, Any]]]) -> ImportResult:
+        """
+        Импортирует записи в таблицу target.
+
+        Args:
+            target: целевая таблица
+            records: словари с колонками target.columns; None - некорректная строка источника
+
+        Returns:
+            Итоги импорта таблицы
+        """
+        result = ImportResult(target.table, dry_run=self.dry_run)
+        self.results.append(result)
+
+        if not await self.writer.has_table(target.table):
+            logger.warning(f"⚠️ Таблицы {target.table} нет в {self.writer.name} - импорт пропущен")
+            return result
+
+        started = last_report = time.perf_counter()
+        # Пачка без повторов ключа: последняя строка источника с тем же ключом побеждает
+        batch: Dict[tuple, tuple] = {}
+        key_positions = [target.columns.index(c) for c in target.key]
+
+        for record in records:
+            result.read += 1
+            if record is None:
+                result.skipped += 1
+                continue
+            row = tuple(record.get(c) for c in target.columns)
+            batch[tuple(row[i] for i in key_positions)] = row
+
+            if len(batch) >= self.batch_size:
+                result.written += await self.writer.write(target, list(batch.values()))
+                batch = {}
+                if time.perf_counter() - last_report >= self.progress_interval:
+                    last_report = time.perf_counter()
+                    self._report_progress(result, started)
+
+        if batch:
+            result.written += await self.writer.write(target, list(batch.values()))
+
+        result.seconds = time.perf_counter() - started
+        logger.info(f"✅ {result}")
+        return result
+
+    @staticmethod
+    def _report_progress(result: ImportResult, started: float):
+        elapsed = time.perf_counter() - started
+        rate = result.read / elapsed if elapsed else 0
+        logger.info(f"📦 {result.table}: прочитано {result.read} ({rate:.0f} строк/с), "
+                    f"записано {result.written}")
+
+
+async def import_reading_plan(importer: BulkImporter, path: str, plan_id: str,
+                              title: str = None, description: str = None) -> ImportResult:
+    """
+    Импортирует план чтения из файла: строка в reading_plans и его дни.
+
+    Дни, которых больше нет в файле, удаляются.
+    """
+    days = [day for day in read_plan_days(path, plan_id)]
+    valid_days = [day for day in days if day is not None]
+    if not valid_days:
+        raise ValueError(f"В файле {path} нет дней чтения")
+
+    title = title or read_plan_title(path) or os.path.splitext(os.path.basename(path))[0]
+    await importer.run(READING_PLANS, [{
+        'plan_id': plan_id,
+        'title': title,
+        'description': description,
+        'total_days': len({day['day_number'] for day in valid_days}),
+    }])
+    result = await importer.run(READING_PLAN_DAYS, days)
+    if not importer.dry_run and await importer.writer.has_table(READING_PLAN_DAYS.table):
+        await importer.writer.delete_stale(
+            READING_PLAN_DAYS, {'plan_id': plan_id}, [day['day_number'] for day in valid_days])
+    return result
+
+
+async def import_topics(importer: BulkImporter, path: str) -> ImportResult:
+    """Импортирует библейские темы из CSV или XLSX файла"""
+    return await importer.run(BIBLE_TOPICS, read_topics(path))
+
+
+async def import_bookmarks(importer: BulkImporter, source_db: str) -> ImportResult:
+    """Импортирует пользователей и их закладки из файла SQLite бота"""
+    # Закладки ссылаются на пользователей - сначала недостающие пользователи
+    if _sqlite_columns(source_db, 'users'):
+        await importer.run(USERS, read_sqlite_users(source_db))
+    return await importer.run(BOOKMARKS, read_sqlite_bookmarks(source_db))
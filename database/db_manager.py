@@ -3,20 +3,27 @@
 Отвечает за хранение информации о пользователях и их закладках.
 """
 import sqlite3
+import json
 import logging
 import os
 import asyncio
+import uuid
 from datetime import datetime
 from typing import List, Tuple, Optional, Dict, Any
 
+from .text_store import pack_text, unpack_text
+
 # Инициализация логгера
 logger = logging.getLogger(__name__)
 
+# Файл базы SQLite по умолчанию (тесты переносят его во временную директорию)
+SQLITE_DB_FILE = os.getenv('SQLITE_DB_FILE', 'data/bible_bot.db')
+
 
 class DatabaseManager:
     """Класс для управления базой данных SQLite"""
 
-    def __init__(self, db_file: str = 'data/bible_bot.db'):
+    def __init__(self, db_file: str = SQLITE_DB_FILE):
         """
         Инициализирует менеджер базы данных.
 
@@ -99,6 +106,11 @@ class DatabaseManager:
                 FOREIGN KEY (user_id) REFERENCES users (user_id)
             )
             ''')
+            # Индекс для поиска закладки по отрывку (и сопоставления строк при импорте)
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_bookmarks_chapters
+            ON bookmarks(user_id, book_id, chapter_start, chapter_end)
+            ''')
 
             # Таблица лимитов ИИ
             logger.info("Создание/проверка таблицы ai_limits")
@@ -110,6 +122,41 @@ class DatabaseManager:
                 PRIMARY KEY (user_id, date)
             )
             ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_limits_date_count
+            ON ai_limits(date, count DESC)
+            ''')
+
+            # Агрегаты использования ИИ (обновляются при каждом запросе)
+            logger.info("Создание/проверка таблиц агрегатов ИИ")
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_usage_totals (
+                user_id INTEGER PRIMARY KEY,
+                total_count INTEGER NOT NULL DEFAULT 0,
+                archived_count INTEGER NOT NULL DEFAULT 0,
+                first_date TEXT,
+                last_date TEXT
+            )
+            ''')
+            # archived_count - часть total_count из уже удаленных дневных строк
+            try:
+                cursor.execute(
+                    "ALTER TABLE ai_usage_totals ADD COLUMN archived_count INTEGER NOT NULL DEFAULT 0")
+                logger.info("Добавлено поле archived_count в таблицу ai_usage_totals")
+            except sqlite3.OperationalError:
+                # Поле уже существует
+                pass
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_usage_totals_count
+            ON ai_usage_totals(total_count DESC)
+            ''')
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_usage_daily (
+                date TEXT PRIMARY KEY,
+                total_count INTEGER NOT NULL DEFAULT 0,
+                active_users INTEGER NOT NULL DEFAULT 0
+            )
+            ''')
 
             # Таблица сохраненных комментариев
             logger.info("Создание/проверка таблицы saved_commentaries")
@@ -131,6 +178,71 @@ class DatabaseManager:
             )
             ''')
 
+            # Сжатые длинные тексты по хэшу (database/text_store.py)
+            logger.info("Создание/проверка таблицы text_blobs")
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS text_blobs (
+                hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+
+            # Ссылка толкования на text_blobs (миграция)
+            try:
+                cursor.execute(
+                    "ALTER TABLE saved_commentaries ADD COLUMN text_hash TEXT REFERENCES text_blobs (hash)")
+                logger.info("Добавлено поле text_hash в таблицу saved_commentaries")
+            except sqlite3.OperationalError:
+                # Поле уже существует
+                pass
+
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_saved_commentaries_text_hash
+            ON saved_commentaries(text_hash)
+            ''')
+
+            # Беседы с ИИ-помощником
+            logger.info("Создание/проверка таблиц ai_conversations и ai_messages")
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_conversations (
+                id TEXT PRIMARY KEY,
+                user_id INTEGER NOT NULL,
+                title TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_conversations_user
+            ON ai_conversations(user_id, updated_at)
+            ''')
+            # created_at пишется с микросекундами - это ключ пагинации сообщений
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS ai_messages (
+                id TEXT PRIMARY KEY,
+                conversation_id TEXT NOT NULL REFERENCES ai_conversations (id) ON DELETE CASCADE,
+                role TEXT NOT NULL,
+                content TEXT NOT NULL,
+                content_hash TEXT REFERENCES text_blobs (hash),
+                meta TEXT DEFAULT '{}',
+                created_at TIMESTAMP NOT NULL
+            )
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_messages_conversation_created
+            ON ai_messages(conversation_id, created_at, id)
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_messages_created_at
+            ON ai_messages(created_at)
+            ''')
+            cursor.execute('''
+            CREATE INDEX IF NOT EXISTS idx_ai_messages_content_hash
+            ON ai_messages(content_hash)
+            ''')
+
             # Таблица прогресса чтения
             logger.info("Создание/проверка таблицы reading_progress")
             cursor.execute('''
@@ -158,6 +270,54 @@ class DatabaseManager:
             )
             ''')
 
+            # Таблица премиум запросов
+            logger.info("Создание/проверка таблицы premium_requests")
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS premium_requests (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL UNIQUE,
+                requests_count INTEGER NOT NULL DEFAULT 0,
+                total_purchased INTEGER NOT NULL DEFAULT 0,
+                total_used INTEGER NOT NULL DEFAULT 0,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+            ''')
+
+            # Таблица покупок премиум запросов
+            logger.info("Создание/проверка таблицы premium_purchases")
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS premium_purchases (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                requests_count INTEGER NOT NULL,
+                amount_rub INTEGER NOT NULL DEFAULT 0,
+                payment_id TEXT,
+                payment_status TEXT DEFAULT 'pending',
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP
+            )
+            ''')
+            cursor.execute('''
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_premium_purchases_payment_id_unique
+            ON premium_purchases(payment_id) WHERE payment_id IS NOT NULL
+            ''')
+
+            # Таблица пожертвований
+            logger.info("Создание/проверка таблицы donations")
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS donations (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                amount_rub INTEGER NOT NULL DEFAULT 0,
+                payment_id TEXT,
+                payment_status TEXT DEFAULT 'pending',
+                message TEXT,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                completed_at TIMESTAMP
+            )
+            ''')
+
             # Проверяем, созданы ли таблицы
             cursor.execute(
                 "SELECT name FROM sqlite_master WHERE type='table' AND (name='users' OR name='bookmarks' OR name='ai_limits' OR name='reading_progress' OR name='reading_parts_progress')")
@@ -675,6 +835,36 @@ class DatabaseManager:
 
         return await asyncio.to_thread(_execute)
 
+    async def is_chapter_bookmarked(self, user_id: int, book_id: int, chapter: int) -> bool:
+        """
+        Проверяет, есть ли у пользователя закладка в главе: на всю главу,
+        на стихи главы или на диапазон глав, который ее включает.
+
+        Args:
+            user_id: ID пользователя Telegram
+            book_id: ID книги Библии
+            chapter: Номер главы
+
+        Returns:
+            bool: True если в главе есть закладка
+        """
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                row = conn.execute(
+                    "SELECT 1 FROM bookmarks WHERE user_id = ? AND book_id = ? "
+                    "AND chapter_start <= ? AND COALESCE(chapter_end, chapter_start) >= ? LIMIT 1",
+                    (user_id, book_id, chapter, chapter)
+                ).fetchone()
+                return row is not None
+            except Exception as e:
+                logger.error(f"Ошибка при проверке закладок главы: {e}")
+                return False
+            finally:
+                conn.close()
+
+        return await asyncio.to_thread(_execute)
+
     async def clear_bookmarks(self, user_id: int) -> None:
         """
         Удаляет все закладки пользователя.
@@ -907,9 +1097,18 @@ class DatabaseManager:
                 commentary_type TEXT DEFAULT 'ai',
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                text_hash TEXT REFERENCES text_blobs (hash),
                 FOREIGN KEY (user_id) REFERENCES users (user_id)
             )''')
 
+            cursor.execute('''
+            CREATE TABLE IF NOT EXISTS text_blobs (
+                hash TEXT PRIMARY KEY,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )''')
+
             cursor.execute('''
             CREATE TABLE IF NOT EXISTS reading_progress (
                 user_id INTEGER,
@@ -956,37 +1155,116 @@ class DatabaseManager:
         loop = asyncio.get_event_loop()
         return await loop.run_in_executor(None, _execute)
 
-    async def increment_ai_limit(self, user_id: int, date: str) -> int:
-        """Увеличивает счетчик ИИ-запросов пользователя за дату, возвращает новое значение"""
-        def _execute():
-            conn = sqlite3.connect(self.db_file)
+    @staticmethod
+    def _record_ai_usage(cursor, user_id: int, date: str) -> int:
+        """Увеличивает дневной счетчик и агрегаты ИИ, возвращает новое значение счетчика"""
+        cursor.execute('''
+            INSERT INTO ai_limits (user_id, date, count) VALUES (?, ?, 1)
+            ON CONFLICT (user_id, date) DO UPDATE SET count = count + 1
+        ''', (user_id, date))
+        cursor.execute(
+            "SELECT count FROM ai_limits WHERE user_id=? AND date=?", (user_id, date))
+        new_count = cursor.fetchone()[0]
+        cursor.execute('''
+            INSERT INTO ai_usage_totals (user_id, total_count, first_date, last_date)
+            VALUES (?, 1, ?, ?)
+            ON CONFLICT (user_id) DO UPDATE SET
+                total_count = total_count + 1,
+                last_date = MAX(last_date, excluded.last_date)
+        ''', (user_id, date, date))
+        cursor.execute('''
+            INSERT INTO ai_usage_daily (date, total_count, active_users) VALUES (?, 1, 1)
+            ON CONFLICT (date) DO UPDATE SET
+                total_count = total_count + 1,
+                active_users = active_users + ?
+        ''', (date, 1 if new_count == 1 else 0))
+        return new_count
+
+    def _increment_ai_usage_sync(self, user_id: int, date: str) -> int:
+        # Дневной счетчик и агрегаты меняются в одной транзакции
+        conn = sqlite3.connect(self.db_file, isolation_level=None)
+        try:
             cursor = conn.cursor()
-            cursor.execute(
-                "SELECT count FROM ai_limits WHERE user_id=? AND date=?", (user_id, date))
-            row = cursor.fetchone()
-            if row:
-                new_count = row[0] + 1
-                cursor.execute(
-                    "UPDATE ai_limits SET count=? WHERE user_id=? AND date=?", (new_count, user_id, date))
-            else:
-                new_count = 1
-                cursor.execute(
-                    "INSERT INTO ai_limits (user_id, date, count) VALUES (?, ?, ?)", (user_id, date, 1))
-            conn.commit()
-            conn.close()
+            cursor.execute("BEGIN IMMEDIATE")
+            new_count = self._record_ai_usage(cursor, user_id, date)
+            cursor.execute("COMMIT")
             return new_count
-        loop = asyncio.get_event_loop()
-        return await loop.run_in_executor(None, _execute)
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    async def increment_ai_limit(self, user_id: int, date: str) -> int:
+        """Увеличивает счетчик ИИ-запросов пользователя за дату, возвращает новое значение"""
+        try:
+            return await asyncio.to_thread(self._increment_ai_usage_sync, user_id, date)
+        except Exception as e:
+            logger.error(f"Ошибка увеличения AI лимита: {e}")
+            return 0
+
+    async def increment_ai_usage(self, user_id: int) -> bool:
+        """Увеличивает счетчик использования ИИ за сегодня"""
+        today = datetime.now().date().isoformat()
+        return await self.increment_ai_limit(user_id, today) > 0
+
+    async def get_ai_usage(self, user_id: int, date=None) -> int:
+        """Получает количество использований ИИ за указанную дату"""
+        date = date or datetime.now().date()
+        if not isinstance(date, str):
+            date = date.isoformat()
+        return await self.get_ai_limit(user_id, date)
+
+    @staticmethod
+    def _forget_ai_usage(cursor, user_id: int, date: str) -> None:
+        """Удаляет дневной счетчик и вычитает его из агрегатов
+
+        Агрегаты остаются равны пересчету из ai_limits, а следующий запрос
+        пользователя в этот день снова считается первым.
+        """
+        cursor.execute(
+            "SELECT count FROM ai_limits WHERE user_id=? AND date=?", (user_id, date))
+        row = cursor.fetchone()
+        if row is None:
+            return
+        cursor.execute(
+            "DELETE FROM ai_limits WHERE user_id=? AND date=?", (user_id, date))
+        count = row[0]
+        if count <= 0:
+            return
+        cursor.execute('''
+            UPDATE ai_usage_totals SET total_count = MAX(total_count - ?, archived_count)
+            WHERE user_id = ?
+        ''', (count, user_id))
+        cursor.execute(
+            "DELETE FROM ai_usage_totals WHERE user_id = ? AND total_count = 0 AND archived_count = 0",
+            (user_id,))
+        cursor.execute('''
+            UPDATE ai_usage_daily SET
+                total_count = MAX(total_count - ?, 0),
+                active_users = MAX(active_users - 1, 0)
+            WHERE date = ?
+        ''', (count, date))
+        cursor.execute(
+            "DELETE FROM ai_usage_daily WHERE date = ? AND total_count = 0", (date,))
 
     async def reset_ai_limit(self, user_id: int, date: str) -> None:
-        """Сбросить лимит ИИ-запросов пользователя за дату (обнуляет счетчик)"""
+        """Сбросить лимит ИИ-запросов пользователя за дату (удаляет счетчик и его вклад в агрегаты)"""
         def _execute():
-            conn = sqlite3.connect(self.db_file)
-            cursor = conn.cursor()
-            cursor.execute(
-                "DELETE FROM ai_limits WHERE user_id=? AND date=?", (user_id, date))
-            conn.commit()
-            conn.close()
+            # Дневной счетчик и агрегаты меняются в одной транзакции
+            conn = sqlite3.connect(self.db_file, isolation_level=None)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                self._forget_ai_usage(cursor, user_id, date)
+                cursor.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, _execute)
 
@@ -1009,13 +1287,222 @@ class DatabaseManager:
             conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
             cursor.execute(
-                "SELECT user_id, SUM(count) as total FROM ai_limits GROUP BY user_id ORDER BY total DESC LIMIT ?", (limit,))
+                "SELECT user_id, total_count FROM ai_usage_totals ORDER BY total_count DESC LIMIT ?", (limit,))
             rows = cursor.fetchall()
             conn.close()
             return rows
         loop = asyncio.get_event_loop()
         return await loop.run_in_executor(None, _execute)
 
+    async def get_ai_usage_summary(self, start_date: str = None, end_date: str = None) -> Dict[str, int]:
+        """Сводка ИИ-запросов за период по дневным агрегатам (даты YYYY-MM-DD, включительно)"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT COALESCE(SUM(total_count), 0), COUNT(*), COALESCE(MAX(active_users), 0)
+                FROM ai_usage_daily
+                WHERE date >= COALESCE(?, date) AND date <= COALESCE(?, date)
+            ''', (start_date, end_date))
+            total_requests, active_days, peak_daily_users = cursor.fetchone()
+            cursor.execute("SELECT COUNT(*) FROM ai_usage_totals")
+            total_users = cursor.fetchone()[0]
+            conn.close()
+            return {
+                'total_requests': total_requests,
+                'active_days': active_days,
+                'peak_daily_users': peak_daily_users,
+                'total_users': total_users
+            }
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка получения сводки AI статистики: {e}")
+            return {'total_requests': 0, 'active_days': 0, 'peak_daily_users': 0, 'total_users': 0}
+
+    async def backfill_ai_usage_rollups(self) -> bool:
+        """Пересчитывает агрегаты ИИ из дневной таблицы ai_limits
+
+        Свернутые обслуживанием дни (archived_count и их строки в
+        ai_usage_daily) сохраняются, пересчитываются только живые данные.
+        """
+        def _execute():
+            conn = sqlite3.connect(self.db_file, isolation_level=None)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute("DELETE FROM ai_usage_totals WHERE archived_count = 0")
+                cursor.execute("UPDATE ai_usage_totals SET total_count = archived_count")
+                cursor.execute('''
+                    INSERT INTO ai_usage_totals (user_id, total_count, first_date, last_date)
+                    SELECT user_id, SUM(count), MIN(date), MAX(date)
+                    FROM ai_limits WHERE count > 0 GROUP BY user_id
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        total_count = total_count + excluded.total_count,
+                        first_date = MIN(first_date, excluded.first_date),
+                        last_date = MAX(last_date, excluded.last_date)
+                ''')
+                cursor.execute(
+                    "DELETE FROM ai_usage_daily WHERE date IN (SELECT date FROM ai_limits)")
+                cursor.execute('''
+                    INSERT INTO ai_usage_daily (date, total_count, active_users)
+                    SELECT date, SUM(count), COUNT(*)
+                    FROM ai_limits WHERE count > 0 GROUP BY date
+                ''')
+                cursor.execute("COMMIT")
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+        try:
+            await asyncio.to_thread(_execute)
+            logger.info("Агрегаты ИИ пересчитаны")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка пересчета агрегатов ИИ: {e}")
+            return False
+
+    # Методы обслуживания БД
+    async def fold_oldest_ai_usage_day(self, before_date: str) -> int:
+        """Сворачивает самый старый день ai_limits раньше before_date в агрегаты
+
+        День обрабатывается целиком в одной транзакции: его счетчики
+        переносятся в archived_count, а строки удаляются.
+        Возвращает количество удаленных строк (0 - сворачивать нечего).
+        """
+        def _execute():
+            conn = sqlite3.connect(self.db_file, isolation_level=None)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute(
+                    "SELECT MIN(date) FROM ai_limits WHERE date < ?", (before_date,))
+                day = cursor.fetchone()[0]
+                if day is None:
+                    cursor.execute("ROLLBACK")
+                    return 0
+
+                cursor.execute('''
+                    INSERT INTO ai_usage_totals (user_id, total_count, archived_count, first_date, last_date)
+                    SELECT user_id, count, count, date, date
+                    FROM ai_limits WHERE date = ? AND count > 0
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        archived_count = archived_count + excluded.archived_count
+                ''', (day,))
+                cursor.execute('''
+                    INSERT INTO ai_usage_daily (date, total_count, active_users)
+                    SELECT date, SUM(count), COUNT(*)
+                    FROM ai_limits WHERE date = ? AND count > 0 GROUP BY date
+                    ON CONFLICT (date) DO NOTHING
+                ''', (day,))
+                cursor.execute("DELETE FROM ai_limits WHERE date = ?", (day,))
+                deleted = cursor.rowcount
+                cursor.execute("COMMIT")
+                return deleted
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка свертки дневных счетчиков ИИ: {e}")
+            return 0
+
+    async def prune_conversation_messages(self, before: str, limit: int = 1000) -> int:
+        """Удаляет до limit сообщений бесед старше before, возвращает количество"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='ai_messages'")
+                if not cursor.fetchone():
+                    return 0
+                cursor.execute('''
+                    DELETE FROM ai_messages WHERE rowid IN (
+                        SELECT rowid FROM ai_messages WHERE created_at < ? LIMIT ?
+                    )
+                ''', (before, limit))
+                deleted = cursor.rowcount
+                conn.commit()
+                return deleted
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка удаления старых сообщений бесед: {e}")
+            return 0
+
+    async def purge_orphan_texts(self, limit: int = 1000) -> int:
+        """Удаляет до limit текстов text_blobs, на которые больше никто не ссылается"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type='table' AND name='ai_messages'")
+                messages_filter = '''
+                    AND NOT EXISTS (SELECT 1 FROM ai_messages m WHERE m.content_hash = b.hash)
+                ''' if cursor.fetchone() else ''
+                cursor.execute(f'''
+                    DELETE FROM text_blobs WHERE hash IN (
+                        SELECT b.hash FROM text_blobs b
+                        WHERE NOT EXISTS (SELECT 1 FROM saved_commentaries c WHERE c.text_hash = b.hash)
+                        {messages_filter}
+                        LIMIT ?
+                    )
+                ''', (limit,))
+                deleted = cursor.rowcount
+                conn.commit()
+                return deleted
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка удаления неиспользуемых текстов: {e}")
+            return 0
+
+    async def run_db_maintenance(self, vacuum_free_ratio: float = 0.2) -> Dict[str, Any]:
+        """ANALYZE и PRAGMA optimize; VACUUM только при большой доле свободных страниц"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file, isolation_level=None)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("ANALYZE")
+                cursor.execute("PRAGMA optimize")
+                page_count = cursor.execute("PRAGMA page_count").fetchone()[0]
+                freelist = cursor.execute("PRAGMA freelist_count").fetchone()[0]
+                free_ratio = freelist / page_count if page_count else 0.0
+                vacuumed = free_ratio >= vacuum_free_ratio
+                if vacuumed:
+                    cursor.execute("VACUUM")
+                return {
+                    'analyze': True,
+                    'vacuum': vacuumed,
+                    'free_pages': freelist,
+                    'total_pages': page_count
+                }
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка обслуживания SQLite: {e}")
+            return {'error': str(e)}
+
     def mark_reading_day_completed(self, user_id: int, plan_id: str, day: int):
         """Отметить день плана как прочитанный пользователем."""
         conn = sqlite3.connect(self.db_file)
@@ -1137,11 +1624,21 @@ class DatabaseManager:
                               reference_text: str = "", commentary_text: str = "",
                               commentary_type: str = "ai") -> bool:
         """Сохраняет толкование для пользователя"""
+        # Длинный текст хранится один раз в text_blobs, в строке - только ссылка
+        packed = pack_text(commentary_text)
+        text_hash = packed[0] if packed else None
+        stored_text = '' if packed else commentary_text
+
         def _execute():
             conn = sqlite3.connect(self.db_file)
             cursor = conn.cursor()
 
             try:
+                if packed:
+                    cursor.execute('''
+                        INSERT OR IGNORE INTO text_blobs (hash, data, size) VALUES (?, ?, ?)
+                    ''', (text_hash, packed[1], len(commentary_text)))
+
                 # Проверяем, есть ли уже комментарий для этой ссылки
                 cursor.execute('''
                     SELECT id FROM saved_commentaries 
@@ -1156,18 +1653,19 @@ class DatabaseManager:
                     # Обновляем существующий
                     cursor.execute('''
                         UPDATE saved_commentaries 
-                        SET reference_text = ?, commentary_text = ?, updated_at = CURRENT_TIMESTAMP
+                        SET reference_text = ?, commentary_text = ?, text_hash = ?,
+                            updated_at = CURRENT_TIMESTAMP
                         WHERE id = ?
-                    ''', (reference_text, commentary_text, existing[0]))
+                    ''', (reference_text, stored_text, text_hash, existing[0]))
                 else:
                     # Создаем новый
                     cursor.execute('''
                         INSERT INTO saved_commentaries 
                         (user_id, book_id, chapter_start, chapter_end, verse_start, verse_end,
-                         reference_text, commentary_text, commentary_type)
-                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                         reference_text, commentary_text, commentary_type, text_hash)
+                        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
                     ''', (user_id, book_id, chapter_start, chapter_end, verse_start, verse_end,
-                          reference_text, commentary_text, commentary_type))
+                          reference_text, stored_text, commentary_type, text_hash))
 
                 conn.commit()
                 return True
@@ -1191,14 +1689,15 @@ class DatabaseManager:
 
             try:
                 cursor.execute('''
-                    SELECT commentary_text FROM saved_commentaries 
-                    WHERE user_id = ? AND book_id = ? AND chapter_start = ? 
-                    AND chapter_end IS ? AND verse_start IS ? AND verse_end IS ? 
-                    AND commentary_type = ?
+                    SELECT c.commentary_text, b.data FROM saved_commentaries c
+                    LEFT JOIN text_blobs b ON b.hash = c.text_hash
+                    WHERE c.user_id = ? AND c.book_id = ? AND c.chapter_start = ? 
+                    AND c.chapter_end IS ? AND c.verse_start IS ? AND c.verse_end IS ? 
+                    AND c.commentary_type = ?
                 ''', (user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, commentary_type))
 
                 result = cursor.fetchone()
-                return result[0] if result else None
+                return unpack_text(result[0], result[1]) if result else None
 
             except Exception as e:
                 logger.error(f"Ошибка получения комментария: {e}")
@@ -1244,11 +1743,12 @@ class DatabaseManager:
 
             try:
                 cursor.execute('''
-                    SELECT id, book_id, chapter_start, chapter_end, verse_start, verse_end,
-                           reference_text, commentary_text, commentary_type, created_at
-                    FROM saved_commentaries 
-                    WHERE user_id = ?
-                    ORDER BY created_at DESC
+                    SELECT c.id, c.book_id, c.chapter_start, c.chapter_end, c.verse_start, c.verse_end,
+                           c.reference_text, c.commentary_text, c.commentary_type, c.created_at, b.data
+                    FROM saved_commentaries c
+                    LEFT JOIN text_blobs b ON b.hash = c.text_hash
+                    WHERE c.user_id = ?
+                    ORDER BY c.created_at DESC
                     LIMIT ?
                 ''', (user_id, limit))
 
@@ -1265,7 +1765,7 @@ class DatabaseManager:
                         'verse_start': row[4],
                         'verse_end': row[5],
                         'reference_text': row[6],
-                        'commentary_text': row[7],
+                        'commentary_text': unpack_text(row[7], row[10]),
                         'commentary_type': row[8],
                         'created_at': row[9]
                     })
@@ -1281,6 +1781,67 @@ class DatabaseManager:
 
         return await asyncio.to_thread(_execute)
 
+    async def get_passage_user_context(self, user_id: int, passage: dict,
+                                       commentary_passage: dict = None) -> dict:
+        """
+        Получает одним запросом данные пользователя для отрывка:
+        наличие закладки и сохраненные толкования ИИ и Лопухина.
+
+        Args:
+            user_id: ID пользователя Telegram
+            passage: координаты закладки (book_id, chapter_start, chapter_end, verse_start, verse_end)
+            commentary_passage: координаты толкований, если отличаются от passage
+
+        Returns:
+            dict: is_bookmarked, ai_commentary, lopukhin_commentary
+        """
+        commentary_passage = commentary_passage or passage
+        params = {'user_id': user_id}
+        for prefix, source in (('b_', passage), ('c_', commentary_passage)):
+            for field in ('book_id', 'chapter_start', 'chapter_end', 'verse_start', 'verse_end'):
+                params[prefix + field] = source.get(field)
+
+        commentary_filter = '''
+            FROM saved_commentaries c
+            LEFT JOIN text_blobs b ON b.hash = c.text_hash
+            WHERE c.user_id = :user_id AND c.book_id = :c_book_id AND c.chapter_start = :c_chapter_start
+            AND c.chapter_end IS :c_chapter_end AND c.verse_start IS :c_verse_start
+            AND c.verse_end IS :c_verse_end
+        '''
+
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+
+            try:
+                cursor.execute(f'''
+                    SELECT
+                        EXISTS(
+                            SELECT 1 FROM bookmarks
+                            WHERE user_id = :user_id AND book_id = :b_book_id AND chapter_start = :b_chapter_start
+                            AND chapter_end IS :b_chapter_end AND verse_start IS :b_verse_start AND verse_end IS :b_verse_end
+                        ),
+                        (SELECT c.commentary_text {commentary_filter} AND c.commentary_type = 'ai' LIMIT 1),
+                        (SELECT b.data {commentary_filter} AND c.commentary_type = 'ai' LIMIT 1),
+                        (SELECT c.commentary_text {commentary_filter} AND c.commentary_type = 'lopukhin' LIMIT 1),
+                        (SELECT b.data {commentary_filter} AND c.commentary_type = 'lopukhin' LIMIT 1)
+                ''', params)
+
+                row = cursor.fetchone()
+                return {
+                    'is_bookmarked': bool(row[0]),
+                    'ai_commentary': unpack_text(row[1], row[2]),
+                    'lopukhin_commentary': unpack_text(row[3], row[4])
+                }
+
+            except Exception as e:
+                logger.error(f"Ошибка получения данных отрывка для пользователя {user_id}: {e}")
+                return {'is_bookmarked': False, 'ai_commentary': None, 'lopukhin_commentary': None}
+            finally:
+                conn.close()
+
+        return await asyncio.to_thread(_execute)
+
     # Заглушки для методов библейских тем (для совместимости API)
     async def get_bible_topics(self, search_query: str = "", limit: int = 50) -> list:
         """Получает список библейских тем (заглушка для SQLite)"""
@@ -1322,6 +1883,402 @@ class DatabaseManager:
         logger.warning("Метод delete_bible_topic не реализован для SQLite")
         return False
 
+    # Методы для премиум запросов
+    async def get_user_premium_requests(self, user_id: int) -> int:
+        """Получает количество премиум запросов пользователя"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT requests_count FROM premium_requests WHERE user_id = ?", (user_id,))
+            row = cursor.fetchone()
+            conn.close()
+            return row[0] if row else 0
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(
+                f"Ошибка получения премиум запросов для пользователя {user_id}: {e}")
+            return 0
+
+    async def add_premium_requests(self, user_id: int, count: int) -> bool:
+        """Добавляет премиум запросы пользователю (атомарный UPSERT)"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT INTO premium_requests (user_id, requests_count, total_purchased, total_used)
+                    VALUES (?, ?, ?, 0)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        requests_count = requests_count + excluded.requests_count,
+                        total_purchased = total_purchased + excluded.total_purchased,
+                        updated_at = CURRENT_TIMESTAMP
+                ''', (user_id, count, count))
+                conn.commit()
+                return True
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(
+                f"Ошибка добавления премиум запросов пользователю {user_id}: {e}")
+            return False
+
+    async def use_premium_request(self, user_id: int) -> bool:
+        """Использует один премиум запрос (условный UPDATE, без гонок)"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    UPDATE premium_requests
+                    SET requests_count = requests_count - 1,
+                        total_used = total_used + 1,
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE user_id = ? AND requests_count > 0
+                ''', (user_id,))
+                conn.commit()
+                return cursor.rowcount > 0
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(
+                f"Ошибка использования премиум запроса пользователем {user_id}: {e}")
+            return False
+
+    async def get_premium_stats(self, user_id: int) -> Dict[str, Any]:
+        """Получает статистику премиум запросов пользователя"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            cursor = conn.cursor()
+            cursor.execute('''
+                SELECT requests_count, total_purchased, total_used, created_at
+                FROM premium_requests WHERE user_id = ?
+            ''', (user_id,))
+            row = cursor.fetchone()
+            conn.close()
+            return row
+
+        try:
+            row = await asyncio.to_thread(_execute)
+            if row:
+                return {
+                    'available': row[0],
+                    'total_purchased': row[1],
+                    'total_used': row[2],
+                    'created_at': row[3]
+                }
+        except Exception as e:
+            logger.error(
+                f"Ошибка получения статистики премиум запросов для пользователя {user_id}: {e}")
+
+        return {
+            'available': 0,
+            'total_purchased': 0,
+            'total_used': 0,
+            'created_at': None
+        }
+
+    async def create_premium_purchase(self, user_id: int, requests_count: int, amount_rub: int, payment_id: str) -> bool:
+        """Создает запись о покупке премиум запросов"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.cursor()
+                cursor.execute('''
+                    INSERT OR IGNORE INTO premium_purchases
+                    (user_id, requests_count, amount_rub, payment_id, payment_status)
+                    VALUES (?, ?, ?, ?, 'pending')
+                ''', (user_id, requests_count, amount_rub, payment_id))
+                conn.commit()
+                return cursor.rowcount > 0
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка создания покупки премиум запросов: {e}")
+            return False
+
+    async def complete_premium_purchase(self, payment_id: str) -> bool:
+        """Завершает покупку премиум запросов (идемпотентно по payment_id)"""
+        def _execute():
+            # Автокоммит выключен вручную: BEGIN IMMEDIATE сразу берет блокировку
+            # на запись, поэтому параллельный вызов дождется нашего COMMIT
+            conn = sqlite3.connect(self.db_file, isolation_level=None)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                cursor.execute('''
+                    SELECT user_id, requests_count FROM premium_purchases
+                    WHERE payment_id = ? AND payment_status = 'pending'
+                ''', (payment_id,))
+                purchase = cursor.fetchone()
+
+                if not purchase:
+                    cursor.execute("ROLLBACK")
+                    return False
+
+                cursor.execute('''
+                    UPDATE premium_purchases
+                    SET payment_status = 'completed', completed_at = CURRENT_TIMESTAMP
+                    WHERE payment_id = ? AND payment_status = 'pending'
+                ''', (payment_id,))
+                cursor.execute('''
+                    INSERT INTO premium_requests (user_id, requests_count, total_purchased, total_used)
+                    VALUES (?, ?, ?, 0)
+                    ON CONFLICT (user_id) DO UPDATE SET
+                        requests_count = requests_count + excluded.requests_count,
+                        total_purchased = total_purchased + excluded.total_purchased,
+                        updated_at = CURRENT_TIMESTAMP
+                ''', (purchase[0], purchase[1], purchase[1]))
+                cursor.execute("COMMIT")
+                return True
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+        try:
+            completed = await asyncio.to_thread(_execute)
+            if not completed:
+                logger.warning(
+                    f"Покупка с payment_id {payment_id} не найдена или уже завершена")
+            return completed
+        except Exception as e:
+            logger.error(f"Ошибка завершения покупки премиум запросов: {e}")
+            return False
+
+    async def get_premium_purchase_status(self, payment_id: str) -> Optional[str]:
+        """Статус покупки по payment_id ('pending', 'completed', ...) или None"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.cursor()
+                cursor.execute(
+                    "SELECT payment_status FROM premium_purchases WHERE payment_id = ?", (payment_id,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка получения статуса покупки {payment_id}: {e}")
+            return None
+
+    # === МЕТОДЫ ДЛЯ ДИАЛОГОВОГО АССИСТЕНТА ===
+
+    @staticmethod
+    def _message_row(row: sqlite3.Row) -> Dict[str, Any]:
+        """Сообщение беседы из строки ai_messages (с присоединенным text_blobs.data)"""
+        message = dict(row)
+        message['content'] = unpack_text(message['content'], message.pop('data'))
+        message.pop('content_hash', None)
+        message['meta'] = json.loads(message['meta']) if message.get('meta') else {}
+        return message
+
+    async def create_conversation(self, user_id: int, title: str = None) -> Optional[str]:
+        """Создает новый разговор и возвращает его id"""
+        def _execute():
+            conversation_id = str(uuid.uuid4())
+            conn = sqlite3.connect(self.db_file)
+            try:
+                conn.execute(
+                    "INSERT INTO ai_conversations (id, user_id, title) VALUES (?, ?, ?)",
+                    (conversation_id, user_id, title or 'Новая беседа'))
+                conn.commit()
+                return conversation_id
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка создания разговора: {e}")
+            return None
+
+    async def update_conversation_title(self, conversation_id: str, user_id: int, title: str) -> bool:
+        """Обновляет заголовок разговора"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.execute('''
+                    UPDATE ai_conversations SET title = ?, updated_at = CURRENT_TIMESTAMP
+                    WHERE id = ? AND user_id = ?
+                ''', (title, conversation_id, user_id))
+                conn.commit()
+                return cursor.rowcount > 0
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка обновления заголовка разговора: {e}")
+            return False
+
+    async def get_conversation(self, conversation_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает разговор пользователя"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            conn.row_factory = sqlite3.Row
+            try:
+                row = conn.execute(
+                    "SELECT * FROM ai_conversations WHERE id = ? AND user_id = ?",
+                    (conversation_id, user_id)).fetchone()
+                return dict(row) if row else None
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка получения разговора: {e}")
+            return None
+
+    async def list_conversations(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Список разговоров пользователя, по убыванию обновления"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            conn.row_factory = sqlite3.Row
+            try:
+                rows = conn.execute('''
+                    SELECT * FROM ai_conversations WHERE user_id = ?
+                    ORDER BY updated_at DESC LIMIT ?
+                ''', (user_id, limit)).fetchall()
+                return [dict(row) for row in rows]
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка получения списка разговоров: {e}")
+            return []
+
+    async def delete_conversation(self, conversation_id: str, user_id: int) -> bool:
+        """Удаляет разговор пользователя вместе с сообщениями"""
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                # Внешние ключи в SQLite по умолчанию выключены - каскад вручную
+                cursor.execute('''
+                    DELETE FROM ai_messages WHERE conversation_id IN (
+                        SELECT id FROM ai_conversations WHERE id = ? AND user_id = ?
+                    )
+                ''', (conversation_id, user_id))
+                cursor.execute(
+                    "DELETE FROM ai_conversations WHERE id = ? AND user_id = ?",
+                    (conversation_id, user_id))
+                deleted = cursor.rowcount > 0
+                cursor.execute("COMMIT")
+                return deleted
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка удаления разговора: {e}")
+            return False
+
+    async def add_message(self, conversation_id: str, role: str, content: str, meta: Dict[str, Any] = None) -> Optional[str]:
+        """Добавляет сообщение в разговор и возвращает его id"""
+        # Длинный ответ хранится один раз в text_blobs, в строке - только ссылка
+        packed = pack_text(content)
+
+        def _execute():
+            message_id = str(uuid.uuid4())
+            created_at = datetime.utcnow().isoformat(sep=' ', timespec='microseconds')
+            conn = sqlite3.connect(self.db_file)
+            try:
+                cursor = conn.cursor()
+                cursor.execute("BEGIN IMMEDIATE")
+                if packed:
+                    cursor.execute(
+                        "INSERT OR IGNORE INTO text_blobs (hash, data, size) VALUES (?, ?, ?)",
+                        (packed[0], packed[1], len(content)))
+                cursor.execute('''
+                    INSERT INTO ai_messages (id, conversation_id, role, content, content_hash, meta, created_at)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                ''', (message_id, conversation_id, role, '' if packed else content,
+                      packed[0] if packed else None,
+                      json.dumps(meta or {}, ensure_ascii=False), created_at))
+                cursor.execute(
+                    "UPDATE ai_conversations SET updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (conversation_id,))
+                cursor.execute("COMMIT")
+                return message_id
+            except Exception:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка добавления сообщения в разговор: {e}")
+            return None
+
+    async def list_messages(self, conversation_id: str, limit: int = 20,
+                            before: str = None) -> List[Dict[str, Any]]:
+        """
+        Возвращает последние сообщения разговора по возрастанию времени.
+
+        Args:
+            before: id сообщения - вернуть сообщения, написанные до него
+                (следующая страница истории, пагинация по (created_at, id))
+        """
+        def _execute():
+            conn = sqlite3.connect(self.db_file)
+            conn.row_factory = sqlite3.Row
+            try:
+                cursor_filter = '''
+                    AND (m.created_at, m.id) < (
+                        SELECT created_at, id FROM ai_messages WHERE id = ? AND conversation_id = ?
+                    )
+                ''' if before else ''
+                params = (conversation_id, before, conversation_id) if before else (conversation_id,)
+                rows = conn.execute(f'''
+                    SELECT m.id, m.conversation_id, m.role, m.content, m.content_hash,
+                           m.meta, m.created_at, b.data
+                    FROM ai_messages m
+                    LEFT JOIN text_blobs b ON b.hash = m.content_hash
+                    WHERE m.conversation_id = ? {cursor_filter}
+                    ORDER BY m.created_at DESC, m.id DESC
+                    LIMIT ?
+                ''', (*params, limit)).fetchall()
+                # Возвращаем по возрастанию
+                return [self._message_row(row) for row in reversed(rows)]
+            finally:
+                conn.close()
+
+        try:
+            return await asyncio.to_thread(_execute)
+        except Exception as e:
+            logger.error(f"Ошибка получения сообщений разговора: {e}")
+            return []
+
 
 # Глобальный экземпляр менеджера БД
 
@@ -0,0 +1,235 @@
+"""
+Инструментирование вызовов менеджера БД.
+
+InstrumentedManager оборачивает менеджер конкретной БД (SQLite, PostgreSQL
+или Supabase) и для каждого метода считает вызовы, ошибки, одновременные
+вызовы и время выполнения (гистограмма + окно последних замеров для
+p50/p95/p99). Данные выгружаются в текстовом формате Prometheus.
+
+Когда метрики выключены, UniversalDatabaseManager работает с менеджером
+напрямую, без обертки, поэтому накладных расходов нет.
+"""
+import asyncio
+import functools
+import os
+import random
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+# Включение метрик и доля вызовов, для которых замеряется время
+DB_METRICS_ENABLED = os.getenv('DB_METRICS_ENABLED', 'false').lower() in [
+    'true', '1', 'yes']
+DB_METRICS_SAMPLE_RATE = float(os.getenv('DB_METRICS_SAMPLE_RATE', '1.0'))
+# Сколько последних замеров хранить для расчета перцентилей
+DB_METRICS_WINDOW = int(os.getenv('DB_METRICS_WINDOW', '1024'))
+
+# Границы корзин гистограммы (секунды)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS_PREFIX = 'gospel_bot_db'
+
+
+class MethodStats:
+    """Статистика вызовов одного метода"""
+
+    __slots__ = ('calls', 'errors', 'in_flight', 'max_in_flight',
+                 'buckets', 'latency_sum', 'latency_count', 'window')
+
+    def __init__(self, window: int):
+        self.calls = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        # Последняя корзина - +Inf
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.latency_sum = 0.0
+        self.latency_count = 0
+        self.window = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.latency_sum += seconds
+        self.latency_count += 1
+        self.window.append(seconds)
+
+    def percentiles(self, quantiles=(0.5, 0.95, 0.99)) -> Dict[float, Optional[float]]:
+        """Перцентили по окну последних замеров"""
+        samples = sorted(self.window)
+        if not samples:
+            return {q: None for q in quantiles}
+        last = len(samples) - 1
+        return {q: samples[min(last, int(round(q * last)))] for q in quantiles}
+
+
+class DBMetrics:
+    """Реестр метрик вызовов БД"""
+
+    def __init__(self, sample_rate: float = DB_METRICS_SAMPLE_RATE, window: int = DB_METRICS_WINDOW):
+        self.sample_rate = sample_rate
+        self.window = window
+        self.backend = 'unknown'
+        self.started_at = time.time()
+        self.methods: Dict[str, MethodStats] = {}
+
+    def stats(self, method: str) -> MethodStats:
+        stats = self.methods.get(method)
+        if stats is None:
+            stats = self.methods[method] = MethodStats(self.window)
+        return stats
+
+    def reset(self):
+        """Сбрасывает все накопленные метрики
+
+        Объекты MethodStats сохраняются: на них ссылаются уже созданные обертки.
+        """
+        for stats in self.methods.values():
+            in_flight = stats.in_flight
+            stats.__init__(self.window)
+            stats.in_flight = in_flight
+        self.started_at = time.time()
+
+    def snapshot(self, sort_by: str = 'total_time') -> List[Dict[str, Any]]:
+        """Сводка по методам (для админ-команды)"""
+        rows = []
+        for name, stats in self.methods.items():
+            p = stats.percentiles()
+            rows.append({
+                'method': name,
+                'calls': stats.calls,
+                'errors': stats.errors,
+                'in_flight': stats.in_flight,
+                'max_in_flight': stats.max_in_flight,
+                'total_time': stats.latency_sum,
+                'avg': stats.latency_sum / stats.latency_count if stats.latency_count else None,
+                'p50': p[0.5],
+                'p95': p[0.95],
+                'p99': p[0.99],
+            })
+        rows.sort(key=lambda row: row[sort_by] or 0, reverse=True)
+        return rows
+
+    def to_prometheus(self) -> str:
+        """Выгрузка метрик в текстовом формате Prometheus"""
+        prefix = METRICS_PREFIX
+        lines = [
+            f'# HELP {prefix}_calls_total Количество вызовов метода менеджера БД',
+            f'# TYPE {prefix}_calls_total counter',
+        ]
+        labels = {name: f'backend="{self.backend}",method="{name}"'
+                  for name in sorted(self.methods)}
+
+        for name, label in labels.items():
+            lines.append(f'{prefix}_calls_total{{{label}}} {self.methods[name].calls}')
+
+        lines += [f'# HELP {prefix}_errors_total Количество вызовов, завершившихся исключением',
+                  f'# TYPE {prefix}_errors_total counter']
+        for name, label in labels.items():
+            lines.append(f'{prefix}_errors_total{{{label}}} {self.methods[name].errors}')
+
+        lines += [f'# HELP {prefix}_in_flight Количество выполняющихся вызовов',
+                  f'# TYPE {prefix}_in_flight gauge']
+        for name, label in labels.items():
+            lines.append(f'{prefix}_in_flight{{{label}}} {self.methods[name].in_flight}')
+
+        lines += [f'# HELP {prefix}_latency_seconds Время выполнения метода',
+                  f'# TYPE {prefix}_latency_seconds histogram']
+        for name, label in labels.items():
+            stats = self.methods[name]
+            cumulative = 0
+            for bound, count in zip(LATENCY_BUCKETS, stats.buckets):
+                cumulative += count
+                lines.append(
+                    f'{prefix}_latency_seconds_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(
+                f'{prefix}_latency_seconds_bucket{{{label},le="+Inf"}} {stats.latency_count}')
+            lines.append(f'{prefix}_latency_seconds_sum{{{label}}} {stats.latency_sum:.6f}')
+            lines.append(f'{prefix}_latency_seconds_count{{{label}}} {stats.latency_count}')
+
+        lines += [f'# HELP {prefix}_latency_window_seconds Перцентили по последним {self.window} замерам',
+                  f'# TYPE {prefix}_latency_window_seconds gauge']
+        for name, label in labels.items():
+            for q, value in self.methods[name].percentiles().items():
+                if value is not None:
+                    lines.append(
+                        f'{prefix}_latency_window_seconds{{{label},quantile="{q}"}} {value:.6f}')
+
+        return '\n'.join(lines) + '\n'
+
+
+def instrument_callable(metrics: DBMetrics, name: str, method):
+    """Оборачивает функцию (синхронную или корутину) сбором метрик под именем name"""
+    stats = metrics.stats(name)
+
+    if asyncio.iscoroutinefunction(method):
+        @functools.wraps(method)
+        async def async_wrapper(*args, **kwargs):
+            stats.calls += 1
+            stats.in_flight += 1
+            if stats.in_flight > stats.max_in_flight:
+                stats.max_in_flight = stats.in_flight
+            sampled = metrics.sample_rate >= 1.0 or random.random() < metrics.sample_rate
+            started = time.perf_counter() if sampled else 0.0
+            try:
+                return await method(*args, **kwargs)
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.in_flight -= 1
+                if sampled:
+                    stats.observe(time.perf_counter() - started)
+        return async_wrapper
+
+    @functools.wraps(method)
+    def sync_wrapper(*args, **kwargs):
+        stats.calls += 1
+        stats.in_flight += 1
+        if stats.in_flight > stats.max_in_flight:
+            stats.max_in_flight = stats.in_flight
+        sampled = metrics.sample_rate >= 1.0 or random.random() < metrics.sample_rate
+        started = time.perf_counter() if sampled else 0.0
+        try:
+            return method(*args, **kwargs)
+        except Exception:
+            stats.errors += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            if sampled:
+                stats.observe(time.perf_counter() - started)
+    return sync_wrapper
+
+
+class InstrumentedManager:
+    """Прозрачная обертка менеджера БД, собирающая метрики вызовов"""
+
+    def __init__(self, manager: Any, metrics: DBMetrics):
+        object.__setattr__(self, '_manager', manager)
+        object.__setattr__(self, '_metrics', metrics)
+        object.__setattr__(self, '_wrapped', {})
+
+    @property
+    def wrapped_manager(self) -> Any:
+        """Исходный менеджер БД"""
+        return self._manager
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._manager, name)
+        if name.startswith('__') or not callable(attr):
+            return attr
+
+        wrapped = self._wrapped.get(name)
+        if wrapped is None:
+            wrapped = instrument_callable(self._metrics, name, attr)
+            self._wrapped[name] = wrapped
+        return wrapped
+
+    def __setattr__(self, name: str, value: Any):
+        setattr(self._manager, name, value)
+
+
+# Глобальный реестр метрик
+db_metrics = DBMetrics()
@@ -3,6 +3,7 @@
 Отвечает за хранение информации о пользователях, закладках и планах чтения.
 """
 import asyncpg
+import json
 import logging
 import asyncio
 import ssl
@@ -10,6 +11,9 @@ from datetime import datetime
 from typing import List, Tuple, Optional, Dict, Any
 import os
 
+from .postgres_pool import MeteredPool, PreparedConnection
+from .text_store import pack_text, unpack_text
+
 # Инициализация логгера
 logger = logging.getLogger(__name__)
 
@@ -43,6 +47,15 @@ class PostgreSQLManager:
         self.ssl_cert = os.getenv('POSTGRES_SSL_CERT', None)
         self.min_connections = int(os.getenv('POSTGRES_MIN_CONNECTIONS', '1'))
         self.max_connections = int(os.getenv('POSTGRES_MAX_CONNECTIONS', '10'))
+        # Таймаут одного запроса (секунды)
+        self.command_timeout = float(os.getenv('POSTGRES_COMMAND_TIMEOUT', '30'))
+        # Подготовленные запросы не работают через pgbouncer в режиме transaction -
+        # там нужно POSTGRES_PREPARED_STATEMENTS=false
+        self.use_prepared = os.getenv('POSTGRES_PREPARED_STATEMENTS', 'true').lower() in [
+            'true', '1', 'yes']
+        # Размер кэша asyncpg для остальных запросов (запросы реестра хранятся отдельно)
+        self.statement_cache_size = int(
+            os.getenv('POSTGRES_STATEMENT_CACHE_SIZE', '100')) if self.use_prepared else 0
 
         # Пул соединений
         self.pool = None
@@ -61,8 +74,13 @@ class PostgreSQLManager:
                 'user': self.user,
                 'password': self.password,
                 'min_size': self.min_connections,
-                'max_size': self.max_connections
+                'max_size': self.max_connections,
+                'command_timeout': self.command_timeout,
+                'statement_cache_size': self.statement_cache_size,
+                'connection_class': PreparedConnection
             }
+            if self.use_prepared:
+                connection_params['init'] = self._init_connection
 
             # Добавляем SSL если указан
             if self.ssl:
@@ -80,8 +98,10 @@ class PostgreSQLManager:
                     logger.info(f"SSL соединение: {self.ssl}")
 
             # Создаем пул соединений
-            self.pool = await asyncpg.create_pool(**connection_params)
-            logger.info("Пул соединений PostgreSQL создан")
+            self.pool = MeteredPool(await asyncpg.create_pool(**connection_params))
+            logger.info(
+                f"Пул соединений PostgreSQL создан (таймаут запроса {self.command_timeout}с, "
+                f"подготовленные запросы: {'да' if self.use_prepared else 'нет'})")
 
             # Создаем таблицы
             await self._create_tables()
@@ -98,6 +118,80 @@ class PostgreSQLManager:
             await self.pool.close()
             logger.info("Пул соединений PostgreSQL закрыт")
 
+    def get_pool_stats(self) -> Dict[str, Any]:
+        """Состояние пула соединений (размер, свободные, ожидание соединения)"""
+        return self.pool.stats() if self.pool else {}
+
+    def get_pool_prometheus(self) -> str:
+        """Состояние пула соединений в текстовом формате Prometheus"""
+        return self.pool.to_prometheus() if self.pool else ''
+
+    async def _init_connection(self, conn: PreparedConnection):
+        """Подготавливает частые запросы на новом соединении пула"""
+        await conn.prepare_registry(self._PREPARED_QUERIES)
+
+    # Реестр частых запросов: на каждом соединении они подготавливаются
+    # один раз при открытии и дальше берутся из подготовленных на соединении
+    _PREPARED_QUERIES = {
+        'get_user': "SELECT * FROM users WHERE user_id = $1",
+        'get_user_translation': "SELECT current_translation FROM users WHERE user_id = $1",
+        'get_user_response_length': "SELECT response_length FROM users WHERE user_id = $1",
+        'update_user_activity': "UPDATE users SET last_activity = $1 WHERE user_id = $2",
+        'get_bookmarks': """
+            SELECT book_id, chapter_start, chapter_end, display_text, verse_start, verse_end, note, created_at
+            FROM bookmarks
+            WHERE user_id = $1
+            ORDER BY created_at DESC
+        """,
+        'is_bookmarked': """
+            SELECT 1 FROM bookmarks
+            WHERE user_id = $1 AND book_id = $2 AND chapter_start = $3
+            AND chapter_end IS NOT DISTINCT FROM $4
+            AND verse_start IS NOT DISTINCT FROM $5
+            AND verse_end IS NOT DISTINCT FROM $6
+        """,
+        'is_chapter_bookmarked': """
+            SELECT 1 FROM bookmarks
+            WHERE user_id = $1 AND book_id = $2
+            AND chapter_start <= $3 AND COALESCE(chapter_end, chapter_start) >= $3
+            LIMIT 1
+        """,
+        'get_ai_limit': "SELECT count FROM ai_limits WHERE user_id = $1 AND date = $2",
+        'get_reading_progress': """
+            SELECT day_number FROM reading_progress
+            WHERE user_id = $1 AND plan_id = $2 AND completed = TRUE
+            ORDER BY day_number
+        """,
+        'is_reading_day_completed': """
+            SELECT completed FROM reading_progress
+            WHERE user_id = $1 AND plan_id = $2 AND day_number = $3
+        """,
+        'is_reading_part_completed': """
+            SELECT completed FROM reading_parts_progress
+            WHERE user_id = $1 AND plan_id = $2 AND day_number = $3 AND part_idx = $4
+        """,
+        'get_reading_part_progress': """
+            SELECT part_idx FROM reading_parts_progress
+            WHERE user_id = $1 AND plan_id = $2 AND day_number = $3 AND completed = TRUE
+            ORDER BY part_idx
+        """,
+    }
+
+    async def _prepared(self, name: str, method: str, *args):
+        """
+        Выполняет запрос из реестра _PREPARED_QUERIES.
+
+        Args:
+            name: имя запроса в реестре
+            method: fetch, fetchrow или fetchval
+            *args: параметры запроса
+        """
+        if not self.use_prepared:
+            return await getattr(self.pool, method)(self._PREPARED_QUERIES[name], *args)
+        # Запрос берется из подготовленных на соединении (PreparedConnection)
+        async with self.pool.acquire() as conn:
+            return await conn.run_prepared(name, self._PREPARED_QUERIES[name], method, *args)
+
     async def _create_tables(self):
         """Создает необходимые таблицы в базе данных"""
         async with self.pool.acquire() as conn:
@@ -155,6 +249,37 @@ class PostgreSQLManager:
                     PRIMARY KEY (user_id, date)
                 )
                 ''')
+                await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_limits_date_count
+                ON ai_limits(date, count DESC)
+                ''')
+
+                # Агрегаты использования ИИ (обновляются при каждом запросе)
+                await conn.execute('''
+                CREATE TABLE IF NOT EXISTS ai_usage_totals (
+                    user_id BIGINT PRIMARY KEY,
+                    total_count BIGINT NOT NULL DEFAULT 0,
+                    archived_count BIGINT NOT NULL DEFAULT 0,
+                    first_date DATE,
+                    last_date DATE
+                )
+                ''')
+                # archived_count - часть total_count из уже удаленных дневных строк
+                await conn.execute('''
+                ALTER TABLE ai_usage_totals
+                ADD COLUMN IF NOT EXISTS archived_count BIGINT NOT NULL DEFAULT 0
+                ''')
+                await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_usage_totals_count
+                ON ai_usage_totals(total_count DESC)
+                ''')
+                await conn.execute('''
+                CREATE TABLE IF NOT EXISTS ai_usage_daily (
+                    date DATE PRIMARY KEY,
+                    total_count BIGINT NOT NULL DEFAULT 0,
+                    active_users INTEGER NOT NULL DEFAULT 0
+                )
+                ''')
 
                 # Таблица планов чтения
                 await conn.execute('''
@@ -255,6 +380,74 @@ class PostgreSQLManager:
                 ON saved_commentaries(user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, commentary_type)
                 ''')
 
+                # Сжатые длинные тексты по хэшу (database/text_store.py)
+                await conn.execute('''
+                CREATE TABLE IF NOT EXISTS text_blobs (
+                    hash TEXT PRIMARY KEY,
+                    data BYTEA NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+
+                # Данные уже сжаты - TOAST не должен сжимать их второй раз
+                await conn.execute('''
+                ALTER TABLE text_blobs ALTER COLUMN data SET STORAGE EXTERNAL
+                ''')
+
+                # Ссылка толкования на text_blobs (миграция)
+                await conn.execute('''
+                ALTER TABLE saved_commentaries
+                ADD COLUMN IF NOT EXISTS text_hash TEXT REFERENCES text_blobs(hash)
+                ''')
+
+                await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_saved_commentaries_text_hash
+                ON saved_commentaries(text_hash)
+                ''')
+
+                # Беседы с ИИ-помощником (схема как в Supabase)
+                await conn.execute('''
+                CREATE TABLE IF NOT EXISTS ai_conversations (
+                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    user_id BIGINT NOT NULL,
+                    title TEXT,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+
+                await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_conversations_user
+                ON ai_conversations(user_id, updated_at DESC)
+                ''')
+
+                await conn.execute('''
+                CREATE TABLE IF NOT EXISTS ai_messages (
+                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    conversation_id UUID NOT NULL REFERENCES ai_conversations(id) ON DELETE CASCADE,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL,
+                    content_hash TEXT REFERENCES text_blobs(hash),
+                    meta JSONB DEFAULT '{}',
+                    created_at TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+                )
+                ''')
+
+                # Пагинация истории по (conversation_id, created_at, id)
+                await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_messages_conversation_created
+                ON ai_messages(conversation_id, created_at, id)
+                ''')
+
+                await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_messages_created_at ON ai_messages(created_at)
+                ''')
+
+                await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_ai_messages_content_hash ON ai_messages(content_hash)
+                ''')
+
                 # Таблица библейских тем
                 await conn.execute('''
                 CREATE TABLE IF NOT EXISTS bible_topics (
@@ -276,6 +469,39 @@ class PostgreSQLManager:
                 CREATE INDEX IF NOT EXISTS idx_bible_topics_fts ON bible_topics USING gin(to_tsvector('russian', topic_name))
                 ''')
 
+                # Таблица премиум запросов пользователей
+                await conn.execute('''
+                CREATE TABLE IF NOT EXISTS premium_requests (
+                    id SERIAL PRIMARY KEY,
+                    user_id BIGINT NOT NULL UNIQUE,
+                    requests_count INTEGER NOT NULL DEFAULT 0,
+                    total_purchased INTEGER NOT NULL DEFAULT 0,
+                    total_used INTEGER NOT NULL DEFAULT 0,
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                ''')
+
+                # Таблица покупок премиум запросов
+                await conn.execute('''
+                CREATE TABLE IF NOT EXISTS premium_purchases (
+                    id SERIAL PRIMARY KEY,
+                    user_id BIGINT NOT NULL,
+                    requests_count INTEGER NOT NULL,
+                    amount_rub INTEGER NOT NULL DEFAULT 0,
+                    payment_id VARCHAR(255),
+                    payment_status VARCHAR(50) DEFAULT 'pending',
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    completed_at TIMESTAMP NULL
+                )
+                ''')
+
+                # Уникальный payment_id - завершение покупки идемпотентно
+                await conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_premium_purchases_payment_id_unique
+                ON premium_purchases(payment_id) WHERE payment_id IS NOT NULL
+                ''')
+
                 logger.info("Все таблицы PostgreSQL созданы")
 
             except Exception as e:
@@ -286,11 +512,8 @@ class PostgreSQLManager:
     # Методы для работы с пользователями
     async def get_user(self, user_id: int) -> Optional[Dict[str, Any]]:
         """Получает информацию о пользователе"""
-        async with self.pool.acquire() as conn:
-            row = await conn.fetchrow(
-                "SELECT * FROM users WHERE user_id = $1", user_id
-            )
-            return dict(row) if row else None
+        row = await self._prepared('get_user', 'fetchrow', user_id)
+        return dict(row) if row else None
 
     async def add_user(self, user_id: int, username: str, first_name: str) -> None:
         """Добавляет или обновляет пользователя"""
@@ -314,12 +537,8 @@ class PostgreSQLManager:
 
     async def get_user_translation(self, user_id: int) -> str:
         """Получает предпочитаемый перевод Библии пользователя"""
-        async with self.pool.acquire() as conn:
-            result = await conn.fetchval(
-                "SELECT current_translation FROM users WHERE user_id = $1",
-                user_id
-            )
-            return result if result else 'rst'
+        result = await self._prepared('get_user_translation', 'fetchval', user_id)
+        return result if result else 'rst'
 
     async def update_user_response_length(self, user_id: int, response_length: str) -> None:
         """Обновляет настройку длины ответа ИИ пользователя"""
@@ -331,20 +550,12 @@ class PostgreSQLManager:
 
     async def get_user_response_length(self, user_id: int) -> str:
         """Получает настройку длины ответа ИИ пользователя"""
-        async with self.pool.acquire() as conn:
-            result = await conn.fetchval(
-                "SELECT response_length FROM users WHERE user_id = $1",
-                user_id
-            )
-            return result if result else 'full'
+        result = await self._prepared('get_user_response_length', 'fetchval', user_id)
+        return result if result else 'full'
 
     async def update_user_activity(self, user_id: int):
         """Обновляет время последней активности пользователя"""
-        async with self.pool.acquire() as conn:
-            await conn.execute(
-                "UPDATE users SET last_activity = $1 WHERE user_id = $2",
-                datetime.now(), user_id
-            )
+        await self._prepared('update_user_activity', 'fetch', datetime.now(), user_id)
 
     # Методы для работы с закладками
     async def add_bookmark(self, user_id: int, book_id: int, chapter_start: int,
@@ -365,14 +576,8 @@ class PostgreSQLManager:
 
     async def get_bookmarks(self, user_id: int) -> List[Tuple]:
         """Получает все закладки пользователя"""
-        async with self.pool.acquire() as conn:
-            rows = await conn.fetch('''
-                SELECT book_id, chapter_start, chapter_end, display_text, verse_start, verse_end, note, created_at
-                FROM bookmarks 
-                WHERE user_id = $1 
-                ORDER BY created_at DESC
-            ''', user_id)
-            return [tuple(row) for row in rows]
+        rows = await self._prepared('get_bookmarks', 'fetch', user_id)
+        return [tuple(row) for row in rows]
 
     async def remove_bookmark(self, user_id: int, book_id: int, chapter_start: int,
                               chapter_end: int = None, verse_start: int = None, verse_end: int = None) -> bool:
@@ -395,19 +600,23 @@ class PostgreSQLManager:
                             chapter_end: int = None, verse_start: int = None, verse_end: int = None) -> bool:
         """Проверяет, есть ли закладка"""
         try:
-            async with self.pool.acquire() as conn:
-                row = await conn.fetchrow('''
-                    SELECT 1 FROM bookmarks 
-                    WHERE user_id = $1 AND book_id = $2 AND chapter_start = $3 
-                    AND chapter_end IS NOT DISTINCT FROM $4 
-                    AND verse_start IS NOT DISTINCT FROM $5 
-                    AND verse_end IS NOT DISTINCT FROM $6
-                ''', user_id, book_id, chapter_start, chapter_end, verse_start, verse_end)
-                return row is not None
+            row = await self._prepared(
+                'is_bookmarked', 'fetchrow',
+                user_id, book_id, chapter_start, chapter_end, verse_start, verse_end)
+            return row is not None
         except Exception as e:
             logger.error(f"Ошибка проверки закладки: {e}")
             return False
 
+    async def is_chapter_bookmarked(self, user_id: int, book_id: int, chapter: int) -> bool:
+        """Проверяет, есть ли закладка в главе (на главу, ее стихи или включающий ее диапазон)"""
+        try:
+            row = await self._prepared('is_chapter_bookmarked', 'fetchrow', user_id, book_id, chapter)
+            return row is not None
+        except Exception as e:
+            logger.error(f"Ошибка проверки закладок главы: {e}")
+            return False
+
     # Методы для работы с планами чтения
     async def add_reading_plan(self, plan_id: str, title: str, description: str = None) -> bool:
         """Добавляет план чтения"""
@@ -504,18 +713,47 @@ class PostgreSQLManager:
             return False
 
     # Методы для работы с лимитами ИИ
+
+    # Дневной счетчик и оба агрегата обновляются одним запросом:
+    # модифицирующие CTE выполняются в одной транзакции
+    _RECORD_AI_USAGE_QUERY = """
+        WITH usage AS (
+            INSERT INTO ai_limits (user_id, date, count)
+            VALUES ($1, $2, 1)
+            ON CONFLICT (user_id, date) DO UPDATE SET
+                count = ai_limits.count + 1
+            RETURNING count
+        ), totals AS (
+            INSERT INTO ai_usage_totals (user_id, total_count, first_date, last_date)
+            VALUES ($1, 1, $2, $2)
+            ON CONFLICT (user_id) DO UPDATE SET
+                total_count = ai_usage_totals.total_count + 1,
+                last_date = GREATEST(ai_usage_totals.last_date, EXCLUDED.last_date)
+        )
+        INSERT INTO ai_usage_daily (date, total_count, active_users)
+        SELECT $2, 1, CASE WHEN count = 1 THEN 1 ELSE 0 END FROM usage
+        ON CONFLICT (date) DO UPDATE SET
+            total_count = ai_usage_daily.total_count + 1,
+            active_users = ai_usage_daily.active_users + EXCLUDED.active_users
+        RETURNING (SELECT count FROM usage)
+    """
+    _PREPARED_QUERIES['record_ai_usage'] = _RECORD_AI_USAGE_QUERY
+
+    @staticmethod
+    def _as_date(value):
+        """Приводит строку YYYY-MM-DD к date (asyncpg не принимает строки для DATE)"""
+        if isinstance(value, str):
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        if isinstance(value, datetime):
+            return value.date()
+        return value
+
     async def increment_ai_usage(self, user_id: int) -> bool:
         """Увеличивает счетчик использования ИИ"""
         try:
             today = datetime.now().date()
-            async with self.pool.acquire() as conn:
-                await conn.execute('''
-                    INSERT INTO ai_limits (user_id, date, count)
-                    VALUES ($1, $2, 1)
-                    ON CONFLICT (user_id, date) DO UPDATE SET
-                        count = ai_limits.count + 1
-                ''', user_id, today)
-                return True
+            result = await self._prepared('record_ai_usage', 'fetchval', user_id, today)
+            return result is not None
         except Exception as e:
             logger.error(f"Ошибка увеличения счетчика ИИ: {e}")
             return False
@@ -539,12 +777,7 @@ class PostgreSQLManager:
     async def get_reading_progress(self, user_id: int, plan_id: str) -> List[int]:
         """Получает список завершенных дней для плана чтения"""
         try:
-            query = """
-                SELECT day_number FROM reading_progress 
-                WHERE user_id = $1 AND plan_id = $2 AND completed = TRUE
-                ORDER BY day_number
-            """
-            rows = await self.pool.fetch(query, user_id, plan_id)
+            rows = await self._prepared('get_reading_progress', 'fetch', user_id, plan_id)
             return [row['day_number'] for row in rows]
         except Exception as e:
             logger.error(f"Ошибка получения прогресса чтения: {e}")
@@ -553,11 +786,8 @@ class PostgreSQLManager:
     async def is_reading_day_completed(self, user_id: int, plan_id: str, day: int) -> bool:
         """Проверяет, завершен ли день плана чтения"""
         try:
-            query = """
-                SELECT completed FROM reading_progress 
-                WHERE user_id = $1 AND plan_id = $2 AND day_number = $3
-            """
-            result = await self.pool.fetchval(query, user_id, plan_id, day)
+            result = await self._prepared(
+                'is_reading_day_completed', 'fetchval', user_id, plan_id, day)
             return result is True
         except Exception as e:
             logger.error(f"Ошибка проверки завершения дня: {e}")
@@ -566,11 +796,8 @@ class PostgreSQLManager:
     async def is_reading_part_completed(self, user_id: int, plan_id: str, day: int, part_idx: int) -> bool:
         """Проверяет, отмечена ли часть дня как прочитанная"""
         try:
-            query = """
-                SELECT completed FROM reading_parts_progress 
-                WHERE user_id = $1 AND plan_id = $2 AND day_number = $3 AND part_index = $4
-            """
-            result = await self.pool.fetchval(query, user_id, plan_id, day, part_idx)
+            result = await self._prepared(
+                'is_reading_part_completed', 'fetchval', user_id, plan_id, day, part_idx)
             return result is True
         except Exception as e:
             logger.error(f"Ошибка проверки завершения части дня: {e}")
@@ -579,13 +806,9 @@ class PostgreSQLManager:
     async def get_reading_part_progress(self, user_id: int, plan_id: str, day: int) -> List[int]:
         """Получает список завершенных частей дня"""
         try:
-            query = """
-                SELECT part_index FROM reading_parts_progress 
-                WHERE user_id = $1 AND plan_id = $2 AND day_number = $3 AND completed = TRUE
-                ORDER BY part_index
-            """
-            rows = await self.pool.fetch(query, user_id, plan_id, day)
-            return [row['part_index'] for row in rows]
+            rows = await self._prepared(
+                'get_reading_part_progress', 'fetch', user_id, plan_id, day)
+            return [row['part_idx'] for row in rows]
         except Exception as e:
             logger.error(f"Ошибка получения прогресса частей: {e}")
             return []
@@ -692,11 +915,8 @@ class PostgreSQLManager:
     async def get_ai_limit(self, user_id: int, date: str) -> int:
         """Возвращает количество ИИ-запросов пользователя за дату (строка YYYY-MM-DD)"""
         try:
-            query = """
-                SELECT count FROM ai_limits 
-                WHERE user_id = $1 AND date = $2
-            """
-            result = await self.pool.fetchval(query, user_id, date)
+            result = await self._prepared(
+                'get_ai_limit', 'fetchval', user_id, self._as_date(date))
             return result if result is not None else 0
         except Exception as e:
             logger.error(f"Ошибка получения AI лимита: {e}")
@@ -705,28 +925,44 @@ class PostgreSQLManager:
     async def increment_ai_limit(self, user_id: int, date: str) -> int:
         """Увеличивает счетчик ИИ-запросов пользователя за дату, возвращает новое значение"""
         try:
-            # Используем UPSERT для атомарной операции
-            query = """
-                INSERT INTO ai_limits (user_id, date, count) 
-                VALUES ($1, $2, 1)
-                ON CONFLICT (user_id, date) 
-                DO UPDATE SET count = ai_limits.count + 1
-                RETURNING count
-            """
-            result = await self.pool.fetchval(query, user_id, date)
+            # UPSERT дневного счетчика вместе с агрегатами
+            result = await self._prepared(
+                'record_ai_usage', 'fetchval', user_id, self._as_date(date))
             return result if result is not None else 1
         except Exception as e:
             logger.error(f"Ошибка увеличения AI лимита: {e}")
             return 0
 
     async def reset_ai_limit(self, user_id: int, date: str) -> None:
-        """Сбросить лимит ИИ-запросов пользователя за дату (удаляет запись)"""
+        """Сбросить лимит ИИ-запросов пользователя за дату (удаляет запись и ее вклад в агрегаты)"""
         try:
-            query = """
-                DELETE FROM ai_limits 
-                WHERE user_id = $1 AND date = $2
-            """
-            await self.pool.execute(query, user_id, date)
+            day = self._as_date(date)
+            # Дневной счетчик и агрегаты меняются в одной транзакции: агрегаты
+            # остаются равны пересчету, следующий запрос за день снова первый
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    count = await conn.fetchval(
+                        "DELETE FROM ai_limits WHERE user_id = $1 AND date = $2 RETURNING count",
+                        user_id, day)
+                    if not count or count <= 0:
+                        return
+                    await conn.execute("""
+                        UPDATE ai_usage_totals
+                        SET total_count = GREATEST(total_count - $2, archived_count)
+                        WHERE user_id = $1
+                    """, user_id, count)
+                    await conn.execute("""
+                        DELETE FROM ai_usage_totals
+                        WHERE user_id = $1 AND total_count = 0 AND archived_count = 0
+                    """, user_id)
+                    await conn.execute("""
+                        UPDATE ai_usage_daily SET
+                            total_count = GREATEST(total_count - $2, 0),
+                            active_users = GREATEST(active_users - 1, 0)
+                        WHERE date = $1
+                    """, day, count)
+                    await conn.execute(
+                        "DELETE FROM ai_usage_daily WHERE date = $1 AND total_count = 0", day)
         except Exception as e:
             logger.error(f"Ошибка сброса AI лимита: {e}")
 
@@ -739,7 +975,7 @@ class PostgreSQLManager:
                 ORDER BY count DESC 
                 LIMIT $2
             """
-            rows = await self.pool.fetch(query, date, limit)
+            rows = await self.pool.fetch(query, self._as_date(date), limit)
             return [(row['user_id'], row['count']) for row in rows]
         except Exception as e:
             logger.error(f"Ошибка получения AI статистики: {e}")
@@ -750,24 +986,173 @@ class PostgreSQLManager:
 
         try:
             query = """
-                SELECT user_id, SUM(count) as total
-                FROM ai_limits
-                GROUP BY user_id
-                ORDER BY total DESC
+                SELECT user_id, total_count
+                FROM ai_usage_totals
+                ORDER BY total_count DESC
                 LIMIT $1
             """
             rows = await self.pool.fetch(query, limit)
-            return [(row['user_id'], row['total']) for row in rows]
+            return [(row['user_id'], row['total_count']) for row in rows]
         except Exception as e:
             logger.error(f"Ошибка получения общей AI статистики: {e}")
             return []
 
+    async def get_ai_usage_summary(self, start_date: str = None, end_date: str = None) -> Dict[str, int]:
+        """Сводка ИИ-запросов за период по дневным агрегатам (даты YYYY-MM-DD, включительно)"""
+        try:
+            query = """
+                SELECT COALESCE(SUM(total_count), 0) AS total_requests,
+                       COUNT(*) AS active_days,
+                       COALESCE(MAX(active_users), 0) AS peak_daily_users,
+                       (SELECT COUNT(*) FROM ai_usage_totals) AS total_users
+                FROM ai_usage_daily
+                WHERE ($1::date IS NULL OR date >= $1)
+                  AND ($2::date IS NULL OR date <= $2)
+            """
+            row = await self.pool.fetchrow(
+                query, self._as_date(start_date), self._as_date(end_date))
+            return {key: int(row[key]) for key in row.keys()}
+        except Exception as e:
+            logger.error(f"Ошибка получения сводки AI статистики: {e}")
+            return {'total_requests': 0, 'active_days': 0, 'peak_daily_users': 0, 'total_users': 0}
+
+    async def backfill_ai_usage_rollups(self) -> bool:
+        """Пересчитывает агрегаты ИИ из дневной таблицы ai_limits
+
+        Свернутые обслуживанием дни (archived_count и их строки в
+        ai_usage_daily) сохраняются, пересчитываются только живые данные.
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    # Блокируем запись агрегатов, чтобы параллельные инкременты
+                    # дождались пересчета и не потерялись
+                    await conn.execute(
+                        "LOCK TABLE ai_limits, ai_usage_totals, ai_usage_daily IN SHARE ROW EXCLUSIVE MODE")
+                    await conn.execute("DELETE FROM ai_usage_totals WHERE archived_count = 0")
+                    await conn.execute("UPDATE ai_usage_totals SET total_count = archived_count")
+                    await conn.execute("""
+                        INSERT INTO ai_usage_totals (user_id, total_count, first_date, last_date)
+                        SELECT user_id, SUM(count), MIN(date), MAX(date)
+                        FROM ai_limits WHERE count > 0 GROUP BY user_id
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            total_count = ai_usage_totals.total_count + EXCLUDED.total_count,
+                            first_date = LEAST(ai_usage_totals.first_date, EXCLUDED.first_date),
+                            last_date = GREATEST(ai_usage_totals.last_date, EXCLUDED.last_date)
+                    """)
+                    await conn.execute(
+                        "DELETE FROM ai_usage_daily WHERE date IN (SELECT date FROM ai_limits)")
+                    await conn.execute("""
+                        INSERT INTO ai_usage_daily (date, total_count, active_users)
+                        SELECT date, SUM(count), COUNT(*)
+                        FROM ai_limits WHERE count > 0 GROUP BY date
+                    """)
+            logger.info("Агрегаты ИИ пересчитаны")
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка пересчета агрегатов ИИ: {e}")
+            return False
+
+    # Методы обслуживания БД
+    async def fold_oldest_ai_usage_day(self, before_date: str) -> int:
+        """Сворачивает самый старый день ai_limits раньше before_date в агрегаты
+
+        День обрабатывается целиком в одной транзакции: его счетчики
+        переносятся в archived_count, а строки удаляются.
+        Возвращает количество удаленных строк (0 - сворачивать нечего).
+        """
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    day = await conn.fetchval(
+                        "SELECT MIN(date) FROM ai_limits WHERE date < $1",
+                        self._as_date(before_date))
+                    if day is None:
+                        return 0
+
+                    await conn.execute("""
+                        INSERT INTO ai_usage_totals (user_id, total_count, archived_count, first_date, last_date)
+                        SELECT user_id, count, count, date, date
+                        FROM ai_limits WHERE date = $1 AND count > 0
+                        ON CONFLICT (user_id) DO UPDATE SET
+                            archived_count = ai_usage_totals.archived_count + EXCLUDED.archived_count
+                    """, day)
+                    await conn.execute("""
+                        INSERT INTO ai_usage_daily (date, total_count, active_users)
+                        SELECT date, SUM(count), COUNT(*)
+                        FROM ai_limits WHERE date = $1 AND count > 0 GROUP BY date
+                        ON CONFLICT (date) DO NOTHING
+                    """, day)
+                    result = await conn.execute(
+                        "DELETE FROM ai_limits WHERE date = $1", day)
+                    return int(result.split()[-1])
+        except Exception as e:
+            logger.error(f"Ошибка свертки дневных счетчиков ИИ: {e}")
+            return 0
+
+    async def prune_conversation_messages(self, before: str, limit: int = 1000) -> int:
+        """Удаляет до limit сообщений бесед старше before, возвращает количество"""
+        try:
+            if not await self.pool.fetchval("SELECT to_regclass('ai_messages') IS NOT NULL"):
+                return 0
+            result = await self.pool.execute("""
+                DELETE FROM ai_messages WHERE ctid IN (
+                    SELECT ctid FROM ai_messages WHERE created_at < $1 LIMIT $2
+                )
+            """, datetime.fromisoformat(before), limit)
+            return int(result.split()[-1])
+        except Exception as e:
+            logger.error(f"Ошибка удаления старых сообщений бесед: {e}")
+            return 0
+
+    async def purge_orphan_texts(self, limit: int = 1000) -> int:
+        """Удаляет до limit текстов text_blobs, на которые больше никто не ссылается"""
+        try:
+            messages_filter = """
+                AND NOT EXISTS (SELECT 1 FROM ai_messages m WHERE m.content_hash = b.hash)
+            """ if await self.pool.fetchval(
+                "SELECT to_regclass('ai_messages') IS NOT NULL") else ''
+            result = await self.pool.execute(f"""
+                DELETE FROM text_blobs WHERE hash IN (
+                    SELECT b.hash FROM text_blobs b
+                    WHERE NOT EXISTS (SELECT 1 FROM saved_commentaries c WHERE c.text_hash = b.hash)
+                    {messages_filter}
+                    LIMIT $1
+                    FOR UPDATE SKIP LOCKED
+                )
+            """, limit)
+            return int(result.split()[-1])
+        except Exception as e:
+            logger.error(f"Ошибка удаления неиспользуемых текстов: {e}")
+            return 0
+
+    async def run_db_maintenance(self) -> Dict[str, Any]:
+        """VACUUM (ANALYZE) для часто изменяемых таблиц (без блокировки записи)"""
+        tables = ['ai_limits', 'ai_usage_totals', 'ai_usage_daily', 'users', 'ai_messages', 'text_blobs']
+        processed = []
+        try:
+            async with self.pool.acquire() as conn:
+                for table in tables:
+                    if not await conn.fetchval("SELECT to_regclass($1) IS NOT NULL", table):
+                        continue
+                    # VACUUM нельзя выполнять внутри транзакции
+                    await conn.execute(f"VACUUM (ANALYZE) {table}")
+                    processed.append(table)
+            return {'vacuum_analyze': processed}
+        except Exception as e:
+            logger.error(f"Ошибка обслуживания PostgreSQL: {e}")
+            return {'vacuum_analyze': processed, 'error': str(e)}
+
     # Методы для сохраненных толкований
     async def save_commentary(self, user_id: int, book_id: int, chapter_start: int,
                               chapter_end: int = None, verse_start: int = None, verse_end: int = None,
                               reference_text: str = "", commentary_text: str = "",
                               commentary_type: str = "ai") -> bool:
         """Сохраняет толкование для пользователя"""
+        # Длинный текст хранится один раз в text_blobs, в строке - только ссылка
+        packed = pack_text(commentary_text)
+        text_hash = packed[0] if packed else None
+        stored_text = '' if packed else commentary_text
         try:
             # Проверяем, есть ли уже толкование для этой ссылки
             check_query = """
@@ -778,31 +1163,43 @@ class PostgreSQLManager:
                 AND verse_end IS NOT DISTINCT FROM $6
                 AND commentary_type = $7
             """
-            existing = await self.pool.fetchrow(
-                check_query, user_id, book_id, chapter_start, chapter_end,
-                verse_start, verse_end, commentary_type
-            )
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    if packed:
+                        # DO UPDATE блокирует строку текста, чтобы очистка
+                        # неиспользуемых текстов не удалила его до нашей ссылки
+                        await conn.execute("""
+                            INSERT INTO text_blobs (hash, data, size) VALUES ($1, $2, $3)
+                            ON CONFLICT (hash) DO UPDATE SET size = EXCLUDED.size
+                        """, text_hash, packed[1], len(commentary_text))
+
+                    existing = await conn.fetchrow(
+                        check_query, user_id, book_id, chapter_start, chapter_end,
+                        verse_start, verse_end, commentary_type
+                    )
 
-            if existing:
-                # Обновляем существующее
-                update_query = """
-                    UPDATE saved_commentaries 
-                    SET reference_text = $1, commentary_text = $2, updated_at = NOW()
-                    WHERE id = $3
-                """
-                await self.pool.execute(update_query, reference_text, commentary_text, existing['id'])
-            else:
-                # Создаем новое
-                insert_query = """
-                    INSERT INTO saved_commentaries 
-                    (user_id, book_id, chapter_start, chapter_end, verse_start, verse_end,
-                     reference_text, commentary_text, commentary_type)
-                    VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9)
-                """
-                await self.pool.execute(
-                    insert_query, user_id, book_id, chapter_start, chapter_end,
-                    verse_start, verse_end, reference_text, commentary_text, commentary_type
-                )
+                    if existing:
+                        # Обновляем существующее
+                        update_query = """
+                            UPDATE saved_commentaries 
+                            SET reference_text = $1, commentary_text = $2, text_hash = $3, updated_at = NOW()
+                            WHERE id = $4
+                        """
+                        await conn.execute(
+                            update_query, reference_text, stored_text, text_hash, existing['id'])
+                    else:
+                        # Создаем новое
+                        insert_query = """
+                            INSERT INTO saved_commentaries 
+                            (user_id, book_id, chapter_start, chapter_end, verse_start, verse_end,
+                             reference_text, commentary_text, commentary_type, text_hash)
+                            VALUES ($1, $2, $3, $4, $5, $6, $7, $8, $9, $10)
+                        """
+                        await conn.execute(
+                            insert_query, user_id, book_id, chapter_start, chapter_end,
+                            verse_start, verse_end, reference_text, stored_text, commentary_type,
+                            text_hash
+                        )
 
             return True
         except Exception as e:
@@ -815,18 +1212,19 @@ class PostgreSQLManager:
         """Получает сохраненное толкование"""
         try:
             query = """
-                SELECT commentary_text FROM saved_commentaries 
-                WHERE user_id = $1 AND book_id = $2 AND chapter_start = $3 
-                AND chapter_end IS NOT DISTINCT FROM $4
-                AND verse_start IS NOT DISTINCT FROM $5 
-                AND verse_end IS NOT DISTINCT FROM $6
-                AND commentary_type = $7
+                SELECT c.commentary_text, b.data FROM saved_commentaries c
+                LEFT JOIN text_blobs b ON b.hash = c.text_hash
+                WHERE c.user_id = $1 AND c.book_id = $2 AND c.chapter_start = $3 
+                AND c.chapter_end IS NOT DISTINCT FROM $4
+                AND c.verse_start IS NOT DISTINCT FROM $5 
+                AND c.verse_end IS NOT DISTINCT FROM $6
+                AND c.commentary_type = $7
             """
-            result = await self.pool.fetchval(
+            row = await self.pool.fetchrow(
                 query, user_id, book_id, chapter_start, chapter_end,
                 verse_start, verse_end, commentary_type
             )
-            return result
+            return unpack_text(row['commentary_text'], row['data']) if row else None
         except Exception as e:
             logger.error(f"Ошибка получения сохраненного толкования: {e}")
             return None
@@ -857,18 +1255,65 @@ class PostgreSQLManager:
         """Получает последние сохраненные толкования пользователя"""
         try:
             query = """
-                SELECT reference_text, commentary_text, commentary_type, created_at
-                FROM saved_commentaries 
-                WHERE user_id = $1
-                ORDER BY created_at DESC
+                SELECT c.reference_text, c.commentary_text, c.commentary_type, c.created_at, b.data
+                FROM saved_commentaries c
+                LEFT JOIN text_blobs b ON b.hash = c.text_hash
+                WHERE c.user_id = $1
+                ORDER BY c.created_at DESC
                 LIMIT $2
             """
             rows = await self.pool.fetch(query, user_id, limit)
-            return [dict(row) for row in rows]
+            commentaries = []
+            for row in rows:
+                commentary = dict(row)
+                commentary['commentary_text'] = unpack_text(commentary['commentary_text'], commentary.pop('data'))
+                commentaries.append(commentary)
+            return commentaries
         except Exception as e:
             logger.error(f"Ошибка получения толкований пользователя: {e}")
             return []
 
+    async def get_passage_user_context(self, user_id: int, passage: dict,
+                                       commentary_passage: dict = None) -> dict:
+        """Наличие закладки и сохраненные толкования (ИИ, Лопухин) для отрывка одним запросом"""
+        commentary_passage = commentary_passage or passage
+        fields = ('book_id', 'chapter_start', 'chapter_end', 'verse_start', 'verse_end')
+        try:
+            query = """
+                SELECT
+                    EXISTS(
+                        SELECT 1 FROM bookmarks
+                        WHERE user_id = $1 AND book_id = $2 AND chapter_start = $3
+                        AND chapter_end IS NOT DISTINCT FROM $4
+                        AND verse_start IS NOT DISTINCT FROM $5
+                        AND verse_end IS NOT DISTINCT FROM $6
+                    ) AS is_bookmarked,
+                    MAX(c.commentary_text) FILTER (WHERE c.commentary_type = 'ai') AS ai_commentary,
+                    (ARRAY_AGG(b.data) FILTER (WHERE c.commentary_type = 'ai'))[1] AS ai_data,
+                    MAX(c.commentary_text) FILTER (WHERE c.commentary_type = 'lopukhin') AS lopukhin_commentary,
+                    (ARRAY_AGG(b.data) FILTER (WHERE c.commentary_type = 'lopukhin'))[1] AS lopukhin_data
+                FROM saved_commentaries c
+                LEFT JOIN text_blobs b ON b.hash = c.text_hash
+                WHERE c.user_id = $1 AND c.book_id = $7 AND c.chapter_start = $8
+                AND c.chapter_end IS NOT DISTINCT FROM $9
+                AND c.verse_start IS NOT DISTINCT FROM $10
+                AND c.verse_end IS NOT DISTINCT FROM $11
+                AND c.commentary_type IN ('ai', 'lopukhin')
+            """
+            row = await self.pool.fetchrow(
+                query, user_id,
+                *(passage.get(field) for field in fields),
+                *(commentary_passage.get(field) for field in fields)
+            )
+            return {
+                'is_bookmarked': row['is_bookmarked'],
+                'ai_commentary': unpack_text(row['ai_commentary'], row['ai_data']),
+                'lopukhin_commentary': unpack_text(row['lopukhin_commentary'], row['lopukhin_data'])
+            }
+        except Exception as e:
+            logger.error(f"Ошибка получения данных отрывка: {e}")
+            return {'is_bookmarked': False, 'ai_commentary': None, 'lopukhin_commentary': None}
+
     # Методы для библейских тем
     async def get_bible_topics(self, search_query: str = "", limit: int = 50) -> list:
         """Получает список библейских тем с возможностью поиска"""
@@ -1016,6 +1461,304 @@ class PostgreSQLManager:
             logger.error(f"Ошибка удаления темы ID {topic_id}: {e}")
             return False
 
+    # Методы для работы с премиум запросами
+    async def get_user_premium_requests(self, user_id: int) -> int:
+        """Получает количество премиум запросов пользователя"""
+        try:
+            query = "SELECT requests_count FROM premium_requests WHERE user_id = $1"
+            result = await self.pool.fetchval(query, user_id)
+            return result if result is not None else 0
+        except Exception as e:
+            logger.error(
+                f"Ошибка получения премиум запросов для пользователя {user_id}: {e}")
+            return 0
+
+    async def add_premium_requests(self, user_id: int, count: int) -> bool:
+        """Добавляет премиум запросы пользователю (атомарный UPSERT)"""
+        try:
+            query = """
+                INSERT INTO premium_requests (user_id, requests_count, total_purchased, total_used)
+                VALUES ($1, $2, $2, 0)
+                ON CONFLICT (user_id) DO UPDATE SET
+                    requests_count = premium_requests.requests_count + EXCLUDED.requests_count,
+                    total_purchased = premium_requests.total_purchased + EXCLUDED.total_purchased,
+                    updated_at = NOW()
+                RETURNING requests_count
+            """
+            result = await self.pool.fetchval(query, user_id, count)
+            return result is not None
+        except Exception as e:
+            logger.error(
+                f"Ошибка добавления премиум запросов пользователю {user_id}: {e}")
+            return False
+
+    async def use_premium_request(self, user_id: int) -> bool:
+        """Использует один премиум запрос (условный UPDATE, без гонок)"""
+        try:
+            query = """
+                UPDATE premium_requests
+                SET requests_count = requests_count - 1,
+                    total_used = total_used + 1,
+                    updated_at = NOW()
+                WHERE user_id = $1 AND requests_count > 0
+                RETURNING requests_count
+            """
+            result = await self.pool.fetchval(query, user_id)
+            return result is not None
+        except Exception as e:
+            logger.error(
+                f"Ошибка использования премиум запроса пользователем {user_id}: {e}")
+            return False
+
+    async def get_premium_stats(self, user_id: int) -> Dict[str, Any]:
+        """Получает статистику премиум запросов пользователя"""
+        try:
+            query = """
+                SELECT requests_count, total_purchased, total_used, created_at
+                FROM premium_requests WHERE user_id = $1
+            """
+            row = await self.pool.fetchrow(query, user_id)
+            if row:
+                return {
+                    'available': row['requests_count'],
+                    'total_purchased': row['total_purchased'],
+                    'total_used': row['total_used'],
+                    'created_at': row['created_at']
+                }
+        except Exception as e:
+            logger.error(
+                f"Ошибка получения статистики премиум запросов для пользователя {user_id}: {e}")
+
+        return {
+            'available': 0,
+            'total_purchased': 0,
+            'total_used': 0,
+            'created_at': None
+        }
+
+    async def create_premium_purchase(self, user_id: int, requests_count: int, amount_rub: int, payment_id: str) -> bool:
+        """Создает запись о покупке премиум запросов"""
+        try:
+            query = """
+                INSERT INTO premium_purchases (user_id, requests_count, amount_rub, payment_id, payment_status)
+                VALUES ($1, $2, $3, $4, 'pending')
+                ON CONFLICT (payment_id) WHERE payment_id IS NOT NULL DO NOTHING
+                RETURNING id
+            """
+            result = await self.pool.fetchval(query, user_id, requests_count, amount_rub, payment_id)
+            return result is not None
+        except Exception as e:
+            logger.error(f"Ошибка создания покупки премиум запросов: {e}")
+            return False
+
+    async def complete_premium_purchase(self, payment_id: str) -> bool:
+        """Завершает покупку премиум запросов (идемпотентно по payment_id)"""
+        try:
+            # Смена статуса и начисление выполняются одним запросом:
+            # повторный вызов не найдет покупку в статусе pending
+            query = """
+                WITH claimed AS (
+                    UPDATE premium_purchases
+                    SET payment_status = 'completed', completed_at = NOW()
+                    WHERE payment_id = $1 AND payment_status = 'pending'
+                    RETURNING user_id, requests_count
+                )
+                INSERT INTO premium_requests (user_id, requests_count, total_purchased, total_used)
+                SELECT user_id, requests_count, requests_count, 0 FROM claimed
+                ON CONFLICT (user_id) DO UPDATE SET
+                    requests_count = premium_requests.requests_count + EXCLUDED.requests_count,
+                    total_purchased = premium_requests.total_purchased + EXCLUDED.total_purchased,
+                    updated_at = NOW()
+                RETURNING user_id
+            """
+            result = await self.pool.fetchval(query, payment_id)
+
+            if result is None:
+                logger.warning(
+                    f"Покупка с payment_id {payment_id} не найдена или уже завершена")
+                return False
+
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка завершения покупки премиум запросов: {e}")
+            return False
+
+    async def get_premium_purchase_status(self, payment_id: str) -> Optional[str]:
+        """Статус покупки по payment_id ('pending', 'completed', ...) или None"""
+        try:
+            return await self.pool.fetchval(
+                "SELECT payment_status FROM premium_purchases WHERE payment_id = $1", payment_id)
+        except Exception as e:
+            logger.error(f"Ошибка получения статуса покупки {payment_id}: {e}")
+            return None
+
+    # Методы для работы с настройками ИИ
+    async def get_ai_setting(self, setting_key: str) -> Optional[Dict[str, Any]]:
+        """Получает настройку ИИ по ключу"""
+        try:
+            query = "SELECT * FROM ai_settings WHERE setting_key = $1"
+            row = await self.pool.fetchrow(query, setting_key)
+            return dict(row) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка получения настройки {setting_key}: {e}")
+            return None
+
+    async def set_ai_setting(self, setting_key: str, setting_value: str, setting_type: str = 'string', description: str = None) -> bool:
+        """Устанавливает настройку ИИ (UPSERT, описание сохраняется если не передано)"""
+        try:
+            query = """
+                INSERT INTO ai_settings (setting_key, setting_value, setting_type, description)
+                VALUES ($1, $2, $3, $4)
+                ON CONFLICT (setting_key) DO UPDATE SET
+                    setting_value = EXCLUDED.setting_value,
+                    setting_type = EXCLUDED.setting_type,
+                    description = COALESCE(EXCLUDED.description, ai_settings.description),
+                    updated_at = NOW()
+            """
+            await self.pool.execute(query, setting_key, setting_value, setting_type, description)
+            return True
+        except Exception as e:
+            logger.error(f"Ошибка установки настройки {setting_key}: {e}")
+            return False
+
+    async def get_all_ai_settings(self) -> List[Dict[str, Any]]:
+        """Получает все настройки ИИ одним запросом"""
+        try:
+            rows = await self.pool.fetch("SELECT * FROM ai_settings ORDER BY setting_key")
+            return [dict(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Ошибка получения всех настроек ИИ: {e}")
+            return []
+
+    # === МЕТОДЫ ДЛЯ ДИАЛОГОВОГО АССИСТЕНТА ===
+
+    @staticmethod
+    def _conversation_row(row) -> Dict[str, Any]:
+        conversation = dict(row)
+        conversation['id'] = str(conversation['id'])
+        return conversation
+
+    async def create_conversation(self, user_id: int, title: str = None) -> Optional[str]:
+        """Создает новый разговор и возвращает его id"""
+        try:
+            conversation_id = await self.pool.fetchval(
+                "INSERT INTO ai_conversations (user_id, title) VALUES ($1, $2) RETURNING id",
+                user_id, title or 'Новая беседа')
+            return str(conversation_id)
+        except Exception as e:
+            logger.error(f"Ошибка создания разговора: {e}")
+            return None
+
+    async def update_conversation_title(self, conversation_id: str, user_id: int, title: str) -> bool:
+        """Обновляет заголовок разговора"""
+        try:
+            result = await self.pool.execute("""
+                UPDATE ai_conversations SET title = $1, updated_at = NOW()
+                WHERE id = $2 AND user_id = $3
+            """, title, conversation_id, user_id)
+            return result != 'UPDATE 0'
+        except Exception as e:
+            logger.error(f"Ошибка обновления заголовка разговора: {e}")
+            return False
+
+    async def get_conversation(self, conversation_id: str, user_id: int) -> Optional[Dict[str, Any]]:
+        """Возвращает разговор пользователя"""
+        try:
+            row = await self.pool.fetchrow(
+                "SELECT * FROM ai_conversations WHERE id = $1 AND user_id = $2",
+                conversation_id, user_id)
+            return self._conversation_row(row) if row else None
+        except Exception as e:
+            logger.error(f"Ошибка получения разговора: {e}")
+            return None
+
+    async def list_conversations(self, user_id: int, limit: int = 20) -> List[Dict[str, Any]]:
+        """Список разговоров пользователя, по убыванию обновления"""
+        try:
+            rows = await self.pool.fetch("""
+                SELECT * FROM ai_conversations WHERE user_id = $1
+                ORDER BY updated_at DESC LIMIT $2
+            """, user_id, limit)
+            return [self._conversation_row(row) for row in rows]
+        except Exception as e:
+            logger.error(f"Ошибка получения списка разговоров: {e}")
+            return []
+
+    async def delete_conversation(self, conversation_id: str, user_id: int) -> bool:
+        """Удаляет разговор пользователя (сообщения удаляются каскадно)"""
+        try:
+            result = await self.pool.execute(
+                "DELETE FROM ai_conversations WHERE id = $1 AND user_id = $2",
+                conversation_id, user_id)
+            return result != 'DELETE 0'
+        except Exception as e:
+            logger.error(f"Ошибка удаления разговора: {e}")
+            return False
+
+    async def add_message(self, conversation_id: str, role: str, content: str, meta: Dict[str, Any] = None) -> Optional[str]:
+        """Добавляет сообщение в разговор и возвращает его id"""
+        # Длинный ответ хранится один раз в text_blobs, в строке - только ссылка
+        packed = pack_text(content)
+        try:
+            async with self.pool.acquire() as conn:
+                async with conn.transaction():
+                    if packed:
+                        await conn.execute("""
+                            INSERT INTO text_blobs (hash, data, size) VALUES ($1, $2, $3)
+                            ON CONFLICT (hash) DO UPDATE SET size = EXCLUDED.size
+                        """, packed[0], packed[1], len(content))
+                    message_id = await conn.fetchval("""
+                        INSERT INTO ai_messages (conversation_id, role, content, content_hash, meta)
+                        VALUES ($1, $2, $3, $4, $5::jsonb)
+                        RETURNING id
+                    """, conversation_id, role, '' if packed else content,
+                        packed[0] if packed else None, json.dumps(meta or {}, ensure_ascii=False))
+                    await conn.execute(
+                        "UPDATE ai_conversations SET updated_at = NOW() WHERE id = $1", conversation_id)
+            return str(message_id)
+        except Exception as e:
+            logger.error(f"Ошибка добавления сообщения в разговор: {e}")
+            return None
+
+    async def list_messages(self, conversation_id: str, limit: int = 20,
+                            before: str = None) -> List[Dict[str, Any]]:
+        """
+        Возвращает последние сообщения разговора по возрастанию времени.
+
+        Args:
+            before: id сообщения - вернуть сообщения, написанные до него
+                (следующая страница истории, пагинация по (created_at, id))
+        """
+        try:
+            cursor_filter = """
+                AND (m.created_at, m.id) < (
+                    SELECT created_at, id FROM ai_messages WHERE id = $3 AND conversation_id = $1
+                )
+            """ if before else ''
+            params = (conversation_id, limit, before) if before else (conversation_id, limit)
+            rows = await self.pool.fetch(f"""
+                SELECT m.id, m.conversation_id, m.role, m.content, m.meta, m.created_at, b.data
+                FROM ai_messages m
+                LEFT JOIN text_blobs b ON b.hash = m.content_hash
+                WHERE m.conversation_id = $1 {cursor_filter}
+                ORDER BY m.created_at DESC, m.id DESC
+                LIMIT $2
+            """, *params)
+
+            messages = []
+            # Возвращаем по возрастанию
+            for row in reversed(rows):
+                message = dict(row)
+                message['id'] = str(message['id'])
+                message['conversation_id'] = str(message['conversation_id'])
+                message['content'] = unpack_text(message['content'], message.pop('data'))
+                message['meta'] = json.loads(message['meta']) if message['meta'] else {}
+                messages.append(message)
+            return messages
+        except Exception as e:
+            logger.error(f"Ошибка получения сообщений разговора: {e}")
+            return []
+
 
 # Создаем глобальный экземпляр
 postgres_manager = PostgreSQLManager()
@@ -0,0 +1,160 @@
+"""
+Пул соединений PostgreSQL с подготовленными запросами и метриками.
+
+PreparedConnection подготавливает (conn.prepare) запросы из реестра
+PostgreSQLManager на каждом новом соединении пула и хранит их по имени.
+Подготовленные запросы переживают возврат соединения в пул, поэтому частые
+запросы не разбираются и не планируются сервером заново, в том числе первым
+обращением на новом соединении.
+
+MeteredPool оборачивает asyncpg.Pool и считает выдачи соединений, время
+ожидания свободного соединения и таймауты, чтобы была видна загрузка пула.
+"""
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+import asyncpg
+from asyncpg.prepared_stmt import PreparedStatement
+
+logger = logging.getLogger(__name__)
+
+
+class PreparedConnection(asyncpg.Connection):
+    """Соединение asyncpg, на котором запросы реестра подготовлены заранее"""
+
+    def _registry_statements(self) -> Dict[str, PreparedStatement]:
+        try:
+            return self._statements
+        except AttributeError:
+            self._statements = {}
+            return self._statements
+
+    async def prepare_registry(self, queries: Dict[str, str]):
+        """Подготавливает все запросы реестра на соединении"""
+        statements = self._registry_statements()
+        for name, query in queries.items():
+            try:
+                statements[name] = await self.prepare(query)
+            except asyncpg.PostgresError as e:
+                # Таблицы еще не созданы - запрос подготовится при первом использовании
+                logger.debug(f"Запрос {name} не подготовлен заранее: {e}")
+
+    async def run_prepared(self, name: str, query: str, method: str, *args, timeout: float = None):
+        """
+        Выполняет подготовленный запрос реестра.
+
+        Args:
+            name: имя запроса в реестре
+            query: текст запроса (подготавливается, если его еще нет на соединении)
+            method: fetch, fetchrow или fetchval
+        """
+        statements = self._registry_statements()
+        statement = statements.get(name)
+        if statement is None:
+            statement = statements[name] = await self.prepare(query)
+        try:
+            return await getattr(statement, method)(*args, timeout=timeout)
+        except (asyncpg.InvalidCachedStatementError, asyncpg.OutdatedSchemaCacheError):
+            # Схема таблицы изменилась после подготовки - подготавливаем заново
+            statement = statements[name] = await self.prepare(query)
+            return await getattr(statement, method)(*args, timeout=timeout)
+
+
+class MeteredPool:
+    """Обертка asyncpg.Pool со счетчиками выдачи соединений"""
+
+    def __init__(self, pool: asyncpg.Pool):
+        self._pool = pool
+        self.acquired_total = 0
+        self.in_use = 0
+        self.waiting = 0
+        self.max_waiting = 0
+        self.timeouts = 0
+        self.wait_sum = 0.0
+        self.wait_max = 0.0
+
+    @asynccontextmanager
+    async def acquire(self, timeout: float = None):
+        """Выдает соединение из пула, замеряя время ожидания"""
+        self.waiting += 1
+        if self.waiting > self.max_waiting:
+            self.max_waiting = self.waiting
+        started = time.perf_counter()
+        try:
+            connection = await self._pool.acquire(timeout=timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            self.waiting -= 1
+        waited = time.perf_counter() - started
+        self.acquired_total += 1
+        self.wait_sum += waited
+        if waited > self.wait_max:
+            self.wait_max = waited
+
+        self.in_use += 1
+        try:
+            yield connection
+        finally:
+            self.in_use -= 1
+            await self._pool.release(connection)
+
+    async def fetch(self, query: str, *args, timeout: float = None):
+        async with self.acquire() as conn:
+            return await conn.fetch(query, *args, timeout=timeout)
+
+    async def fetchrow(self, query: str, *args, timeout: float = None):
+        async with self.acquire() as conn:
+            return await conn.fetchrow(query, *args, timeout=timeout)
+
+    async def fetchval(self, query: str, *args, column: int = 0, timeout: float = None):
+        async with self.acquire() as conn:
+            return await conn.fetchval(query, *args, column=column, timeout=timeout)
+
+    async def execute(self, query: str, *args, timeout: float = None):
+        async with self.acquire() as conn:
+            return await conn.execute(query, *args, timeout=timeout)
+
+    def __getattr__(self, name: str) -> Any:
+        # close, get_size, get_idle_size и прочее - напрямую из пула asyncpg
+        return getattr(self._pool, name)
+
+    def stats(self) -> Dict[str, Any]:
+        """Текущее состояние пула и накопленные счетчики"""
+        return {
+            'size': self._pool.get_size(),
+            'idle': self._pool.get_idle_size(),
+            'min_size': self._pool.get_min_size(),
+            'max_size': self._pool.get_max_size(),
+            'in_use': self.in_use,
+            'waiting': self.waiting,
+            'max_waiting': self.max_waiting,
+            'acquired_total': self.acquired_total,
+            'timeouts': self.timeouts,
+            'wait_avg': self.wait_sum / self.acquired_total if self.acquired_total else 0.0,
+            'wait_max': self.wait_max,
+        }
+
+    def to_prometheus(self, prefix: str = 'gospel_bot_db_pool') -> str:
+        """Состояние пула в текстовом формате Prometheus"""
+        stats = self.stats()
+        lines = []
+        for name, kind, value, description in (
+            ('connections', 'gauge', stats['size'], 'Открытых соединений в пуле'),
+            ('idle_connections', 'gauge', stats['idle'], 'Свободных соединений в пуле'),
+            ('in_use_connections', 'gauge', stats['in_use'], 'Выданных соединений'),
+            ('max_connections', 'gauge', stats['max_size'], 'Максимальный размер пула'),
+            ('waiting', 'gauge', stats['waiting'], 'Ожидающих свободного соединения'),
+            ('acquired_total', 'counter', stats['acquired_total'], 'Выдано соединений'),
+            ('acquire_timeouts_total', 'counter', stats['timeouts'], 'Таймаутов ожидания соединения'),
+            ('acquire_wait_seconds_sum', 'counter', round(self.wait_sum, 6), 'Суммарное ожидание соединения'),
+            ('acquire_wait_seconds_max', 'gauge', round(self.wait_max, 6), 'Максимальное ожидание соединения'),
+        ):
+            lines += [f'# HELP {prefix}_{name} {description}',
+                      f'# TYPE {prefix}_{name} {kind}',
+                      f'{prefix}_{name} {value}']
+        return '\n'.join(lines) + '\n'
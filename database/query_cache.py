@@ -0,0 +1,256 @@
+"""
+Кэш чтения для UniversalDatabaseManager.
+
+Методы чтения помечаются декоратором @cached с TTL и тегами, методы записи -
+декоратором @invalidates с тегами, которые они делают устаревшими. Кэш
+работает поверх универсального менеджера, поэтому одинаково ведет себя
+для SQLite, PostgreSQL и Supabase.
+
+Теги и ключи задаются шаблонами по именам аргументов метода, например
+'user_plans:{user_id}'. Объем ограничен числом записей (вытесняются
+давно неиспользуемые), для каждого метода ведутся счетчики попаданий,
+промахов, вытеснений и инвалидаций.
+"""
+import asyncio
+import copy
+import functools
+import inspect
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE_ENABLED', 'true').lower() in [
+    'true', '1', 'yes']
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv('QUERY_CACHE_MAX_ENTRIES', '2048'))
+
+_MISSING = object()
+
+
+class CacheStats:
+    """Счетчики кэша одного метода"""
+
+    __slots__ = ('hits', 'misses', 'evictions', 'invalidations')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+
+class QueryCache:
+    """LRU-кэш с TTL и тегами"""
+
+    def __init__(self, max_entries: int = QUERY_CACHE_MAX_ENTRIES, enabled: bool = QUERY_CACHE_ENABLED):
+        self.max_entries = max_entries
+        self.enabled = enabled
+        # ключ -> (значение, срок действия, теги)
+        self._entries: "OrderedDict[Tuple, Tuple[Any, float, Tuple[str, ...]]]" = OrderedDict()
+        self._tags: Dict[str, set] = {}
+        self._pending: Dict[Tuple, asyncio.Future] = {}
+        # Растет при каждой инвалидации: чтение, начатое до записи, не сохраняется
+        self.generation = 0
+        self.stats: Dict[str, CacheStats] = {}
+
+    def _stats(self, method: str) -> CacheStats:
+        stats = self.stats.get(method)
+        if stats is None:
+            stats = self.stats[method] = CacheStats()
+        return stats
+
+    def get(self, key: Tuple) -> Any:
+        """Значение по ключу или _MISSING"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return _MISSING
+        value, expires_at, _ = entry
+        if expires_at < time.monotonic():
+            self._remove(key)
+            return _MISSING
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Tuple, value: Any, ttl: float, tags: Iterable[str] = ()):
+        """Сохраняет значение, вытесняя самые старые записи при переполнении"""
+        if key in self._entries:
+            self._remove(key)
+        tags = tuple(tags)
+        self._entries[key] = (value, time.monotonic() + ttl, tags)
+        for tag in tags:
+            self._tags.setdefault(tag, set()).add(key)
+
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self._stats(oldest[0]).evictions += 1
+
+    def _remove(self, key: Tuple):
+        _, _, tags = self._entries.pop(key)
+        for tag in tags:
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def invalidate(self, *tags: str) -> int:
+        """Удаляет все записи с указанными тегами, возвращает их количество"""
+        self.generation += 1
+        removed = 0
+        for tag in tags:
+            for key in list(self._tags.get(tag, ())):
+                if key in self._entries:
+                    self._remove(key)
+                    self._stats(key[0]).invalidations += 1
+                    removed += 1
+        return removed
+
+    def clear(self):
+        """Полностью очищает кэш"""
+        self.generation += 1
+        self._entries.clear()
+        self._tags.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        """Сводка по кэшу для админ-команд и метрик"""
+        return {
+            'enabled': self.enabled,
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'methods': {
+                name: {
+                    'hits': s.hits, 'misses': s.misses,
+                    'evictions': s.evictions, 'invalidations': s.invalidations
+                }
+                for name, s in sorted(self.stats.items())
+            }
+        }
+
+    def to_prometheus(self, prefix: str = 'gospel_bot_db_cache') -> str:
+        """Счетчики кэша в текстовом формате Prometheus"""
+        lines = [f'# HELP {prefix}_entries Количество записей в кэше',
+                 f'# TYPE {prefix}_entries gauge',
+                 f'{prefix}_entries {len(self._entries)}']
+        for counter in CacheStats.__slots__:
+            lines.append(f'# HELP {prefix}_{counter}_total Кэш чтения БД: {counter}')
+            lines.append(f'# TYPE {prefix}_{counter}_total counter')
+            for name, stats in sorted(self.stats.items()):
+                lines.append(
+                    f'{prefix}_{counter}_total{{method="{name}"}} {getattr(stats, counter)}')
+        return '\n'.join(lines) + '\n'
+
+
+# Глобальный кэш запросов
+query_cache = QueryCache()
+
+
+def _bind(signature: inspect.Signature, args, kwargs) -> Dict[str, Any]:
+    bound = signature.bind(*args, **kwargs)
+    bound.apply_defaults()
+    arguments = dict(bound.arguments)
+    arguments.pop('self', None)
+    return arguments
+
+
+def _render(templates: Iterable[str], arguments: Dict[str, Any]) -> Tuple[str, ...]:
+    return tuple(template.format(**arguments) for template in templates)
+
+
+def cached(ttl: float, tags: Iterable[str] = (), key: Optional[Callable[..., Any]] = None,
+           cache_empty: bool = False, cache: QueryCache = None):
+    """Кэширует результат асинхронного метода чтения
+
+    Args:
+        ttl: время жизни записи в секундах
+        tags: шаблоны тегов по именам аргументов, например 'topic:{topic_id}'
+        key: функция ключа от аргументов метода (по умолчанию - все аргументы)
+        cache_empty: кэшировать ли пустые результаты (None, [], {}).
+            Менеджеры возвращают их и при ошибках БД, поэтому по умолчанию нет.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+        name = method.__name__
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            store = cache or query_cache
+            if not store.enabled:
+                return await method(*args, **kwargs)
+
+            arguments = _bind(signature, args, kwargs)
+            cache_key = (name, key(**arguments) if key else tuple(arguments.items()))
+            stats = store._stats(name)
+
+            value = store.get(cache_key)
+            if value is not _MISSING:
+                stats.hits += 1
+                return copy.deepcopy(value)
+
+            # Параллельные промахи по одному ключу ждут один запрос к БД
+            pending = store._pending.get(cache_key)
+            while pending is not None:
+                try:
+                    value = await asyncio.shield(pending)
+                except asyncio.CancelledError:
+                    # Отменен сам ожидающий - пробрасываем; отменен только запрос
+                    # другого вызова (клиент отключился) - загружаем сами
+                    if not pending.cancelled() or asyncio.current_task().cancelling():
+                        raise
+                    pending = store._pending.get(cache_key)
+                else:
+                    stats.hits += 1
+                    return copy.deepcopy(value)
+
+            stats.misses += 1
+            generation = store.generation
+            future = asyncio.get_running_loop().create_future()
+            store._pending[cache_key] = future
+            try:
+                value = await method(*args, **kwargs)
+            except asyncio.CancelledError:
+                future.cancel()
+                raise
+            except BaseException as e:
+                future.set_exception(e)
+                # Исключение уже передано вызывающему, ожидающих может не быть
+                future.exception()
+                raise
+            else:
+                future.set_result(value)
+                # Запись, закончившаяся во время чтения, могла сделать результат устаревшим
+                if (cache_empty or value not in (None, [], {})) and store.generation == generation:
+                    store.set(cache_key, value, ttl, _render(tags, arguments))
+                return copy.deepcopy(value)
+            finally:
+                if store._pending.get(cache_key) is future:
+                    del store._pending[cache_key]
+
+        wrapper.cache_tags = tuple(tags)
+        return wrapper
+    return decorator
+
+
+def invalidates(*tags: str, cache: QueryCache = None):
+    """Сбрасывает записи кэша с указанными тегами после вызова метода записи
+
+    Сброс выполняется и при исключении: запись могла частично пройти.
+    """
+    def decorator(method):
+        signature = inspect.signature(method)
+
+        @functools.wraps(method)
+        async def wrapper(*args, **kwargs):
+            try:
+                return await method(*args, **kwargs)
+            finally:
+                store = cache or query_cache
+                if store.enabled:
+                    store.invalidate(*_render(tags, _bind(signature, args, kwargs)))
+
+        wrapper.invalidates_tags = tags
+        return wrapper
+    return decorator
@@ -0,0 +1,114 @@
+-- Миграция для Supabase: агрегаты использования ИИ
+-- Выполните этот скрипт в SQL Editor вашего Supabase проекта
+--
+-- Статистика ИИ (топ пользователей, сводки за период) читается из
+-- небольших таблиц-агрегатов вместо выгрузки всей истории ai_limits.
+-- Агрегаты обновляются при каждом запросе через record_ai_usage_rollup,
+-- а backfill_ai_usage_rollups пересчитывает их из дневных таблиц.
+
+-- 1. Итоги по пользователям за всё время
+CREATE TABLE IF NOT EXISTS ai_usage_totals (
+    user_id BIGINT PRIMARY KEY,
+    total_count BIGINT NOT NULL DEFAULT 0,
+    first_date DATE,
+    last_date DATE
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_usage_totals_count ON ai_usage_totals(total_count DESC);
+
+-- 2. Итоги по дням
+CREATE TABLE IF NOT EXISTS ai_usage_daily (
+    date DATE PRIMARY KEY,
+    total_count BIGINT NOT NULL DEFAULT 0,
+    active_users INTEGER NOT NULL DEFAULT 0
+);
+
+-- 3. Индекс для топа пользователей за день
+CREATE INDEX IF NOT EXISTS idx_ai_limits_date_count ON ai_limits(date, count DESC);
+
+-- 4. Инкрементальное обновление агрегатов
+-- p_first_today = TRUE, если это первый запрос пользователя за день
+CREATE OR REPLACE FUNCTION record_ai_usage_rollup(p_user_id BIGINT, p_date DATE, p_first_today BOOLEAN)
+RETURNS VOID AS $$
+    INSERT INTO ai_usage_totals (user_id, total_count, first_date, last_date)
+    VALUES (p_user_id, 1, p_date, p_date)
+    ON CONFLICT (user_id) DO UPDATE SET
+        total_count = ai_usage_totals.total_count + 1,
+        last_date = GREATEST(ai_usage_totals.last_date, EXCLUDED.last_date);
+
+    INSERT INTO ai_usage_daily (date, total_count, active_users)
+    VALUES (p_date, 1, CASE WHEN p_first_today THEN 1 ELSE 0 END)
+    ON CONFLICT (date) DO UPDATE SET
+        total_count = ai_usage_daily.total_count + 1,
+        active_users = ai_usage_daily.active_users + EXCLUDED.active_users;
+$$ LANGUAGE sql;
+
+-- 5. Сброс дневного счетчика пользователя вместе с его вкладом в агрегаты
+-- (следующий запрос пользователя в этот день снова считается первым)
+CREATE OR REPLACE FUNCTION reset_ai_limit_rollup(p_user_id BIGINT, p_date DATE)
+RETURNS VOID AS $$
+DECLARE
+    v_count INTEGER;
+BEGIN
+    DELETE FROM ai_limits WHERE user_id = p_user_id AND date = p_date
+    RETURNING count INTO v_count;
+    IF v_count IS NULL OR v_count <= 0 THEN
+        RETURN;
+    END IF;
+
+    UPDATE ai_usage_totals SET total_count = GREATEST(total_count - v_count, 0)
+    WHERE user_id = p_user_id;
+    DELETE FROM ai_usage_totals WHERE user_id = p_user_id AND total_count = 0;
+
+    UPDATE ai_usage_daily SET
+        total_count = GREATEST(total_count - v_count, 0),
+        active_users = GREATEST(active_users - 1, 0)
+    WHERE date = p_date;
+    DELETE FROM ai_usage_daily WHERE date = p_date AND total_count = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 6. Полный пересчет агрегатов из ai_limits и ai_usage (если есть)
+CREATE OR REPLACE FUNCTION backfill_ai_usage_rollups()
+RETURNS VOID AS $$
+DECLARE
+    v_source TEXT := 'SELECT user_id, date, count FROM ai_limits';
+BEGIN
+    IF to_regclass('public.ai_usage') IS NOT NULL THEN
+        v_source := v_source || ' UNION ALL SELECT user_id, date, count FROM ai_usage';
+    END IF;
+
+    LOCK TABLE ai_usage_totals, ai_usage_daily IN SHARE ROW EXCLUSIVE MODE;
+    TRUNCATE ai_usage_totals, ai_usage_daily;
+
+    EXECUTE format(
+        'INSERT INTO ai_usage_totals (user_id, total_count, first_date, last_date)
+         SELECT user_id, SUM(count), MIN(date), MAX(date)
+         FROM (%s) src WHERE count > 0 GROUP BY user_id', v_source);
+
+    EXECUTE format(
+        'INSERT INTO ai_usage_daily (date, total_count, active_users)
+         SELECT date, SUM(count), COUNT(DISTINCT user_id)
+         FROM (%s) src WHERE count > 0 GROUP BY date', v_source);
+END;
+$$ LANGUAGE plpgsql;
+
+-- Доступ только для сервисного ключа
+ALTER TABLE ai_usage_totals ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ai_usage_daily ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE ai_usage_totals IS 'Итоги ИИ-запросов по пользователям за всё время';
+COMMENT ON TABLE ai_usage_daily IS 'Итоги ИИ-запросов по дням';
+COMMENT ON FUNCTION record_ai_usage_rollup(BIGINT, DATE, BOOLEAN) IS 'Инкрементальное обновление агрегатов ИИ';
+COMMENT ON FUNCTION reset_ai_limit_rollup(BIGINT, DATE) IS 'Сброс дневного счетчика ИИ с вычетом из агрегатов';
+COMMENT ON FUNCTION backfill_ai_usage_rollups() IS 'Полный пересчет агрегатов ИИ';
+
+-- Первичное заполнение агрегатов
+SELECT backfill_ai_usage_rollups();
+
+DO $$
+BEGIN
+    RAISE NOTICE 'Миграция завершена успешно!';
+    RAISE NOTICE 'Созданы таблицы: ai_usage_totals, ai_usage_daily';
+    RAISE NOTICE 'Созданы функции: record_ai_usage_rollup, reset_ai_limit_rollup, backfill_ai_usage_rollups';
+END $$;
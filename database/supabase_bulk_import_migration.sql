@@ -0,0 +1,44 @@
+-- Миграция для Supabase: уникальные ключи для пакетного импорта
+-- Выполните этот скрипт в SQL Editor вашего Supabase проекта
+--
+-- bulk_import.py пишет планы и темы многострочными upsert по ключу
+-- (database/bulk_import.py, SupabaseBulkWriter). Для upsert ключ должен быть
+-- закреплен уникальным ограничением.
+
+-- 1. Удаляем повторяющиеся дни планов (остается одна строка)
+DELETE FROM reading_plan_days d
+USING reading_plan_days other
+WHERE d.plan_id = other.plan_id
+AND d.day = other.day
+AND d.ctid > other.ctid;
+
+-- 2. Один день плана - одна строка
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_constraint WHERE conname = 'reading_plan_days_plan_day_key'
+    ) THEN
+        ALTER TABLE reading_plan_days
+            ADD CONSTRAINT reading_plan_days_plan_day_key UNIQUE (plan_id, day);
+    END IF;
+END $$;
+
+COMMENT ON CONSTRAINT reading_plan_days_plan_day_key ON reading_plan_days
+    IS 'Ключ upsert при пакетном импорте планов';
+
+-- 3. Уникальность названия темы (в create-скрипте есть, в старых базах могло не быть)
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM pg_indexes
+        WHERE tablename = 'bible_topics' AND indexdef ILIKE '%UNIQUE%(topic_name)%'
+    ) THEN
+        CREATE UNIQUE INDEX bible_topics_topic_name_key ON bible_topics(topic_name);
+    END IF;
+END $$;
+
+DO $$
+BEGIN
+    RAISE NOTICE 'Миграция завершена успешно!';
+    RAISE NOTICE 'Созданы уникальные ключи: reading_plan_days(plan_id, day), bible_topics(topic_name)';
+END $$;
@@ -0,0 +1,59 @@
+-- Миграция для Supabase: таблицы бесед с ИИ-помощником и пагинация истории
+-- Выполните этот скрипт в SQL Editor вашего Supabase проекта
+--
+-- Беседы хранятся во всех бэкендах (SQLite и PostgreSQL создают эти таблицы
+-- сами). История читается страницами по (conversation_id, created_at):
+-- последние сообщения, затем - написанные до самого раннего полученного
+-- (SupabaseManager.list_messages, параметр before).
+
+-- 1. Беседы
+CREATE TABLE IF NOT EXISTS ai_conversations (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    user_id BIGINT NOT NULL,
+    title TEXT,
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW(),
+    updated_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_ai_conversations_user
+    ON ai_conversations(user_id, updated_at DESC);
+
+-- 2. Сообщения бесед
+CREATE TABLE IF NOT EXISTS ai_messages (
+    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    conversation_id UUID NOT NULL REFERENCES ai_conversations(id) ON DELETE CASCADE,
+    role TEXT NOT NULL CHECK (role IN ('user', 'assistant', 'system')),
+    content TEXT NOT NULL,
+    meta JSONB DEFAULT '{}',
+    created_at TIMESTAMP WITH TIME ZONE NOT NULL DEFAULT clock_timestamp()
+);
+
+-- Ссылка на сжатый текст, если уже применена supabase_text_store_migration.sql
+DO $$
+BEGIN
+    IF to_regclass('text_blobs') IS NOT NULL THEN
+        ALTER TABLE ai_messages
+            ADD COLUMN IF NOT EXISTS content_hash TEXT REFERENCES text_blobs(hash);
+        CREATE INDEX IF NOT EXISTS idx_ai_messages_content_hash
+            ON ai_messages(content_hash);
+    END IF;
+END $$;
+
+ALTER TABLE ai_conversations ENABLE ROW LEVEL SECURITY;
+ALTER TABLE ai_messages ENABLE ROW LEVEL SECURITY;
+
+-- 3. Пагинация истории: индекс покрывает фильтр по беседе и порядок по времени
+CREATE INDEX IF NOT EXISTS idx_ai_messages_conversation_created
+    ON ai_messages(conversation_id, created_at, id);
+
+-- Старый индекс только по conversation_id покрывается новым
+DROP INDEX IF EXISTS idx_ai_messages_conversation_id;
+
+-- Индекс для удаления старых сообщений (services/maintenance.py)
+CREATE INDEX IF NOT EXISTS idx_ai_messages_created_at ON ai_messages(created_at);
+
+DO $$
+BEGIN
+    RAISE NOTICE 'Миграция завершена успешно!';
+    RAISE NOTICE 'Таблицы: ai_conversations, ai_messages; индекс: idx_ai_messages_conversation_created';
+END $$;
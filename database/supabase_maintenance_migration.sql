@@ -0,0 +1,113 @@
+-- Миграция для Supabase: обслуживание таблиц использования ИИ и бесед
+-- Выполните этот скрипт в SQL Editor вашего Supabase проекта
+-- (после supabase_ai_usage_rollups_migration.sql)
+--
+-- Старые дневные счетчики ИИ сворачиваются в агрегаты и удаляются,
+-- старые сообщения бесед удаляются порциями (services/maintenance.py).
+
+-- 1. Часть итога пользователя, перенесенная из удаленных дневных строк
+ALTER TABLE ai_usage_totals ADD COLUMN IF NOT EXISTS archived_count BIGINT NOT NULL DEFAULT 0;
+
+-- 2. Индекс для удаления старых сообщений
+DO $$
+BEGIN
+    IF to_regclass('public.ai_messages') IS NOT NULL THEN
+        CREATE INDEX IF NOT EXISTS idx_ai_messages_created_at ON ai_messages(created_at);
+    END IF;
+END $$;
+
+-- 3. Свертка самого старого дня раньше p_before (ai_limits и ai_usage)
+-- Возвращает количество удаленных строк, 0 - сворачивать нечего
+CREATE OR REPLACE FUNCTION fold_oldest_ai_usage_day(p_before DATE)
+RETURNS INTEGER AS $$
+DECLARE
+    v_day DATE;
+    v_has_usage BOOLEAN := to_regclass('public.ai_usage') IS NOT NULL;
+    v_deleted INTEGER := 0;
+    v_rows INTEGER;
+BEGIN
+    SELECT MIN(date) INTO v_day FROM ai_limits WHERE date < p_before;
+    IF v_has_usage THEN
+        EXECUTE 'SELECT LEAST($1, (SELECT MIN(date) FROM ai_usage WHERE date < $2))'
+            INTO v_day USING v_day, p_before;
+    END IF;
+
+    IF v_day IS NULL THEN
+        RETURN 0;
+    END IF;
+
+    CREATE TEMP TABLE IF NOT EXISTS fold_rows (user_id BIGINT, count INTEGER) ON COMMIT DROP;
+    DELETE FROM fold_rows;
+
+    WITH deleted AS (
+        DELETE FROM ai_limits WHERE date = v_day RETURNING user_id, count
+    )
+    INSERT INTO fold_rows SELECT user_id, count FROM deleted;
+    GET DIAGNOSTICS v_rows = ROW_COUNT;
+    v_deleted := v_rows;
+
+    IF v_has_usage THEN
+        EXECUTE 'WITH deleted AS (DELETE FROM ai_usage WHERE date = $1 RETURNING user_id, count)
+                 INSERT INTO fold_rows SELECT user_id, count FROM deleted' USING v_day;
+        GET DIAGNOSTICS v_rows = ROW_COUNT;
+        v_deleted := v_deleted + v_rows;
+    END IF;
+
+    INSERT INTO ai_usage_totals (user_id, total_count, archived_count, first_date, last_date)
+    SELECT user_id, SUM(count), SUM(count), v_day, v_day
+    FROM fold_rows WHERE count > 0 GROUP BY user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        archived_count = ai_usage_totals.archived_count + EXCLUDED.archived_count;
+
+    INSERT INTO ai_usage_daily (date, total_count, active_users)
+    SELECT v_day, SUM(count), COUNT(DISTINCT user_id)
+    FROM fold_rows WHERE count > 0
+    HAVING COUNT(*) > 0
+    ON CONFLICT (date) DO NOTHING;
+
+    DELETE FROM fold_rows;
+    RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 4. Пересчет агрегатов с сохранением свернутых дней
+CREATE OR REPLACE FUNCTION backfill_ai_usage_rollups()
+RETURNS VOID AS $$
+DECLARE
+    v_source TEXT := 'SELECT user_id, date, count FROM ai_limits';
+BEGIN
+    IF to_regclass('public.ai_usage') IS NOT NULL THEN
+        v_source := v_source || ' UNION ALL SELECT user_id, date, count FROM ai_usage';
+    END IF;
+
+    LOCK TABLE ai_usage_totals, ai_usage_daily IN SHARE ROW EXCLUSIVE MODE;
+    DELETE FROM ai_usage_totals WHERE archived_count = 0;
+    UPDATE ai_usage_totals SET total_count = archived_count;
+
+    EXECUTE format(
+        'INSERT INTO ai_usage_totals (user_id, total_count, first_date, last_date)
+         SELECT user_id, SUM(count), MIN(date), MAX(date)
+         FROM (%s) src WHERE count > 0 GROUP BY user_id
+         ON CONFLICT (user_id) DO UPDATE SET
+             total_count = ai_usage_totals.total_count + EXCLUDED.total_count,
+             first_date = LEAST(ai_usage_totals.first_date, EXCLUDED.first_date),
+             last_date = GREATEST(ai_usage_totals.last_date, EXCLUDED.last_date)', v_source);
+
+    EXECUTE format(
+        'DELETE FROM ai_usage_daily WHERE date IN (SELECT date FROM (%s) src)', v_source);
+
+    EXECUTE format(
+        'INSERT INTO ai_usage_daily (date, total_count, active_users)
+         SELECT date, SUM(count), COUNT(DISTINCT user_id)
+         FROM (%s) src WHERE count > 0 GROUP BY date', v_source);
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON COLUMN ai_usage_totals.archived_count IS 'Запросы из удаленных (свернутых) дневных строк';
+COMMENT ON FUNCTION fold_oldest_ai_usage_day(DATE) IS 'Свертка самого старого дня дневных счетчиков ИИ в агрегаты';
+
+DO $$
+BEGIN
+    RAISE NOTICE 'Миграция завершена успешно!';
+    RAISE NOTICE 'Созданы функции: fold_oldest_ai_usage_day, backfill_ai_usage_rollups (обновлена)';
+END $$;
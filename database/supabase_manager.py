@@ -8,9 +8,36 @@ from typing import List, Tuple, Optional, Dict, Any
 import os
 from supabase import create_client, Client
 
+from .text_store import encode_blob, pack_text, unpack_text
+
 # Инициализация логгера
 logger = logging.getLogger(__name__)
 
+# Коды PostgREST/PostgreSQL "функция не найдена": SQL-функция RPC не установлена
+_MISSING_RPC_CODES = ('PGRST202', '42883')
+
+
+def _is_missing_rpc(error: Exception) -> bool:
+    """Ошибка RPC из-за отсутствующей функции (а не таймаут или сбой после выполнения)"""
+    if getattr(error, 'code', None) in _MISSING_RPC_CODES:
+        return True
+    message = str(error)
+    return any(code in message for code in _MISSING_RPC_CODES) or 'Could not find the function' in message
+
+
+# Коды "нет таблицы/связи/колонки": миграция text_blobs не применена
+_MISSING_TEXT_STORE_CODES = ('PGRST200', 'PGRST204', 'PGRST205', '42P01', '42703')
+
+
+def _is_missing_text_store(error: Exception) -> bool:
+    """Ошибка из-за отсутствующей таблицы text_blobs или связи с ней (а не таймаут или сбой сети)"""
+    if getattr(error, 'code', None) in _MISSING_TEXT_STORE_CODES:
+        return True
+    message = str(error)
+    return (any(code in message for code in _MISSING_TEXT_STORE_CODES)
+            or 'Could not find a relationship' in message
+            or ('text_blobs' in message and 'does not exist' in message))
+
 
 class SupabaseManager:
     """Класс для управления базой данных через Supabase SDK"""
@@ -36,6 +63,9 @@ class SupabaseManager:
         # Service role имеет bypass RLS и позволит включить RLS для безопасности
         self.client: Client = create_client(self.url, self.key)
 
+        # Применена ли database/supabase_text_store_migration.sql (выясняется при первом обращении)
+        self._text_store_supported = True
+
         logger.info(f"Инициализация Supabase: {self.url}")
 
     async def initialize(self):
@@ -246,6 +276,18 @@ class SupabaseManager:
                 f"Ошибка проверки закладки для пользователя {user_id}: {e}")
             return False
 
+    async def is_chapter_bookmarked(self, user_id: int, book_id: int, chapter: int) -> bool:
+        """Проверяет, есть ли закладка в главе (на главу, ее стихи или включающий ее диапазон)"""
+        try:
+            result = self.client.table('bookmarks').select('id').eq('user_id', user_id).eq(
+                'book_id', book_id).lte('chapter_start', chapter).or_(
+                f"chapter_start.eq.{chapter},chapter_end.gte.{chapter}").limit(1).execute()
+            return len(result.data) > 0
+        except Exception as e:
+            logger.error(
+                f"Ошибка проверки закладок главы для пользователя {user_id}: {e}")
+            return False
+
     async def is_bookmark_exists(self, user_id: int, reference: str) -> bool:
         """Проверяет существование закладки по ссылке"""
         try:
@@ -274,7 +316,7 @@ class SupabaseManager:
                 update_result = self.client.table('ai_usage').update({
                     'count': new_count
                 }).eq('user_id', user_id).eq('date', today).execute()
-                return len(update_result.data) > 0
+                success = len(update_result.data) > 0
             else:
                 # Создаем новую запись
                 insert_result = self.client.table('ai_usage').insert({
@@ -282,7 +324,11 @@ class SupabaseManager:
                     'date': today,
                     'count': 1
                 }).execute()
-                return len(insert_result.data) > 0
+                success = len(insert_result.data) > 0
+
+            if success:
+                await self._record_ai_usage_rollup(user_id, today, not result.data)
+            return success
         except Exception as e:
             logger.error(
                 f"Ошибка увеличения счетчика AI для пользователя {user_id}: {e}")
@@ -516,16 +562,61 @@ class SupabaseManager:
                     'count': new_count
                 }).execute()
 
+            await self._record_ai_usage_rollup(user_id, date, new_count == 1)
             return new_count
         except Exception as e:
             logger.error(f"Ошибка увеличения AI лимита: {e}")
             return 0
 
     async def reset_ai_limit(self, user_id: int, date: str) -> None:
-        """Сбросить лимит ИИ-запросов пользователя за дату (удаляет запись)"""
+        """Сбросить лимит ИИ-запросов пользователя за дату (удаляет запись и ее вклад в агрегаты)"""
+        try:
+            self.client.rpc('reset_ai_limit_rollup', {
+                'p_user_id': user_id,
+                'p_date': date
+            }).execute()
+            return
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                # Сброс мог пройти на сервере: повтор не нужен, расхождения исправляет пересчет
+                logger.error(f"Ошибка сброса AI лимита: {e}")
+                return
+            logger.warning(
+                f"RPC reset_ai_limit_rollup недоступна, сбрасываем напрямую: {e}")
+        await self._reset_ai_limit_fallback(user_id, date)
+
+    async def _reset_ai_limit_fallback(self, user_id: int, date: str) -> None:
+        """Сброс без RPC (не атомарно, расхождения исправляет пересчет)"""
         try:
-            self.client.table('ai_limits').delete().eq(
+            removed = self.client.table('ai_limits').delete().eq(
                 'user_id', user_id).eq('date', date).execute()
+            count = sum(row.get('count') or 0 for row in removed.data or [])
+            if count <= 0:
+                return
+
+            totals = self.client.table('ai_usage_totals').select(
+                'total_count').eq('user_id', user_id).execute()
+            if totals.data:
+                total_count = max(totals.data[0]['total_count'] - count, 0)
+                if total_count:
+                    self.client.table('ai_usage_totals').update({
+                        'total_count': total_count
+                    }).eq('user_id', user_id).execute()
+                else:
+                    self.client.table('ai_usage_totals').delete().eq('user_id', user_id).execute()
+
+            daily = self.client.table('ai_usage_daily').select(
+                'total_count, active_users').eq('date', date).execute()
+            if daily.data:
+                current = daily.data[0]
+                total_count = max(current['total_count'] - count, 0)
+                if total_count:
+                    self.client.table('ai_usage_daily').update({
+                        'total_count': total_count,
+                        'active_users': max(current['active_users'] - 1, 0)
+                    }).eq('date', date).execute()
+                else:
+                    self.client.table('ai_usage_daily').delete().eq('date', date).execute()
         except Exception as e:
             logger.error(f"Ошибка сброса AI лимита: {e}")
 
@@ -539,29 +630,195 @@ class SupabaseManager:
             logger.error(f"Ошибка получения AI статистики: {e}")
             return []
 
-    async def get_ai_stats_alltime(self, limit: int = 10) -> list:
-        """Топ пользователей по ИИ-запросам за всё время (user_id, total_count)"""
+    async def _record_ai_usage_rollup(self, user_id: int, day: str, first_today: bool) -> None:
+        """Обновляет агрегаты ИИ после увеличения дневного счетчика"""
+        try:
+            self.client.rpc('record_ai_usage_rollup', {
+                'p_user_id': user_id,
+                'p_date': day,
+                'p_first_today': first_today
+            }).execute()
+        except Exception as e:
+            logger.warning(
+                f"RPC record_ai_usage_rollup недоступна, обновляем агрегаты напрямую: {e}")
+            await self._record_ai_usage_rollup_fallback(user_id, day, first_today)
+
+    async def _record_ai_usage_rollup_fallback(self, user_id: int, day: str, first_today: bool) -> None:
+        """Обновление агрегатов без RPC (не атомарно, расхождения исправляет пересчет)"""
         try:
-            # В Supabase используем агрегацию через RPC функцию или простой запрос
-            # Для простоты используем Python агрегацию
-            result = self.client.table('ai_limits').select(
-                'user_id, count').execute()
+            totals = self.client.table('ai_usage_totals').select(
+                'total_count, first_date, last_date').eq('user_id', user_id).execute()
+            if totals.data:
+                current = totals.data[0]
+                self.client.table('ai_usage_totals').update({
+                    'total_count': current['total_count'] + 1,
+                    'last_date': max(current['last_date'] or day, day)
+                }).eq('user_id', user_id).execute()
+            else:
+                self.client.table('ai_usage_totals').insert({
+                    'user_id': user_id, 'total_count': 1,
+                    'first_date': day, 'last_date': day
+                }).execute()
 
-            # Агрегируем данные по пользователям
-            user_totals = {}
-            for row in result.data:
-                user_id = row['user_id']
-                count = row['count']
-                user_totals[user_id] = user_totals.get(user_id, 0) + count
+            daily = self.client.table('ai_usage_daily').select(
+                'total_count, active_users').eq('date', day).execute()
+            if daily.data:
+                current = daily.data[0]
+                self.client.table('ai_usage_daily').update({
+                    'total_count': current['total_count'] + 1,
+                    'active_users': current['active_users'] + (1 if first_today else 0)
+                }).eq('date', day).execute()
+            else:
+                self.client.table('ai_usage_daily').insert({
+                    'date': day, 'total_count': 1, 'active_users': 1
+                }).execute()
+        except Exception as e:
+            logger.error(f"Ошибка обновления агрегатов ИИ: {e}")
 
-            # Сортируем и возвращаем топ
-            sorted_users = sorted(user_totals.items(),
-                                  key=lambda x: x[1], reverse=True)
-            return sorted_users[:limit]
+    async def get_ai_stats_alltime(self, limit: int = 10) -> list:
+        """Топ пользователей по ИИ-запросам за всё время (user_id, total_count)"""
+        try:
+            result = self.client.table('ai_usage_totals').select(
+                'user_id, total_count').order('total_count', desc=True).limit(limit).execute()
+            return [(row['user_id'], row['total_count']) for row in result.data]
         except Exception as e:
             logger.error(f"Ошибка получения общей AI статистики: {e}")
             return []
 
+    async def get_ai_usage_summary(self, start_date: str = None, end_date: str = None) -> Dict[str, int]:
+        """Сводка ИИ-запросов за период по дневным агрегатам (даты YYYY-MM-DD, включительно)"""
+        try:
+            query = self.client.table('ai_usage_daily').select(
+                'total_count, active_users')
+            if start_date:
+                query = query.gte('date', start_date)
+            if end_date:
+                query = query.lte('date', end_date)
+            # Одна строка на день, поэтому объем ответа мал
+            days = query.execute().data or []
+
+            users = self.client.table('ai_usage_totals').select(
+                'user_id', count='exact').limit(1).execute()
+
+            return {
+                'total_requests': sum(row['total_count'] for row in days),
+                'active_days': len(days),
+                'peak_daily_users': max((row['active_users'] for row in days), default=0),
+                'total_users': users.count or 0
+            }
+        except Exception as e:
+            logger.error(f"Ошибка получения сводки AI статистики: {e}")
+            return {'total_requests': 0, 'active_days': 0, 'peak_daily_users': 0, 'total_users': 0}
+
+    async def backfill_ai_usage_rollups(self) -> bool:
+        """Пересчитывает агрегаты ИИ на стороне БД (RPC backfill_ai_usage_rollups)"""
+        try:
+            self.client.rpc('backfill_ai_usage_rollups', {}).execute()
+            logger.info("Агрегаты ИИ пересчитаны")
+            return True
+        except Exception as e:
+            logger.error(
+                f"Ошибка пересчета агрегатов ИИ (примените database/supabase_ai_usage_rollups_migration.sql): {e}")
+            return False
+
+    # Методы обслуживания БД
+    async def fold_oldest_ai_usage_day(self, before_date: str) -> int:
+        """Сворачивает самый старый день ai_limits/ai_usage раньше before_date в агрегаты
+
+        Выполняется одной транзакцией на стороне БД (RPC fold_oldest_ai_usage_day).
+        Возвращает количество удаленных строк (0 - сворачивать нечего).
+        """
+        try:
+            result = self.client.rpc('fold_oldest_ai_usage_day', {
+                'p_before': before_date
+            }).execute()
+            return int(result.data or 0)
+        except Exception as e:
+            logger.error(
+                f"Ошибка свертки дневных счетчиков ИИ (примените database/supabase_maintenance_migration.sql): {e}")
+            return 0
+
+    async def prune_conversation_messages(self, before: str, limit: int = 1000) -> int:
+        """Удаляет до limit сообщений бесед старше before, возвращает количество"""
+        try:
+            result = self.client.table('ai_messages').select('id').lt(
+                'created_at', before).limit(limit).execute()
+            ids = [row['id'] for row in result.data or []]
+            if not ids:
+                return 0
+            self.client.table('ai_messages').delete().in_('id', ids).execute()
+            return len(ids)
+        except Exception as e:
+            logger.error(f"Ошибка удаления старых сообщений бесед: {e}")
+            return 0
+
+    async def run_db_maintenance(self) -> Dict[str, Any]:
+        """VACUUM через API Supabase недоступен, таблицы обслуживает autovacuum"""
+        return {'skipped': 'autovacuum'}
+
+    # Хранилище длинных текстов (database/text_store.py)
+    def _store_text(self, text: str) -> Tuple[str, Optional[str]]:
+        """
+        Сохраняет длинный текст в text_blobs.
+
+        Returns:
+            (текст для строки, хэш) - ('', хэш) для вынесенного текста,
+            (text, None), если текст короткий или миграция не применена
+        """
+        packed = pack_text(text) if self._text_store_supported else None
+        if not packed:
+            return text, None
+        try:
+            self.client.table('text_blobs').upsert(
+                {'hash': packed[0], 'data': encode_blob(packed[1]), 'size': len(text)},
+                on_conflict='hash', ignore_duplicates=True).execute()
+            return '', packed[0]
+        except Exception as e:
+            if not _is_missing_text_store(e):
+                # Временный сбой: текст сохраняется в строке целиком, хранилище остается включенным
+                logger.warning(f"Не удалось сохранить текст в text_blobs, сохраняем в строке: {e}")
+                return text, None
+            self._text_store_supported = False
+            logger.warning(
+                f"Хранилище текстов недоступно (примените database/supabase_text_store_migration.sql): {e}")
+            return text, None
+
+    def _select_with_text(self, table: str, columns: str, filters):
+        """
+        select с подгрузкой сжатого текста из text_blobs.
+
+        filters получает построитель запроса и добавляет условия. Если миграция
+        не применена, запрос повторяется без text_blobs; другие ошибки
+        (таймаут, сбой сети) передаются вызывающему.
+        """
+        if self._text_store_supported:
+            try:
+                return filters(self.client.table(table).select(f'{columns}, text_blobs(data)')).execute()
+            except Exception as e:
+                if not _is_missing_text_store(e):
+                    raise
+                self._text_store_supported = False
+                logger.warning(
+                    f"Хранилище текстов недоступно (примените database/supabase_text_store_migration.sql): {e}")
+        return filters(self.client.table(table).select(columns)).execute()
+
+    @staticmethod
+    def _unpack_row(row: Dict[str, Any], field: str) -> Dict[str, Any]:
+        """Подставляет в row[field] текст из вложенного text_blobs"""
+        blob = row.pop('text_blobs', None)
+        row[field] = unpack_text(row.get(field), blob['data'] if blob else None)
+        return row
+
+    async def purge_orphan_texts(self, limit: int = 1000) -> int:
+        """Удаляет до limit текстов text_blobs, на которые больше никто не ссылается"""
+        try:
+            result = self.client.rpc('purge_orphan_texts', {'p_limit': limit}).execute()
+            return int(result.data or 0)
+        except Exception as e:
+            logger.error(
+                f"Ошибка удаления неиспользуемых текстов (примените database/supabase_text_store_migration.sql): {e}")
+            return 0
+
     # Методы для сохраненных толкований
     async def save_commentary(self, user_id: int, book_id: int, chapter_start: int,
                               chapter_end: int = None, verse_start: int = None, verse_end: int = None,
@@ -594,6 +851,9 @@ class SupabaseManager:
 
             existing = query.execute()
 
+            # Длинный текст хранится один раз в text_blobs, в строке - только ссылка
+            stored_text, text_hash = self._store_text(commentary_text)
+
             data = {
                 'user_id': user_id,
                 'book_id': book_id,
@@ -602,10 +862,12 @@ class SupabaseManager:
                 'verse_start': verse_start,
                 'verse_end': verse_end,
                 'reference_text': reference_text,
-                'commentary_text': commentary_text,
+                'commentary_text': stored_text,
                 'commentary_type': commentary_type,
                 'updated_at': datetime.now().isoformat()
             }
+            if self._text_store_supported:
+                data['text_hash'] = text_hash
 
             if existing.data:
                 # Обновляем существующее
@@ -625,30 +887,15 @@ class SupabaseManager:
                                    commentary_type: str = "ai") -> Optional[str]:
         """Получает сохраненное толкование"""
         try:
-            query = self.client.table('saved_commentaries').select(
-                'commentary_text').eq('user_id', user_id).eq('book_id', book_id).eq(
-                'chapter_start', chapter_start).eq('commentary_type', commentary_type)
-
-            # Правильно обрабатываем NULL значения для chapter_end
-            if chapter_end is None:
-                query = query.is_('chapter_end', 'null')
-            else:
-                query = query.eq('chapter_end', chapter_end)
-
-            # Правильно обрабатываем NULL значения для verse_start
-            if verse_start is None:
-                query = query.is_('verse_start', 'null')
-            else:
-                query = query.eq('verse_start', verse_start)
-
-            # Правильно обрабатываем NULL значения для verse_end
-            if verse_end is None:
-                query = query.is_('verse_end', 'null')
-            else:
-                query = query.eq('verse_end', verse_end)
-
-            result = query.execute()
-            return result.data[0]['commentary_text'] if result.data else None
+            passage = {'book_id': book_id, 'chapter_start': chapter_start, 'chapter_end': chapter_end,
+                       'verse_start': verse_start, 'verse_end': verse_end}
+            result = self._select_with_text(
+                'saved_commentaries', 'commentary_text',
+                lambda query: self._filter_passage(
+                    query.eq('user_id', user_id).eq('commentary_type', commentary_type), passage))
+            if not result.data:
+                return None
+            return self._unpack_row(result.data[0], 'commentary_text')['commentary_text']
         except Exception as e:
             logger.error(f"Ошибка получения сохраненного толкования: {e}")
             return None
@@ -699,17 +946,74 @@ class SupabaseManager:
     async def get_user_commentaries(self, user_id: int, limit: int = 50) -> list:
         """Получает последние сохраненные толкования пользователя"""
         try:
-            result = self.client.table('saved_commentaries').select(
-                'id, book_id, chapter_start, chapter_end, verse_start, verse_end, reference_text, commentary_text, commentary_type, created_at'
-            ).eq('user_id', user_id).order(
-                'created_at', desc=True
-            ).limit(limit).execute()
+            result = self._select_with_text(
+                'saved_commentaries',
+                'id, book_id, chapter_start, chapter_end, verse_start, verse_end, reference_text, commentary_text, commentary_type, created_at',
+                lambda query: query.eq('user_id', user_id).order(
+                    'created_at', desc=True).limit(limit))
 
-            return [dict(row) for row in result.data]
+            return [self._unpack_row(dict(row), 'commentary_text') for row in result.data]
         except Exception as e:
             logger.error(f"Ошибка получения толкований пользователя: {e}")
             return []
 
+    async def get_passage_user_context(self, user_id: int, passage: dict,
+                                       commentary_passage: dict = None) -> dict:
+        """Наличие закладки и сохраненные толкования (ИИ, Лопухин) для отрывка одним RPC"""
+        commentary_passage = commentary_passage or passage
+        fields = ('book_id', 'chapter_start', 'chapter_end', 'verse_start', 'verse_end')
+        params = {'p_user_id': user_id}
+        for field in fields:
+            params[f'p_{field}'] = passage.get(field)
+            params[f'p_c_{field}'] = commentary_passage.get(field)
+
+        try:
+            result = self.client.rpc('get_passage_user_context', params).execute()
+            row = result.data[0] if result.data else {}
+            return {
+                'is_bookmarked': bool(row.get('is_bookmarked')),
+                'ai_commentary': unpack_text(row.get('ai_commentary'), row.get('ai_blob')),
+                'lopukhin_commentary': unpack_text(row.get('lopukhin_commentary'), row.get('lopukhin_blob'))
+            }
+        except Exception as e:
+            logger.warning(
+                f"RPC get_passage_user_context недоступна, выполняем отдельные запросы: {e}")
+            return await self._get_passage_user_context_fallback(user_id, passage, commentary_passage)
+
+    @staticmethod
+    def _filter_passage(query, passage: dict):
+        """Добавляет к запросу точное совпадение координат отрывка (NULL как IS NULL)"""
+        query = query.eq('book_id', passage.get('book_id')).eq(
+            'chapter_start', passage.get('chapter_start'))
+        for field in ('chapter_end', 'verse_start', 'verse_end'):
+            if passage.get(field) is None:
+                query = query.is_(field, 'null')
+            else:
+                query = query.eq(field, passage[field])
+        return query
+
+    async def _get_passage_user_context_fallback(self, user_id: int, passage: dict,
+                                                 commentary_passage: dict) -> dict:
+        """Данные отрывка без RPC: закладка и оба типа толкований двумя запросами"""
+        context = {'is_bookmarked': False, 'ai_commentary': None, 'lopukhin_commentary': None}
+        try:
+            bookmarks = self._filter_passage(
+                self.client.table('bookmarks').select('id').eq('user_id', user_id),
+                passage).limit(1).execute()
+            context['is_bookmarked'] = len(bookmarks.data) > 0
+
+            commentaries = self._select_with_text(
+                'saved_commentaries', 'commentary_type, commentary_text',
+                lambda query: self._filter_passage(
+                    query.eq('user_id', user_id).in_('commentary_type', ['ai', 'lopukhin']),
+                    commentary_passage))
+            for row in commentaries.data:
+                row = self._unpack_row(dict(row), 'commentary_text')
+                context[f"{row['commentary_type']}_commentary"] = row['commentary_text']
+        except Exception as e:
+            logger.error(f"Ошибка получения данных отрывка для пользователя {user_id}: {e}")
+        return context
+
     # Методы для библейских тем
     async def get_bible_topics(self, search_query: str = "", limit: int = 50) -> list:
         """Получает список библейских тем с возможностью поиска"""
@@ -848,14 +1152,17 @@ class SupabaseManager:
     async def set_ai_setting(self, setting_key: str, setting_value: str, setting_type: str = 'string', description: str = None) -> bool:
         """Устанавливает настройку ИИ"""
         try:
-            # Пытаемся обновить существующую настройку
-            result = self.client.table('ai_settings').upsert({
+            data = {
                 'setting_key': setting_key,
                 'setting_value': setting_value,
                 'setting_type': setting_type,
-                'description': description,
                 'updated_at': datetime.now().isoformat()
-            }).execute()
+            }
+            if description is not None:
+                data['description'] = description
+            # Обновляем существующую настройку по уникальному ключу
+            result = self.client.table('ai_settings').upsert(
+                data, on_conflict='setting_key').execute()
             return bool(result.data)
         except Exception as e:
             logger.error(f"Ошибка установки настройки {setting_key}: {e}")
@@ -924,12 +1231,15 @@ class SupabaseManager:
     async def add_message(self, conversation_id: str, role: str, content: str, meta: Dict[str, Any] = None) -> Optional[str]:
         """Добавляет сообщение в разговор и возвращает его id"""
         try:
+            stored_content, content_hash = self._store_text(content)
             data = {
                 'conversation_id': conversation_id,
                 'role': role,
-                'content': content,
+                'content': stored_content,
                 'meta': meta or {}
             }
+            if content_hash:
+                data['content_hash'] = content_hash
             result = self.client.table('ai_messages').insert(data).execute()
             if result.data:
                 return result.data[0]['id']
@@ -938,12 +1248,32 @@ class SupabaseManager:
             logger.error(f"Ошибка добавления сообщения в разговор: {e}")
             return None
 
-    async def list_messages(self, conversation_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """Возвращает последние сообщения разговора по возрастанию времени"""
+    async def list_messages(self, conversation_id: str, limit: int = 20,
+                            before: str = None) -> List[Dict[str, Any]]:
+        """
+        Возвращает последние сообщения разговора по возрастанию времени.
+
+        Args:
+            before: id сообщения - вернуть сообщения, написанные до него
+                (следующая страница истории, пагинация по created_at)
+        """
         try:
-            result = self.client.table('ai_messages').select(
-                '*').eq('conversation_id', conversation_id).order('created_at', desc=True).limit(limit).execute()
-            rows = result.data or []
+            anchor = None
+            if before:
+                found = self.client.table('ai_messages').select('created_at').eq(
+                    'id', before).eq('conversation_id', conversation_id).execute()
+                if not found.data:
+                    return []
+                anchor = found.data[0]['created_at']
+
+            def _filters(query):
+                query = query.eq('conversation_id', conversation_id)
+                if anchor:
+                    query = query.lt('created_at', anchor)
+                return query.order('created_at', desc=True).limit(limit)
+
+            result = self._select_with_text('ai_messages', '*', _filters)
+            rows = [self._unpack_row(dict(row), 'content') for row in result.data or []]
             # Возвращаем по возрастанию
             return list(reversed(rows))
         except Exception as e:
@@ -974,60 +1304,107 @@ class SupabaseManager:
             return 0
 
     async def add_premium_requests(self, user_id: int, count: int) -> bool:
-        """Добавляет премиум запросы пользователю"""
+        """Добавляет премиум запросы пользователю (атомарно через RPC)"""
         try:
-            # Получаем текущие данные
-            existing = self.client.table('premium_requests').select(
-                '*').eq('user_id', user_id).execute()
+            result = self.client.rpc('add_premium_requests', {
+                'p_user_id': user_id,
+                'p_count': count
+            }).execute()
+            return result.data is not None
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                # Запрос мог выполниться на сервере - повтор начислил бы запросы дважды
+                logger.error(
+                    f"Ошибка добавления премиум запросов пользователю {user_id}: {e}")
+                return False
+            logger.warning(
+                f"RPC add_premium_requests недоступна, используем CAS-обновление: {e}")
+            return await self._add_premium_requests_cas(user_id, count)
+
+    async def _add_premium_requests_cas(self, user_id: int, count: int, attempts: int = 5) -> bool:
+        """Добавляет премиум запросы через compare-and-set (если RPC не установлена)"""
+        try:
+            for _ in range(attempts):
+                existing = self.client.table('premium_requests').select(
+                    'requests_count, total_purchased').eq('user_id', user_id).execute()
+
+                if not existing.data:
+                    try:
+                        result = self.client.table('premium_requests').insert({
+                            'user_id': user_id,
+                            'requests_count': count,
+                            'total_purchased': count,
+                            'total_used': 0
+                        }).execute()
+                        return bool(result.data)
+                    except Exception:
+                        # Запись создана параллельным запросом - повторяем как обновление
+                        continue
 
-            if existing.data:
-                # Обновляем существующую запись
                 current = existing.data[0]
-                new_count = current['requests_count'] + count
-                new_total = current['total_purchased'] + count
-
+                # Обновляем только если значения не изменились с момента чтения
                 result = self.client.table('premium_requests').update({
-                    'requests_count': new_count,
-                    'total_purchased': new_total,
+                    'requests_count': current['requests_count'] + count,
+                    'total_purchased': current['total_purchased'] + count,
                     'updated_at': datetime.now().isoformat()
-                }).eq('user_id', user_id).execute()
-            else:
-                # Создаем новую запись
-                result = self.client.table('premium_requests').insert({
-                    'user_id': user_id,
-                    'requests_count': count,
-                    'total_purchased': count,
-                    'total_used': 0
-                }).execute()
+                }).eq('user_id', user_id).eq(
+                    'requests_count', current['requests_count']).eq(
+                    'total_purchased', current['total_purchased']).execute()
 
-            return bool(result.data)
+                if result.data:
+                    return True
+
+            logger.error(
+                f"Не удалось добавить премиум запросы пользователю {user_id}: конфликт обновления")
+            return False
         except Exception as e:
             logger.error(
                 f"Ошибка добавления премиум запросов пользователю {user_id}: {e}")
             return False
 
     async def use_premium_request(self, user_id: int) -> bool:
-        """Использует один премиум запрос"""
+        """Использует один премиум запрос (атомарно через RPC)"""
         try:
-            # Получаем текущее количество
-            result = self.client.table('premium_requests').select(
-                '*').eq('user_id', user_id).execute()
-
-            if not result.data or result.data[0]['requests_count'] <= 0:
+            # Функция возвращает остаток или NULL, если запросов нет
+            result = self.client.rpc('use_premium_request', {
+                'p_user_id': user_id
+            }).execute()
+            return result.data is not None
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                # Запрос мог выполниться на сервере - повтор списал бы запрос дважды
+                logger.error(
+                    f"Ошибка использования премиум запроса пользователем {user_id}: {e}")
                 return False
+            logger.warning(
+                f"RPC use_premium_request недоступна, используем CAS-обновление: {e}")
+            return await self._use_premium_request_cas(user_id)
 
-            current = result.data[0]
-            new_count = current['requests_count'] - 1
-            new_used = current['total_used'] + 1
+    async def _use_premium_request_cas(self, user_id: int, attempts: int = 5) -> bool:
+        """Списывает премиум запрос через compare-and-set (если RPC не установлена)"""
+        try:
+            for _ in range(attempts):
+                result = self.client.table('premium_requests').select(
+                    'requests_count, total_used').eq('user_id', user_id).execute()
 
-            # Обновляем запись
-            update_result = self.client.table('premium_requests').update({
-                'requests_count': new_count,
-                'total_used': new_used,
-                'updated_at': datetime.now().isoformat()
-            }).eq('user_id', user_id).execute()
+                if not result.data or result.data[0]['requests_count'] <= 0:
+                    return False
+
+                current = result.data[0]
+                # Обновляем только если счетчик не изменился с момента чтения
+                update_result = self.client.table('premium_requests').update({
+                    'requests_count': current['requests_count'] - 1,
+                    'total_used': current['total_used'] + 1,
+                    'updated_at': datetime.now().isoformat()
+                }).eq('user_id', user_id).eq(
+                    'requests_count', current['requests_count']).execute()
 
-            return bool(update_result.data)
+                if update_result.data:
+                    return True
+
+            logger.error(
+                f"Не удалось списать премиум запрос пользователя {user_id}: конфликт обновления")
+            return False
         except Exception as e:
             logger.error(
                 f"Ошибка использования премиум запроса пользователем {user_id}: {e}")
@@ -1082,39 +1459,64 @@ class SupabaseManager:
             return False
 
     async def complete_premium_purchase(self, payment_id: str) -> bool:
-        """Завершает покупку премиум запросов"""
+        """Завершает покупку премиум запросов (идемпотентно по payment_id)"""
         try:
-            # Получаем данные покупки
-            purchase_result = self.client.table('premium_purchases').select(
-                '*').eq('payment_id', payment_id).eq('payment_status', 'pending').execute()
+            # Смена статуса и начисление запросов выполняются в одной транзакции
+            result = self.client.rpc('complete_premium_purchase', {
+                'p_payment_id': payment_id
+            }).execute()
 
-            if not purchase_result.data:
+            if not result.data:
                 logger.warning(
                     f"Покупка с payment_id {payment_id} не найдена или уже завершена")
                 return False
 
-            purchase = purchase_result.data[0]
+            return True
+        except Exception as e:
+            if not _is_missing_rpc(e):
+                logger.error(f"Ошибка завершения покупки премиум запросов: {e}")
+                return False
+            logger.warning(
+                f"RPC complete_premium_purchase недоступна, используем условное обновление: {e}")
+            return await self._complete_premium_purchase_fallback(payment_id)
+
+    async def get_premium_purchase_status(self, payment_id: str) -> Optional[str]:
+        """Статус покупки по payment_id ('pending', 'completed', ...) или None"""
+        try:
+            result = self.client.table('premium_purchases').select(
+                'payment_status').eq('payment_id', payment_id).execute()
+            return result.data[0]['payment_status'] if result.data else None
+        except Exception as e:
+            logger.error(f"Ошибка получения статуса покупки {payment_id}: {e}")
+            return None
 
-            # Обновляем статус покупки
+    async def _complete_premium_purchase_fallback(self, payment_id: str) -> bool:
+        """Завершает покупку без RPC: статус переводится условным UPDATE"""
+        try:
+            # Только один из параллельных вызовов получит строку обратно
             status_result = self.client.table('premium_purchases').update({
                 'payment_status': 'completed',
                 'completed_at': datetime.now().isoformat()
-            }).eq('payment_id', payment_id).execute()
+            }).eq('payment_id', payment_id).eq('payment_status', 'pending').execute()
 
-            if status_result.data:
-                # Добавляем премиум запросы пользователю
-                success = await self.add_premium_requests(purchase['user_id'], purchase['requests_count'])
+            if not status_result.data:
+                logger.warning(
+                    f"Покупка с payment_id {payment_id} не найдена или уже завершена")
+                return False
 
-                if not success:
-                    # Откатываем статус покупки если не удалось добавить запросы
-                    self.client.table('premium_purchases').update({
-                        'payment_status': 'failed'
-                    }).eq('payment_id', payment_id).execute()
-                    return False
+            purchase = status_result.data[0]
 
-                return True
+            # Добавляем премиум запросы пользователю
+            success = await self.add_premium_requests(purchase['user_id'], purchase['requests_count'])
 
-            return False
+            if not success:
+                # Откатываем статус покупки если не удалось добавить запросы
+                self.client.table('premium_purchases').update({
+                    'payment_status': 'failed'
+                }).eq('payment_id', payment_id).execute()
+                return False
+
+            return True
         except Exception as e:
             logger.error(f"Ошибка завершения покупки премиум запросов: {e}")
             return False
@@ -0,0 +1,56 @@
+-- Миграция для Supabase: данные пользователя для отрывка одним запросом
+-- Выполните этот скрипт в SQL Editor вашего Supabase проекта
+--
+-- Клавиатуры главы/стиха показывают наличие закладки и сохраненных толкований
+-- ИИ и Лопухина. Функция возвращает все это за один вызов RPC
+-- (SupabaseManager.get_passage_user_context).
+
+-- 1. Индекс для поиска закладки по координатам отрывка
+CREATE INDEX IF NOT EXISTS idx_bookmarks_user_passage
+    ON bookmarks(user_id, book_id, chapter_start);
+
+-- 2. Индекс для поиска толкований по координатам отрывка
+CREATE INDEX IF NOT EXISTS idx_saved_commentaries_user_passage
+    ON saved_commentaries(user_id, book_id, chapter_start);
+
+-- 3. Функция: закладка (p_*) и толкования (p_c_*) для отрывка
+CREATE OR REPLACE FUNCTION get_passage_user_context(
+    p_user_id BIGINT,
+    p_book_id INTEGER,
+    p_chapter_start INTEGER,
+    p_chapter_end INTEGER,
+    p_verse_start INTEGER,
+    p_verse_end INTEGER,
+    p_c_book_id INTEGER,
+    p_c_chapter_start INTEGER,
+    p_c_chapter_end INTEGER,
+    p_c_verse_start INTEGER,
+    p_c_verse_end INTEGER
+)
+RETURNS TABLE (is_bookmarked BOOLEAN, ai_commentary TEXT, lopukhin_commentary TEXT) AS $$
+    SELECT
+        EXISTS(
+            SELECT 1 FROM bookmarks
+            WHERE user_id = p_user_id AND book_id = p_book_id AND chapter_start = p_chapter_start
+            AND chapter_end IS NOT DISTINCT FROM p_chapter_end
+            AND verse_start IS NOT DISTINCT FROM p_verse_start
+            AND verse_end IS NOT DISTINCT FROM p_verse_end
+        ),
+        MAX(commentary_text) FILTER (WHERE commentary_type = 'ai'),
+        MAX(commentary_text) FILTER (WHERE commentary_type = 'lopukhin')
+    FROM saved_commentaries
+    WHERE user_id = p_user_id AND book_id = p_c_book_id AND chapter_start = p_c_chapter_start
+    AND chapter_end IS NOT DISTINCT FROM p_c_chapter_end
+    AND verse_start IS NOT DISTINCT FROM p_c_verse_start
+    AND verse_end IS NOT DISTINCT FROM p_c_verse_end
+    AND commentary_type IN ('ai', 'lopukhin');
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION get_passage_user_context(BIGINT, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER)
+    IS 'Наличие закладки и сохраненные толкования ИИ и Лопухина для отрывка';
+
+DO $$
+BEGIN
+    RAISE NOTICE 'Миграция завершена успешно!';
+    RAISE NOTICE 'Создана функция: get_passage_user_context';
+END $$;
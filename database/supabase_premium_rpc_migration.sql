@@ -0,0 +1,68 @@
+-- Миграция для Supabase: атомарные операции с премиум запросами
+-- Выполните этот скрипт в SQL Editor вашего Supabase проекта
+--
+-- Функции вызываются из SupabaseManager через client.rpc(...) и заменяют
+-- схему "прочитать -> посчитать в Python -> записать", при которой
+-- параллельные запросы одного пользователя теряли или дублировали списания.
+
+-- 1. Уникальность payment_id: завершение покупки идемпотентно по платежу
+CREATE UNIQUE INDEX IF NOT EXISTS idx_premium_purchases_payment_id_unique
+    ON premium_purchases(payment_id)
+    WHERE payment_id IS NOT NULL;
+
+-- 2. Начисление премиум запросов (создает запись при необходимости)
+CREATE OR REPLACE FUNCTION add_premium_requests(p_user_id BIGINT, p_count INTEGER)
+RETURNS INTEGER AS $$
+    INSERT INTO premium_requests (user_id, requests_count, total_purchased, total_used)
+    VALUES (p_user_id, p_count, p_count, 0)
+    ON CONFLICT (user_id) DO UPDATE SET
+        requests_count = premium_requests.requests_count + EXCLUDED.requests_count,
+        total_purchased = premium_requests.total_purchased + EXCLUDED.total_purchased,
+        updated_at = NOW()
+    RETURNING requests_count;
+$$ LANGUAGE sql;
+
+-- 3. Списание одного премиум запроса
+-- Возвращает остаток или NULL, если запросов не было
+CREATE OR REPLACE FUNCTION use_premium_request(p_user_id BIGINT)
+RETURNS INTEGER AS $$
+    UPDATE premium_requests
+    SET requests_count = requests_count - 1,
+        total_used = total_used + 1,
+        updated_at = NOW()
+    WHERE user_id = p_user_id AND requests_count > 0
+    RETURNING requests_count;
+$$ LANGUAGE sql;
+
+-- 4. Завершение покупки: смена статуса и начисление в одной транзакции
+-- Возвращает TRUE только для вызова, который перевел покупку из pending
+CREATE OR REPLACE FUNCTION complete_premium_purchase(p_payment_id TEXT)
+RETURNS BOOLEAN AS $$
+DECLARE
+    v_user_id BIGINT;
+    v_requests_count INTEGER;
+BEGIN
+    UPDATE premium_purchases
+    SET payment_status = 'completed',
+        completed_at = NOW()
+    WHERE payment_id = p_payment_id AND payment_status = 'pending'
+    RETURNING user_id, requests_count INTO v_user_id, v_requests_count;
+
+    IF NOT FOUND THEN
+        RETURN FALSE;
+    END IF;
+
+    PERFORM add_premium_requests(v_user_id, v_requests_count);
+    RETURN TRUE;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION add_premium_requests(BIGINT, INTEGER) IS 'Атомарное начисление премиум запросов';
+COMMENT ON FUNCTION use_premium_request(BIGINT) IS 'Атомарное списание одного премиум запроса';
+COMMENT ON FUNCTION complete_premium_purchase(TEXT) IS 'Идемпотентное завершение покупки по payment_id';
+
+DO $$
+BEGIN
+    RAISE NOTICE 'Миграция завершена успешно!';
+    RAISE NOTICE 'Созданы функции: add_premium_requests, use_premium_request, complete_premium_purchase';
+END $$;
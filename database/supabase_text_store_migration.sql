@@ -0,0 +1,115 @@
+-- Миграция для Supabase: сжатое хранилище длинных текстов
+-- Выполните этот скрипт в SQL Editor вашего Supabase проекта
+--
+-- Длинные толкования и ответы ИИ сохраняются один раз в text_blobs под своим
+-- SHA-256 (сжатые, в base64), а saved_commentaries / ai_messages ссылаются на
+-- них по хэшу (database/text_store.py). Одно и то же толкование, сохраненное
+-- многими пользователями, занимает место один раз.
+
+-- 1. Таблица сжатых текстов
+CREATE TABLE IF NOT EXISTS text_blobs (
+    hash TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- base64 сжатых данных почти не сжимается - TOAST не должен тратить на это время
+ALTER TABLE text_blobs ALTER COLUMN data SET STORAGE EXTERNAL;
+
+ALTER TABLE text_blobs ENABLE ROW LEVEL SECURITY;
+
+COMMENT ON TABLE text_blobs IS 'Сжатые длинные тексты (толкования, ответы ИИ) по SHA-256';
+
+-- 2. Ссылки на text_blobs (внешние ключи нужны и для вложенного select text_blobs(data))
+ALTER TABLE saved_commentaries
+    ADD COLUMN IF NOT EXISTS text_hash TEXT REFERENCES text_blobs(hash);
+
+CREATE INDEX IF NOT EXISTS idx_saved_commentaries_text_hash
+    ON saved_commentaries(text_hash);
+
+DO $$
+BEGIN
+    IF to_regclass('ai_messages') IS NOT NULL THEN
+        ALTER TABLE ai_messages
+            ADD COLUMN IF NOT EXISTS content_hash TEXT REFERENCES text_blobs(hash);
+        CREATE INDEX IF NOT EXISTS idx_ai_messages_content_hash
+            ON ai_messages(content_hash);
+    END IF;
+END $$;
+
+-- 3. Данные отрывка: толкования возвращаются вместе со сжатым текстом
+DROP FUNCTION IF EXISTS get_passage_user_context(BIGINT, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER);
+
+CREATE FUNCTION get_passage_user_context(
+    p_user_id BIGINT,
+    p_book_id INTEGER,
+    p_chapter_start INTEGER,
+    p_chapter_end INTEGER,
+    p_verse_start INTEGER,
+    p_verse_end INTEGER,
+    p_c_book_id INTEGER,
+    p_c_chapter_start INTEGER,
+    p_c_chapter_end INTEGER,
+    p_c_verse_start INTEGER,
+    p_c_verse_end INTEGER
+)
+RETURNS TABLE (
+    is_bookmarked BOOLEAN,
+    ai_commentary TEXT,
+    ai_blob TEXT,
+    lopukhin_commentary TEXT,
+    lopukhin_blob TEXT
+) AS $$
+    SELECT
+        EXISTS(
+            SELECT 1 FROM bookmarks
+            WHERE user_id = p_user_id AND book_id = p_book_id AND chapter_start = p_chapter_start
+            AND chapter_end IS NOT DISTINCT FROM p_chapter_end
+            AND verse_start IS NOT DISTINCT FROM p_verse_start
+            AND verse_end IS NOT DISTINCT FROM p_verse_end
+        ),
+        MAX(c.commentary_text) FILTER (WHERE c.commentary_type = 'ai'),
+        MAX(b.data) FILTER (WHERE c.commentary_type = 'ai'),
+        MAX(c.commentary_text) FILTER (WHERE c.commentary_type = 'lopukhin'),
+        MAX(b.data) FILTER (WHERE c.commentary_type = 'lopukhin')
+    FROM saved_commentaries c
+    LEFT JOIN text_blobs b ON b.hash = c.text_hash
+    WHERE c.user_id = p_user_id AND c.book_id = p_c_book_id AND c.chapter_start = p_c_chapter_start
+    AND c.chapter_end IS NOT DISTINCT FROM p_c_chapter_end
+    AND c.verse_start IS NOT DISTINCT FROM p_c_verse_start
+    AND c.verse_end IS NOT DISTINCT FROM p_c_verse_end
+    AND c.commentary_type IN ('ai', 'lopukhin');
+$$ LANGUAGE sql STABLE;
+
+COMMENT ON FUNCTION get_passage_user_context(BIGINT, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER, INTEGER)
+    IS 'Наличие закладки и сохраненные толкования ИИ и Лопухина для отрывка';
+
+-- 4. Очистка текстов, на которые больше никто не ссылается (MaintenanceManager)
+CREATE OR REPLACE FUNCTION purge_orphan_texts(p_limit INTEGER DEFAULT 1000)
+RETURNS INTEGER AS $$
+DECLARE
+    v_deleted INTEGER;
+BEGIN
+    DELETE FROM text_blobs WHERE hash IN (
+        SELECT b.hash FROM text_blobs b
+        WHERE NOT EXISTS (SELECT 1 FROM saved_commentaries c WHERE c.text_hash = b.hash)
+        AND NOT EXISTS (SELECT 1 FROM ai_messages m WHERE m.content_hash = b.hash)
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    );
+    GET DIAGNOSTICS v_deleted = ROW_COUNT;
+    RETURN v_deleted;
+END;
+$$ LANGUAGE plpgsql;
+
+COMMENT ON FUNCTION purge_orphan_texts(INTEGER)
+    IS 'Удаляет до p_limit неиспользуемых строк text_blobs';
+
+DO $$
+BEGIN
+    RAISE NOTICE 'Миграция завершена успешно!';
+    RAISE NOTICE 'Создана таблица: text_blobs';
+    RAISE NOTICE 'Добавлены колонки: saved_commentaries.text_hash, ai_messages.content_hash';
+    RAISE NOTICE 'Обновлена функция: get_passage_user_context, создана: purge_orphan_texts';
+END $$;
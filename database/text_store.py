@@ -0,0 +1,103 @@
+"""
+Хранилище длинных текстов по содержимому (толкования ИИ, ответы ассистента).
+
+Текст сохраняется один раз в таблицу text_blobs под своим SHA-256 в сжатом
+виде, а строки saved_commentaries / ai_messages ссылаются на него по хэшу.
+Одно и то же кэшированное толкование, сохраненное многими пользователями,
+занимает место один раз, а сжатие (zstd, если установлен zstandard, иначе
+zlib) уменьшает и размер базы, и трафик Supabase.
+
+Короткие тексты (меньше TEXT_STORE_MIN_LENGTH символов) хранятся как раньше,
+в самой строке: лишняя ссылка для них не окупается. Чтение прозрачно -
+менеджеры БД собирают текст обратно через unpack_text.
+
+Формат blob: первый байт - кодек (b'Z' zlib, b'S' zstd), дальше сжатые
+UTF-8 байты. Supabase хранит blob в base64 (encode_blob / decode_blob).
+"""
+import base64
+import hashlib
+import logging
+import os
+import zlib
+from typing import Any, Optional, Tuple
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# Включение хранилища и минимальная длина текста, который выносится в text_blobs
+TEXT_STORE_ENABLED = os.getenv('TEXT_STORE_ENABLED', 'true').lower() in ['true', '1', 'yes']
+TEXT_STORE_MIN_LENGTH = int(os.getenv('TEXT_STORE_MIN_LENGTH', '512'))
+# Кодек новых записей: zstd (если установлен zstandard) или zlib
+TEXT_STORE_CODEC = os.getenv('TEXT_STORE_CODEC', 'zstd' if zstandard else 'zlib').lower()
+
+_ZLIB = b'Z'
+_ZSTD = b'S'
+
+if TEXT_STORE_CODEC == 'zstd' and zstandard is None:
+    logger.warning("TEXT_STORE_CODEC=zstd, но пакет zstandard не установлен - используется zlib")
+    TEXT_STORE_CODEC = 'zlib'
+
+
+def text_hash(text: str) -> str:
+    """SHA-256 текста (hex) - ключ в text_blobs"""
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+def compress_text(text: str) -> bytes:
+    """Сжимает текст текущим кодеком"""
+    data = text.encode('utf-8')
+    if TEXT_STORE_CODEC == 'zstd':
+        return _ZSTD + zstandard.ZstdCompressor(level=19).compress(data)
+    return _ZLIB + zlib.compress(data, 9)
+
+
+def decompress_text(blob: bytes) -> str:
+    """Восстанавливает текст из blob любого поддерживаемого кодека"""
+    blob = bytes(blob)
+    codec, payload = blob[:1], blob[1:]
+    if codec == _ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if codec == _ZSTD:
+        if zstandard is None:
+            raise RuntimeError("Текст сжат zstd, а пакет zstandard не установлен")
+        return zstandard.ZstdDecompressor().decompress(payload).decode('utf-8')
+    raise ValueError(f"Неизвестный кодек текста: {codec!r}")
+
+
+def pack_text(text: Optional[str]) -> Optional[Tuple[str, bytes]]:
+    """
+    Готовит текст к сохранению в text_blobs.
+
+    Returns:
+        (хэш, сжатый blob) или None, если текст нужно хранить в самой строке
+    """
+    if not TEXT_STORE_ENABLED or not text or len(text) < TEXT_STORE_MIN_LENGTH:
+        return None
+    return text_hash(text), compress_text(text)
+
+
+def unpack_text(inline: Optional[str], blob: Any) -> Optional[str]:
+    """Текст строки: из blob, если строка ссылается на text_blobs, иначе inline"""
+    if blob is None:
+        return inline
+    try:
+        return decompress_text(decode_blob(blob))
+    except Exception as e:
+        logger.error(f"Ошибка распаковки текста из хранилища: {e}")
+        return inline
+
+
+def encode_blob(blob: bytes) -> str:
+    """blob для текстовой колонки Supabase"""
+    return base64.b64encode(blob).decode('ascii')
+
+
+def decode_blob(value: Any) -> bytes:
+    """blob из bytes/memoryview (SQLite, PostgreSQL) или base64 (Supabase)"""
+    if isinstance(value, str):
+        return base64.b64decode(value)
+    return bytes(value)
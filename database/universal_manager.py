@@ -4,11 +4,13 @@
 """
 import logging
 import os
-from typing import Optional, Union, List, Dict
+from typing import Any, Awaitable, Callable, Optional, Union, List, Dict
 
 from .db_manager import DatabaseManager
 from .postgres_manager import PostgreSQLManager
 from .supabase_manager import SupabaseManager
+from .instrumentation import DB_METRICS_ENABLED, InstrumentedManager, db_metrics, instrument_callable
+from .query_cache import cached, invalidates, query_cache
 
 logger = logging.getLogger(__name__)
 
@@ -22,6 +24,8 @@ class UniversalDatabaseManager:
                                      SupabaseManager]] = None
         self.is_postgres = False
         self.is_supabase = False
+        # Подписчики на изменения тем: async callback(action, topic_id, topic_name, verses)
+        self._topic_listeners: List[Callable[..., Awaitable[Any]]] = []
         self._initialize()
 
     def _initialize(self):
@@ -50,6 +54,54 @@ class UniversalDatabaseManager:
             self.is_postgres = False
             self.is_supabase = False
 
+        if DB_METRICS_ENABLED:
+            self.enable_metrics()
+
+    # Методы SQL-запросов самого универсального менеджера, которые тоже замеряются
+    _INSTRUMENTED_OWN_METHODS = ('fetch_one', 'fetch_all', 'execute')
+
+    @property
+    def metrics_enabled(self) -> bool:
+        """Включен ли сбор метрик вызовов БД"""
+        return isinstance(self.manager, InstrumentedManager)
+
+    def enable_metrics(self):
+        """Включает сбор метрик: менеджер БД подменяется оберткой"""
+        if self.metrics_enabled:
+            return
+        db_metrics.backend = 'supabase' if self.is_supabase else (
+            'postgres' if self.is_postgres else 'sqlite')
+        self.manager = InstrumentedManager(self.manager, db_metrics)
+        for name in self._INSTRUMENTED_OWN_METHODS:
+            setattr(self, name, instrument_callable(
+                db_metrics, f"sql.{name}", getattr(self, name)))
+        logger.info("📈 Сбор метрик БД включен")
+
+    def disable_metrics(self):
+        """Выключает сбор метрик: вызовы снова идут в менеджер напрямую"""
+        if not self.metrics_enabled:
+            return
+        self.manager = self.manager.wrapped_manager
+        for name in self._INSTRUMENTED_OWN_METHODS:
+            self.__dict__.pop(name, None)
+        logger.info("📉 Сбор метрик БД выключен")
+
+    def get_metrics_prometheus(self) -> str:
+        """Метрики вызовов БД и кэша запросов в текстовом формате Prometheus"""
+        pool_metrics = self.manager.get_pool_prometheus() if hasattr(
+            self.manager, 'get_pool_prometheus') else ''
+        return db_metrics.to_prometheus() + query_cache.to_prometheus() + pool_metrics
+
+    def get_pool_stats(self) -> dict:
+        """Состояние пула соединений (только PostgreSQL)"""
+        if hasattr(self.manager, 'get_pool_stats'):
+            return self.manager.get_pool_stats()
+        return {}
+
+    def get_cache_stats(self) -> dict:
+        """Сводка по кэшу запросов (записи, попадания, промахи по методам)"""
+        return query_cache.summary()
+
     async def initialize(self):
         """Асинхронная инициализация менеджера"""
         if self.is_postgres or self.is_supabase:
@@ -125,6 +177,10 @@ class UniversalDatabaseManager:
         """Проверяет, есть ли закладка"""
         return await self.manager.is_bookmarked(user_id, book_id, chapter_start, chapter_end, verse_start, verse_end)
 
+    async def is_chapter_bookmarked(self, user_id: int, book_id: int, chapter: int) -> bool:
+        """Проверяет, есть ли в главе любая закладка (на главу, ее стихи или диапазон глав)"""
+        return await self.manager.is_chapter_bookmarked(user_id, book_id, chapter)
+
     # Методы для работы с лимитами ИИ
     async def increment_ai_usage(self, user_id: int):
         """Увеличивает счетчик использования ИИ"""
@@ -160,18 +216,22 @@ class UniversalDatabaseManager:
         return await self.manager.is_reading_part_completed(user_id, plan_id, day, part_idx)
 
     # Методы для совместимости с handlers
+    @cached(ttl=300, tags=('user_plans:{user_id}',))
     async def get_user_reading_plan(self, user_id: int, plan_id: str):
         """Получает план чтения пользователя"""
         return await self.manager.get_user_reading_plan(user_id, plan_id)
 
+    @invalidates('user_plans:{user_id}')
     async def set_user_reading_plan(self, user_id: int, plan_id: str, day: int = 1):
         """Устанавливает план чтения для пользователя"""
         return await self.manager.set_user_reading_plan(user_id, plan_id, day)
 
+    @cached(ttl=300, tags=('user_plans:{user_id}',))
     async def get_user_reading_plans(self, user_id: int):
         """Получает все планы чтения пользователя"""
         return await self.manager.get_user_reading_plans(user_id)
 
+    @invalidates('user_plans:{user_id}')
     async def update_reading_plan_day(self, user_id: int, plan_id: str, day: int):
         """Обновляет текущий день плана чтения"""
         return await self.manager.update_reading_plan_day(user_id, plan_id, day)
@@ -194,6 +254,7 @@ class UniversalDatabaseManager:
         return await self.mark_reading_day_completed(user_id, plan_id, day)
 
     # Методы для работы с планами чтения (только для PostgreSQL)
+    @cached(ttl=3600, tags=('reading_plans',))
     async def get_reading_plans(self):
         """Получает все планы чтения (только PostgreSQL/Supabase)"""
         if self.is_postgres or self.is_supabase:
@@ -202,6 +263,7 @@ class UniversalDatabaseManager:
             # Для SQLite возвращаем пустой список, планы будут из CSV
             return []
 
+    @cached(ttl=3600, tags=('reading_plans', 'reading_plan:{plan_id}'))
     async def get_reading_plan_days(self, plan_id: str):
         """Получает дни плана чтения (только PostgreSQL/Supabase)"""
         if self.is_postgres or self.is_supabase:
@@ -210,6 +272,7 @@ class UniversalDatabaseManager:
             # Для SQLite возвращаем пустой список, планы будут из CSV
             return []
 
+    @cached(ttl=3600, tags=('reading_plans', 'reading_plan:{plan_id}'))
     async def get_reading_plan_by_id(self, plan_id: str):
         """Получает план чтения по ID (только PostgreSQL/Supabase)"""
         if self.is_postgres or self.is_supabase:
@@ -251,7 +314,33 @@ class UniversalDatabaseManager:
         """Топ пользователей по ИИ-запросам за всё время (user_id, total_count)"""
         return await self.manager.get_ai_stats_alltime(limit)
 
+    async def get_ai_usage_summary(self, start_date: str = None, end_date: str = None) -> dict:
+        """Сводка ИИ-запросов за период (total_requests, active_days, peak_daily_users, total_users)"""
+        return await self.manager.get_ai_usage_summary(start_date, end_date)
+
+    async def backfill_ai_usage_rollups(self) -> bool:
+        """Пересчитывает агрегаты ИИ из дневных счетчиков"""
+        return await self.manager.backfill_ai_usage_rollups()
+
+    # Методы обслуживания БД
+    async def fold_oldest_ai_usage_day(self, before_date: str) -> int:
+        """Сворачивает самый старый день дневных счетчиков ИИ в агрегаты"""
+        return await self.manager.fold_oldest_ai_usage_day(before_date)
+
+    async def prune_conversation_messages(self, before: str, limit: int = 1000) -> int:
+        """Удаляет порцию сообщений бесед старше before"""
+        return await self.manager.prune_conversation_messages(before, limit)
+
+    async def purge_orphan_texts(self, limit: int = 1000) -> int:
+        """Удаляет порцию сжатых текстов, на которые больше никто не ссылается"""
+        return await self.manager.purge_orphan_texts(limit)
+
+    async def run_db_maintenance(self) -> dict:
+        """Обслуживание таблиц (VACUUM/ANALYZE)"""
+        return await self.manager.run_db_maintenance()
+
     # Методы для сохраненных толкований
+    @invalidates('commentaries:{user_id}')
     async def save_commentary(self, user_id: int, book_id: int, chapter_start: int,
                               chapter_end: int = None, verse_start: int = None, verse_end: int = None,
                               reference_text: str = "", commentary_text: str = "",
@@ -261,6 +350,7 @@ class UniversalDatabaseManager:
             user_id, book_id, chapter_start, chapter_end, verse_start, verse_end,
             reference_text, commentary_text, commentary_type)
 
+    @cached(ttl=600, tags=('commentaries:{user_id}',))
     async def get_saved_commentary(self, user_id: int, book_id: int, chapter_start: int,
                                    chapter_end: int = None, verse_start: int = None, verse_end: int = None,
                                    commentary_type: str = "ai") -> Optional[str]:
@@ -268,6 +358,7 @@ class UniversalDatabaseManager:
         return await self.manager.get_saved_commentary(
             user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, commentary_type)
 
+    @invalidates('commentaries:{user_id}')
     async def delete_saved_commentary(self, user_id: int, book_id: int = None, chapter_start: int = None,
                                       chapter_end: int = None, verse_start: int = None, verse_end: int = None,
                                       commentary_type: str = "ai", commentary_id: int = None) -> bool:
@@ -297,6 +388,7 @@ class UniversalDatabaseManager:
             return await self.manager.delete_saved_commentary(
                 user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, commentary_type)
 
+    @cached(ttl=600, tags=('commentaries:{user_id}',))
     async def get_user_commentaries(self, user_id: int, limit: int = 50) -> list:
         """Получает последние сохраненные толкования пользователя"""
         return await self.manager.get_user_commentaries(user_id, limit)
@@ -305,7 +397,21 @@ class UniversalDatabaseManager:
         """Алиас для get_user_commentaries для совместимости"""
         return await self.get_user_commentaries(user_id, limit)
 
+    async def get_passage_user_context(self, user_id: int, passage: dict,
+                                       commentary_passage: dict = None) -> dict:
+        """
+        Данные пользователя для клавиатур отрывка за один запрос к БД.
+
+        passage - координаты закладки (book_id, chapter_start, chapter_end,
+        verse_start, verse_end), commentary_passage - координаты толкований,
+        если отличаются. Результат совпадает с cached_data для
+        create_chapter_action_buttons: is_bookmarked, ai_commentary,
+        lopukhin_commentary.
+        """
+        return await self.manager.get_passage_user_context(user_id, passage, commentary_passage)
+
     # Методы для библейских тем
+    @cached(ttl=600, tags=('topics',))
     async def get_bible_topics(self, search_query: str = "", limit: int = 50) -> list:
         """Получает список библейских тем с возможностью поиска"""
         return await self.manager.get_bible_topics(search_query, limit)
@@ -472,35 +578,64 @@ class UniversalDatabaseManager:
             logger.error(f"❌ Ошибка создания таблицы ai_settings: {e}")
             return False
 
+    @cached(ttl=600, tags=('topics',))
     async def get_topic_by_name(self, topic_name: str) -> dict:
         """Получает тему по точному названию"""
         return await self.manager.get_topic_by_name(topic_name)
 
+    @cached(ttl=600, tags=('topics',))
     async def get_topic_by_id(self, topic_id: int) -> dict:
         """Получает тему по ID"""
         return await self.manager.get_topic_by_id(topic_id)
 
+    @cached(ttl=600, tags=('topics',))
     async def search_topics_fulltext(self, search_query: str, limit: int = 20) -> list:
         """Полнотекстовый поиск по темам"""
         return await self.manager.search_topics_fulltext(search_query, limit)
 
+    @cached(ttl=600, tags=('topics',))
     async def get_topics_count(self) -> int:
         """Получает общее количество тем"""
         return await self.manager.get_topics_count()
 
+    def add_topic_listener(self, callback: Callable[..., Awaitable[Any]]):
+        """Подписывает async callback(action, topic_id, topic_name, verses) на изменения тем"""
+        if callback not in self._topic_listeners:
+            self._topic_listeners.append(callback)
+
+    async def _notify_topic_listeners(self, action: str, topic_id: int = None,
+                                      topic_name: str = None, verses: str = None):
+        for callback in list(self._topic_listeners):
+            try:
+                await callback(action, topic_id, topic_name, verses)
+            except Exception as e:
+                logger.error(f"Ошибка обработчика изменения темы ({action}): {e}")
+
+    @invalidates('topics')
     async def add_bible_topic(self, topic_name: str, verses: str) -> bool:
         """Добавляет новую библейскую тему"""
-        return await self.manager.add_bible_topic(topic_name, verses)
+        result = await self.manager.add_bible_topic(topic_name, verses)
+        if result:
+            await self._notify_topic_listeners('add', topic_name=topic_name, verses=verses)
+        return result
 
+    @invalidates('topics')
     async def update_bible_topic(self, topic_id: int, topic_name: str = None, verses: str = None) -> bool:
         """Обновляет существующую библейскую тему"""
-        return await self.manager.update_bible_topic(topic_id, topic_name, verses)
+        result = await self.manager.update_bible_topic(topic_id, topic_name, verses)
+        if result:
+            await self._notify_topic_listeners('update', topic_id, topic_name, verses)
+        return result
 
+    @invalidates('topics')
     async def delete_bible_topic(self, topic_id: int) -> bool:
         """Удаляет библейскую тему"""
-        return await self.manager.delete_bible_topic(topic_id)
+        result = await self.manager.delete_bible_topic(topic_id)
+        if result:
+            await self._notify_topic_listeners('delete', topic_id)
+        return result
 
-    # === Диалоговый ассистент: врапперы для Supabase ===
+    # === Диалоговый ассистент (беседы хранятся во всех бэкендах) ===
     async def create_conversation(self, user_id: int, title: str = None):
         if hasattr(self.manager, 'create_conversation'):
             return await self.manager.create_conversation(user_id, title)
@@ -531,9 +666,9 @@ class UniversalDatabaseManager:
             return await self.manager.add_message(conversation_id, role, content, meta)
         return None
 
-    async def list_messages(self, conversation_id: str, limit: int = 20):
+    async def list_messages(self, conversation_id: str, limit: int = 20, before: str = None):
         if hasattr(self.manager, 'list_messages'):
-            return await self.manager.list_messages(conversation_id, limit)
+            return await self.manager.list_messages(conversation_id, limit, before)
         return []
 
     # === МЕТОДЫ ДЛЯ РАБОТЫ С НАСТРОЙКАМИ ИИ ===
@@ -724,6 +859,17 @@ class UniversalDatabaseManager:
                     f"Ошибка завершения покупки премиум запросов: {e}")
                 return False
 
+    async def get_premium_purchase_status(self, payment_id: str) -> Optional[str]:
+        """Статус покупки по payment_id ('pending', 'completed', ...) или None"""
+        if hasattr(self.manager, 'get_premium_purchase_status'):
+            return await self.manager.get_premium_purchase_status(payment_id)
+        else:
+            purchase = await self.fetch_one(
+                "SELECT payment_status FROM premium_purchases WHERE payment_id = ?",
+                (payment_id,)
+            )
+            return purchase['payment_status'] if purchase else None
+
     async def create_donation(self, user_id: int, amount_rub: int, payment_id: str, message: str = None) -> bool:
         """Создает запись о пожертвовании"""
         if hasattr(self.manager, 'create_donation'):
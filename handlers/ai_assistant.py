@@ -4,6 +4,7 @@
 import logging
 import re
 import html
+from typing import List, Optional
 from aiogram import Router, F
 from aiogram.types import CallbackQuery, Message, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
@@ -11,10 +12,12 @@ from aiogram.fsm.state import State, StatesGroup
 
 
 from handlers.text_messages import ai_check_and_increment_db, format_ai_or_commentary
+from config.settings import AI_VERSE_BUTTONS_LIMIT
 from utils.api_client import bible_api, ask_gpt_bible_verses
-from utils.bible_data import bible_data
+from utils.orthodox_calendar import CALENDAR_BOOK_NAMES, get_last_verse_in_chapter
+from utils.reference_parser import ReferenceSpan, reference_engine
+from utils.reference_extractor import extract_references, format_span
 from utils.text_utils import split_text, get_verses_parse_mode
-from database.universal_manager import universal_db_manager as db_manager
 
 # Инициализация логгера
 logger = logging.getLogger(__name__)
@@ -116,24 +119,17 @@ async def process_problem_description(message: Message, state: FSMContext):
             )
             return
 
-        # Парсим ответ ИИ и извлекаем ссылки на стихи
-        verse_references = parse_ai_response(verses_response)
+        # Извлекаем из ответа ИИ разобранные ссылки на стихи
+        verse_spans = extract_ai_spans(verses_response)
 
-        if not verse_references:
+        if not verse_spans:
             await loading_msg.edit_text(
                 "❌ ИИ не смог подобрать подходящие стихи. Попробуйте переформулировать вашу проблему или обратитесь к разделу 'Темы'."
             )
             return
 
         # Создаем кнопки со ссылками на стихи
-        buttons = []
-        for verse_ref in verse_references[:5]:  # Ограничиваем до 5 стихов
-            buttons.append([
-                InlineKeyboardButton(
-                    text=verse_ref,
-                    callback_data=f"ai_verse_{verse_ref}"
-                )
-            ])
+        buttons = verse_buttons(verse_spans)
 
         # Добавляем кнопку возврата в меню
         buttons.append([
@@ -176,7 +172,7 @@ async def process_problem_description(message: Message, state: FSMContext):
         await state.set_state(AIAssistantStates.showing_verses)
         await state.update_data(
             problem_text=problem_text,
-            verse_references=verse_references,
+            verse_references=verse_spans,
             verses_message_text=formatted_text
         )
 
@@ -190,12 +186,15 @@ async def process_problem_description(message: Message, state: FSMContext):
 @router.callback_query(F.data.startswith("ai_verse_"))
 async def show_ai_recommended_verse(callback: CallbackQuery, state: FSMContext):
     """Показывает рекомендованный ИИ стих"""
-    verse_ref = callback.data[len("ai_verse_"):]
+    span = span_from_callback(callback.data)
+    if span is None:
+        await callback.answer("❌ Не удалось найти указанный стих")
+        return
 
     try:
-        # Получаем текст стиха
-        from handlers.verse_reference import get_verse_by_reference
-        text, _ = await get_verse_by_reference(state, verse_ref)
+        # Получаем текст стиха (через главы - весь отрывок)
+        from handlers.verse_reference import get_verse_by_span
+        text, _ = await get_verse_by_span(state, span)
 
         if text.startswith("Ошибка"):
             await callback.answer("❌ Не удалось найти указанный стих")
@@ -207,7 +206,7 @@ async def show_ai_recommended_verse(callback: CallbackQuery, state: FSMContext):
             await callback.message.answer(part, parse_mode=parse_mode)
 
         # Создаем кнопки для дополнительных действий
-        buttons = await create_ai_verse_buttons(verse_ref, callback.from_user.id, from_ai_assistant=True)
+        buttons = await create_ai_verse_buttons(span, callback.from_user.id, from_ai_assistant=True)
 
         if buttons:
             keyboard = InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -223,27 +222,29 @@ async def show_ai_recommended_verse(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Произошла ошибка при получении стиха")
 
 
-async def create_ai_verse_buttons(verse_ref: str, user_id: int, from_ai_assistant: bool = False) -> list:
+async def create_ai_verse_buttons(span: ReferenceSpan, user_id: int, from_ai_assistant: bool = False) -> list:
     """Создает кнопки для действий со стихом, рекомендованным ИИ"""
     buttons = []
 
-    # Парсим ссылку на стих
-    import re
-    match = re.match(
-        r"([А-Яа-яёЁ0-9\s]+)\s(\d+)(?::(\d+)(?:-(\d+))?)?", verse_ref)
-    if not match:
-        return buttons
-
-    book_raw = match.group(1).strip().lower()
-    chapter = int(match.group(2))
-    verse_start = match.group(3)
-    verse_end = match.group(4) if match.group(4) else verse_start
-
-    book_abbr = bible_data.normalize_book_name(book_raw)
-    book_id = bible_data.get_book_id(book_abbr)
-
-    if not book_id:
-        return buttons
+    book_id, chapter = span.book_id, span.chapter
+    verse_end = span.verse_end
+    if span.verse_start is not None and span.end_chapter != span.chapter:
+        # Через главы - действия для первой главы, как у кнопок чтений календаря
+        verse_end = get_last_verse_in_chapter(
+            CALENDAR_BOOK_NAMES.get(book_id, span.book), chapter, book_id, span.verse_start)
+    verse_start = str(span.verse_start) if span.verse_start else None
+    verse_end = str(verse_end) if verse_end else verse_start
+    book_abbr = reference_engine.book_abbr(book_id)
+
+    # Закладка и сохраненное толкование - одним запросом к БД
+    from utils.bible_data import get_chapter_cached_data
+    commentary_verse_start = int(verse_start) if verse_start else 0
+    commentary_verse_end = int(verse_end) if verse_end else commentary_verse_start
+    passage_context = await get_chapter_cached_data(
+        user_id, book_id, chapter,
+        verse_start=int(verse_start) if verse_start else None,
+        verse_end=int(verse_end) if verse_end and verse_end != verse_start else None,
+        commentary_verses=(chapter, commentary_verse_start, commentary_verse_end))
 
     # Создаем ряд кнопок для максимального использования ширины
     action_row = []
@@ -252,15 +253,7 @@ async def create_ai_verse_buttons(verse_ref: str, user_id: int, from_ai_assistan
     from config.ai_settings import ENABLE_GPT_EXPLAIN
     if ENABLE_GPT_EXPLAIN:
         # Проверяем есть ли сохраненное толкование
-        saved_commentary = None
-        try:
-            verse_start_num = int(verse_start) if verse_start else 0
-            verse_end_num = int(verse_end) if verse_end else verse_start_num
-            saved_commentary = await db_manager.get_saved_commentary(
-                user_id, book_id, chapter, chapter, verse_start_num, verse_end_num, "ai"
-            )
-        except:
-            pass
+        saved_commentary = passage_context['ai_commentary']
 
         # Определяем текст кнопки
         ai_text = "🔄 Обновить разбор ИИ" if saved_commentary else "🤖 Разбор от ИИ"
@@ -318,23 +311,17 @@ async def create_ai_verse_buttons(verse_ref: str, user_id: int, from_ai_assistan
 
     # Кнопка закладки для стиха/диапазона стихов
     from utils.bookmark_utils import create_bookmark_button
-    from handlers.bookmark_handlers import check_if_bookmarked
 
     verse_start_num = int(verse_start) if verse_start else None
     verse_end_num = int(
         verse_end) if verse_end and verse_end != verse_start else None
 
-    # Проверяем, добавлен ли стих в закладки
-    is_bookmarked = await check_if_bookmarked(
-        user_id, book_id, chapter, None, verse_start_num, verse_end_num
-    )
-
     bookmark_button = create_bookmark_button(
         book_id=book_id,
         chapter_start=chapter,
         verse_start=verse_start_num,
         verse_end=verse_end_num,
-        is_bookmarked=is_bookmarked
+        is_bookmarked=passage_context['is_bookmarked']
     )
 
     buttons.append([bookmark_button])
@@ -365,22 +352,15 @@ async def back_to_ai_verses(callback: CallbackQuery, state: FSMContext):
         # Получаем сохраненные данные
         data = await state.get_data()
         problem_text = data.get('problem_text')
-        verse_references = data.get('verse_references')
+        verse_spans = data.get('verse_references')
         verses_message_text = data.get('verses_message_text')
 
-        if not verse_references:
+        if not verse_spans:
             await callback.answer("❌ Данные отрывков не найдены")
             return
 
         # Создаем кнопки со ссылками на стихи заново
-        buttons = []
-        for verse_ref in verse_references[:5]:  # Ограничиваем до 5 стихов
-            buttons.append([
-                InlineKeyboardButton(
-                    text=verse_ref,
-                    callback_data=f"ai_verse_{verse_ref}"
-                )
-            ])
+        buttons = verse_buttons(verse_spans)
 
         # Добавляем кнопку возврата в меню
         buttons.append([
@@ -405,44 +385,59 @@ async def back_to_ai_verses(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Произошла ошибка")
 
 
-def parse_ai_response(response: str) -> list:
+def extract_ai_spans(response: str) -> List[ReferenceSpan]:
     """Извлекает ссылки на библейские стихи из произвольного текста ответа ИИ.
 
-    Поддерживает форматы с диапазонами и одиночными стихами. Ищет по всему тексту,
-    а не только по разделителям ';', чтобы работать с новыми промптами с описаниями.
+    Поддерживает форматы с диапазонами, списками и одиночными стихами. Ищет по всему
+    тексту за один проход (utils/reference_extractor.py), а не только по разделителям ';',
+    чтобы работать с новыми промптами с описаниями. Возвращает разобранные части
+    ссылок, чтобы кнопки не разбирали ссылку повторно.
     """
     if not response or response.startswith("Извините"):
         return []
 
-    # Нормализация текста: заменяем типографские тире на обычный дефис
-    text = response.replace("\u2013", "-").replace("\u2014", "-")
-    # Упрощаем множественные пробелы
-    import re as _re
-    text = _re.sub(r"\s+", " ", text)
-
-    # Регулярка: Название/сокращение книги (рус), пробел, глава:стих[-стих]
-    # Примеры: "Мф 6:25-34", "Пс 22:1-6", "Иак 1:5", "Рим 8:28"
-    # Допускаем точку в сокращениях (напр. "Ин.") и разные тире
-    pattern = r"([А-Яа-яЁё0-9][А-Яа-яЁё0-9\.\s]{0,30})\s(\d+):(\d+)(?:[-](\d+))?"
-    matches = _re.findall(pattern, text)
-
-    candidates = []
-    for book, chapter, verse_start, verse_end in matches:
-        book_clean = _re.sub(r"\s+", " ", book).strip().rstrip('.')
-        if verse_end:
-            ref = f"{book_clean} {chapter}:{verse_start}-{verse_end}"
-        else:
-            ref = f"{book_clean} {chapter}:{verse_start}"
-        candidates.append(ref)
-
-    # Удаляем дубли, сохраняем порядок
+    # Каждая часть ссылки ("Мф 6:25-34; 7:7") - отдельная кнопка, дубли удаляем
     seen = set()
-    valid_refs = []
-    for ref in candidates:
-        if ref not in seen:
-            seen.add(ref)
-            valid_refs.append(ref)
+    spans = []
+    for reference in extract_references(response):
+        for span in reference.spans:
+            key = (span.book_id, span.chapter, span.verse_start, span.end_chapter, span.verse_end)
+            if key not in seen:
+                seen.add(key)
+                spans.append(span)
 
     logger.info(
-        f"Извлечено {len(valid_refs)} валидных ссылок из ответа ИИ: {valid_refs}")
-    return valid_refs
+        f"Извлечено {len(spans)} валидных ссылок из ответа ИИ: {[format_span(span) for span in spans]}")
+    return spans
+
+
+def parse_ai_response(response: str) -> list:
+    """Ссылки из ответа ИИ строками ("Мф 6:25-34") для ответов API"""
+    return [format_span(span) for span in extract_ai_spans(response)]
+
+
+def verse_callback(span: ReferenceSpan) -> str:
+    """callback_data кнопки стиха: ID книги и номера глав и стихов (0 - глава целиком)"""
+    return (f"ai_verse_{span.book_id}_{span.chapter}_{span.verse_start or 0}_"
+            f"{span.end_chapter}_{span.verse_end or 0}")
+
+
+def span_from_callback(data: str) -> Optional[ReferenceSpan]:
+    """Часть ссылки из callback_data кнопки стиха"""
+    payload = data[len("ai_verse_"):]
+    try:
+        book_id, chapter, verse_start, end_chapter, verse_end = map(int, payload.split('_'))
+    except ValueError:
+        # Кнопки старых сообщений содержат ссылку строкой ("ai_verse_Мф 6:25-34")
+        spans = reference_engine.parse(payload)
+        return spans[0] if spans else None
+    book = reference_engine.book_abbr(book_id)
+    if not book:
+        return None
+    return ReferenceSpan(book_id, book, chapter, verse_start or None, end_chapter, verse_end or None)
+
+
+def verse_buttons(spans: List[ReferenceSpan]) -> list:
+    """Ряды кнопок со стихами из ответа ИИ (не больше AI_VERSE_BUTTONS_LIMIT)"""
+    return [[InlineKeyboardButton(text=format_span(span), callback_data=verse_callback(span))]
+            for span in spans[:AI_VERSE_BUTTONS_LIMIT]]
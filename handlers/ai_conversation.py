@@ -1,5 +1,6 @@
 """
-Диалоговый ИИ‑ассистент с памятью (короткая в FSM + долговременная в Supabase).
+Диалоговый ИИ‑ассистент с памятью: беседы хранятся в БД, последние сообщения
+активной беседы - в кольцевом буфере процесса (services/conversation_buffer.py).
 """
 import logging
 from datetime import datetime
@@ -13,7 +14,10 @@ from handlers.text_messages import format_ai_or_commentary
 from utils.text_utils import split_text
 from utils.api_client import ask_gpt_chat
 from services.ai_quota_manager import ai_quota_manager
-from handlers.ai_assistant import parse_ai_response
+from services.conversation_buffer import conversation_buffer
+from services.idempotency import chat_idempotency, derive_key
+from handlers.ai_assistant import extract_ai_spans, verse_buttons
+from utils.reference_parser import ReferenceSpan
 
 logger = logging.getLogger(__name__)
 
@@ -25,14 +29,23 @@ class ChatStates(StatesGroup):
 
 router = Router()
 
+# Размер истории в FSM, если беседу не удалось сохранить в БД
+FALLBACK_HISTORY_SIZE = 20
 
-def _conversation_keyboard(show_end: bool = True, verse_refs: list[str] | None = None) -> InlineKeyboardMarkup:
-    buttons = []
+
+async def _ensure_conversation(user_id: int, state: FSMContext, data: dict) -> str | None:
+    """id текущей беседы из state, при отсутствии создает новую"""
+    conv_id = data.get('chat_conversation_id')
+    if not conv_id:
+        conv_id = await db.create_conversation(user_id, title="Беседа")
+        if conv_id:
+            await state.update_data(chat_conversation_id=conv_id)
+    return conv_id
+
+
+def _conversation_keyboard(show_end: bool = True, verse_spans: list[ReferenceSpan] | None = None) -> InlineKeyboardMarkup:
     # Кнопки со стихами (если извлекли из ответа)
-    if verse_refs:
-        for ref in verse_refs[:5]:
-            buttons.append([InlineKeyboardButton(
-                text=ref, callback_data=f"ai_verse_{ref}")])
+    buttons = verse_buttons(verse_spans) if verse_spans else []
     # Служебные кнопки
     if show_end:
         buttons.append([InlineKeyboardButton(
@@ -57,11 +70,7 @@ async def start_chat(message: Message, state: FSMContext):
 
     # Создаем разговор, если его нет в state
     data = await state.get_data()
-    conv_id = data.get('chat_conversation_id')
-    if not conv_id and db.is_supabase:
-        conv_id = await db.create_conversation(user_id, title="Беседа")
-        if conv_id:
-            await state.update_data(chat_conversation_id=conv_id)
+    await _ensure_conversation(user_id, state, data)
 
     await state.set_state(ChatStates.in_conversation)
 
@@ -87,7 +96,12 @@ async def start_chat(message: Message, state: FSMContext):
 
 @router.callback_query(F.data == "chat_reset")
 async def chat_reset(callback: CallbackQuery, state: FSMContext):
-    await state.update_data(chat_history=[])
+    # Новая беседа: старая остается в БД, но выгружается из памяти
+    data = await state.get_data()
+    if data.get('chat_conversation_id'):
+        conversation_buffer.drop(data['chat_conversation_id'])
+    await state.update_data(chat_history=[], chat_conversation_id=None)
+    await _ensure_conversation(callback.from_user.id, state, {})
     await callback.message.edit_text(
         "♻️ Контекст очищен. Напишите новый вопрос.",
         reply_markup=_conversation_keyboard()
@@ -108,20 +122,29 @@ async def chat_message(message: Message, state: FSMContext):
         await message.answer("Главное меню:", reply_markup=await get_main_keyboard())
         return
 
-    data = await state.get_data()
-    conv_id = data.get('chat_conversation_id')
+    # Повторная доставка того же апдейта Telegram (таймаут вебхука, перезапуск
+    # polling) не должна второй раз списывать квоту, вызывать модель и отвечать
+    key = derive_key('tg', message.chat.id, message.message_id)
+    _, replayed = await chat_idempotency.run(key, lambda: _answer_message(message, state, text))
+    if replayed:
+        logger.info(f"Повторное сообщение {message.message_id} пользователя {user_id} пропущено")
 
-    # Короткая память в state
-    history = data.get('chat_history', [])  # list[dict(role, content)]
-    history.append({"role": "user", "content": text})
-    history = history[-20:]  # ограничиваем размер
 
-    # Долгая память в Supabase
-    if conv_id and db.is_supabase:
-        try:
-            await db.add_message(conv_id, 'user', text)
-        except Exception as e:
-            logger.error(f"Ошибка сохранения сообщения пользователя: {e}")
+async def _answer_message(message: Message, state: FSMContext, text: str) -> None:
+    """Ответ ассистента на сообщение диалога (выполняется один раз на сообщение)"""
+    user_id = message.from_user.id
+    data = await state.get_data()
+    conv_id = await _ensure_conversation(user_id, state, data)
+
+    # Последние сообщения беседы из буфера (БД читается только при первом ходе),
+    # без беседы в БД - короткая память в state
+    if conv_id:
+        history = await conversation_buffer.history(conv_id)
+        await conversation_buffer.add(conv_id, 'user', text)
+    else:
+        history = data.get('chat_history', [])  # list[dict(role, content)]
+    history.append({"role": "user", "content": text})
+    history = history[-FALLBACK_HISTORY_SIZE:]  # ограничиваем размер
 
     # Собираем контекст сообщений (оперативная память)
     system_prompt = (
@@ -195,7 +218,7 @@ async def chat_message(message: Message, state: FSMContext):
     reply = await ask_gpt_chat(messages)
 
     # Извлекаем ссылки на стихи и формируем клавиатуру
-    verse_refs = parse_ai_response(reply) or []
+    verse_spans = extract_ai_spans(reply)
 
     # Форматируем как цитату + обычный текст
     formatted, opts = format_ai_or_commentary(
@@ -208,15 +231,12 @@ async def chat_message(message: Message, state: FSMContext):
             part,
             parse_mode=opts.get("parse_mode", "HTML"),
             reply_markup=_conversation_keyboard(
-                verse_refs=verse_refs) if is_last else None,
+                verse_spans=verse_spans) if is_last else None,
         )
 
     # Сохраняем ответ ассистента
-    history.append({"role": "assistant", "content": reply})
-    await state.update_data(chat_history=history)
-
-    if conv_id and db.is_supabase:
-        try:
-            await db.add_message(conv_id, 'assistant', reply)
-        except Exception as e:
-            logger.error(f"Ошибка сохранения ответа ассистента: {e}")
+    if conv_id:
+        await conversation_buffer.add(conv_id, 'assistant', reply)
+    else:
+        history.append({"role": "assistant", "content": reply})
+        await state.update_data(chat_history=history)
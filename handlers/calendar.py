@@ -10,7 +10,8 @@ from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
 from aiogram.types import CallbackQuery, Message, InlineKeyboardButton, InlineKeyboardMarkup
 
-from utils.orthodox_calendar import orthodox_calendar
+from services.calendar_service import calendar_service
+from services.scripture_bundles import parse_scripture_callback, scripture_bundles
 from keyboards.calendar import create_calendar_keyboard, create_calendar_settings_keyboard
 from services.ai_settings_manager import ai_settings_manager
 from config.settings import ADMIN_USER_ID
@@ -33,16 +34,13 @@ async def show_calendar_for_date(message: Message, state: FSMContext, target_dat
         logger.info(
             f"Настройки календаря из Supabase (show_calendar_for_date): {settings}")
 
-        # Получаем данные календаря
-        calendar_html = await orthodox_calendar.get_calendar_data(target_date, settings)
+        # Разобранные данные календаря (из кэша, соседние дни загружаются в фоне)
+        calendar_data = await calendar_service.get(target_date, settings)
 
-        if not calendar_html:
+        if not calendar_data:
             await message.answer("❌ Не удалось получить данные календаря")
             return
 
-        # Парсим HTML в структурированные данные
-        calendar_data = orthodox_calendar.parse_calendar_content(calendar_html)
-
         # Форматируем сообщение
         message_text = _format_calendar_message(calendar_data, target_date)
 
@@ -74,16 +72,13 @@ async def show_calendar_for_callback(callback: CallbackQuery, state: FSMContext,
         logger.info(
             f"Настройки календаря из Supabase (show_calendar_for_callback): {settings}")
 
-        # Получаем данные календаря
-        calendar_html = await orthodox_calendar.get_calendar_data(target_date, settings)
+        # Разобранные данные календаря (из кэша, соседние дни загружаются в фоне)
+        calendar_data = await calendar_service.get(target_date, settings)
 
-        if not calendar_html:
+        if not calendar_data:
             await callback.answer("❌ Не удалось получить данные календаря")
             return
 
-        # Парсим HTML в структурированные данные
-        calendar_data = orthodox_calendar.parse_calendar_content(calendar_html)
-
         # Форматируем сообщение
         message_text = _format_calendar_message(calendar_data, target_date)
 
@@ -197,63 +192,38 @@ async def calendar_date_handler(callback: CallbackQuery, state: FSMContext):
         await callback.answer("❌ Ошибка при обработке даты")
 
 
+async def _remember_reading(state: FSMContext, parts: list):
+    """Запоминает книгу и главу чтения, как при открытии ссылки на стих"""
+    from middleware.state import set_chosen_book, set_current_chapter
+
+    book_id, chapter = parts[-1][0], parts[-1][1]
+    await set_chosen_book(state, book_id)
+    await set_current_chapter(state, chapter)
+    # Отмечаем что пользователь пришел из календаря
+    await state.update_data(from_calendar=True)
+
+
 @router.callback_query(F.data.startswith("scripture_read_complex_"))
 async def scripture_read_complex(callback: CallbackQuery, state: FSMContext):
     """Обработчик для сложных чтений с несколькими частями"""
     try:
-        logger.info(
-            f"scripture_read_complex вызван с данными: {callback.data}")
-
-        # Парсим callback_data: scripture_read_complex_book_id_chapter_verse_start_verse_end|book_id_chapter_verse_start_verse_end|...
-        data_part = callback.data.replace("scripture_read_complex_", "")
-        ref_parts = data_part.split("|")
-        logger.info(f"Части сложного чтения: {ref_parts}")
+        # callback_data: scripture_read_complex_book_id_chapter_verse_start_verse_end|book_id_chapter_verse_start_verse_end|...
+        ref_parts = parse_scripture_callback(callback.data)
+        if not ref_parts:
+            await callback.answer("❌ Неверный формат данных", show_alert=True)
+            return
 
         from utils.bible_data import bible_data
-        from handlers.verse_reference import get_verse_by_reference
-        from utils.text_utils import get_verses_parse_mode, split_text
-        from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-
-        # Отмечаем что пользователь пришел из календаря
-        await state.update_data(from_calendar=True)
-
-        all_texts = []
-        all_references = []
-        combined_book_ids = set()
-        combined_chapters = set()
-
-        # Обрабатываем каждую часть
-        for ref_part in ref_parts:
-            parts = ref_part.split("_")
-            if len(parts) != 4:
-                continue
-
-            book_id = int(parts[0])
-            chapter = int(parts[1])
-            verse_start = int(parts[2])
-            verse_end = int(parts[3])
-
-            combined_book_ids.add(book_id)
-            combined_chapters.add(chapter)
-
-            book_name = bible_data.get_book_name(book_id)
-            if not book_name:
-                continue
-
-            if verse_start == verse_end:
-                reference = f"{book_name} {chapter}:{verse_start}"
-            else:
-                reference = f"{book_name} {chapter}:{verse_start}-{verse_end}"
-
-            all_references.append(reference)
-            logger.info(f"Добавляем ссылку: {reference}")
+        from utils.text_utils import get_verses_parse_mode
+        from middleware.state import get_current_translation
 
-            # Получаем текст для каждой части
-            text, meta = await get_verse_by_reference(state, reference)
-            all_texts.append(f"<b>{reference}</b>\n{text}")
+        # Готовые сообщения с текстом чтения (подготовлены вместе с днем календаря)
+        translation = await get_current_translation(state)
+        messages = await scripture_bundles.get(callback.data, translation)
+        await _remember_reading(state, ref_parts)
 
-        # Объединяем все тексты
-        combined_text = "\n\n━━━━━━━━━━━━━━━━━━━━━━━━━\n\n".join(all_texts)
+        combined_book_ids = {book_id for book_id, _, _, _ in ref_parts}
+        combined_chapters = {chapter for _, chapter, _, _ in ref_parts}
 
         # Формируем новую клавиатуру под текстом (без отдельного сообщения)
         kb_rows = []
@@ -266,16 +236,11 @@ async def scripture_read_complex(callback: CallbackQuery, state: FSMContext):
             main_row = []
             from config.ai_settings import ENABLE_GPT_EXPLAIN
             if ENABLE_GPT_EXPLAIN:
-                complex_parts = []
-                for ref_part in ref_parts:
-                    parts_arr = ref_part.split("_")
-                    if len(parts_arr) == 4:
-                        complex_parts.append(ref_part)
-                if complex_parts:
-                    main_row.append(InlineKeyboardButton(
-                        text="🤖 Разбор сложного чтения от ИИ",
-                        callback_data=f"gpt_explain_complex_{'|'.join(complex_parts)}"
-                    ))
+                complex_parts = ['_'.join(map(str, part)) for part in ref_parts]
+                main_row.append(InlineKeyboardButton(
+                    text="🤖 Разбор сложного чтения от ИИ",
+                    callback_data=f"gpt_explain_complex_{'|'.join(complex_parts)}"
+                ))
             # Открыть первую главу
             ru_book_abbr = None
             for abbr, b_id in bible_data.book_abbr_dict.items():
@@ -315,9 +280,8 @@ async def scripture_read_complex(callback: CallbackQuery, state: FSMContext):
             text="⬅️ Назад в календарь", callback_data="back_to_calendar")])
 
         parse_mode = get_verses_parse_mode()
-        parts = list(split_text(combined_text))
-        for i, part in enumerate(parts):
-            if i == len(parts) - 1:
+        for i, part in enumerate(messages):
+            if i == len(messages) - 1:
                 await callback.message.answer(
                     part,
                     parse_mode=parse_mode,
@@ -326,7 +290,6 @@ async def scripture_read_complex(callback: CallbackQuery, state: FSMContext):
             else:
                 await callback.message.answer(part, parse_mode=parse_mode)
 
-        logger.info("Сложное чтение показано успешно")
         await callback.answer()
 
     except Exception as e:
@@ -338,53 +301,30 @@ async def scripture_read_complex(callback: CallbackQuery, state: FSMContext):
 async def scripture_read(callback: CallbackQuery, state: FSMContext):
     """Обработчик для чтения Евангельских отрывков"""
     try:
-        logger.info(f"scripture_read вызван с данными: {callback.data}")
-
-        # Парсим callback_data: scripture_read_book_id_chapter_verse_start_verse_end
-        parts = callback.data.split("_")
-        logger.info(f"Части callback_data: {parts}")
-
-        if len(parts) != 6:
+        # callback_data: scripture_read_book_id_chapter_verse_start_verse_end
+        ref_parts = parse_scripture_callback(callback.data)
+        if len(ref_parts) != 1:
             await callback.answer("❌ Неверный формат данных", show_alert=True)
             return
-
-        book_id = int(parts[2])
-        chapter = int(parts[3])
-        verse_start = int(parts[4])
-        verse_end = int(parts[5])
-        logger.info(
-            f"Парсинг успешен: book_id={book_id}, chapter={chapter}, verse_start={verse_start}, verse_end={verse_end}")
+        book_id, chapter, verse_start, verse_end = ref_parts[0]
 
         from utils.bible_data import bible_data
-        book_name = bible_data.get_book_name(book_id)
-        logger.info(f"Название книги: {book_name}")
-
-        if not book_name:
+        if not bible_data.get_book_name(book_id):
             await callback.answer("❌ Книга не найдена", show_alert=True)
             return
 
-        if verse_start == verse_end:
-            reference = f"{book_name} {chapter}:{verse_start}"
-        else:
-            reference = f"{book_name} {chapter}:{verse_start}-{verse_end}"
-
-        logger.info(f"Сформированная ссылка: {reference}")
-        logger.info(f"Используем ID: {book_id}")
-
-        from handlers.verse_reference import get_verse_by_reference
-        from utils.text_utils import get_verses_parse_mode, split_text
-        from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
-        from utils.bible_data import create_chapter_action_buttons, get_english_book_abbreviation
-
-        # Отмечаем что пользователь пришел из календаря
-        await state.update_data(from_calendar=True)
+        from utils.text_utils import get_verses_parse_mode
+        from utils.bible_data import get_english_book_abbreviation
+        from middleware.state import get_current_translation
 
-        text, meta = await get_verse_by_reference(state, reference)
+        # Готовые сообщения с текстом чтения (подготовлены вместе с днем календаря)
+        translation = await get_current_translation(state)
+        messages = await scripture_bundles.get(callback.data, translation)
+        await _remember_reading(state, ref_parts)
 
         parse_mode = get_verses_parse_mode()
-        parts = list(split_text(text))
-        for i, part in enumerate(parts):
-            if i == len(parts) - 1:
+        for i, part in enumerate(messages):
+            if i == len(messages) - 1:
                 # Последняя часть: в одну строку Разбор ИИ + Открыть главу, и ряд "Назад в календарь"
                 row_main = []
                 from config.ai_settings import ENABLE_GPT_EXPLAIN
@@ -420,9 +360,7 @@ async def scripture_read(callback: CallbackQuery, state: FSMContext):
 
         # Старую дополнительную клавиатуру не отправляем — все нужные кнопки уже добавлены под текстом
 
-        logger.info("Чтение показано успешно")
         await callback.answer()
-        logger.info("Callback обработан успешно")
 
     except (ValueError, IndexError) as e:
         await callback.answer("❌ Ошибка при открытии чтения", show_alert=True)
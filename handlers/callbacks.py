@@ -113,17 +113,17 @@ async def next_chapter(callback: CallbackQuery, state: FSMContext, db=None):
             for part in split_text(text):
                 await callback.message.answer(part, parse_mode=parse_mode)
 
-            # Проверяем, добавлена ли глава в закладки
-            is_bookmarked = await is_chapter_bookmarked(
-                callback.from_user.id, book_id, next_chapter_num, db
-            )
+            # Закладка и сохраненные толкования главы - одним запросом к БД
+            from utils.bible_data import create_chapter_action_buttons, get_chapter_cached_data
+            chapter_data = await get_chapter_cached_data(
+                callback.from_user.id, book_id, next_chapter_num)
+            is_bookmarked = chapter_data['is_bookmarked']
             logger.info(
                 f"Статус закладки для главы {book_id}:{next_chapter_num}: {is_bookmarked}")
 
             # Создаем кнопки действий для главы
-            from utils.bible_data import create_chapter_action_buttons
             extra_buttons = await create_chapter_action_buttons(
-                book_id, next_chapter_num, user_id=callback.from_user.id)
+                book_id, next_chapter_num, user_id=callback.from_user.id, cached_data=chapter_data)
 
             # Навигация по главам
             has_previous = next_chapter_num > 1
@@ -180,17 +180,17 @@ async def prev_chapter(callback: CallbackQuery, state: FSMContext, db=None):
             for part in split_text(text):
                 await callback.message.answer(part, parse_mode=parse_mode)
 
-            # Проверяем, добавлена ли глава в закладки
-            is_bookmarked = await is_chapter_bookmarked(
-                callback.from_user.id, book_id, prev_chapter_num, db
-            )
+            # Закладка и сохраненные толкования главы - одним запросом к БД
+            from utils.bible_data import create_chapter_action_buttons, get_chapter_cached_data
+            chapter_data = await get_chapter_cached_data(
+                callback.from_user.id, book_id, prev_chapter_num)
+            is_bookmarked = chapter_data['is_bookmarked']
             logger.info(
                 f"Статус закладки для главы {book_id}:{prev_chapter_num}: {is_bookmarked}")
 
             # Создаем кнопки действий для главы
-            from utils.bible_data import create_chapter_action_buttons
             extra_buttons = await create_chapter_action_buttons(
-                book_id, prev_chapter_num, user_id=callback.from_user.id)
+                book_id, prev_chapter_num, user_id=callback.from_user.id, cached_data=chapter_data)
 
             # Добавляем клавиатуру навигации
             has_previous = prev_chapter_num > 1
@@ -350,66 +350,8 @@ async def is_chapter_bookmarked(user_id: int, book_id: int, chapter: int, db=Non
         db: Объект базы данных (не используется, оставлен для совместимости)
 
     Returns:
-        True, если глава в закладках, иначе False
+        True, если в главе есть закладка (на главу целиком или на ее стихи), иначе False
     """
     from database.universal_manager import universal_db_manager as db_manager
 
-    try:
-        # Получаем все закладки пользователя напрямую из db_manager
-        bookmarks = await db_manager.get_bookmarks(user_id)
-
-        # Проверяем, есть ли среди них нужная
-        # Поддержка разных форматов данных (кортежи для SQLite, словари для Supabase/PostgreSQL)
-        for bookmark in bookmarks:
-            if isinstance(bookmark, dict):
-                # Формат словаря (Supabase/PostgreSQL)
-                bm_book_id = bookmark['book_id']
-                bm_chapter = bookmark['chapter']
-            else:
-                # Формат кортежа (SQLite)
-                bm_book_id, bm_chapter, _ = bookmark
-
-            if bm_book_id == book_id and bm_chapter == chapter:
-                logger.info(
-                    f"Глава {book_id}:{chapter} найдена в закладках пользователя {user_id}")
-                return True
-
-        logger.info(
-            f"Глава {book_id}:{chapter} не найдена в закладках пользователя {user_id}")
-
-        # Дополнительно проверяем в состоянии через FSMContext
-        try:
-            from aiogram.fsm.context import FSMContext
-            from aiogram.fsm.storage.memory import MemoryStorage
-            from aiogram import Bot
-
-            # Импортируем функцию получения закладок из состояния
-            from middleware.state import get_bookmarks
-
-            # Получаем экземпляр бота для создания контекста FSM
-            from handlers import bot
-
-            # Если бот доступен, создаем контекст и проверяем закладки в состоянии
-            if bot:
-                state = FSMContext(bot=bot, user_id=user_id,
-                                   storage=MemoryStorage())
-                state_bookmarks = await get_bookmarks(state)
-
-                # Проверяем закладки в состоянии
-                for key, data in state_bookmarks.items():
-                    if isinstance(data, dict):
-                        bm_book_id = data.get('book_id')
-                        bm_chapter = data.get('chapter')
-                        if bm_book_id == book_id and bm_chapter == chapter:
-                            logger.info(
-                                f"Глава {book_id}:{chapter} найдена в закладках состояния пользователя {user_id}")
-                            return True
-        except Exception as state_error:
-            logger.error(
-                f"Ошибка при проверке закладок в состоянии: {state_error}")
-
-        return False
-    except Exception as e:
-        logger.error(
-            f"Ошибка при проверке статуса закладки: {e}", exc_info=True)
-        return False
+    return await db_manager.is_chapter_bookmarked(user_id, book_id, chapter)
@@ -78,6 +78,8 @@ async def cmd_help(message: Message):
         "• `/help` — Эта справка\n"
         "• `/books` — Список книг Библии\n"
         "• `/random` — Случайный стих\n"
+        "• `/tolk слова` — Поиск по толкованиям Лопухина\n"
+        "• `/topic слова` — Поиск тем по названиям и тексту стихов\n"
         "• `/bookmarks` — Ваши закладки\n\n"
 
         "🔍 **Поиск стихов (прямо в чат):**\n"
@@ -724,6 +726,60 @@ async def ai_limit_reset_command(message: Message):
     await message.answer(f"Лимит ИИ-запросов для пользователя {user_id} сброшен на сегодня.")
 
 
+@router.message(F.text.regexp(r"^/db_stats( on| off| reset)?$"))
+async def db_stats_command(message: Message):
+    """Метрики вызовов БД: /db_stats [on|off|reset] (только для владельца)"""
+    if message.from_user.id != AI_OWNER_ID:
+        await message.answer("Доступ запрещён.")
+        return
+    from database.instrumentation import db_metrics
+
+    parts = message.text.strip().split()
+    action = parts[1] if len(parts) == 2 else None
+    if action == "on":
+        db_manager.enable_metrics()
+    elif action == "off":
+        db_manager.disable_metrics()
+    elif action == "reset":
+        db_metrics.reset()
+
+    if not db_manager.metrics_enabled:
+        await message.answer(
+            "📉 Сбор метрик БД выключен.\nВключить: /db_stats on")
+        return
+
+    def ms(value):
+        return f"{value * 1000:.1f}" if value is not None else "-"
+
+    rows = db_metrics.snapshot()[:15]
+    uptime = int(datetime.now().timestamp() - db_metrics.started_at)
+    lines = [f"<b>📈 Метрики БД ({db_metrics.backend}), {uptime} с</b>",
+             "<code>метод: вызовы/ошибки, p50/p95/p99 мс, max параллельно</code>"]
+    for row in rows:
+        lines.append(
+            f"<code>{row['method']}</code>: {row['calls']}/{row['errors']}, "
+            f"{ms(row['p50'])}/{ms(row['p95'])}/{ms(row['p99'])}, {row['max_in_flight']}")
+    if not rows:
+        lines.append("Вызовов пока не было.")
+
+    pool = db_manager.get_pool_stats()
+    if pool:
+        lines.append(
+            f"\n<b>🔌 Пул соединений</b>: {pool['size']}/{pool['max_size']}, свободно {pool['idle']}, "
+            f"ожидают {pool['waiting']} (макс. {pool['max_waiting']}), "
+            f"ожидание {ms(pool['wait_avg'])}/{ms(pool['wait_max'])} мс, таймаутов {pool['timeouts']}")
+
+    cache = db_manager.get_cache_stats()
+    lines.append(f"\n<b>🗄 Кэш запросов</b>: {cache['entries']}/{cache['max_entries']} записей"
+                 + ("" if cache['enabled'] else " (выключен)"))
+    for method, stats in cache['methods'].items():
+        lines.append(
+            f"<code>{method}</code>: попаданий {stats['hits']}, промахов {stats['misses']}, "
+            f"сбросов {stats['invalidations']}, вытеснено {stats['evictions']}")
+    lines.append("\n/db_stats reset — сбросить, /db_stats off — выключить")
+    await message.answer("\n".join(lines), parse_mode="HTML")
+
+
 @router.message(F.text == "/admin")
 async def admin_panel(message: Message):
     if message.from_user.id != AI_OWNER_ID:
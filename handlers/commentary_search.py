@@ -0,0 +1,123 @@
+"""
+Поиск по Толковой Библии Лопухина: команда /tolk <слова>.
+
+Результаты показываются страницами с фрагментами текста, кнопка под
+результатом открывает толкование стиха (или всей главы) обычным просмотром.
+"""
+import html
+import logging
+
+from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.state import State, StatesGroup
+from aiogram.types import CallbackQuery, InlineKeyboardButton, InlineKeyboardMarkup, Message
+
+from config import settings
+from utils.bible_data import bible_data
+from utils.lopukhin_search import lopukhin_search
+
+logger = logging.getLogger(__name__)
+
+
+class CommentarySearchStates(StatesGroup):
+    waiting_query = State()
+
+
+router = Router()
+
+# Результатов на странице
+PAGE_SIZE = 5
+
+
+def _reference(result: dict) -> str:
+    ru_book = bible_data.book_synonyms.get(result['book'].lower(), result['book'])
+    if result['verse']:
+        return f"{ru_book} {result['chapter']}:{result['verse']}"
+    return f"{ru_book} {result['chapter']}"
+
+
+def _results_keyboard(results: list, offset: int, has_more: bool) -> InlineKeyboardMarkup:
+    buttons = [
+        [InlineKeyboardButton(
+            text=f"📚 {_reference(result)}",
+            callback_data=f"open_commentary_{result['book']}_{result['chapter']}_{result['verse']}")]
+        for result in results
+    ]
+    nav = []
+    if offset > 0:
+        nav.append(InlineKeyboardButton(
+            text="⬅️ Назад", callback_data=f"tolk_page_{max(offset - PAGE_SIZE, 0)}"))
+    if has_more:
+        nav.append(InlineKeyboardButton(
+            text="Далее ➡️", callback_data=f"tolk_page_{offset + PAGE_SIZE}"))
+    if nav:
+        buttons.append(nav)
+    return InlineKeyboardMarkup(inline_keyboard=buttons)
+
+
+async def _search_page(query: str, offset: int):
+    """Текст и клавиатура страницы результатов (None, если ничего не найдено)"""
+    # Лишний результат показывает, есть ли следующая страница
+    results = await lopukhin_search.search(query, limit=PAGE_SIZE + 1, offset=offset)
+    has_more = len(results) > PAGE_SIZE
+    results = results[:PAGE_SIZE]
+    if not results:
+        return None, None
+
+    lines = [f"🔍 <b>Толкования Лопухина:</b> «{html.escape(query)}»\n"]
+    for number, result in enumerate(results, start=offset + 1):
+        lines.append(f"<b>{number}. {_reference(result)}</b>\n{result['snippet']}\n")
+    return "\n".join(lines), _results_keyboard(results, offset, has_more)
+
+
+async def _answer_search(message: Message, state: FSMContext, query: str):
+    await state.set_state(None)
+    await state.update_data(tolk_query=query)
+    text, keyboard = await _search_page(query, 0)
+    if text is None:
+        await message.answer(f"По запросу «{html.escape(query)}» в толкованиях ничего не найдено.")
+        return
+    await message.answer(text, reply_markup=keyboard, parse_mode="HTML")
+
+
+@router.message(Command("tolk", "search_commentary"))
+async def cmd_search_commentary(message: Message, state: FSMContext, command: CommandObject):
+    """Обработчик команды /tolk: поиск по толкованиям"""
+    if not settings.ENABLE_LOPUKHIN_COMMENTARY:
+        await message.answer("Толкования Лопухина сейчас отключены.")
+        return
+    if not lopukhin_search.available:
+        await message.answer("Поиск по толкованиям временно недоступен.")
+        return
+
+    query = (command.args or "").strip()
+    if not query:
+        await state.set_state(CommentarySearchStates.waiting_query)
+        await message.answer("Введите слова для поиска в толкованиях Лопухина:")
+        return
+    await _answer_search(message, state, query)
+
+
+@router.message(CommentarySearchStates.waiting_query, F.text)
+async def search_commentary_query(message: Message, state: FSMContext):
+    await _answer_search(message, state, message.text.strip())
+
+
+@router.callback_query(F.data.regexp(r'^tolk_page_(\d+)$'))
+async def search_commentary_page(callback: CallbackQuery, state: FSMContext):
+    """Переход между страницами результатов"""
+    offset = int(callback.data.rsplit('_', 1)[1])
+    query = (await state.get_data()).get('tolk_query')
+    if not query:
+        await callback.answer("Повторите поиск: /tolk <слова>", show_alert=True)
+        return
+    try:
+        text, keyboard = await _search_page(query, offset)
+        if text is None:
+            await callback.answer("Больше результатов нет")
+            return
+        await callback.message.edit_text(text, reply_markup=keyboard, parse_mode="HTML")
+    except Exception as e:
+        logger.error(f"Ошибка листания результатов поиска по толкованиям: {e}")
+    await callback.answer()
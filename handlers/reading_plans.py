@@ -17,7 +17,6 @@ from keyboards.main import (
 from services.universal_reading_plans import universal_reading_plans_service
 from database.universal_manager import universal_db_manager as db_manager
 from utils.api_client import bible_api
-from utils.bible_data import bible_data
 from middleware.state import get_current_translation
 
 logger = logging.getLogger(__name__)
@@ -565,11 +564,10 @@ async def show_reading_reference(callback: CallbackQuery, state: FSMContext):
             is_bookmarked = False
 
             if parsed_ref:
-                book_name = parsed_ref['book']
                 chapter = parsed_ref['chapter']
                 verse_start = parsed_ref.get('verse_start', 1)
                 verse_end = parsed_ref.get('verse_end', verse_start)
-                book_id = bible_data.get_book_id(book_name)
+                book_id = parsed_ref['book_id']
 
                 if book_id:
                     is_bookmarked = await db_manager.is_bookmark_exists_detailed(
@@ -796,13 +794,12 @@ async def add_bookmark_reading(callback: CallbackQuery, state: FSMContext):
             parsed_ref = parse_reference(current_ref)
 
             if parsed_ref:
-                book_name = parsed_ref['book']
                 chapter = parsed_ref['chapter']
                 verse_start = parsed_ref.get('verse_start', 1)
                 verse_end = parsed_ref.get('verse_end', verse_start)
 
-                # Получаем book_id из bible_data
-                book_id = bible_data.get_book_id(book_name)
+                # ID книги - из разобранной ссылки (в 'book' полное название)
+                book_id = parsed_ref['book_id']
 
                 if book_id:
                     # Добавляем закладку
@@ -873,13 +870,12 @@ async def remove_bookmark_reading(callback: CallbackQuery, state: FSMContext):
             parsed_ref = parse_reference(current_ref)
 
             if parsed_ref:
-                book_name = parsed_ref['book']
                 chapter = parsed_ref['chapter']
                 verse_start = parsed_ref.get('verse_start', 1)
                 verse_end = parsed_ref.get('verse_end', verse_start)
 
-                # Получаем book_id из bible_data
-                book_id = bible_data.get_book_id(book_name)
+                # ID книги - из разобранной ссылки (в 'book' полное название)
+                book_id = parsed_ref['book_id']
 
                 if book_id:
                     # Удаляем закладку
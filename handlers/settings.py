@@ -412,6 +412,15 @@ async def admin_stats(callback: CallbackQuery, state: FSMContext):
         await callback.answer("У вас нет прав доступа")
         return
 
+    # Статистика ИИ берется из агрегатов (без выгрузки истории запросов)
+    import datetime
+    today = datetime.date.today()
+    ai_today = await db_manager.get_ai_usage_summary(today.isoformat(), today.isoformat())
+    ai_week = await db_manager.get_ai_usage_summary(
+        (today - datetime.timedelta(days=6)).isoformat(), today.isoformat())
+    ai_month = await db_manager.get_ai_usage_summary(
+        (today - datetime.timedelta(days=29)).isoformat(), today.isoformat())
+
     # Здесь должна быть логика получения статистики
     stats_text = (
         "📊 **Статистика бота**\n\n"
@@ -420,9 +429,10 @@ async def admin_stats(callback: CallbackQuery, state: FSMContext):
         "• Активных сегодня: 25\n"
         "• Новых за неделю: 12\n\n"
         "🤖 **ИИ запросы:**\n"
-        "• Сегодня: 45\n"
-        "• За неделю: 320\n"
-        "• За месяц: 1,250\n\n"
+        f"• Сегодня: {ai_today['total_requests']} (пользователей: {ai_today['peak_daily_users']})\n"
+        f"• За неделю: {ai_week['total_requests']}\n"
+        f"• За месяц: {ai_month['total_requests']}\n"
+        f"• Пользователей ИИ за всё время: {ai_month['total_users']}\n\n"
         "📝 **Закладки:**\n"
         "• Всего создано: 890\n"
         "• Активных: 750\n\n"
@@ -2,10 +2,12 @@
 Обработчики текстовых сообщений бота.
 """
 from config.settings import MARKDOWN_ENABLED, MARKDOWN_MODE, MARKDOWN_BOLD_TITLE, MARKDOWN_QUOTE, MARKDOWN_ESCAPE, ENABLE_VERSE_NUMBERS, BIBLE_MARKDOWN_ENABLED, BIBLE_MARKDOWN_MODE
+import html
 import logging
 import re
 from datetime import datetime
 from aiogram import Router, F
+from aiogram.filters import Command, CommandObject
 from aiogram.types import Message, CallbackQuery, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardMarkup, InlineKeyboardButton
 from aiogram.fsm.context import FSMContext
 from aiogram.enums.parse_mode import ParseMode
@@ -21,6 +23,7 @@ from keyboards.main import (
 from utils.api_client import bible_api, ask_gpt_explain, ask_gpt_explain_premium
 from config.ai_settings import PREMIUM_MAX_TOKENS_SHORT, PREMIUM_MAX_TOKENS_FULL
 from utils.bible_data import bible_data
+from utils.reference_parser import reference_engine
 from utils.text_utils import split_text
 from middleware.state import (
     get_chosen_book, set_chosen_book,
@@ -31,7 +34,7 @@ from middleware.state import (
 )
 from config.settings import ENABLE_WORD_SEARCH
 from handlers.verse_reference import get_verse_by_reference
-from utils.topics import get_topics_list, get_verses_for_topic
+from services.topic_service import topic_service
 from utils.lopukhin_commentary import lopukhin_commentary
 from database.universal_manager import universal_db_manager as db_manager
 
@@ -202,41 +205,14 @@ async def is_chapter_bookmarked(user_id: int, book_id: int, chapter: int, db) ->
         user_id: ID пользователя
         book_id: ID книги
         chapter: Номер главы
-        db: Объект базы данных
+        db: Объект базы данных (не используется, оставлен для совместимости)
 
     Returns:
-        True, если глава в закладках, иначе False
+        True, если в главе есть закладка (на главу целиком или на ее стихи), иначе False
     """
-    if not db:
-        logger.warning("Объект db не доступен при проверке закладки")
-        return False
-
-    try:
-        # Получаем все закладки пользователя
-        bookmarks = await db.get_bookmarks(user_id)
-
-        # Проверяем, есть ли среди них нужная
-        # Поддержка разных форматов данных (кортежи для SQLite, словари для Supabase/PostgreSQL)
-        for bookmark in bookmarks:
-            if isinstance(bookmark, dict):
-                # Формат словаря (Supabase/PostgreSQL)
-                bm_book_id = bookmark['book_id']
-                bm_chapter = bookmark['chapter']
-            else:
-                # Формат кортежа (SQLite)
-                bm_book_id, bm_chapter, _ = bookmark
-
-            if bm_book_id == book_id and bm_chapter == chapter:
-                logger.info(
-                    f"Глава {book_id}:{chapter} найдена в закладках пользователя {user_id}")
-                return True
+    from database.universal_manager import universal_db_manager as db_manager
 
-        logger.info(
-            f"Глава {book_id}:{chapter} не найдена в закладках пользователя {user_id}")
-        return False
-    except Exception as e:
-        logger.error(f"Ошибка при проверке статуса закладки: {e}")
-        return False
+    return await db_manager.is_chapter_bookmarked(user_id, book_id, chapter)
 
 
 @router.message(F.text.regexp(r'^\d+$'))
@@ -284,12 +260,12 @@ async def chapter_input(message: Message, state: FSMContext, db=None):
             )
             return
 
-        # Проверяем, добавлена ли глава в закладки
-        is_bookmarked = False
-        if db:
-            is_bookmarked = await is_chapter_bookmarked(message.from_user.id, book_id, chapter, db)
-            logger.info(
-                f"Статус закладки для главы {book_id}:{chapter}: {is_bookmarked}")
+        # Закладка и сохраненные толкования главы - одним запросом к БД
+        from utils.bible_data import create_chapter_action_buttons, get_chapter_cached_data
+        chapter_data = await get_chapter_cached_data(message.from_user.id, book_id, chapter)
+        is_bookmarked = chapter_data['is_bookmarked']
+        logger.info(
+            f"Статус закладки для главы {book_id}:{chapter}: {is_bookmarked}")
 
         # Определяем, есть ли предыдущие/следующие главы
         has_previous = chapter > 1
@@ -303,8 +279,8 @@ async def chapter_input(message: Message, state: FSMContext, db=None):
             await message.answer(part, parse_mode=parse_mode)
 
         # Создаем кнопки действий для главы
-        from utils.bible_data import create_chapter_action_buttons
-        extra_buttons = await create_chapter_action_buttons(book_id, chapter, user_id=message.from_user.id)
+        extra_buttons = await create_chapter_action_buttons(
+            book_id, chapter, user_id=message.from_user.id, cached_data=chapter_data)
 
         # Отправляем объединенную клавиатуру навигации с дополнительными кнопками
         await message.answer(
@@ -339,14 +315,10 @@ async def verse_reference(message: Message, state: FSMContext):
 
         for part in split_text(text):
             await message.answer(part, parse_mode=parse_mode)
-        match = re.match(
-            r'^([а-яА-ЯёЁ0-9\s]+)\s+(\d+)(?::(\d+)(?:-(\d+))?)?$', message.text.strip(), re.IGNORECASE)
-        if match:
-            book_raw = match.group(1).strip()
-            chapter = int(match.group(2))
-            verse = match.group(3)
-            book_abbr = bible_data.normalize_book_name(book_raw)
-            book_id = bible_data.get_book_id(book_abbr)
+        parsed = bible_data.parse_reference(message.text)
+        if parsed:
+            book_id, chapter, verse, parsed_verse_end = parsed
+            book_abbr = reference_engine.book_abbr(book_id)
             en_book = None
             en_to_ru = {
                 "Gen": "Быт", "Exod": "Исх", "Lev": "Лев", "Num": "Чис", "Deut": "Втор", "Josh": "Нав", "Judg": "Суд", "Ruth": "Руф",
@@ -385,16 +357,7 @@ async def verse_reference(message: Message, state: FSMContext):
             else:
                 # Для стиха - используем умную функцию создания кнопок
                 verse_start = int(verse) if verse else None
-                verse_end = None
-
-                # Парсим диапазон стихов если есть
-                if verse and '-' in message.text:
-                    match_range = re.match(
-                        r'^([а-яА-ЯёЁ0-9\s]+)\s+(\d+):(\d+)-(\d+)$',
-                        message.text.strip(), re.IGNORECASE
-                    )
-                    if match_range:
-                        verse_end = int(match_range.group(4))
+                verse_end = parsed_verse_end
 
                 from utils.bible_data import create_chapter_action_buttons
                 extra_buttons = await create_chapter_action_buttons(
@@ -574,9 +537,9 @@ def create_topics_keyboard(topics: list) -> list:
 @router.callback_query(F.data == "back_to_topics")
 async def back_to_topics(callback: CallbackQuery):
     """Возвращает к списку тем"""
-    from utils.topics import get_topics_list_async
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    topics = await get_topics_list_async()
+    await topic_service.ensure_loaded()
+    topics = topic_service.topic_names()
 
     buttons = create_topics_keyboard(topics)
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
@@ -589,7 +552,7 @@ async def back_to_calendar(callback: CallbackQuery, state: FSMContext):
     """Возвращает к календарю"""
     from datetime import datetime
     from keyboards.calendar import create_calendar_keyboard
-    from utils.orthodox_calendar import orthodox_calendar
+    from services.calendar_service import calendar_service
     from handlers.calendar import _format_calendar_message
 
     try:
@@ -600,15 +563,12 @@ async def back_to_calendar(callback: CallbackQuery, state: FSMContext):
         from services.ai_settings_manager import ai_settings_manager
         calendar_settings = await ai_settings_manager.get_calendar_default_settings()
 
-        # Получаем данные календаря
-        calendar_html = await orthodox_calendar.get_calendar_data(today, calendar_settings)
-        if not calendar_html:
+        # Разобранные данные календаря (из кэша)
+        calendar_data = await calendar_service.get(today, calendar_settings)
+        if not calendar_data:
             await callback.answer("❌ Не удалось получить данные календаря", show_alert=True)
             return
 
-        # Парсим HTML в структурированные данные
-        calendar_data = orthodox_calendar.parse_calendar_content(calendar_html)
-
         # Форматируем сообщение
         message_text = _format_calendar_message(calendar_data, today)
 
@@ -637,15 +597,36 @@ async def back_to_calendar(callback: CallbackQuery, state: FSMContext):
 
 @router.message(F.text == "🎯 Темы")
 async def show_topics_menu(message: Message):
-    from utils.topics import get_topics_list_async
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-    topics = await get_topics_list_async()
+    await topic_service.ensure_loaded()
+    topics = topic_service.topic_names()
 
     buttons = create_topics_keyboard(topics)
     kb = InlineKeyboardMarkup(inline_keyboard=buttons)
     await message.answer("Выберите тему или воспользуйтесь ИИ помощником:", reply_markup=kb)
 
 
+@router.message(Command("topic"))
+async def search_topics_command(message: Message, command: CommandObject):
+    """Поиск тем: /topic <слова> (по названиям тем и тексту их стихов)"""
+    query = (command.args or "").strip()
+    if not query:
+        await message.answer("Введите слова для поиска темы, например: /topic надежда")
+        return
+    await topic_service.ensure_loaded()
+    names = topic_service.topic_names()
+    buttons = [
+        [InlineKeyboardButton(text=topic['topic'], callback_data=f"topic_{names.index(topic['topic'])}")]
+        for topic in topic_service.search(query, limit=10) if topic['topic'] in names
+    ]
+    if not buttons:
+        await message.answer(f"По запросу «{html.escape(query)}» темы не найдены.")
+        return
+    buttons.append([InlineKeyboardButton(text="🎯 Все темы", callback_data="back_to_topics")])
+    await message.answer(f"🔍 Темы по запросу «{html.escape(query)}»:",
+                         reply_markup=InlineKeyboardMarkup(inline_keyboard=buttons))
+
+
 @router.callback_query(F.data.regexp(r'^topic_(\d+)$'))
 async def show_topic_verses(callback: CallbackQuery, state: FSMContext):
     # При выборе новой темы — удалить предыдущий список стихов и все сообщения ниже
@@ -662,11 +643,15 @@ async def show_topic_verses(callback: CallbackQuery, state: FSMContext):
             except Exception:
                 pass
     # Показываем новый список стихов
-    from utils.topics import get_topics_list_async, get_verses_for_topic_async
-    topics = await get_topics_list_async()
+    await topic_service.ensure_loaded()
+    topics = topic_service.topic_names()
     idx = int(callback.data.split('_')[1])
+    if idx >= len(topics):
+        # Список тем обновился после показа меню
+        await callback.answer("Тема не найдена, откройте список тем заново", show_alert=True)
+        return
     topic = topics[idx]
-    verses = await get_verses_for_topic_async(topic)
+    verses = topic_service.verses(topic)
     # Формируем inline-клавиатуру с кнопками по 2 в ряд
     buttons = []
     row = []
@@ -703,10 +688,18 @@ async def topic_verse_callback(callback: CallbackQuery, state: FSMContext):
                 await callback.bot.delete_message(callback.message.chat.id, msg_id)
             except Exception:
                 pass
-    # Отправить новый стих
-    text, _ = await get_verse_by_reference(state, verse_ref)
+    # Отправить новый стих: готовый текст из памяти, для ссылок не из тем - обычный разбор
+    translation = await get_current_translation(state)
+    parts = await topic_service.verse_text(verse_ref, translation)
+    if parts is None:
+        text, _ = await get_verse_by_reference(state, verse_ref)
+        parts = split_text(text)
+    else:
+        book_id, chapter = topic_service.reference(verse_ref)[:2]
+        await set_chosen_book(state, book_id)
+        await set_current_chapter(state, chapter)
     sent = None
-    for part in split_text(text):
+    for part in parts:
         sent = await callback.message.answer(part)
     # Сохраняем id нового сообщения со стихом
     if sent and state is not None:
@@ -717,16 +710,12 @@ async def topic_verse_callback(callback: CallbackQuery, state: FSMContext):
         except Exception:
             pass
     # Добавить только inline-кнопки под стихом
-    import re
-    match = re.match(
-        r"([А-Яа-яёЁ0-9\s]+)\s(\d+)(?::(\d+)(?:-(\d+))?)?", verse_ref)
-    if match:
-        book_raw = match.group(1).strip().lower()
-        chapter = int(match.group(2))
-        verse_start = match.group(3)
-        verse_end = match.group(4) if match.group(4) else verse_start
-        book_abbr = bible_data.normalize_book_name(book_raw)
-        book_id = bible_data.get_book_id(book_abbr)
+    parsed = topic_service.reference(verse_ref) or bible_data.parse_reference(verse_ref)
+    if parsed:
+        book_id, chapter, verse_start, verse_end = parsed
+        verse_start = str(verse_start) if verse_start else None
+        verse_end = str(verse_end) if verse_end else verse_start
+        book_abbr = reference_engine.book_abbr(book_id)
         en_book = None
         en_to_ru = {
             "Gen": "Быт", "Exod": "Исх", "Lev": "Лев", "Num": "Чис", "Deut": "Втор", "Josh": "Нав", "Judg": "Суд", "Ruth": "Руф",
@@ -747,6 +736,21 @@ async def topic_verse_callback(callback: CallbackQuery, state: FSMContext):
         buttons = []
         action_row = []
 
+        # Закладка и сохраненные толкования - одним запросом к БД
+        passage_context = {'is_bookmarked': False,
+                           'ai_commentary': None, 'lopukhin_commentary': None}
+        if book_id:
+            from utils.bible_data import get_chapter_cached_data
+            commentary_verse_start = int(verse_start) if verse_start else 0
+            commentary_verse_end = int(
+                verse_end) if verse_end else commentary_verse_start
+            passage_context = await get_chapter_cached_data(
+                callback.from_user.id, book_id, chapter,
+                verse_start=int(verse_start) if verse_start else None,
+                verse_end=int(
+                    verse_end) if verse_end and verse_end != verse_start else None,
+                commentary_verses=(chapter, commentary_verse_start, commentary_verse_end))
+
         # Кнопка "Открыть всю главу"
         if book_id:
             action_row.append(
@@ -761,26 +765,14 @@ async def topic_verse_callback(callback: CallbackQuery, state: FSMContext):
         if ENABLE_LOPUKHIN_COMMENTARY and en_book:
             commentary = None
             if verse_start:
-                commentary = lopukhin_commentary.get_commentary(
+                commentary = await lopukhin_commentary.get_commentary(
                     en_book, chapter, int(verse_start))
             if not commentary:
-                commentary = lopukhin_commentary.get_commentary(
+                commentary = await lopukhin_commentary.get_commentary(
                     en_book, chapter, 0)
             if commentary:
                 # Проверяем есть ли сохраненное толкование Лопухина для правильного текста кнопки
-                saved_lopukhin_commentary = None
-                if book_id:
-                    try:
-                        from database.universal_manager import universal_db_manager
-                        verse_start_num = int(
-                            verse_start) if verse_start else 0
-                        verse_end_num = int(
-                            verse_end) if verse_end else verse_start_num
-                        saved_lopukhin_commentary = await universal_db_manager.get_saved_commentary(
-                            callback.from_user.id, book_id, chapter, chapter, verse_start_num, verse_end_num, "lopukhin"
-                        )
-                    except:
-                        pass
+                saved_lopukhin_commentary = passage_context['lopukhin_commentary']
 
                 # Определяем текст кнопки
                 lopukhin_text = "📚 Обновить толкование Лопухина" if saved_lopukhin_commentary else "Толкование проф. Лопухина"
@@ -804,17 +796,7 @@ async def topic_verse_callback(callback: CallbackQuery, state: FSMContext):
         # Кнопка ИИ-разбора - используем умную функцию для правильного текста
         if ENABLE_GPT_EXPLAIN and book_id:
             # Проверяем есть ли сохраненное толкование для правильного текста кнопки
-            saved_commentary = None
-            try:
-                from database.universal_manager import universal_db_manager
-                verse_start_num = int(verse_start) if verse_start else 0
-                verse_end_num = int(
-                    verse_end) if verse_end else verse_start_num
-                saved_commentary = await universal_db_manager.get_saved_commentary(
-                    callback.from_user.id, book_id, chapter, chapter, verse_start_num, verse_end_num, "ai"
-                )
-            except:
-                pass
+            saved_commentary = passage_context['ai_commentary']
 
             # Определяем текст кнопки
             ai_text = "🔄 Обновить толкование ИИ" if saved_commentary else "🤖 Разбор от ИИ"
@@ -842,23 +824,17 @@ async def topic_verse_callback(callback: CallbackQuery, state: FSMContext):
         # Добавляем кнопку закладки для стиха/отрывка
         if book_id:
             from utils.bookmark_utils import create_bookmark_button
-            from handlers.bookmark_handlers import check_if_bookmarked
 
             verse_start_num = int(verse_start) if verse_start else None
             verse_end_num = int(
                 verse_end) if verse_end and verse_end != verse_start else None
 
-            # Проверяем, добавлен ли стих в закладки
-            is_bookmarked = await check_if_bookmarked(
-                callback.from_user.id, book_id, chapter, None, verse_start_num, verse_end_num
-            )
-
             bookmark_button = create_bookmark_button(
                 book_id=book_id,
                 chapter_start=chapter,
                 verse_start=verse_start_num,
                 verse_end=verse_end_num,
-                is_bookmarked=is_bookmarked
+                is_bookmarked=passage_context['is_bookmarked']
             )
 
             buttons.append([bookmark_button])
@@ -894,9 +870,9 @@ async def open_commentary_callback(callback: CallbackQuery, state: FSMContext):
         # Перенаправляем на постраничный просмотр
         await open_commentary_chapter_paginated(callback)
         return
-    commentary = lopukhin_commentary.get_commentary(book, chapter, verse)
+    commentary = await lopukhin_commentary.get_commentary(book, chapter, verse)
     if not commentary:
-        commentary = lopukhin_commentary.get_commentary(book, chapter, 0)
+        commentary = await lopukhin_commentary.get_commentary(book, chapter, 0)
     if commentary:
         # Очищаем комментарий от HTML тегов на всякий случай
         import re
@@ -1000,7 +976,7 @@ async def open_commentary_chapter_paginated(callback: CallbackQuery, state: FSMC
     book = match.group(1)
     chapter = int(match.group(2))
     from utils.lopukhin_commentary import lopukhin_commentary
-    all_comments = lopukhin_commentary.get_all_commentaries_for_chapter(
+    all_comments = await lopukhin_commentary.get_all_commentaries_for_chapter(
         book, chapter)
     if not all_comments:
         await callback.message.answer("Толкования на главу не найдено.")
@@ -1022,7 +998,7 @@ async def commentary_page_callback(callback: CallbackQuery, state: FSMContext =
     chapter = int(match.group(2))
     idx = int(match.group(3))
     from utils.lopukhin_commentary import lopukhin_commentary
-    all_comments = lopukhin_commentary.get_all_commentaries_for_chapter(
+    all_comments = await lopukhin_commentary.get_all_commentaries_for_chapter(
         book, chapter)
     # Редактируем текущее сообщение с толкованием вместо удаления навигации
     await show_commentary_page(callback, book, chapter, all_comments, idx, state, edit_message=True)
@@ -1542,41 +1518,15 @@ async def gpt_explain_callback(callback: CallbackQuery, state: FSMContext = None
         formatted, _ = format_ai_or_commentary(cleaned_response, title=title)
 
         # Проверяем, есть ли уже сохраненное толкование (ОПТИМИЗИРОВАННО)
-        from database.universal_manager import universal_db_manager as db_manager
         verse_start_num = verse if verse != 0 else None
         verse_end_num = verse_end if verse_end is not None else verse_start_num
 
-        # ОПТИМИЗАЦИЯ: Выполняем только нужные проверки параллельно
-        import asyncio
-        from handlers.bookmark_handlers import check_if_bookmarked
-        from config.settings import ENABLE_LOPUKHIN_COMMENTARY
-
-        tasks = [
-            db_manager.get_saved_commentary(
-                user_id, book_id, chapter, None, verse_start_num, verse_end_num, "ai"),
-            check_if_bookmarked(
-                user_id, book_id, chapter, verse_start=verse_start_num, verse_end=verse_end_num)
-        ]
-
-        # Добавляем проверку толкований Лопухина только если они включены
-        lopukhin_task_index = None
-        if ENABLE_LOPUKHIN_COMMENTARY:
-            lopukhin_task_index = len(tasks)
-            tasks.append(db_manager.get_saved_commentary(
-                user_id, book_id, chapter, None, verse_start_num, verse_end_num, "lopukhin"))
-
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-        saved_commentary = results[0] if not isinstance(
-            results[0], Exception) else None
-        is_bookmarked = results[1] if not isinstance(
-            results[1], Exception) else False
-
-        # Получаем результат толкований Лопухина только если запрос был сделан
-        if lopukhin_task_index is not None:
-            saved_lopukhin_commentary = results[lopukhin_task_index] if not isinstance(
-                results[lopukhin_task_index], Exception) else None
-        else:
-            saved_lopukhin_commentary = None
+        # Закладка и оба толкования - одним запросом к БД
+        from utils.bible_data import get_chapter_cached_data
+        passage_context = await get_chapter_cached_data(
+            user_id, book_id, chapter, verse_start=verse_start_num, verse_end=verse_end_num,
+            commentary_verses=(None, verse_start_num, verse_end_num))
+        saved_commentary = passage_context['ai_commentary']
 
         # Разбиваем на части с улучшенной функцией split_text
         text_parts = list(split_text(formatted))
@@ -1586,16 +1536,10 @@ async def gpt_explain_callback(callback: CallbackQuery, state: FSMContext = None
                 # Создаем кнопки без кнопки AI (exclude_ai=True) с учетом стихов
                 from utils.bible_data import create_chapter_action_buttons
 
-                # Передаем кэшированные данные чтобы избежать повторных запросов
-                cached_data = {
-                    'ai_commentary': saved_commentary,
-                    'lopukhin_commentary': saved_lopukhin_commentary,
-                    'is_bookmarked': is_bookmarked
-                }
-
+                # Передаем уже полученные данные отрывка чтобы избежать повторных запросов
                 action_buttons = await create_chapter_action_buttons(
                     book_id, chapter, book, exclude_ai=True, user_id=callback.from_user.id,
-                    verse_start=verse_start_num, verse_end=verse_end_num, cached_data=cached_data)
+                    verse_start=verse_start_num, verse_end=verse_end_num, cached_data=passage_context)
 
                 # Добавляем кнопку для сохранения толкования
                 save_buttons = []
@@ -1775,12 +1719,11 @@ async def gpt_explain_callback(callback: CallbackQuery, state: FSMContext = None
                 f"Ошибка возврата кнопки AI при ошибке: {button_error}")
 
 
-@router.message(F.text.in_(get_topics_list()))
+@router.message(F.text.func(topic_service.is_topic))
 async def topic_selected(message: Message):
-    from utils.topics import get_verses_for_topic
     from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
     topic = message.text.strip()
-    verses = get_verses_for_topic(topic)
+    verses = topic_service.verses(topic)
     # Формируем inline-клавиатуру с кнопками по 2 в ряд
     buttons = []
     row = []
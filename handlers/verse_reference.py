@@ -3,6 +3,8 @@ from aiogram.fsm.context import FSMContext
 from middleware.state import get_current_translation, set_chosen_book, set_current_chapter
 from utils.bible_data import bible_data
 from utils.api_client import bible_api
+from utils.reference_parser import ReferenceSpan, reference_engine
+from utils.versification import versification
 import logging
 
 logger = logging.getLogger(__name__)
@@ -28,7 +30,7 @@ async def get_verse_by_reference(state: FSMContext, reference: str) -> tuple:
 
         # Проверка допустимости главы
         # ПРИМЕЧАНИЕ: 2 Петра имеет ID 47 (не 61)
-        max_chapter = bible_data.max_chapters.get(book_id, 0)
+        max_chapter = versification.chapter_count(book_id, translation) or bible_data.max_chapters.get(book_id, 0)
 
         logger.info(
             f"Запрос на стих: {book_name} (ID: {book_id}) глава {chapter}, макс. глав: {max_chapter}")
@@ -61,6 +63,13 @@ async def get_verse_by_reference(state: FSMContext, reference: str) -> tuple:
             return result, {"book_id": book_id, "chapter": start_chapter, "is_range": True}
 
         elif verse:
+            # Номера стихов проверяются по таблице стихов, без загрузки главы
+            verse_start, verse_end = verse if isinstance(verse, tuple) else (verse, verse)
+            if not versification.is_valid_reference(book_id, chapter, verse_start, verse_end, translation):
+                verses = versification.verse_count(book_id, chapter, translation)
+                if verses and verse_start > verses:
+                    return f"В главе {chapter} книги '{book_name}' {verses} стихов. Укажите стих от 1 до {verses}.", False
+                return f"Неверный диапазон стихов: {verse_start}-{verse_end}.", False
             await set_chosen_book(state, book_id)
             await set_current_chapter(state, chapter)
             if isinstance(verse, tuple):
@@ -88,6 +97,39 @@ async def get_verse_by_reference(state: FSMContext, reference: str) -> tuple:
         return "Произошла ошибка при обработке ссылки. Пожалуйста, проверьте формат и попробуйте снова.", False
 
 
+async def get_verse_by_span(state: FSMContext, span: ReferenceSpan) -> tuple:
+    """
+    Текст части ссылки, уже разобранной reference_engine (кнопки стихов ИИ).
+    Ссылка через главы (Быт 1:1-2:3) возвращается целиком.
+    """
+    translation = await get_current_translation(state)
+
+    try:
+        book_id = span.book_id
+        await set_chosen_book(state, book_id)
+        await set_current_chapter(state, span.chapter)
+
+        if span.verse_start is None:
+            if span.end_chapter != span.chapter:
+                result = await get_chapter_range(book_id, span.chapter, span.end_chapter, translation)
+            else:
+                result = await bible_api.get_formatted_chapter(book_id, span.chapter, translation)
+        elif span.end_chapter != span.chapter:
+            result = await get_cross_chapter_range(
+                book_id, span.chapter, span.verse_start, span.end_chapter, span.verse_end, translation)
+        elif span.verse_end != span.verse_start:
+            result = await bible_api.get_verses(book_id, span.chapter, (span.verse_start, span.verse_end), translation)
+        else:
+            result = await bible_api.get_verses(book_id, span.chapter, span.verse_start, translation)
+
+        if result.startswith("Ошибка"):
+            return result, False
+        return result, True
+    except Exception as e:
+        logger.error(f"Ошибка при получении стихов {span}: {e}", exc_info=True)
+        return "Ошибка: не удалось получить стихи.", False
+
+
 def parse_reference(reference: str):
     """
     Парсит ссылку на стих или диапазон стихов/глав.
@@ -100,45 +142,27 @@ def parse_reference(reference: str):
       - 'от иоанна 3:16', 'иоанн 3:16' и т.д.
     Возвращает (нормализованное_название_книги, номер_главы, номер_стиха или специальный формат для диапазонов)
     """
-    # Сначала проверяем диапазон глав: Быт 1-3
-    chapter_range_match = re.match(
-        r'^([а-яА-ЯёЁ0-9\s]+)\s+(\d+)-(\d+)$', reference.strip(), re.IGNORECASE)
-    if chapter_range_match:
-        book_raw = chapter_range_match.group(1).strip()
-        start_chapter = int(chapter_range_match.group(2))
-        end_chapter = int(chapter_range_match.group(3))
-        book = bible_data.normalize_book_name(book_raw)
-        return book, "chapter_range", (start_chapter, end_chapter)
-
-    # Проверяем диапазон стихов через главы: Быт 1:1-2:25
-    cross_chapter_match = re.match(
-        r'^([а-яА-ЯёЁ0-9\s]+)\s+(\d+):(\d+)-(\d+):(\d+)$', reference.strip(), re.IGNORECASE)
-    if cross_chapter_match:
-        book_raw = cross_chapter_match.group(1).strip()
-        start_chapter = int(cross_chapter_match.group(2))
-        start_verse = int(cross_chapter_match.group(3))
-        end_chapter = int(cross_chapter_match.group(4))
-        end_verse = int(cross_chapter_match.group(5))
-        book = bible_data.normalize_book_name(book_raw)
-        return book, "cross_chapter_range", (start_chapter, start_verse, end_chapter, end_verse)
-
-    # Обычные форматы: Ин 3:16-18 или Ин 3:16 или Ин 3
-    match = re.match(
-        r'^([а-яА-ЯёЁ0-9\s]+)\s+(\d+)(?::(\d+)(?:-(\d+))?)?$', reference.strip(), re.IGNORECASE)
-    if not match:
+    spans = reference_engine.parse(reference)
+    if not spans or len(spans) > 1:
+        match = re.match(r'^([а-яА-ЯёЁ0-9\s]+?)\s+\d', reference.strip())
+        if match and not reference_engine.books.match(reference.strip()):
+            # Книга не распознана - возвращаем название, чтобы сообщить "Книга не найдена"
+            return match.group(1).strip().capitalize(), None, None
         return None, None, None
-    book_raw = match.group(1).strip()
-    chapter = int(match.group(2))
-    verse = match.group(3)
-    verse_end = match.group(4)
-    # Нормализация названия книги
-    book = bible_data.normalize_book_name(book_raw)
-    if verse and verse_end:
-        return book, chapter, (int(verse), int(verse_end))
-    elif verse:
-        return book, chapter, int(verse)
-    else:
-        return book, chapter, None
+
+    span = spans[0]
+    book = reference_engine.book_abbr(span.book_id)
+    if span.verse_start is None and span.end_chapter != span.chapter:
+        # Диапазон глав: Быт 1-3
+        return book, "chapter_range", (span.chapter, span.end_chapter)
+    if span.end_chapter != span.chapter:
+        # Диапазон стихов через главы: Быт 1:1-2:25
+        return book, "cross_chapter_range", (span.chapter, span.verse_start, span.end_chapter, span.verse_end)
+    if span.verse_start is None:
+        return book, span.chapter, None
+    if span.verse_end != span.verse_start:
+        return book, span.chapter, (span.verse_start, span.verse_end)
+    return book, span.chapter, span.verse_start
 
 
 async def get_chapter_range(book_id: int, start_chapter: int, end_chapter: int, translation: str) -> str:
@@ -151,7 +175,7 @@ async def get_chapter_range(book_id: int, start_chapter: int, end_chapter: int,
         from config.settings import ENABLE_VERSE_NUMBERS
 
         # Проверяем валидность диапазона
-        max_chapter = bible_data.max_chapters.get(book_id, 0)
+        max_chapter = versification.chapter_count(book_id, translation) or bible_data.max_chapters.get(book_id, 0)
         if start_chapter < 1 or end_chapter > max_chapter or start_chapter > end_chapter:
             return f"Ошибка: неверный диапазон глав {start_chapter}-{end_chapter}"
 
@@ -183,9 +207,12 @@ async def get_cross_chapter_range(book_id: int, start_chapter: int, start_verse:
         from utils.api_client import bible_api
 
         # Проверяем валидность диапазона
-        max_chapter = bible_data.max_chapters.get(book_id, 0)
+        max_chapter = versification.chapter_count(book_id, translation) or bible_data.max_chapters.get(book_id, 0)
         if start_chapter < 1 or end_chapter > max_chapter or start_chapter > end_chapter:
             return f"Ошибка: неверный диапазон глав {start_chapter}-{end_chapter}"
+        if not versification.is_valid_reference(book_id, start_chapter, start_verse, translation=translation) or \
+                not versification.is_valid_reference(book_id, end_chapter, 1, end_verse, translation):
+            return f"Ошибка: неверный диапазон стихов {start_chapter}:{start_verse}-{end_chapter}:{end_verse}"
 
         result = ""
 
@@ -197,20 +224,21 @@ async def get_cross_chapter_range(book_id: int, start_chapter: int, start_verse:
             for chapter_num in range(start_chapter, end_chapter + 1):
                 if chapter_num == start_chapter:
                     # Первая глава: от start_verse до конца главы
-                    # Получаем информацию о количестве стихов в главе
-                    chapter_data = await bible_api.get_chapter(book_id, chapter_num, translation)
-                    if not chapter_data:
-                        return f"Ошибка: не удалось получить главу {chapter_num}"
-
-                    # Находим максимальный номер стиха в главе
-                    max_verse = 0
-                    for key in chapter_data.keys():
-                        if key != "info":
-                            try:
-                                verse_num = int(key)
-                                max_verse = max(max_verse, verse_num)
-                            except ValueError:
-                                continue
+                    max_verse = versification.verse_count(book_id, chapter_num, translation)
+                    if max_verse is None:
+                        # Таблицы стихов нет - находим последний стих по тексту главы
+                        chapter_data = await bible_api.get_chapter(book_id, chapter_num, translation)
+                        if not chapter_data:
+                            return f"Ошибка: не удалось получить главу {chapter_num}"
+
+                        max_verse = 0
+                        for key in chapter_data.keys():
+                            if key != "info":
+                                try:
+                                    verse_num = int(key)
+                                    max_verse = max(max_verse, verse_num)
+                                except ValueError:
+                                    continue
 
                     chapter_text = await bible_api.get_verses(book_id, chapter_num, (start_verse, max_verse), translation)
                 elif chapter_num == end_chapter:
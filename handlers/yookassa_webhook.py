@@ -140,43 +140,28 @@ class YooKassaWebhookHandler:
                     f"❌ Некорректное количество запросов: {requests_count}")
                 return
 
-            # Создаем запись о покупке в базе данных
-            if db_manager.is_supabase:
-                # Для Supabase - используем вашу схему таблицы
-                purchase_result = db_manager.manager.client.table('premium_purchases').insert({
-                    'user_id': user_id,
+            # Создаем запись о покупке (повторный webhook не создаст дубль)
+            await self.premium_manager.create_premium_purchase(
+                user_id=user_id,
+                requests_count=requests_count,
+                # Конвертируем в integer как в схеме
+                amount_rub=int(amount),
+                payment_id=payment_id
+            )
+
+            # Начисляем запросы: покупка завершается один раз по payment_id
+            if await self.premium_manager.complete_premium_purchase(payment_id):
+                logger.info(
+                    f"✅ Обработан платеж за премиум запросы: пользователь {user_id}, {requests_count} запросов за {amount}₽")
+
+                # Отправляем уведомление пользователю (если бот запущен)
+                await self.send_payment_notification(user_id, 'premium', {
                     'requests_count': requests_count,
-                    # Конвертируем в integer как в схеме
-                    'amount_rub': int(amount),
-                    'amount_stars': 0,
-                    'payment_method': 'ruble',
-                    'payment_id': payment_id,
-                    'payment_status': 'completed',
-                    'completed_at': 'now()',
-                    'telegram_payment_charge_id': None  # Для ЮKassa это null
-                }).execute()
-
-                if purchase_result.data:
-                    purchase_id = purchase_result.data[0]['id']
-
-                    # Добавляем премиум запросы пользователю
-                    await self.premium_manager.add_premium_requests(user_id, requests_count)
-
-                    logger.info(
-                        f"✅ Обработан платеж за премиум запросы: пользователь {user_id}, {requests_count} запросов за {amount}₽")
-
-                    # Отправляем уведомление пользователю (если бот запущен)
-                    await self.send_payment_notification(user_id, 'premium', {
-                        'requests_count': requests_count,
-                        'amount': amount,
-                        'payment_id': payment_id
-                    })
-                else:
-                    logger.error(f"❌ Не удалось создать запись о покупке в БД")
+                    'amount': amount,
+                    'payment_id': payment_id
+                })
             else:
-                # Для других БД
-                logger.warning(
-                    "⚠️ Обработка платежей для не-Supabase БД не реализована")
+                logger.error(f"❌ Не удалось завершить покупку {payment_id} в БД")
 
         except Exception as e:
             logger.error(f"❌ Ошибка обработки платежа за премиум запросы: {e}")
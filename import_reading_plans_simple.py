@@ -41,84 +41,31 @@ async def import_plans():
     try:
         # Создаем менеджер
         from database.supabase_manager import SupabaseManager
+        from database.bulk_import import BulkImporter, SupabaseBulkWriter, import_reading_plan
         manager = SupabaseManager()
         await manager.initialize()
         print("✅ Подключение к Supabase установлено")
 
+        writer = SupabaseBulkWriter(manager.client)
+        importer = BulkImporter(writer)
+
         for plan in PLANS:
             print(f"\n📚 Импорт: {plan['title']}")
 
-            # Читаем файл
             if not os.path.exists(plan['file']):
                 print(f"❌ Файл {plan['file']} не найден")
                 continue
 
-            days_data = []
-            with open(plan['file'], 'r', encoding='utf-8') as f:
-                lines = f.readlines()
-
-                # Обрабатываем строки начиная с 3-й (пропускаем заголовки)
-                for i, line in enumerate(lines[2:], start=1):
-                    line = line.strip()
-                    if not line:
-                        continue
-
-                    # Простое разделение по первой запятой
-                    parts = line.split(',', 1)
-                    if len(parts) == 2:
-                        try:
-                            day = int(parts[0])
-                            reading = parts[1].strip()
-                            if reading:
-                                days_data.append({
-                                    'plan_id': plan['id'],
-                                    'day': day,
-                                    'reading_text': reading
-                                })
-                        except ValueError:
-                            continue
-
-            if not days_data:
-                print(f"⚠️ Нет данных в файле {plan['file']}")
-                continue
-
-            print(f"📅 Найдено дней: {len(days_data)}")
-
-            # 1. Создаем план
-            plan_data = {
-                'plan_id': plan['id'],
-                'title': plan['title'],
-                'description': plan['description'],
-                'total_days': len(days_data)
-            }
-
+            # План и его дни пишутся пачками upsert, лишние старые дни удаляются
             try:
-                result = manager.client.table(
-                    'reading_plans').upsert(plan_data).execute()
-                print(f"✅ План создан/обновлен")
+                result = await import_reading_plan(
+                    importer, plan['file'], plan['id'],
+                    title=plan['title'], description=plan['description'])
+                print(f"✅ Дней: {result.written} записано, {result.skipped} строк пропущено")
             except Exception as e:
-                print(f"❌ Ошибка создания плана: {e}")
+                print(f"❌ Ошибка импорта плана: {e}")
                 continue
 
-            # 2. Удаляем старые дни
-            try:
-                manager.client.table('reading_plan_days').delete().eq(
-                    'plan_id', plan['id']).execute()
-                print(f"🧹 Старые дни удалены")
-            except Exception as e:
-                print(f"⚠️ Ошибка удаления: {e}")
-
-            # 3. Добавляем дни батчами
-            batch_size = 100
-            for i in range(0, len(days_data), batch_size):
-                batch = days_data[i:i + batch_size]
-                try:
-                    result = manager.client.table(
-                        'reading_plan_days').insert(batch).execute()
-                    print(f"✅ Добавлено дней: {len(batch)}")
-                except Exception as e:
-                    print(f"❌ Ошибка добавления дней: {e}")
-
             print(f"🎉 План '{plan['title']}' импортирован!")
 
         # Показываем итоги
@@ -5,12 +5,13 @@
 Использует исправленный CSV файл с темами
 """
 
-import csv
 import asyncio
 import os
 from pathlib import Path
 from supabase import create_client, Client
 
+from database.bulk_import import BulkImporter, SupabaseBulkWriter, import_topics
+
 
 async def import_topics_to_supabase():
     """Импортирует темы в Supabase"""
@@ -37,64 +38,15 @@ async def import_topics_to_supabase():
             print("Сначала запустите fix_bible_names_topics.py")
             return False
 
-        # Очищаем существующие данные (опционально)
-        print("🧹 Очищаем существующие темы...")
-        try:
-            supabase.table('bible_topics').delete().neq('id', 0).execute()
-            print("✅ Существующие темы удалены")
-        except Exception as e:
-            print(f"ℹ️ Предупреждение при очистке: {e}")
-
-        # Читаем и импортируем темы
-        topics_imported = 0
-        topics_failed = 0
-
-        with open(input_file, 'r', encoding='utf-8') as file:
-            reader = csv.reader(file)
-
-            # Пропускаем заголовок
-            header = next(reader, None)
-            if header:
-                print(f"📋 Заголовок: {header}")
-
-            for row_num, row in enumerate(reader, start=2):
-                if len(row) >= 2:
-                    topic_name = row[0].strip()
-                    verses = row[1].strip()
-
-                    if topic_name and verses:
-                        try:
-                            # Вставляем тему в Supabase
-                            data = {
-                                'topic_name': topic_name,
-                                'verses': verses
-                            }
-
-                            result = supabase.table(
-                                'bible_topics').insert(data).execute()
-
-                            if result.data:
-                                topics_imported += 1
-                                print(
-                                    f"✅ Строка {row_num}: '{topic_name}' - импортирована")
-                            else:
-                                topics_failed += 1
-                                print(
-                                    f"❌ Строка {row_num}: '{topic_name}' - ошибка импорта")
-
-                        except Exception as e:
-                            topics_failed += 1
-                            print(
-                                f"❌ Строка {row_num}: '{topic_name}' - ошибка: {e}")
-                    else:
-                        print(f"⚠️ Строка {row_num}: пустые данные, пропущена")
-                else:
-                    print(
-                        f"⚠️ Строка {row_num}: неправильный формат, пропущена")
+        # Темы пишутся пачками upsert по topic_name - повторный запуск не дублирует их
+        importer = BulkImporter(SupabaseBulkWriter(supabase))
+        result = await import_topics(importer, input_file)
+        topics_imported = result.read - result.skipped
+        topics_failed = result.skipped
 
         print(f"\n📊 РЕЗУЛЬТАТ ИМПОРТА:")
         print(f"✅ Успешно импортировано: {topics_imported}")
-        print(f"❌ Ошибок: {topics_failed}")
+        print(f"❌ Пропущено строк: {topics_failed}")
         print(f"📝 Всего обработано: {topics_imported + topics_failed}")
 
         # Проверяем результат
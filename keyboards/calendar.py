@@ -2,11 +2,54 @@
 Клавиатуры для православного календаря
 """
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from config.settings import ADMIN_USER_ID
 
 
+def scripture_reading_buttons(scripture_references: List[Dict]) -> List[Tuple[str, str]]:
+    """
+    Текст и callback_data кнопок чтений дня (части сложного чтения - одна кнопка)
+
+    Args:
+        scripture_references: Список ссылок на Евангельские чтения
+    """
+    # Группируем ссылки по full_text (исходному чтению) для обработки сложных ссылок
+    grouped_refs = {}
+    for ref in scripture_references:
+        full_text = ref.get('full_text', ref['display_text'])
+        if full_text not in grouped_refs:
+            grouped_refs[full_text] = []
+        grouped_refs[full_text].append(ref)
+
+    buttons = []
+    for full_text, refs in grouped_refs.items():
+        if len(refs) > 1:
+            # Сложное чтение с несколькими частями: одна кнопка с callback для всех частей
+            ref_parts = [
+                f"{ref['book_id']}_{ref['chapter']}_{ref['verse_start']}_{ref['verse_end']}"
+                for ref in refs]
+
+            # Создаем краткое отображение для сложного чтения
+            first_ref = refs[0]
+            if len(refs) == 2 and refs[1]['chapter'] == first_ref['chapter'] + 1:
+                # Межглавный переход: показываем как "Книга гл1:стих-гл2:стих"
+                second_ref = refs[1]
+                button_text = f"📖 {first_ref['book_name']} {first_ref['chapter']}:{first_ref['verse_start']}-{second_ref['chapter']}:{second_ref['verse_end']}"
+            else:
+                # Обычное сложное чтение
+                button_text = f"📖 {first_ref['display_text']}..."
+            # Ограничиваем длину callback_data до 64 байт, как требует Telegram
+            raw_data = f"scripture_read_complex_{'|'.join(ref_parts)}"
+            buttons.append((button_text, raw_data[:64]))
+        else:
+            # Простое чтение с одной частью
+            ref = refs[0]
+            raw_simple = f"scripture_read_{ref['book_id']}_{ref['chapter']}_{ref['verse_start']}_{ref['verse_end']}"
+            buttons.append((f"📖 {ref['display_text']}", raw_simple[:64]))
+    return buttons
+
+
 def create_calendar_keyboard(current_date: datetime = None,
                              scripture_references: List[Dict] = None,
                              show_settings: bool = True,
@@ -58,57 +101,10 @@ def create_calendar_keyboard(current_date: datetime = None,
 
     # Кнопки для Евангельских чтений
     if scripture_references:
-        reading_buttons = []
-
-        # Группируем ссылки по full_text (исходному чтению) для обработки сложных ссылок
-        grouped_refs = {}
-        for ref in scripture_references:
-            full_text = ref.get('full_text', ref['display_text'])
-            if full_text not in grouped_refs:
-                grouped_refs[full_text] = []
-            grouped_refs[full_text].append(ref)
-
-        # Создаем кнопки для каждой группы
-        for full_text, refs in grouped_refs.items():
-            if len(refs) > 1:
-                # Сложное чтение с несколькими частями
-                # Создаем одну кнопку с callback для всех частей
-                ref_parts = []
-                for ref in refs:
-                    ref_parts.append(
-                        f"{ref['book_id']}_{ref['chapter']}_{ref['verse_start']}_{ref['verse_end']}")
-
-                # Создаем краткое отображение для сложного чтения
-                first_ref = refs[0]
-                if len(refs) == 2 and refs[1]['chapter'] == first_ref['chapter'] + 1:
-                    # Межглавный переход: показываем как "Книга гл1:стих-гл2:стих"
-                    second_ref = refs[1]
-                    button_text = f"📖 {first_ref['book_name']} {first_ref['chapter']}:{first_ref['verse_start']}-{second_ref['chapter']}:{second_ref['verse_end']}"
-                else:
-                    # Обычное сложное чтение
-                    button_text = f"📖 {first_ref['display_text']}..."
-                # Ограничиваем длину callback_data до 64 байт, как требует Telegram
-                raw_data = f"scripture_read_complex_{'|'.join(ref_parts)}"
-                callback_data = raw_data[:64]
-
-                reading_buttons.append(
-                    InlineKeyboardButton(
-                        text=button_text,
-                        callback_data=callback_data
-                    )
-                )
-            else:
-                # Простое чтение с одной частью
-                ref = refs[0]
-                # Простое чтение: формируем и уменьшаем при необходимости
-                raw_simple = f"scripture_read_{ref['book_id']}_{ref['chapter']}_{ref['verse_start']}_{ref['verse_end']}"
-                simple_cb = raw_simple[:64]
-                reading_buttons.append(
-                    InlineKeyboardButton(
-                        text=f"📖 {ref['display_text']}",
-                        callback_data=simple_cb
-                    )
-                )
+        reading_buttons = [
+            InlineKeyboardButton(text=text, callback_data=callback_data)
+            for text, callback_data in scripture_reading_buttons(scripture_references)
+        ]
 
         # Добавляем кнопки, разделяя на строки если больше 3
         if reading_buttons:
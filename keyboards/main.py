@@ -28,7 +28,7 @@ async def get_main_keyboard() -> ReplyKeyboardMarkup:
 
     # Добавляем кнопку календаря если функция включена
     try:
-        calendar_enabled = await ai_settings_manager.is_calendar_enabled()
+        calendar_enabled = (await ai_settings_manager.get_snapshot()).calendar_enabled
         if calendar_enabled:
             buttons.append([
                 KeyboardButton(text="📅 Православный календарь"),
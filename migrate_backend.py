@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Перенос всех данных бота из одного бэкенда в другой (SQLite, PostgreSQL, Supabase).
+
+    python migrate_backend.py sqlite postgres
+    python migrate_backend.py postgres supabase --workers 6 --chunk-size 2000
+    python migrate_backend.py sqlite postgres --tables users bookmarks
+
+Таблицы переносятся порциями (память не зависит от размера таблиц), после
+каждой таблицы число строк и контрольная сумма сверяются с приемником.
+Прерванную миграцию достаточно запустить той же командой - она продолжится
+с сохраненной позиции (файл состояния data/migration_<источник>_<приемник>.json).
+Параметры подключения берутся из тех же переменных окружения, что и у бота.
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+
+from dotenv import load_dotenv
+
+from database.backend_migration import (
+    DEFAULT_CHUNK_SIZE, MIGRATION_TABLES, BackendMigration, create_manager)
+
+# Загружаем переменные окружения
+load_dotenv()
+
+# Настройка логирования
+logging.basicConfig(level=logging.INFO, format='%(asctime)s %(message)s')
+logger = logging.getLogger(__name__)
+
+BACKENDS = ['sqlite', 'postgres', 'supabase']
+
+
+async def migrate(args) -> bool:
+    """Выполняет миграцию по аргументам командной строки"""
+    state_path = args.state or f"data/migration_{args.source}_{args.target}.json"
+    if args.restart and os.path.exists(state_path):
+        os.remove(state_path)
+
+    source = create_manager(args.source, args.source_sqlite)
+    target = create_manager(args.target, args.target_sqlite)
+    # SQLite инициализируется в конструкторе
+    for manager in (source, target):
+        if hasattr(manager, 'initialize'):
+            await manager.initialize()
+    try:
+        migration = BackendMigration(
+            source, target, state_path=state_path, chunk_size=args.chunk_size,
+            workers=args.workers, tables=args.tables, verify=not args.no_verify)
+        logger.info(f"🚀 Миграция {args.source} → {args.target}: {len(migration.tables)} таблиц, "
+                    f"порции по {args.chunk_size}, параллельно {args.workers}")
+        success = await migration.run()
+
+        logger.info("📊 Итоги:")
+        for result in migration.results:
+            logger.info(f"   • {result}")
+        if success:
+            logger.info("✅ Миграция завершена")
+        else:
+            logger.error(f"❌ Миграция завершена с ошибками, повторный запуск продолжит с {state_path}")
+        return success
+    finally:
+        for manager in (source, target):
+            await manager.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Миграция данных между бэкендами")
+    parser.add_argument('source', choices=BACKENDS, help="откуда")
+    parser.add_argument('target', choices=BACKENDS, help="куда")
+    parser.add_argument('--tables', nargs='+', choices=[t.name for t in MIGRATION_TABLES],
+                        help="только эти таблицы")
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help="строк в порции")
+    parser.add_argument('--workers', type=int, default=4, help="таблиц параллельно")
+    parser.add_argument('--source-sqlite', help="файл SQLite источника")
+    parser.add_argument('--target-sqlite', help="файл SQLite приемника")
+    parser.add_argument('--state', help="файл состояния миграции")
+    parser.add_argument('--restart', action='store_true', help="начать заново, забыв сохраненную позицию")
+    parser.add_argument('--no-verify', action='store_true', help="не сверять таблицы после переноса")
+    args = parser.parse_args()
+
+    if args.source == args.target and args.source != 'sqlite':
+        parser.error("источник и приемник совпадают")
+
+    sys.exit(0 if asyncio.run(migrate(args)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -76,16 +76,13 @@ def migrate_sqlite_bookmarks():
         # Переносим данные из старой таблицы в новую
         if old_data:
             print("📦 Перенос данных...")
-            for row in old_data:
-                # Старая структура: id, user_id, book_id, chapter, display_text, comment, created_at
-                old_id, user_id, book_id, chapter, display_text, comment, created_at = row
-                
-                # Новая структура: добавляем chapter_start = chapter, остальные поля NULL
-                cursor.execute('''
-                    INSERT INTO bookmarks_new 
-                    (id, user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, display_text, note, created_at)
-                    VALUES (?, ?, ?, ?, NULL, NULL, NULL, ?, ?, ?)
-                ''', (old_id, user_id, book_id, chapter, display_text, comment, created_at))
+            # Старая структура: id, user_id, book_id, chapter, display_text, comment, created_at
+            # Новая структура: добавляем chapter_start = chapter, остальные поля NULL
+            cursor.executemany('''
+                INSERT INTO bookmarks_new 
+                (id, user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, display_text, note, created_at)
+                VALUES (?, ?, ?, ?, NULL, NULL, NULL, ?, ?, ?)
+            ''', old_data)
             
             print(f"✅ Перенесено {len(old_data)} закладок")
         
@@ -85,13 +85,14 @@ class AIQuotaManager:
         """Сбрасывает дневные квоты (очищает старые записи)"""
         try:
             today = datetime.utcnow().strftime('%Y-%m-%d')
-            yesterday = (datetime.utcnow() - timedelta(days=1)
-                         ).strftime('%Y-%m-%d')
 
             logger.info(f"🔄 Сброс квот ИИ на {today}")
 
-            # Здесь можно добавить логику очистки старых записей
-            # Пока что просто логируем событие
+            # Квоты считаются по дате, поэтому новый день начинается с нуля;
+            # старые счетчики сворачиваются в агрегаты при обслуживании БД
+            from services.maintenance import maintenance_manager
+            await maintenance_manager.run()
+
             logger.info(f"✅ Квоты сброшены на {today}")
 
             self.last_reset_date = today
@@ -114,7 +115,7 @@ class AIQuotaManager:
             else:
                 # Получаем динамический лимит из настроек
                 from services.ai_settings_manager import ai_settings_manager
-                daily_limit = await ai_settings_manager.get_daily_limit()
+                daily_limit = (await ai_settings_manager.get_snapshot()).daily_limit
 
             # Вычисляем оставшиеся обычные запросы
             remaining = max(0, daily_limit - used_today)
@@ -185,13 +186,13 @@ class AIQuotaManager:
             from services.ai_settings_manager import ai_settings_manager
 
             premium_available = await premium_manager.get_user_premium_requests(user_id)
-            free_premium_users = await ai_settings_manager.get_free_premium_users()
-            is_free_premium_user = user_id in free_premium_users
+            settings = await ai_settings_manager.get_snapshot()
+            is_free_premium_user = user_id in settings.free_premium_users
 
             # Проверяем админский режим
             is_admin_premium_mode = False
             if user_id == ADMIN_USER_ID:
-                is_admin_premium_mode = await ai_settings_manager.get_admin_premium_mode()
+                is_admin_premium_mode = settings.admin_premium_mode
 
             # Если есть премиум запросы, бесплатный премиум доступ или админ в премиум режиме - используем премиум ИИ
             if premium_available > 0 or is_free_premium_user or is_admin_premium_mode:
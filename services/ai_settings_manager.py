@@ -1,54 +1,224 @@
 """
 Менеджер динамических настроек ИИ
+
+Все настройки хранятся в одном неизменяемом снимке (AISettingsSnapshot),
+который загружается одним запросом и подменяется целиком при изменениях.
+Горячие пути читают ai_settings_manager.snapshot без await.
+
+Межпроцессная инвалидация: при каждом изменении в таблицу ai_settings
+пишется строка settings_version. Фоновая задача в каждом процессе (бот,
+FastAPI backend) опрашивает эту строку и перечитывает снимок, если версия
+изменилась.
 """
+import asyncio
+import json
 import logging
-from typing import Optional, Dict, Any, Union
+import os
+import time
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Optional, Dict, Any, FrozenSet, Iterable, Mapping
+
+from config.ai_settings import AI_DAILY_LIMIT, PREMIUM_AI_PACKAGE_PRICE, PREMIUM_AI_PACKAGE_REQUESTS
 from database.universal_manager import universal_db_manager
 
 logger = logging.getLogger(__name__)
 
+# Служебная строка в ai_settings, значение меняется при каждом изменении настроек
+SETTINGS_VERSION_KEY = 'settings_version'
+
+# Интервал опроса версии настроек (секунды)
+SETTINGS_POLL_INTERVAL = float(os.getenv('AI_SETTINGS_POLL_INTERVAL', '1.0'))
+
+# Настройки календаря по умолчанию
+DEFAULT_CALENDAR_SETTINGS = {
+    'header': True,
+    'lives': 4,      # 4 = основные святые в одном параграфе
+    'tropars': 0,    # 0 = тропари отключены, 1 = с заголовком, 2 = без заголовка
+    'scripture': 1,  # 0 = чтения отключены, 1 = с заголовком, 2 = без заголовка
+    'date_format': True
+}
+
+
+def _convert_value(str_value: str, setting_type: str) -> Any:
+    """Конвертировать строковое значение в нужный тип"""
+    try:
+        if setting_type == 'integer':
+            return int(str_value)
+        elif setting_type == 'float':
+            return float(str_value)
+        elif setting_type == 'boolean':
+            return str(str_value).lower() in ('true', '1', 'yes', 'on')
+        else:  # string
+            return str_value
+    except (ValueError, TypeError):
+        logger.warning(
+            f"Не удалось конвертировать значение '{str_value}' в тип '{setting_type}'")
+        return str_value
+
+
+def _parse_free_premium_users(value: Any) -> FrozenSet[int]:
+    """Разбирает JSON список пользователей с бесплатным премиум доступом"""
+    try:
+        return frozenset(json.loads(value))
+    except (json.JSONDecodeError, TypeError):
+        logger.warning(
+            "Ошибка парсинга списка бесплатных премиум пользователей")
+        return frozenset()
+
+
+def _as_bool(value: Any) -> bool:
+    return value if isinstance(value, bool) else (str(value).lower() == 'true')
+
+
+def _as_int(value: Any, default: int) -> int:
+    if isinstance(value, int) and not isinstance(value, bool):
+        return value
+    return int(value) if isinstance(value, str) and value.isdigit() else default
+
+
+@dataclass(frozen=True)
+class AISettingsSnapshot:
+    """Неизменяемый снимок всех настроек ИИ"""
+    entries: Mapping[str, Mapping[str, Any]]  # ключ -> {value, type, description}
+    version: Optional[str] = None
+    loaded_at: float = 0.0
+    daily_limit: int = AI_DAILY_LIMIT
+    premium_price: int = PREMIUM_AI_PACKAGE_PRICE
+    premium_requests: int = PREMIUM_AI_PACKAGE_REQUESTS
+    admin_premium_mode: bool = True
+    free_premium_users: FrozenSet[int] = frozenset()
+    calendar_enabled: bool = True
+    calendar_defaults: Mapping[str, Any] = field(
+        default_factory=lambda: MappingProxyType(dict(DEFAULT_CALENDAR_SETTINGS)))
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Dict[str, Any]]) -> 'AISettingsSnapshot':
+        """Строит снимок из строк таблицы ai_settings"""
+        entries = {}
+        version = None
+        for row in rows:
+            key = row['setting_key']
+            if key == SETTINGS_VERSION_KEY:
+                version = row['setting_value']
+                continue
+            entries[key] = MappingProxyType({
+                'value': _convert_value(row['setting_value'], row['setting_type']),
+                'type': row['setting_type'],
+                'description': row.get('description')
+            })
+
+        def value(key: str, default: Any = None) -> Any:
+            return entries[key]['value'] if key in entries else default
+
+        calendar_defaults = {
+            'header': _as_bool(value('calendar_default_header', True)),
+            'lives': _as_int(value('calendar_default_lives', 4), 4),
+            'tropars': _as_int(value('calendar_default_tropars', 0), 0),
+            'scripture': _as_int(value('calendar_default_scripture', 1), 1),
+            'date_format': _as_bool(value('calendar_default_date_format', True))
+        }
+
+        return cls(
+            entries=MappingProxyType(entries),
+            version=version,
+            loaded_at=time.time(),
+            daily_limit=value('ai_daily_limit', AI_DAILY_LIMIT),
+            premium_price=value('premium_package_price', PREMIUM_AI_PACKAGE_PRICE),
+            premium_requests=value(
+                'premium_package_requests', PREMIUM_AI_PACKAGE_REQUESTS),
+            admin_premium_mode=value('admin_premium_mode', True),
+            free_premium_users=_parse_free_premium_users(
+                value('free_premium_users', '[]')),
+            calendar_enabled=value('calendar_enabled', True),
+            calendar_defaults=MappingProxyType(calendar_defaults)
+        )
+
+    def get(self, key: str, default_value: Any = None) -> Any:
+        """Значение настройки по ключу"""
+        entry = self.entries.get(key)
+        return entry['value'] if entry is not None else default_value
+
 
 class AISettingsManager:
     """Менеджер динамических настроек ИИ"""
 
     def __init__(self):
         self.db = universal_db_manager
-        self._cache = {}  # Кэш настроек
-        self._cache_ttl = 300  # TTL кэша в секундах (5 минут)
-        self._cache_timestamps = {}  # Временные метки для TTL
+        self._snapshot = AISettingsSnapshot(entries=MappingProxyType({}))
+        self._loaded = False
+        self._reload_lock = asyncio.Lock()
+        self._watch_task: Optional[asyncio.Task] = None
+
+    @property
+    def snapshot(self) -> AISettingsSnapshot:
+        """Текущий снимок настроек (без обращения к БД)"""
+        return self._snapshot
+
+    async def refresh(self) -> AISettingsSnapshot:
+        """Перечитывает все настройки одним запросом и подменяет снимок"""
+        async with self._reload_lock:
+            try:
+                rows = await self.db.get_all_ai_settings()
+                self._snapshot = AISettingsSnapshot.from_rows(rows or [])
+                self._loaded = True
+                logger.debug(
+                    f"Снимок настроек ИИ обновлен (версия {self._snapshot.version})")
+            except Exception as e:
+                logger.error(f"Ошибка загрузки настроек ИИ: {e}")
+            return self._snapshot
+
+    async def get_snapshot(self) -> AISettingsSnapshot:
+        """Текущий снимок настроек (загружается при первом обращении)"""
+        if not self._loaded:
+            await self.refresh()
+        return self._snapshot
+
+    async def start_watcher(self, interval: float = SETTINGS_POLL_INTERVAL):
+        """Загружает снимок и запускает отслеживание версии настроек"""
+        await self.refresh()
+        if self._watch_task is None or self._watch_task.done():
+            self._watch_task = asyncio.create_task(self._watch_loop(interval))
+            logger.info(
+                f"🔄 Отслеживание настроек ИИ запущено (интервал {interval}с)")
+
+    async def stop_watcher(self):
+        """Останавливает отслеживание версии настроек"""
+        if self._watch_task:
+            self._watch_task.cancel()
+            try:
+                await self._watch_task
+            except asyncio.CancelledError:
+                pass
+            self._watch_task = None
+            logger.info("⏹️ Отслеживание настроек ИИ остановлено")
+
+    async def _watch_loop(self, interval: float):
+        """Опрашивает строку версии и перечитывает снимок при изменении"""
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                row = await self.db.get_ai_setting(SETTINGS_VERSION_KEY)
+                version = row['setting_value'] if row else None
+                if version != self._snapshot.version:
+                    logger.info(
+                        f"Настройки ИИ изменены в другом процессе (версия {version})")
+                    await self.refresh()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка проверки версии настроек ИИ: {e}")
+
+    async def _bump_version(self) -> None:
+        """Помечает настройки как измененные для всех процессов"""
+        await self.db.set_ai_setting(
+            SETTINGS_VERSION_KEY, str(time.time_ns()), 'string',
+            'Версия настроек ИИ (меняется при каждом изменении)')
 
     async def get_setting(self, key: str, default_value: Any = None) -> Any:
-        """Получить значение настройки с кэшированием"""
-        try:
-            import time
-            current_time = time.time()
-
-            # Проверяем кэш с TTL
-            if key in self._cache and key in self._cache_timestamps:
-                if current_time - self._cache_timestamps[key] < self._cache_ttl:
-                    return self._cache[key]
-                else:
-                    # Кэш устарел, удаляем
-                    del self._cache[key]
-                    del self._cache_timestamps[key]
-
-            # Получаем из базы данных
-            query = "SELECT setting_value, setting_type FROM ai_settings WHERE setting_key = ?"
-            result = await self.db.fetch_one(query, (key,))
-
-            if result:
-                value = self._convert_value(
-                    result['setting_value'], result['setting_type'])
-                self._cache[key] = value
-                self._cache_timestamps[key] = current_time
-                return value
-            else:
-                # Если настройка не найдена, возвращаем значение по умолчанию
-                return default_value
-
-        except Exception as e:
-            logger.error(f"Ошибка получения настройки {key}: {e}")
-            return default_value
+        """Получить значение настройки из снимка"""
+        snapshot = await self.get_snapshot()
+        return snapshot.get(key, default_value)
 
     async def set_setting(self, key: str, value: Any, setting_type: str = None, description: str = None) -> bool:
         """Установить значение настройки"""
@@ -57,32 +227,19 @@ class AISettingsManager:
             if setting_type is None:
                 setting_type = self._get_type_name(value)
 
+            if description is None:
+                entry = self._snapshot.entries.get(key)
+                description = entry['description'] if entry else None
+
             # Конвертируем значение в строку для хранения
             str_value = str(value)
 
-            # Проверяем, существует ли настройка
-            existing = await self.db.fetch_one("SELECT setting_key FROM ai_settings WHERE setting_key = ?", (key,))
-
-            if existing:
-                # Обновляем существующую настройку
-                query = """
-                    UPDATE ai_settings 
-                    SET setting_value = ?, setting_type = ?, description = COALESCE(?, description), updated_at = datetime('now')
-                    WHERE setting_key = ?
-                """
-                await self.db.execute(query, (str_value, setting_type, description, key))
-            else:
-                # Вставляем новую настройку
-                query = """
-                    INSERT INTO ai_settings (setting_key, setting_value, setting_type, description)
-                    VALUES (?, ?, ?, ?)
-                """
-                await self.db.execute(query, (key, str_value, setting_type, description))
-
-            # Обновляем кэш
-            import time
-            self._cache[key] = value
-            self._cache_timestamps[key] = time.time()
+            if not await self.db.set_ai_setting(key, str_value, setting_type, description):
+                logger.error(f"Не удалось сохранить настройку {key}")
+                return False
+
+            await self._bump_version()
+            await self.refresh()
 
             logger.info(f"Настройка {key} обновлена: {value}")
             return True
@@ -93,35 +250,12 @@ class AISettingsManager:
 
     async def get_all_settings(self) -> Dict[str, Any]:
         """Получить все настройки"""
-        try:
-            query = "SELECT setting_key, setting_value, setting_type, description FROM ai_settings ORDER BY setting_key"
-            results = await self.db.fetch_all(query)
-
-            settings = {}
-            for row in results:
-                key = row['setting_key']
-                value = self._convert_value(
-                    row['setting_value'], row['setting_type'])
-                settings[key] = {
-                    'value': value,
-                    'type': row['setting_type'],
-                    'description': row['description']
-                }
-                # Обновляем кэш
-                self._cache[key] = value
-
-            return settings
-
-        except Exception as e:
-            logger.error(f"Ошибка получения всех настроек: {e}")
-            return {}
+        snapshot = await self.refresh()
+        return {key: dict(entry) for key, entry in sorted(snapshot.entries.items())}
 
     async def reset_to_defaults(self) -> bool:
         """Сбросить настройки к значениям по умолчанию"""
         try:
-            # Импортируем значения по умолчанию из ai_settings.py
-            from config.ai_settings import AI_DAILY_LIMIT, PREMIUM_AI_PACKAGE_PRICE, PREMIUM_AI_PACKAGE_REQUESTS
-
             defaults = {
                 'ai_daily_limit': AI_DAILY_LIMIT,
                 'premium_package_price': PREMIUM_AI_PACKAGE_PRICE,
@@ -141,26 +275,13 @@ class AISettingsManager:
             return False
 
     def clear_cache(self):
-        """Очистить кэш настроек"""
-        self._cache.clear()
-        self._cache_timestamps.clear()
+        """Сбросить снимок: при следующем обращении он будет перечитан"""
+        self._loaded = False
         logger.info("Кэш настроек ИИ очищен")
 
     def _convert_value(self, str_value: str, setting_type: str) -> Any:
         """Конвертировать строковое значение в нужный тип"""
-        try:
-            if setting_type == 'integer':
-                return int(str_value)
-            elif setting_type == 'float':
-                return float(str_value)
-            elif setting_type == 'boolean':
-                return str_value.lower() in ('true', '1', 'yes', 'on')
-            else:  # string
-                return str_value
-        except (ValueError, TypeError):
-            logger.warning(
-                f"Не удалось конвертировать значение '{str_value}' в тип '{setting_type}'")
-            return str_value
+        return _convert_value(str_value, setting_type)
 
     def _get_type_name(self, value: Any) -> str:
         """Определить тип значения"""
@@ -176,22 +297,19 @@ class AISettingsManager:
     # Удобные методы для часто используемых настроек
     async def get_daily_limit(self) -> int:
         """Получить дневной лимит ИИ"""
-        from config.ai_settings import AI_DAILY_LIMIT
-        return await self.get_setting('ai_daily_limit', AI_DAILY_LIMIT)
+        return (await self.get_snapshot()).daily_limit
 
     async def get_premium_price(self) -> int:
         """Получить цену премиум пакета"""
-        from config.ai_settings import PREMIUM_AI_PACKAGE_PRICE
-        return await self.get_setting('premium_package_price', PREMIUM_AI_PACKAGE_PRICE)
+        return (await self.get_snapshot()).premium_price
 
     async def get_premium_requests(self) -> int:
         """Получить количество запросов в премиум пакете"""
-        from config.ai_settings import PREMIUM_AI_PACKAGE_REQUESTS
-        return await self.get_setting('premium_package_requests', PREMIUM_AI_PACKAGE_REQUESTS)
+        return (await self.get_snapshot()).premium_requests
 
     async def get_admin_premium_mode(self) -> bool:
         """Получить режим премиум ИИ для админа"""
-        return await self.get_setting('admin_premium_mode', True)
+        return (await self.get_snapshot()).admin_premium_mode
 
     async def set_admin_premium_mode(self, enabled: bool) -> bool:
         """Установить режим премиум ИИ для админа"""
@@ -199,19 +317,10 @@ class AISettingsManager:
 
     async def get_free_premium_users(self) -> set:
         """Получить список пользователей с бесплатным премиум доступом"""
-        import json
-        try:
-            users_json = await self.get_setting('free_premium_users', '[]')
-            users_list = json.loads(users_json)
-            return set(users_list)
-        except (json.JSONDecodeError, TypeError):
-            logger.warning(
-                "Ошибка парсинга списка бесплатных премиум пользователей")
-            return set()
+        return set((await self.get_snapshot()).free_premium_users)
 
     async def set_free_premium_users(self, users: set) -> bool:
         """Установить список пользователей с бесплатным премиум доступом"""
-        import json
         try:
             users_list = list(users)
             users_json = json.dumps(users_list)
@@ -236,7 +345,7 @@ class AISettingsManager:
 
     async def is_calendar_enabled(self) -> bool:
         """Проверить, включена ли функция календаря"""
-        return await self.get_setting('calendar_enabled', True)
+        return (await self.get_snapshot()).calendar_enabled
 
     async def set_calendar_enabled(self, enabled: bool) -> bool:
         """Включить/выключить функцию календаря"""
@@ -244,23 +353,7 @@ class AISettingsManager:
 
     async def get_calendar_default_settings(self) -> dict:
         """Получить настройки календаря по умолчанию"""
-        # Получаем настройки из БД
-        header = await self.get_setting('calendar_default_header', True)
-        lives = await self.get_setting('calendar_default_lives', 4)
-        tropars = await self.get_setting('calendar_default_tropars', 0)
-        scripture = await self.get_setting('calendar_default_scripture', 1)
-        date_format = await self.get_setting('calendar_default_date_format', True)
-
-        return {
-            'header': header if isinstance(header, bool) else (header == 'true'),
-            # 4 = основные святые в одном параграфе
-            'lives': int(lives) if isinstance(lives, (int, str)) and str(lives).isdigit() else 4,
-            # 0 = тропари отключены, 1 = с заголовком, 2 = без заголовка
-            'tropars': int(tropars) if isinstance(tropars, (int, str)) and str(tropars).isdigit() else 0,
-            # 0 = чтения отключены, 1 = с заголовком, 2 = без заголовка
-            'scripture': int(scripture) if isinstance(scripture, (int, str)) and str(scripture).isdigit() else 1,
-            'date_format': date_format if isinstance(date_format, bool) else (date_format == 'true')
-        }
+        return dict((await self.get_snapshot()).calendar_defaults)
 
     async def set_calendar_default_setting(self, setting_name: str, value) -> bool:
         """Установить настройку календаря по умолчанию"""
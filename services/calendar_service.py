@@ -0,0 +1,291 @@
+"""
+Кэш разобранных дней православного календаря с фоновой загрузкой.
+
+Страница календаря загружается с holytrinityorthodox.com и разбирается
+(parse_calendar_content) один раз на день и профиль настроек отображения.
+Когда сайт недоступен, дату, праздники и чтения дня дает пасхалия
+(utils/paschalion.py); такой день при следующем просмотре снова
+запрашивается с сайта.
+Разобранные дни хранятся в LRU в памяти и сохраняются на диск
+(CALENDAR_CACHE_FILE), поэтому переживают перезапуск бота.
+
+Фоновая задача держит в кэше сегодняшний день и CALENDAR_PREFETCH_DAYS дней
+в каждую сторону, а при просмотре дня в фоне загружаются соседние - показ
+календаря и переход на предыдущий/следующий день не ждут сайт. Устаревший
+день (старше CALENDAR_CACHE_TTL_SECONDS) показывается из кэша и
+перезагружается в фоне.
+
+Для загруженных дней в фоне готовятся тексты чтений
+(services/scripture_bundles.py), кнопки чтений их только показывают.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from datetime import date as date_type, datetime, timedelta
+from typing import Any, Dict, Optional, Set, Tuple
+
+from config.settings import (
+    CALENDAR_CACHE_FILE,
+    CALENDAR_CACHE_MAX_ENTRIES,
+    CALENDAR_CACHE_TTL_SECONDS,
+    CALENDAR_PREFETCH_DAYS,
+    CALENDAR_PREFETCH_INTERVAL,
+)
+from services.scripture_bundles import scripture_bundles
+from utils.orthodox_calendar import orthodox_calendar
+
+logger = logging.getLogger(__name__)
+
+# Одновременных запросов к сайту календаря при фоновой загрузке
+PREFETCH_CONCURRENCY = 3
+
+CacheKey = Tuple[str, str]
+
+
+def profile_key(settings: Dict = None) -> str:
+    """Ключ профиля настроек: параметры запроса без даты (стабилен между процессами)"""
+    params = orthodox_calendar.build_request_params(datetime(2000, 1, 1), settings)
+    return '&'.join(f"{name}={params[name]}" for name in sorted(params)
+                    if name not in ('month', 'today', 'year'))
+
+
+def _day(value) -> date_type:
+    return value.date() if isinstance(value, datetime) else value
+
+
+class CalendarService:
+    """Разобранные дни календаря: LRU в памяти, файл на диске и фоновая загрузка"""
+
+    def __init__(self, cache_file: str = CALENDAR_CACHE_FILE,
+                 max_entries: int = CALENDAR_CACHE_MAX_ENTRIES,
+                 ttl: float = CALENDAR_CACHE_TTL_SECONDS):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # (дата, профиль) -> (разобранный день, время загрузки time.time())
+        self._entries: "OrderedDict[CacheKey, Tuple[Dict[str, Any], float]]" = OrderedDict()
+        self._inflight: Dict[CacheKey, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+        self._prefetch_task: Optional[asyncio.Task] = None
+        self._dirty = False
+        self.hits = 0
+        self.misses = 0
+
+    # --- Кэш ---
+
+    def _put(self, key: CacheKey, data: Dict[str, Any], fetched_at: float):
+        self._entries[key] = (data, fetched_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        self._dirty = True
+
+    def _is_stale(self, key: CacheKey) -> bool:
+        entry = self._entries.get(key)
+        return entry is None or time.time() - entry[1] > self.ttl
+
+    async def _fetch(self, day: date_type, settings: Dict, key: CacheKey) -> Optional[Dict[str, Any]]:
+        """Загружает и разбирает день; одновременные запросы одного дня объединяются"""
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._load(day, settings, key))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отмена ожидающего просмотра не отменяет загрузку для остальных
+        return await asyncio.shield(task)
+
+    async def _load(self, day: date_type, settings: Dict, key: CacheKey) -> Optional[Dict[str, Any]]:
+        target = datetime(day.year, day.month, day.day)
+        html = await orthodox_calendar.get_calendar_data(target, settings)
+        if not html:
+            # Сайт недоступен: показываем дату и чтения по пасхалии (без чтений
+            # святым дня), при следующем просмотре день снова запросится с сайта
+            params = orthodox_calendar.build_request_params(target, settings)
+            data = orthodox_calendar.get_offline_content(target, params)
+            if data is not None:
+                self._put(key, data, 0)
+            return data
+        try:
+            # Разбор за один проход занимает доли миллисекунды (benchmark_calendar_parser.py),
+            # передача в поток стоит столько же, поэтому разбираем в цикле событий
+            data = orthodox_calendar.parse_calendar_content(html)
+        except Exception as e:
+            logger.error(f"Ошибка разбора календаря на {key[0]}: {e}")
+            return None
+        self._put(key, data, time.time())
+        return data
+
+    def _spawn(self, coro):
+        task = asyncio.create_task(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _prepare_readings(self, data: Optional[Dict[str, Any]]):
+        if not data:
+            return
+        try:
+            await scripture_bundles.precompute(data)
+        except Exception as e:
+            logger.error(f"Ошибка подготовки чтений календаря: {e}")
+
+    async def _refresh(self, day: date_type, settings: Dict, key: CacheKey):
+        try:
+            await self._prepare_readings(await self._fetch(day, settings, key))
+        except Exception as e:
+            logger.error(f"Ошибка фоновой загрузки календаря на {key[0]}: {e}")
+
+    def _prefetch_neighbours(self, day: date_type, settings: Dict, profile: str):
+        for delta in (-1, 1):
+            neighbour = day + timedelta(days=delta)
+            key = (neighbour.isoformat(), profile)
+            if key not in self._inflight and self._is_stale(key):
+                self._spawn(self._refresh(neighbour, settings, key))
+
+    async def get(self, day=None, settings: Dict = None) -> Optional[Dict[str, Any]]:
+        """
+        Разобранный день календаря (как parse_calendar_content) или None при ошибке.
+
+        Сайт запрашивается только если дня нет в кэше; соседние дни
+        загружаются в фоне.
+        """
+        day = _day(day or datetime.now())
+        profile = profile_key(settings)
+        key = (day.isoformat(), profile)
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            self._entries.move_to_end(key)
+            if self._is_stale(key) and key not in self._inflight:
+                self._spawn(self._refresh(day, settings, key))
+            data = entry[0]
+        else:
+            self.misses += 1
+            data = await self._fetch(day, settings, key)
+
+        # Тексты чтений готовятся, пока пользователь читает день
+        # (уже готовые только проверяются по ключу)
+        self._spawn(self._prepare_readings(data))
+        self._prefetch_neighbours(day, settings, profile)
+        return data
+
+    # --- Файл на диске ---
+
+    def _save_sync(self, entries: list):
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_file)), exist_ok=True)
+        tmp_path = self.cache_file + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, ensure_ascii=False)
+        os.replace(tmp_path, self.cache_file)
+
+    async def save(self):
+        """Сохраняет кэш на диск, если он изменился"""
+        if not self._dirty:
+            return
+        entries = [[day, profile, data, fetched_at]
+                   for (day, profile), (data, fetched_at) in self._entries.items()]
+        self._dirty = False
+        try:
+            await asyncio.to_thread(self._save_sync, entries)
+        except Exception as e:
+            self._dirty = True
+            logger.error(f"Ошибка сохранения кэша календаря: {e}")
+
+    def load(self) -> int:
+        """Загружает кэш с диска, возвращает число дней"""
+        if not os.path.exists(self.cache_file):
+            return 0
+        try:
+            with open(self.cache_file, encoding='utf-8') as f:
+                entries = json.load(f)
+            for day, profile, data, fetched_at in entries[-self.max_entries:]:
+                self._entries[(day, profile)] = (data, fetched_at)
+            logger.info(f"Кэш календаря загружен с диска: {len(self._entries)} дней")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки кэша календаря: {e}")
+        return len(self._entries)
+
+    # --- Фоновая загрузка ---
+
+    async def prefetch(self, settings: Dict = None, days: int = CALENDAR_PREFETCH_DAYS) -> int:
+        """Загружает недостающие и устаревшие дни вокруг сегодняшнего, возвращает число загруженных"""
+        today = datetime.now().date()
+        profile = profile_key(settings)
+        semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+
+        async def load_day(day: date_type) -> bool:
+            key = (day.isoformat(), profile)
+            loaded = False
+            if self._is_stale(key):
+                async with semaphore:
+                    loaded = await self._fetch(day, settings, key) is not None
+            # Дни из файла на диске тоже получают готовые тексты чтений
+            entry = self._entries.get(key)
+            if entry is not None:
+                await self._prepare_readings(entry[0])
+            return loaded
+
+        days_range = [today + timedelta(days=delta) for delta in range(-days, days + 1)]
+        # Сначала сегодня, затем ближайшие дни
+        days_range.sort(key=lambda day: abs((day - today).days))
+        results = await asyncio.gather(*(load_day(day) for day in days_range), return_exceptions=True)
+        loaded = sum(1 for result in results if result is True)
+        if loaded:
+            logger.info(f"Календарь: загружено дней вокруг {today.isoformat()}: {loaded}")
+        await self.save()
+        return loaded
+
+    async def _prefetch_loop(self, interval: float):
+        from services.ai_settings_manager import ai_settings_manager
+
+        while True:
+            try:
+                settings = await ai_settings_manager.get_calendar_default_settings()
+                await self.prefetch(settings)
+                await asyncio.sleep(interval)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка фоновой загрузки календаря: {e}")
+                await asyncio.sleep(interval)
+
+    async def start(self, interval: float = CALENDAR_PREFETCH_INTERVAL):
+        """Загружает кэш с диска и запускает фоновую загрузку дней"""
+        if not self._entries:
+            await asyncio.to_thread(self.load)
+        if self._prefetch_task is None or self._prefetch_task.done():
+            self._prefetch_task = asyncio.create_task(self._prefetch_loop(interval))
+            logger.info(
+                f"📅 Фоновая загрузка календаря запущена (±{CALENDAR_PREFETCH_DAYS} дней, интервал {interval}с)")
+
+    async def stop(self):
+        """Останавливает фоновую загрузку и сохраняет кэш"""
+        if self._prefetch_task:
+            self._prefetch_task.cancel()
+            try:
+                await self._prefetch_task
+            except asyncio.CancelledError:
+                pass
+            self._prefetch_task = None
+        for task in list(self._background):
+            task.cancel()
+        await self.save()
+        await orthodox_calendar.close()
+
+    def summary(self) -> Dict[str, Any]:
+        """Сводка по кэшу для админ-команд и метрик"""
+        return {
+            'days': len(self._entries),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+            'inflight': len(self._inflight),
+            'readings': scripture_bundles.summary(),
+        }
+
+
+# Глобальный сервис календаря
+calendar_service = CalendarService()
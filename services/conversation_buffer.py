@@ -0,0 +1,112 @@
+"""
+Кольцевой буфер последних сообщений активных бесед с ИИ-помощником.
+
+Сообщения бесед хранятся в БД (ai_messages), но на каждом ходе диалога
+модели нужны только последние CONVERSATION_BUFFER_SIZE реплик. Буфер держит
+их в памяти процесса: история читается из БД один раз при первом обращении
+к беседе, дальше новые сообщения дописываются и в БД, и в буфер, а старые
+вытесняются сами (deque с maxlen).
+
+Число бесед в памяти ограничено (вытесняются давно неактивные), беседа без
+сообщений дольше CONVERSATION_BUFFER_IDLE_SECONDS выгружается.
+"""
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from config.settings import (
+    CONVERSATION_BUFFER_IDLE_SECONDS,
+    CONVERSATION_BUFFER_MAX_CONVERSATIONS,
+    CONVERSATION_BUFFER_SIZE,
+)
+from database.universal_manager import universal_db_manager as db_manager
+
+logger = logging.getLogger(__name__)
+
+
+class ConversationBuffer:
+    """Последние сообщения активных бесед в памяти процесса"""
+
+    def __init__(self, size: int = CONVERSATION_BUFFER_SIZE,
+                 max_conversations: int = CONVERSATION_BUFFER_MAX_CONVERSATIONS,
+                 idle_seconds: float = CONVERSATION_BUFFER_IDLE_SECONDS):
+        self.db = db_manager
+        self.size = size
+        self.max_conversations = max_conversations
+        self.idle_seconds = idle_seconds
+        # id беседы -> (последние сообщения, время последнего обращения)
+        self._entries: "OrderedDict[str, Tuple[Deque[Dict[str, str]], float]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def _touch(self, conversation_id: str) -> Optional[Deque[Dict[str, str]]]:
+        """Сообщения беседы из буфера (None, если беседы нет или она выгружена)"""
+        entry = self._entries.get(conversation_id)
+        if entry is None:
+            return None
+        messages, last_used = entry
+        now = time.monotonic()
+        if now - last_used > self.idle_seconds:
+            del self._entries[conversation_id]
+            return None
+        self._entries[conversation_id] = (messages, now)
+        self._entries.move_to_end(conversation_id)
+        return messages
+
+    def _evict(self):
+        """Выгружает неактивные беседы и самые старые при переполнении"""
+        now = time.monotonic()
+        while self._entries:
+            oldest_id, (_, last_used) = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_conversations and now - last_used <= self.idle_seconds:
+                break
+            del self._entries[oldest_id]
+
+    async def history(self, conversation_id: str) -> List[Dict[str, str]]:
+        """Последние сообщения беседы (role, content) по возрастанию времени"""
+        messages = self._touch(conversation_id)
+        if messages is not None:
+            self.hits += 1
+            return list(messages)
+
+        self.misses += 1
+        rows = await self.db.list_messages(conversation_id, limit=self.size)
+        messages = deque(
+            ({'role': row.get('role', 'user'), 'content': row.get('content', '')} for row in rows),
+            maxlen=self.size)
+        self._entries[conversation_id] = (messages, time.monotonic())
+        self._entries.move_to_end(conversation_id)
+        self._evict()
+        return list(messages)
+
+    async def add(self, conversation_id: str, role: str, content: str,
+                  meta: Dict[str, Any] = None) -> Optional[str]:
+        """Сохраняет сообщение в БД и дописывает его в буфер, возвращает id сообщения"""
+        message_id = await self.db.add_message(conversation_id, role, content, meta)
+        if message_id is None:
+            logger.warning(f"Сообщение беседы {conversation_id} не сохранено в БД, остается только в памяти")
+
+        # Беседу, которой нет в буфере, history() загрузит из БД уже с этим сообщением
+        messages = self._touch(conversation_id)
+        if messages is not None:
+            messages.append({'role': role, 'content': content})
+        return message_id
+
+    def drop(self, conversation_id: str):
+        """Выгружает беседу из буфера (сброс или удаление беседы)"""
+        self._entries.pop(conversation_id, None)
+
+    def summary(self) -> Dict[str, Any]:
+        """Сводка по буферу для админ-команд и метрик"""
+        return {
+            'conversations': len(self._entries),
+            'max_conversations': self.max_conversations,
+            'size': self.size,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Глобальный экземпляр буфера бесед
+conversation_buffer = ConversationBuffer()
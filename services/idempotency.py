@@ -0,0 +1,124 @@
+"""
+Идемпотентная обработка сообщений диалога с ИИ.
+
+Клиент, не дождавшийся ответа (таймаут сети, повторная доставка апдейта
+Telegram), присылает то же сообщение еще раз. Без защиты повтор снова
+списывает квоту, снова вызывает модель и сохраняет дубли сообщений.
+
+IdempotencyStore выполняет работу один раз на ключ:
+- повтор, пришедший во время генерации, ждет уже запущенную задачу;
+- повтор после завершения получает сохраненный результат (пока не истек TTL);
+- при ошибке результат не сохраняется - повтор выполнит работу заново;
+- если исходный запрос отменен, ожидающий повтор выполняет работу сам.
+
+Ключ строится (derive_key) из идентификатора запроса: ключа клиента
+(заголовок Idempotency-Key) или id апдейта Telegram. Текст сообщения
+ключом не служит: одинаковые сообщения подряд бывают намеренными.
+"""
+import asyncio
+import hashlib
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from config.settings import CHAT_IDEMPOTENCY_MAX_ENTRIES, CHAT_IDEMPOTENCY_TTL_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+def derive_key(*parts: Any) -> str:
+    """Ключ идемпотентности из частей запроса (пользователь, беседа, id запроса)"""
+    return hashlib.sha256('\x1f'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+class IdempotencyStore:
+    """Результаты по ключу с TTL и объединение одновременных повторов"""
+
+    def __init__(self, ttl: float = CHAT_IDEMPOTENCY_TTL_SECONDS,
+                 max_entries: int = CHAT_IDEMPOTENCY_MAX_ENTRIES):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # ключ -> (результат, срок действия)
+        self._results: "OrderedDict[str, Tuple[Any, float]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.replayed = 0
+        self.joined = 0
+
+    def _get(self, key: str) -> Tuple[bool, Any]:
+        entry = self._results.get(key)
+        if entry is None:
+            return False, None
+        value, expires_at = entry
+        if expires_at < time.monotonic():
+            del self._results[key]
+            return False, None
+        return True, value
+
+    def _set(self, key: str, value: Any, ttl: float):
+        self._results[key] = (value, time.monotonic() + ttl)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]],
+                  ttl: float = None) -> Tuple[Any, bool]:
+        """
+        Выполняет factory один раз на ключ.
+
+        Returns:
+            (результат, повтор) - повтор True, если результат взят из хранилища
+            или получен от уже выполнявшейся задачи
+        """
+        found, value = self._get(key)
+        if found:
+            self.replayed += 1
+            logger.info(f"Повтор запроса {key[:16]}: возвращаем сохраненный результат")
+            return value, True
+
+        future = self._inflight.get(key)
+        while future is not None:
+            self.joined += 1
+            logger.info(f"Повтор запроса {key[:16]} во время выполнения: ждем исходный запрос")
+            try:
+                # shield: отмена ожидающего повтора не отменяет исходную задачу
+                return await asyncio.shield(future), True
+            except asyncio.CancelledError:
+                # Отменен сам повтор - пробрасываем; отменен только исходный запрос
+                # (клиент отключился) - выполняем работу сами
+                if not future.cancelled() or asyncio.current_task().cancelling():
+                    raise
+                future = self._inflight.get(key)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await factory()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Исключение получают ожидающие повторы; без них не логируем его повторно
+            future.exception()
+            raise
+        else:
+            self._set(key, value, self.ttl if ttl is None else ttl)
+            future.set_result(value)
+            return value, False
+        finally:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+    def summary(self) -> Dict[str, Any]:
+        """Сводка для админ-команд и метрик"""
+        return {
+            'results': len(self._results),
+            'inflight': len(self._inflight),
+            'replayed': self.replayed,
+            'joined': self.joined,
+        }
+
+
+# Глобальное хранилище результатов сообщений диалога
+chat_idempotency = IdempotencyStore()
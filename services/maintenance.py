@@ -0,0 +1,131 @@
+"""
+Обслуживание базы данных: свертка старых счетчиков ИИ, удаление старых
+сообщений бесед и неиспользуемых сжатых текстов, VACUUM/ANALYZE.
+
+Запускается ежедневно планировщиком квот (AIQuotaManager._reset_daily_quotas).
+Все удаления выполняются небольшими порциями с паузами между ними,
+поэтому обслуживание не блокирует обработку сообщений бота.
+"""
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any
+
+from config.settings import (
+    AI_USAGE_RETENTION_DAYS,
+    CONVERSATION_RETENTION_DAYS,
+    MAINTENANCE_CHUNK_SIZE,
+    MAINTENANCE_CHUNK_PAUSE,
+    MAINTENANCE_MAX_CHUNKS,
+)
+from database.universal_manager import universal_db_manager as db_manager
+
+logger = logging.getLogger(__name__)
+
+
+class MaintenanceManager:
+    """Менеджер обслуживания БД"""
+
+    def __init__(self):
+        self.db = db_manager
+        self.last_report: Optional[Dict[str, Any]] = None
+        self._lock = asyncio.Lock()
+
+    async def run(self) -> Dict[str, Any]:
+        """Выполняет все шаги обслуживания и возвращает отчет"""
+        if self._lock.locked():
+            logger.warning("Обслуживание БД уже выполняется, пропускаем запуск")
+            return self.last_report or {}
+
+        async with self._lock:
+            started = time.perf_counter()
+            now = datetime.utcnow()
+            report: Dict[str, Any] = {'started_at': now.isoformat(timespec='seconds')}
+
+            logger.info("🧹 Запуск обслуживания БД")
+
+            step_started = time.perf_counter()
+            report['usage'] = await self._fold_ai_usage(
+                (now - timedelta(days=AI_USAGE_RETENTION_DAYS)).strftime('%Y-%m-%d'))
+            report['usage']['seconds'] = round(time.perf_counter() - step_started, 3)
+
+            step_started = time.perf_counter()
+            report['messages'] = await self._prune_messages(
+                (now - timedelta(days=CONVERSATION_RETENTION_DAYS)).isoformat(sep=' ', timespec='seconds'))
+            report['messages']['seconds'] = round(time.perf_counter() - step_started, 3)
+
+            # После удаления сообщений часть сжатых текстов остается без ссылок
+            step_started = time.perf_counter()
+            report['texts'] = await self._purge_texts()
+            report['texts']['seconds'] = round(time.perf_counter() - step_started, 3)
+
+            step_started = time.perf_counter()
+            report['db'] = await self.db.run_db_maintenance()
+            report['db']['seconds'] = round(time.perf_counter() - step_started, 3)
+
+            report['total_seconds'] = round(time.perf_counter() - started, 3)
+            self.last_report = report
+
+            logger.info(
+                f"✅ Обслуживание БД завершено за {report['total_seconds']}с: "
+                f"свернуто дней ИИ {report['usage']['days']} ({report['usage']['rows']} строк), "
+                f"удалено сообщений {report['messages']['rows']}, "
+                f"текстов {report['texts']['rows']}, "
+                f"БД: {report['db']}")
+            return report
+
+    async def _fold_ai_usage(self, before_date: str) -> Dict[str, Any]:
+        """Сворачивает дневные счетчики ИИ старше before_date (по одному дню за порцию)"""
+        result = {'before': before_date, 'days': 0, 'rows': 0, 'complete': True}
+
+        # Без агрегатов свертка потеряла бы историю - сначала пересчитываем их
+        summary = await self.db.get_ai_usage_summary()
+        if summary.get('total_users', 0) == 0:
+            logger.info("Агрегаты ИИ пусты, выполняем пересчет перед сверткой")
+            if not await self.db.backfill_ai_usage_rollups():
+                result['complete'] = False
+                return result
+
+        for _ in range(MAINTENANCE_MAX_CHUNKS):
+            rows = await self.db.fold_oldest_ai_usage_day(before_date)
+            if rows == 0:
+                return result
+            result['days'] += 1
+            result['rows'] += rows
+            await asyncio.sleep(MAINTENANCE_CHUNK_PAUSE)
+
+        result['complete'] = False
+        return result
+
+    async def _prune_messages(self, before: str) -> Dict[str, Any]:
+        """Удаляет сообщения бесед старше before порциями по MAINTENANCE_CHUNK_SIZE"""
+        result = {'before': before, 'rows': 0, 'complete': True}
+
+        for _ in range(MAINTENANCE_MAX_CHUNKS):
+            rows = await self.db.prune_conversation_messages(before, MAINTENANCE_CHUNK_SIZE)
+            result['rows'] += rows
+            if rows < MAINTENANCE_CHUNK_SIZE:
+                return result
+            await asyncio.sleep(MAINTENANCE_CHUNK_PAUSE)
+
+        result['complete'] = False
+        return result
+
+    async def _purge_texts(self) -> Dict[str, Any]:
+        """Удаляет неиспользуемые тексты text_blobs порциями по MAINTENANCE_CHUNK_SIZE"""
+        result = {'rows': 0, 'complete': True}
+
+        for _ in range(MAINTENANCE_MAX_CHUNKS):
+            rows = await self.db.purge_orphan_texts(MAINTENANCE_CHUNK_SIZE)
+            result['rows'] += rows
+            if rows < MAINTENANCE_CHUNK_SIZE:
+                return result
+            await asyncio.sleep(MAINTENANCE_CHUNK_PAUSE)
+
+        result['complete'] = False
+        return result
+
+
+# Глобальный экземпляр менеджера обслуживания
+maintenance_manager = MaintenanceManager()
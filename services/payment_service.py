@@ -249,18 +249,18 @@ class PaymentService:
                 requests_count = int(metadata.get("requests_count", 0))
                 amount = payment_data.get("amount", 0)
                 
-                # Добавляем премиум запросы
-                success = await premium_manager.add_premium_requests(user_id, requests_count)
-                
+                # Создаем запись о покупке (повторный webhook не создаст дубль)
+                await premium_manager.create_premium_purchase(
+                    user_id=user_id,
+                    requests_count=requests_count,
+                    amount_rub=amount,
+                    payment_id=payment_data["payment_id"]
+                )
+
+                # Начисляем запросы: покупка завершается один раз по payment_id
+                success = await premium_manager.complete_premium_purchase(payment_data["payment_id"])
+
                 if success:
-                    # Создаем запись о покупке
-                    await premium_manager.create_premium_purchase(
-                        user_id=user_id,
-                        requests_count=requests_count,
-                        amount_rub=amount,
-                        payment_id=payment_data["payment_id"]
-                    )
-                    
                     logger.info(f"✅ Обработана покупка {requests_count} запросов для пользователя {user_id}")
                     return True
 
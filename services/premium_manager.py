@@ -32,45 +32,44 @@ class PremiumManager:
             return False
 
     async def use_premium_request(self, user_id: int) -> bool:
-        """Использовать один премиум запрос"""
-        try:
-            # Получаем текущее количество
-            current = await self.get_user_premium_requests(user_id)
+        """Использовать один премиум запрос
 
-            if current <= 0:
-                return False
+        Списание выполняется одной атомарной операцией на стороне БД,
+        поэтому параллельные запросы пользователя не спишут лишнего.
+        """
+        try:
+            success = await self.db.use_premium_request(user_id)
+            if success:
+                logger.info(f"Использован премиум запрос пользователем {user_id}")
+            return success
 
-            # Используем метод universal_db_manager для уменьшения запросов
-            if self.db.is_supabase:
-                # Для Supabase используем клиент напрямую
-                result = self.db.manager.client.table('premium_requests').update({
-                    'requests_count': current - 1,
-                    'total_used': self.db.manager.client.table('premium_requests').select('total_used').eq('user_id', user_id).execute().data[0]['total_used'] + 1 if self.db.manager.client.table('premium_requests').select('total_used').eq('user_id', user_id).execute().data else 1,
-                    'updated_at': 'now()'
-                }).eq('user_id', user_id).execute()
-                
-                if result.data:
-                    logger.info(f"Использован премиум запрос пользователем {user_id}")
-                    return True
-            else:
-                # Для других БД используем SQL
-                query = """
-                    UPDATE premium_requests 
-                    SET requests_count = requests_count - 1, 
-                        total_used = total_used + 1,
-                        updated_at = CURRENT_TIMESTAMP
-                    WHERE user_id = %s AND requests_count > 0
-                """
-                result = await self.db.execute(query, (user_id,))
-                
-                if result:
-                    logger.info(f"Использован премиум запрос пользователем {user_id}")
-                    return True
+        except Exception as e:
+            logger.error(f"Ошибка использования премиум запроса пользователем {user_id}: {e}")
+            return False
 
+    async def create_premium_purchase(self, user_id: int, requests_count: int, amount_rub: int, payment_id: str) -> bool:
+        """Создать запись о покупке премиум запросов (статус pending)"""
+        try:
+            return await self.db.create_premium_purchase(user_id, requests_count, amount_rub, payment_id)
+        except Exception as e:
+            logger.error(f"Ошибка создания покупки премиум запросов: {e}")
             return False
 
+    async def complete_premium_purchase(self, payment_id: str) -> bool:
+        """Завершить покупку и начислить запросы (повторный вызов ничего не начислит)
+
+        Уже завершенная покупка тоже считается успехом: повторный webhook
+        по тому же платежу не должен возвращать ошибку платежной системе.
+        """
+        try:
+            if await self.db.complete_premium_purchase(payment_id):
+                return True
+            if await self.db.get_premium_purchase_status(payment_id) == 'completed':
+                logger.info(f"Покупка {payment_id} уже завершена ранее")
+                return True
+            return False
         except Exception as e:
-            logger.error(f"Ошибка использования премиум запроса пользователем {user_id}: {e}")
+            logger.error(f"Ошибка завершения покупки премиум запросов: {e}")
             return False
 
     async def get_user_premium_stats(self, user_id: int) -> Dict[str, Any]:
@@ -0,0 +1,148 @@
+"""
+Готовые тексты чтений для дней календаря.
+
+Для каждого разобранного дня (services/calendar_service.py) чтения заранее
+собираются в сообщения: стихи каждой части сложного чтения ("Матфея
+18:18-22; 19:1-2, 13-15") загружаются, форматируются и разбиваются на
+части по MESS_MAX_LENGTH для каждого перевода. Кнопка чтения в календаре
+(scripture_read_*) после этого только берет готовые сообщения из памяти.
+
+Ключ набора - callback_data кнопки, перевод и режим разметки
+(get_verses_parse_mode), поэтому смена настроек форматирования не
+показывает устаревший текст.
+"""
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config.settings import AVAILABLE_TRANSLATIONS, SCRIPTURE_BUNDLES_MAX_ENTRIES
+from keyboards.calendar import scripture_reading_buttons
+from utils.api_client import bible_api
+from utils.bible_data import bible_data
+from utils.text_utils import get_verses_parse_mode, split_text
+
+logger = logging.getLogger(__name__)
+
+SIMPLE_PREFIX = "scripture_read_"
+COMPLEX_PREFIX = "scripture_read_complex_"
+
+# Разделитель частей сложного чтения
+PART_SEPARATOR = "\n\n━━━━━━━━━━━━━━━━━━━━━━━━━\n\n"
+
+# (книга, глава, первый стих, последний стих)
+ReadingPart = Tuple[int, int, int, int]
+BundleKey = Tuple[str, str, Optional[str]]
+
+
+def parse_scripture_callback(callback_data: str) -> List[ReadingPart]:
+    """Части чтения из callback_data кнопки (обрезанные до 64 байт части пропускаются)"""
+    if callback_data.startswith(COMPLEX_PREFIX):
+        raw_parts = callback_data[len(COMPLEX_PREFIX):].split("|")
+    elif callback_data.startswith(SIMPLE_PREFIX):
+        raw_parts = [callback_data[len(SIMPLE_PREFIX):]]
+    else:
+        return []
+
+    parts = []
+    for raw_part in raw_parts:
+        fields = raw_part.split("_")
+        if len(fields) != 4:
+            continue
+        try:
+            parts.append(tuple(int(field) for field in fields))
+        except ValueError:
+            continue
+    return parts
+
+
+def _reference(book_name: str, chapter: int, verse_start: int, verse_end: int) -> str:
+    if verse_start == verse_end:
+        return f"{book_name} {chapter}:{verse_start}"
+    return f"{book_name} {chapter}:{verse_start}-{verse_end}"
+
+
+class ScriptureBundles:
+    """Готовые сообщения с текстом чтений календаря (LRU в памяти)"""
+
+    def __init__(self, max_entries: int = SCRIPTURE_BUNDLES_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._bundles: "OrderedDict[BundleKey, List[str]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    async def _render(self, callback_data: str, translation: str) -> Tuple[List[str], bool]:
+        """Сообщения чтения и признак, что все части получены без ошибок"""
+        parts = parse_scripture_callback(callback_data)
+        complete = bool(parts)
+        texts = []
+        for book_id, chapter, verse_start, verse_end in parts:
+            verse_range = verse_start if verse_start == verse_end else (verse_start, verse_end)
+            text = await bible_api.get_verses(book_id, chapter, verse_range, translation)
+            if text.startswith("Ошибка:"):
+                complete = False
+            if callback_data.startswith(COMPLEX_PREFIX):
+                book_name = bible_data.get_book_name(book_id)
+                if not book_name:
+                    complete = False
+                    continue
+                text = f"<b>{_reference(book_name, chapter, verse_start, verse_end)}</b>\n{text}"
+            texts.append(text)
+        return list(split_text(PART_SEPARATOR.join(texts))), complete
+
+    def _put(self, key: BundleKey, messages: List[str]):
+        self._bundles[key] = messages
+        self._bundles.move_to_end(key)
+        while len(self._bundles) > self.max_entries:
+            self._bundles.popitem(last=False)
+
+    async def get(self, callback_data: str, translation: str = "rst") -> List[str]:
+        """Сообщения чтения для кнопки календаря; при промахе собираются и запоминаются"""
+        key = (callback_data, translation, get_verses_parse_mode())
+        messages = self._bundles.get(key)
+        if messages is not None:
+            self.hits += 1
+            self._bundles.move_to_end(key)
+            return messages
+
+        self.misses += 1
+        messages, complete = await self._render(callback_data, translation)
+        if complete:
+            self._put(key, messages)
+        return messages
+
+    async def precompute(self, calendar_data: Dict[str, Any],
+                         translations: Iterable[str] = None) -> int:
+        """Собирает сообщения всех чтений дня, возвращает число новых наборов"""
+        references = calendar_data.get('scripture_references') or []
+        if not references:
+            return 0
+
+        parse_mode = get_verses_parse_mode()
+        built = 0
+        for _, callback_data in scripture_reading_buttons(references):
+            for translation in translations or AVAILABLE_TRANSLATIONS:
+                key = (callback_data, translation, parse_mode)
+                if key in self._bundles:
+                    continue
+                try:
+                    messages, complete = await self._render(callback_data, translation)
+                except Exception as e:
+                    logger.error(f"Ошибка подготовки чтения {callback_data} ({translation}): {e}")
+                    continue
+                if complete:
+                    self._put(key, messages)
+                    built += 1
+        return built
+
+    def summary(self) -> Dict[str, Any]:
+        """Сводка по готовым чтениям для админ-команд и метрик"""
+        return {
+            'bundles': len(self._bundles),
+            'max_entries': self.max_entries,
+            'hits': self.hits,
+            'misses': self.misses,
+        }
+
+
+# Глобальное хранилище готовых чтений
+scripture_bundles = ScriptureBundles()
@@ -0,0 +1,317 @@
+"""
+Библейские темы в памяти: список тем, стихи тем и готовые тексты стихов.
+
+Темы загружаются один раз при запуске (Supabase, при ошибке - CSV,
+utils/topics.py) и перезагружаются в фоне каждые TOPICS_REFRESH_INTERVAL
+секунд. Ссылки стихов темы разбираются в (книга, глава, стихи), тексты
+стихов готовятся в фоне для каждого перевода, поэтому меню тем и кнопки
+verse_... обслуживаются из памяти. API запускает сервис без подготовки
+текстов (start(render=False)): тексты для Telegram ему не нужны.
+
+Поиск по темам (search) идет по индексу в памяти (utils/topic_search.py)
+по названиям тем и тексту их стихов. Изменения тем через
+universal_db_manager (add/update/delete_bible_topic) применяются к
+индексу сразу, по одной теме; изменения из других процессов приходят с
+фоновым обновлением.
+"""
+import asyncio
+import logging
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from config.settings import AVAILABLE_TRANSLATIONS, TOPICS_REFRESH_INTERVAL
+from utils.api_client import bible_api
+from utils.bible_data import bible_data
+from utils.text_utils import get_verses_parse_mode, split_text
+from utils.topic_search import TopicSearchIndex
+
+logger = logging.getLogger(__name__)
+
+# (книга, глава, первый стих или None, последний стих или None)
+ParsedReference = Tuple[int, int, Optional[int], Optional[int]]
+
+
+class TopicService:
+    """Темы и тексты их стихов в памяти с фоновым обновлением"""
+
+    def __init__(self):
+        self._topics: List[Dict[str, Any]] = []
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        # Ссылка стиха как в теме -> разобранная ссылка
+        self._references: Dict[str, ParsedReference] = {}
+        # (разобранная ссылка, перевод, режим разметки) -> сообщения
+        self._texts: Dict[Tuple[ParsedReference, str, Optional[str]], List[str]] = {}
+        # Поиск по названиям тем и тексту стихов (ключ - название темы)
+        self.index = TopicSearchIndex()
+        # Темы, тексты стихов которых уже в индексе
+        self._verses_indexed: Set[str] = set()
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._render_task: Optional[asyncio.Task] = None
+        self._reload_task: Optional[asyncio.Task] = None
+        self._listening = False
+        self.loaded = False
+        # Готовить ли в фоне тексты стихов для всех переводов (бот)
+        self.render_texts = True
+
+    # --- Темы ---
+
+    def _apply(self, topics: List[Dict[str, Any]]):
+        references = {}
+        for topic in topics:
+            for verse in topic['verses']:
+                if verse not in references:
+                    parsed = bible_data.parse_reference(verse)
+                    if parsed:
+                        references[verse] = parsed
+                    else:
+                        logger.warning(f"Тема «{topic['topic']}»: не удалось разобрать ссылку «{verse}»")
+        by_name = {topic['topic']: topic for topic in topics}
+        # В индексе меняются только новые, измененные и удаленные темы
+        for name, topic in by_name.items():
+            if self._by_name.get(name) != topic or name not in self.index:
+                self.index.set_topic(name, topic)
+                self._verses_indexed.discard(name)
+        for name in self._by_name.keys() - by_name.keys():
+            self.index.remove_topic(name)
+            self._verses_indexed.discard(name)
+
+        self._topics = topics
+        self._by_name = by_name
+        self._references = references
+        # Тексты стихов, которых больше нет в темах, не нужны
+        alive = set(references.values())
+        self._texts = {key: value for key, value in self._texts.items() if key[0] in alive}
+        self.loaded = True
+
+    async def load(self) -> int:
+        """Загружает темы из базы (или CSV), возвращает число тем"""
+        from utils.topics import load_topics_from_supabase
+
+        topics = await load_topics_from_supabase()
+        if topics:
+            self._apply(topics)
+        elif not self.loaded:
+            logger.warning("Темы не загружены, список тем пуст")
+        return len(self._topics)
+
+    async def ensure_loaded(self):
+        """Загружает темы при первом обращении и подписывается на их изменения в базе"""
+        if not self._listening:
+            try:
+                from database.universal_manager import universal_db_manager
+                universal_db_manager.add_topic_listener(self._on_topic_changed)
+                self._listening = True
+            except Exception as e:
+                logger.error(f"Ошибка подписки на изменения тем: {e}")
+        if not self.loaded:
+            await self.load()
+            self._start_prerender()
+
+    async def _on_topic_changed(self, action: str, topic_id: int = None,
+                                topic_name: str = None, verses: str = None):
+        """Применяет добавление, изменение или удаление темы в базе"""
+        from utils.topics import split_verses
+
+        topics = list(self._topics)
+        if action == 'add':
+            topics = [topic for topic in topics if topic['topic'] != topic_name]
+            topics.append({"topic": topic_name, "verses": split_verses(verses), "id": None})
+        else:
+            position = next((i for i, topic in enumerate(topics)
+                             if topic_id is not None and topic.get('id') == topic_id), None)
+            if position is None:
+                # Темы без ID (из CSV) - перечитываем все после записи в базу
+                if self._reload_task is None or self._reload_task.done():
+                    self._reload_task = asyncio.create_task(self._reload())
+                return
+            if action == 'delete':
+                del topics[position]
+            else:
+                topic = dict(topics[position])
+                if topic_name is not None:
+                    topic['topic'] = topic_name
+                if verses is not None:
+                    topic['verses'] = split_verses(verses)
+                topics[position] = topic
+        self._apply(topics)
+        self._start_prerender()
+
+    async def _reload(self):
+        try:
+            await self.load()
+            self._start_prerender()
+        except Exception as e:
+            logger.error(f"Ошибка перезагрузки тем: {e}")
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """Темы по запросу из индекса в памяти: {'topic', 'verses', 'id', 'score'}"""
+        return self.index.search(query, limit)
+
+    def topics(self) -> List[Dict[str, Any]]:
+        """Темы как в utils/topics.py: {'topic', 'verses', 'id'}"""
+        return self._topics
+
+    def topic_names(self) -> List[str]:
+        return [topic['topic'] for topic in self._topics]
+
+    def is_topic(self, text: str) -> bool:
+        """Является ли текст названием темы (фильтр сообщений)"""
+        return bool(text) and text.strip() in self._by_name
+
+    def verses(self, topic_name: str) -> List[str]:
+        topic = self._by_name.get(topic_name)
+        return topic['verses'] if topic else []
+
+    def reference(self, verse_ref: str) -> Optional[ParsedReference]:
+        """Разобранная ссылка стиха темы или None"""
+        return self._references.get(verse_ref)
+
+    # --- Тексты стихов ---
+
+    async def _render(self, parsed: ParsedReference, translation: str) -> Optional[List[str]]:
+        book_id, chapter, verse_start, verse_end = parsed
+        if verse_start is None:
+            text = await bible_api.get_formatted_chapter(book_id, chapter, translation)
+        elif verse_end is None:
+            text = await bible_api.get_verses(book_id, chapter, verse_start, translation)
+        else:
+            text = await bible_api.get_verses(book_id, chapter, (verse_start, verse_end), translation)
+        if text.startswith("Ошибка:"):
+            return None
+        return list(split_text(text))
+
+    async def verse_text(self, verse_ref: str, translation: str = "rst") -> Optional[List[str]]:
+        """Сообщения с текстом стиха темы или None, если ссылка не из тем"""
+        parsed = self._references.get(verse_ref)
+        if parsed is None:
+            return None
+        key = (parsed, translation, get_verses_parse_mode())
+        messages = self._texts.get(key)
+        if messages is None:
+            messages = await self._render(parsed, translation)
+            if messages is not None:
+                self._texts[key] = messages
+        return messages
+
+    async def _plain_verses(self, verse_refs: List[str], chapters: Dict) -> List[str]:
+        """Текст стихов темы без разметки (синодальный перевод) для индекса"""
+        texts = []
+        for verse_ref in verse_refs:
+            parsed = self._references.get(verse_ref)
+            if parsed is None:
+                continue
+            book_id, chapter, verse_start, verse_end = parsed
+            key = (book_id, chapter)
+            if key not in chapters:
+                try:
+                    chapters[key] = await bible_api.get_chapter(book_id, chapter, "rst")
+                except Exception as e:
+                    logger.error(f"Ошибка загрузки главы {book_id}:{chapter} для поиска тем: {e}")
+                    chapters[key] = None
+            data = chapters[key]
+            if not data:
+                continue
+            first = verse_start or 1
+            last = verse_end or verse_start or 10 ** 4
+            texts.extend(text for number, text in data.items()
+                         if number.isdigit() and first <= int(number) <= last)
+        return texts
+
+    async def index_verses(self) -> int:
+        """Добавляет в индекс тексты стихов тем, для которых их еще нет"""
+        chapters: Dict = {}
+        indexed = 0
+        for topic in list(self._topics):
+            name = topic['topic']
+            if name in self._verses_indexed:
+                continue
+            texts = await self._plain_verses(topic['verses'], chapters)
+            # Тема могла измениться, пока загружались главы
+            if self._by_name.get(name) is topic:
+                self.index.set_topic(name, topic, texts)
+                self._verses_indexed.add(name)
+                indexed += 1
+        return indexed
+
+    async def prerender(self) -> int:
+        """Готовит тексты всех стихов тем для всех переводов, возвращает число новых"""
+        parse_mode = get_verses_parse_mode()
+        rendered = 0
+        for parsed in set(self._references.values()):
+            for translation in AVAILABLE_TRANSLATIONS:
+                key = (parsed, translation, parse_mode)
+                if key in self._texts:
+                    continue
+                try:
+                    messages = await self._render(parsed, translation)
+                except Exception as e:
+                    logger.error(f"Ошибка подготовки текста стиха {parsed} ({translation}): {e}")
+                    continue
+                if messages is not None:
+                    self._texts[key] = messages
+                    rendered += 1
+        if rendered:
+            logger.info(f"Темы: подготовлено текстов стихов: {rendered}")
+        return rendered
+
+    async def _background(self):
+        try:
+            # Темы, измененные во время подготовки, обрабатываются следующим проходом
+            while await self.index_verses() + (await self.prerender() if self.render_texts else 0):
+                pass
+        except Exception as e:
+            logger.error(f"Ошибка подготовки тем: {e}")
+
+    def _start_prerender(self):
+        if self._render_task is None or self._render_task.done():
+            self._render_task = asyncio.create_task(self._background())
+
+    # --- Фоновое обновление ---
+
+    async def _refresh_loop(self, interval: float):
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                await self.load()
+                self._start_prerender()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка фонового обновления тем: {e}")
+
+    async def start(self, interval: float = TOPICS_REFRESH_INTERVAL, render: bool = True):
+        """
+        Загружает темы и запускает индексацию стихов и фоновое обновление.
+        render=False - без подготовки текстов стихов (только индекс для поиска).
+        """
+        self.render_texts = render
+        await self.ensure_loaded()
+        count = len(self._topics)
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = asyncio.create_task(self._refresh_loop(interval))
+        logger.info(f"🎯 Темы загружены: {count}, обновление каждые {interval}с")
+
+    async def stop(self):
+        """Останавливает фоновое обновление и подготовку текстов"""
+        for task in (self._refresh_task, self._render_task, self._reload_task):
+            if task and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        self._refresh_task = None
+        self._render_task = None
+        self._reload_task = None
+
+    def summary(self) -> Dict[str, Any]:
+        """Сводка для админ-команд и метрик"""
+        return {
+            'topics': len(self._topics),
+            'references': len(self._references),
+            'texts': len(self._texts),
+            'indexed': len(self.index),
+        }
+
+
+# Глобальный сервис тем
+topic_service = TopicService()
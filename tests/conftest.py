@@ -0,0 +1,27 @@
+"""
+Общие настройки тестов.
+
+Тесты запускаются из корня репозитория: python -m pytest -q tests
+Зависимости из requirements.txt должны быть установлены. Рабочая
+директория - корень репозитория: модули при импорте читают данные по
+относительным путям (bible_data - ./file.xlsx). Глобальный
+universal_db_manager при импорте создает SQLite базу, а календарь пишет
+кэш, поэтому эти файлы перенесены во временную директорию.
+"""
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.setdefault('BOT_TOKEN', 'test')
+os.environ['USE_SUPABASE'] = 'false'
+os.environ['USE_POSTGRES'] = 'false'
+
+WORK_DIR = tempfile.mkdtemp(prefix='gospel_bot_tests_')
+os.chdir(ROOT)
+os.environ['SQLITE_DB_FILE'] = os.path.join(WORK_DIR, 'bible_bot.db')
+os.environ['CALENDAR_CACHE_FILE'] = os.path.join(WORK_DIR, 'calendar_cache.json')
+
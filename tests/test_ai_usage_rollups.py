@@ -0,0 +1,52 @@
+"""
+Агрегаты ИИ (SQLite): после сброса дневного лимита инкрементальные
+агрегаты совпадают с пересчетом из ai_limits.
+"""
+import asyncio
+import sqlite3
+
+import pytest
+
+from database.db_manager import DatabaseManager
+
+TODAY = '2026-10-19'
+YESTERDAY = '2026-10-18'
+
+
+@pytest.fixture
+def db(tmp_path):
+    return DatabaseManager(str(tmp_path / 'rollups.db'))
+
+
+def _rollups(db):
+    conn = sqlite3.connect(db.db_file)
+    try:
+        daily = conn.execute(
+            "SELECT date, total_count, active_users FROM ai_usage_daily ORDER BY date").fetchall()
+        totals = conn.execute(
+            "SELECT user_id, total_count FROM ai_usage_totals ORDER BY user_id").fetchall()
+        return daily, totals
+    finally:
+        conn.close()
+
+
+def test_reset_keeps_rollups_equal_to_backfill(db):
+    async def scenario():
+        for _ in range(3):
+            await db.increment_ai_limit(1, TODAY)
+        await db.increment_ai_limit(2, TODAY)
+        await db.increment_ai_limit(3, YESTERDAY)
+
+        await db.reset_ai_limit(1, TODAY)
+        # Первый запрос после сброса снова считается первым за день
+        assert await db.increment_ai_limit(1, TODAY) == 1
+        await db.reset_ai_limit(3, YESTERDAY)
+        await db.reset_ai_limit(4, TODAY)
+
+        incremental = _rollups(db)
+        assert await db.backfill_ai_usage_rollups()
+        return incremental, _rollups(db)
+
+    incremental, backfilled = asyncio.run(scenario())
+    assert incremental == backfilled
+    assert incremental == ([(TODAY, 2, 2)], [(1, 1), (2, 1)])
@@ -0,0 +1,74 @@
+"""
+Кнопки стихов из ответа ИИ (handlers/ai_assistant.py): ссылки передаются
+разобранными, без повторного разбора строки, в том числе ссылки через главы.
+"""
+import asyncio
+import sys
+
+import pytest
+
+if sys.version_info < (3, 12):
+    # handlers/admin.py использует f-строки Python 3.12 (образ собирается на python:3.12)
+    pytest.skip("handlers импортируются только на Python 3.12+", allow_module_level=True)
+
+from handlers.ai_assistant import (  # noqa: E402
+    create_ai_verse_buttons,
+    extract_ai_spans,
+    parse_ai_response,
+    span_from_callback,
+    verse_buttons,
+    verse_callback,
+)
+
+RESPONSE = (
+    "Прочитайте о сотворении мира: Быт 1:1-2:3. Об утешении - Мф 6:25-34; 7:7, "
+    "а также Пс 22. Повторно: Мф 6:25-34."
+)
+
+
+def test_cross_chapter_span_gets_button():
+    spans = extract_ai_spans(RESPONSE)
+    assert [(span.book_id, span.chapter, span.verse_start, span.end_chapter, span.verse_end)
+            for span in spans] == [
+        (1, 1, 1, 2, 3), (40, 6, 25, 6, 34), (40, 7, 7, 7, 7)]
+    # "Пс 22" без стиха в обычном тексте не считается ссылкой
+    assert parse_ai_response(RESPONSE) == ['Быт 1:1-2:3', 'Мф 6:25-34', 'Мф 7:7']
+
+    rows = verse_buttons(spans)
+    assert [row[0].text for row in rows] == parse_ai_response(RESPONSE)
+
+
+def test_callback_keeps_span():
+    for span in extract_ai_spans(RESPONSE):
+        data = verse_callback(span)
+        assert len(data.encode('utf-8')) <= 64
+        restored = span_from_callback(data)
+        assert restored[:1] + restored[2:] == span[:1] + span[2:]
+
+
+def test_callback_from_old_messages():
+    span = span_from_callback("ai_verse_Быт 1:1-2:3")
+    assert (span.book_id, span.chapter, span.verse_start, span.end_chapter, span.verse_end) == (1, 1, 1, 2, 3)
+    assert span_from_callback("ai_verse_неизвестно") is None
+
+
+def test_buttons_limit(monkeypatch):
+    monkeypatch.setattr('handlers.ai_assistant.AI_VERSE_BUTTONS_LIMIT', 2)
+    assert len(verse_buttons(extract_ai_spans(RESPONSE))) == 2
+
+
+def test_cross_chapter_actions_for_first_chapter(monkeypatch):
+    requested = []
+
+    async def cached_data(user_id, book_id, chapter, verse_start=None, verse_end=None, commentary_verses=None):
+        requested.append((book_id, chapter, verse_start, verse_end))
+        return {'ai_commentary': None, 'is_bookmarked': False}
+
+    monkeypatch.setattr('utils.bible_data.get_chapter_cached_data', cached_data)
+    span = extract_ai_spans(RESPONSE)[0]
+    buttons = asyncio.run(create_ai_verse_buttons(span, 1, from_ai_assistant=True))
+
+    book_id, chapter, verse_start, verse_end = requested[0]
+    assert (book_id, chapter, verse_start) == (1, 1, 1)
+    assert verse_end >= verse_start
+    assert buttons[-1][0].callback_data == "back_to_ai_verses"
@@ -0,0 +1,68 @@
+"""
+Пакетная запись в Supabase (database/bulk_import.py): число записанных
+строк берется из ответа PostgREST, а не из размера пачки.
+"""
+import asyncio
+from types import SimpleNamespace
+
+from database.bulk_import import BIBLE_TOPICS, USERS, ImportTarget, SupabaseBulkWriter
+
+
+class FakeTable:
+    """Таблица PostgREST: upsert/insert отвечают числом затронутых строк"""
+
+    def __init__(self, client, name):
+        self.client = client
+        self.name = name
+        self.result = None
+
+    def upsert(self, payload, on_conflict='', ignore_duplicates=False, count=None, returning=None):
+        self.client.calls.append(('upsert', self.name, ignore_duplicates, count, returning))
+        self.result = SimpleNamespace(data=[], count=self.client.affected)
+        return self
+
+    def insert(self, payload, count=None, returning=None):
+        self.client.calls.append(('insert', self.name, len(payload), count, returning))
+        self.result = SimpleNamespace(data=[], count=len(payload))
+        return self
+
+    def select(self, columns):
+        self.result = SimpleNamespace(data=[{'user_id': 1, 'book_id': 43}], count=None)
+        return self
+
+    def in_(self, column, values):
+        return self
+
+    def execute(self):
+        return self.result
+
+
+class FakeClient:
+    def __init__(self, affected):
+        self.affected = affected
+        self.calls = []
+
+    def table(self, name):
+        return FakeTable(self, name)
+
+
+def test_upsert_returns_affected_rows():
+    client = FakeClient(affected=1)
+    writer = SupabaseBulkWriter(client)
+    rows = [('Надежда', 'Рим 8:28'), ('Вера', 'Евр 11:1')]
+
+    assert asyncio.run(writer.write(BIBLE_TOPICS, rows)) == 1
+    assert client.calls == [('upsert', 'bible_topics', False, 'exact', 'minimal')]
+
+    # Уже существующие пользователи не обновляются и не считаются
+    client = FakeClient(affected=0)
+    assert asyncio.run(SupabaseBulkWriter(client).write(USERS, [(1, 'user', 'User')])) == 0
+    assert client.calls[0][2] is True
+
+
+def test_insert_without_unique_key_counts_new_rows():
+    target = ImportTarget('marks', ('user_id', 'book_id'), ('user_id', 'book_id'), unique=False)
+    client = FakeClient(affected=None)
+    written = asyncio.run(SupabaseBulkWriter(client).write(target, [(1, 43), (1, 40), (1, 40)]))
+    assert written == 1
+    assert client.calls == [('insert', 'marks', 1, 'exact', 'minimal')]
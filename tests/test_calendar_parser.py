@@ -0,0 +1,21 @@
+"""
+Разбор страниц православного календаря сверяется с эталоном.
+
+Страницы и эталоны лежат в data/calendar_pages, эталоны получены парсером
+до перехода на разбор за один проход, сеть не нужна.
+"""
+import glob
+import os
+
+from benchmark_calendar_parser import PAGES_DIR, compare_with_golden
+
+
+def test_pages_have_golden():
+    pages = glob.glob(os.path.join(PAGES_DIR, '*.html'))
+    assert pages
+    assert all(os.path.exists(page[:-len('.html')] + '.json') for page in pages)
+
+
+def test_parse_matches_golden():
+    problems = compare_with_golden()
+    assert not problems, '\n'.join(problems)
@@ -0,0 +1,42 @@
+"""
+Кнопки чтений календаря (OrthodoxCalendar.extract_scripture_references):
+подписи с полным названием книги и границы ссылок через главы.
+"""
+import pytest
+
+from utils.orthodox_calendar import get_last_verse_in_chapter, orthodox_calendar
+from utils.versification import Versification
+
+
+def _buttons(*readings):
+    data = {'scripture_readings': list(readings)}
+    return [(ref['book_name'], ref['display_text'])
+            for ref in orthodox_calendar.extract_scripture_references(data)]
+
+
+@pytest.mark.parametrize('reading, expected', [
+    ('Матфея 11:27-30', ('Матфея', 'Матфея 11:27-30')),
+    ('Притч. 3:1-18', ('Притчи', 'Притчи 3:1-18')),
+    ('Ин. 1:1-17', ('Иоанна', 'Иоанна 1:1-17')),
+    ('1 Кор. 1:10', ('1 Коринфянам', '1 Коринфянам 1:10')),
+])
+def test_display_text_uses_full_book_name(reading, expected):
+    assert _buttons(reading) == [expected]
+
+
+def test_each_part_of_reading_gets_button():
+    assert _buttons('Луки 6:17-23; 7:1') == [('Луки', 'Луки 6:17-23'), ('Луки', 'Луки 7:1')]
+
+
+@pytest.fixture
+def without_table(tmp_path, monkeypatch):
+    # Таблицы стихов нет - число стихов в главе оценивается
+    monkeypatch.setattr('utils.orthodox_calendar.versification',
+                        Versification(str(tmp_path / 'missing.json')))
+
+
+def test_cross_chapter_range_is_not_inverted_without_table(without_table):
+    # Оценка для Евреям - 25 стихов, а ссылка начинается с 26-го
+    assert get_last_verse_in_chapter('Евреям', 7, 65, 26) == 26
+    assert get_last_verse_in_chapter('Евреям', 7, 65, 3) == 25
+    assert _buttons('Евр. 7:26-8:2') == [('Евреям', 'Евреям 7:26-26')]
@@ -0,0 +1,36 @@
+"""
+Закладки главы (SQLite): is_chapter_bookmarked находит любую закладку в
+главе, а is_bookmarked - только закладку на тот же отрывок.
+"""
+import asyncio
+import sqlite3
+
+from database.db_manager import DatabaseManager
+
+USER_ID = 7
+JOHN = 43
+
+
+def test_any_bookmark_in_chapter(tmp_path):
+    db = DatabaseManager(str(tmp_path / 'bookmarks.db'))
+    conn = sqlite3.connect(db.db_file)
+    conn.executemany(
+        "INSERT INTO bookmarks (user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, display_text) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        [(USER_ID, JOHN, 3, None, 16, 18, 'Ин 3:16-18'), (USER_ID, JOHN, 5, 7, None, None, 'Ин 5-7')])
+    conn.commit()
+    conn.close()
+
+    async def scenario():
+        return (
+            [await db.is_chapter_bookmarked(USER_ID, JOHN, chapter) for chapter in range(2, 9)],
+            await db.is_chapter_bookmarked(USER_ID + 1, JOHN, 3),
+            await db.is_bookmarked(USER_ID, JOHN, 3),
+            await db.is_bookmarked(USER_ID, JOHN, 3, None, 16, 18),
+        )
+
+    chapters, other_user, whole_chapter, verses = asyncio.run(scenario())
+    assert chapters == [False, True, False, True, True, True, False]
+    assert other_user is False
+    assert whole_chapter is False
+    assert verses is True
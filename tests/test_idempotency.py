@@ -0,0 +1,119 @@
+"""
+Идемпотентность сообщений диалога (services/idempotency.py): работа
+выполняется один раз на ключ, повтор во время выполнения ждет исходный
+запрос, а при его отмене выполняет работу сам.
+"""
+import asyncio
+
+import pytest
+
+from services.idempotency import IdempotencyStore, derive_key
+
+KEY = derive_key('tg', 1, 100)
+
+
+def test_replay_returns_saved_result():
+    store = IdempotencyStore(ttl=60)
+    calls = []
+
+    async def answer():
+        calls.append(1)
+        return 'ответ'
+
+    async def scenario():
+        return await store.run(KEY, answer), await store.run(KEY, answer)
+
+    assert asyncio.run(scenario()) == (('ответ', False), ('ответ', True))
+    assert len(calls) == 1
+
+
+def test_failed_request_is_not_saved():
+    store = IdempotencyStore(ttl=60)
+
+    async def fail():
+        raise RuntimeError('модель недоступна')
+
+    async def answer():
+        return 'ответ'
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await store.run(KEY, fail)
+        return await store.run(KEY, answer)
+
+    assert asyncio.run(scenario()) == ('ответ', False)
+
+
+def test_concurrent_retry_waits_for_original():
+    store = IdempotencyStore(ttl=60)
+    calls = []
+
+    async def scenario():
+        done = asyncio.Event()
+
+        async def answer():
+            calls.append(1)
+            await done.wait()
+            return 'ответ'
+
+        original = asyncio.create_task(store.run(KEY, answer))
+        await asyncio.sleep(0)
+        retry = asyncio.create_task(store.run(KEY, answer))
+        await asyncio.sleep(0)
+        done.set()
+        return await original, await retry
+
+    assert asyncio.run(scenario()) == (('ответ', False), ('ответ', True))
+    assert len(calls) == 1
+    assert store.summary()['inflight'] == 0
+
+
+def test_cancelled_original_does_not_fail_retry():
+    store = IdempotencyStore(ttl=60)
+
+    async def scenario():
+        started = asyncio.Event()
+
+        async def hanging():
+            started.set()
+            await asyncio.Event().wait()
+
+        async def answer():
+            return 'ответ'
+
+        original = asyncio.create_task(store.run(KEY, hanging))
+        await started.wait()
+        retry = asyncio.create_task(store.run(KEY, answer))
+        await asyncio.sleep(0)
+
+        original.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await original
+        return await retry
+
+    assert asyncio.run(scenario()) == ('ответ', False)
+    assert store.summary()['inflight'] == 0
+
+
+def test_cancelled_retry_keeps_original():
+    store = IdempotencyStore(ttl=60)
+
+    async def scenario():
+        done = asyncio.Event()
+
+        async def answer():
+            await done.wait()
+            return 'ответ'
+
+        original = asyncio.create_task(store.run(KEY, answer))
+        await asyncio.sleep(0)
+        retry = asyncio.create_task(store.run(KEY, answer))
+        await asyncio.sleep(0)
+
+        retry.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await retry
+        done.set()
+        return await original
+
+    assert asyncio.run(scenario()) == ('ответ', False)
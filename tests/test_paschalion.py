@@ -0,0 +1,85 @@
+"""
+Пасхалия и чтения дня без сайта (utils/paschalion.py), а также календарь:
+таблицы пасхалии подменяют сайт только когда он недоступен.
+"""
+import asyncio
+from datetime import date, datetime
+
+import pytest
+
+from services.calendar_service import CalendarService
+from utils.orthodox_calendar import orthodox_calendar
+from utils.paschalion import day_info, pascha
+
+
+@pytest.mark.parametrize('year, expected', [
+    (2024, date(2024, 5, 5)),
+    (2025, date(2025, 4, 20)),
+    (2026, date(2026, 4, 12)),
+    (2027, date(2027, 5, 2)),
+])
+def test_pascha(year, expected):
+    assert pascha(year) == expected
+    assert day_info(expected)['days_from_pascha'] == 0
+
+
+@pytest.mark.parametrize('day, feast, propers', [
+    (date(2025, 9, 28), 'Неделя по Воздвижении', ['Галатам 2:16-20', 'Марка 8:34-9:1']),
+    (date(2025, 7, 27), 'Неделя святых отцов шести Вселенских Соборов',
+     ['Евреям 13:7-16', 'Иоанна 17:1-13']),
+    (date(2025, 10, 26), 'Неделя святых отцов VII Вселенского Собора',
+     ['Евреям 13:7-16', 'Луки 8:5-15']),
+])
+def test_sunday_propers_are_read_with_ordinary(day, feast, propers):
+    info = day_info(day)
+    assert feast in info['feasts']
+    for reading in propers:
+        assert info['readings'].count(reading) == 1
+    # Рядовые воскресные чтения остаются
+    assert len(info['readings']) > len(set(propers))
+
+
+def test_sunday_after_exaltation_keeps_ordinary_readings():
+    readings = day_info(date(2025, 9, 28))['readings']
+    assert readings[:2] == ['2 Коринфянам 6:1-10', 'Матфея 25:14-30']
+
+
+def test_offline_content_follows_display_settings():
+    day = datetime(2025, 4, 20)
+    settings = {'date_format': False, 'header': False, 'scripture': 0}
+    data = orthodox_calendar.get_offline_content(
+        day, orthodox_calendar.build_request_params(day, settings))
+    assert data['date'] == ''
+    assert data['header'] == ''
+    assert data['scripture_readings'] == []
+
+    data = orthodox_calendar.get_offline_content(day)
+    assert data['date'].startswith('20 апреля 2025')
+    assert 'Пасха' in data['header']
+    assert data['scripture_readings'] == ['Деяния 1:1-8', 'Иоанна 1:1-17']
+
+
+def test_calendar_asks_site_first_and_falls_back(tmp_path, monkeypatch):
+    requested = []
+    site_day = {'date': 'с сайта', 'header': '', 'saints': [], 'tropars': '',
+                'scripture_readings': [], 'scripture_references': []}
+
+    async def site(target, settings=None):
+        requested.append(target)
+        return '<html>' if len(requested) == 1 else None
+
+    monkeypatch.setattr(orthodox_calendar, 'get_calendar_data', site)
+    monkeypatch.setattr(orthodox_calendar, 'parse_calendar_content', lambda html: site_day)
+    service = CalendarService(cache_file=str(tmp_path / 'calendar.json'))
+
+    async def scenario():
+        # Профиль по умолчанию (без житий и тропарей) тоже берется с сайта
+        first = await service._load(date(2025, 9, 28), None, ('2025-09-28', 'default'))
+        second = await service._load(date(2025, 9, 28), None, ('2025-09-28', 'default'))
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first is site_day
+    assert second['offline'] is True
+    assert 'Галатам 2:16-20' in second['scripture_readings']
+    assert len(requested) == 2
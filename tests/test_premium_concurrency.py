@@ -0,0 +1,112 @@
+"""
+Параллельные списания и начисления премиум запросов через PremiumManager
+(SQLite): ни одно списание не теряется и не дублируется, покупка
+начисляется один раз при любом числе повторных webhook.
+"""
+import asyncio
+
+import pytest
+
+from database.db_manager import DatabaseManager
+from database.supabase_manager import SupabaseManager
+from database.universal_manager import UniversalDatabaseManager
+from services.premium_manager import PremiumManager
+
+USER_ID = 1001
+
+
+@pytest.fixture
+def premium_manager(tmp_path):
+    db = UniversalDatabaseManager()
+    db.manager = DatabaseManager(str(tmp_path / 'premium.db'))
+    manager = PremiumManager()
+    manager.db = db
+    return manager
+
+
+def test_parallel_use_spends_exactly_available(premium_manager):
+    async def scenario():
+        assert await premium_manager.add_premium_requests(USER_ID, 50)
+        results = await asyncio.gather(
+            *(premium_manager.use_premium_request(USER_ID) for _ in range(200)))
+        return results, await premium_manager.db.get_premium_stats(USER_ID)
+
+    results, stats = asyncio.run(scenario())
+    assert results.count(True) == 50
+    assert stats['available'] == 0
+    assert stats['total_used'] == 50
+    assert stats['total_purchased'] == 50
+
+
+def test_parallel_add_is_not_lost(premium_manager):
+    async def scenario():
+        results = await asyncio.gather(
+            *(premium_manager.add_premium_requests(USER_ID, 2) for _ in range(100)))
+        return results, await premium_manager.get_user_premium_requests(USER_ID)
+
+    results, available = asyncio.run(scenario())
+    assert all(results)
+    assert available == 200
+
+
+def test_repeated_purchase_completion_credits_once(premium_manager):
+    async def scenario():
+        assert await premium_manager.create_premium_purchase(USER_ID, 10, 100, 'pay-1')
+        # Повторное создание (повторный webhook) не создает дубль
+        assert not await premium_manager.create_premium_purchase(USER_ID, 10, 100, 'pay-1')
+        results = await asyncio.gather(
+            *(premium_manager.complete_premium_purchase('pay-1') for _ in range(20)))
+        redelivered = await premium_manager.complete_premium_purchase('pay-1')
+        return results, redelivered, await premium_manager.get_user_premium_requests(USER_ID)
+
+    results, redelivered, available = asyncio.run(scenario())
+    # Уже завершенная покупка - тоже успех, но запросы начислены один раз
+    assert all(results)
+    assert redelivered
+    assert available == 10
+
+
+def test_unknown_purchase_is_not_completed(premium_manager):
+    assert not asyncio.run(premium_manager.complete_premium_purchase('missing'))
+
+
+class _FailingRpc:
+    """Клиент Supabase, у которого RPC падает с заданной ошибкой"""
+
+    def __init__(self, error: Exception):
+        self.error = error
+
+    def rpc(self, name, params):
+        raise self.error
+
+
+class _ApiError(Exception):
+    def __init__(self, message: str, code: str):
+        super().__init__(message)
+        self.code = code
+
+
+@pytest.mark.parametrize('method, fallback, args', [
+    ('add_premium_requests', '_add_premium_requests_cas', (USER_ID, 5)),
+    ('use_premium_request', '_use_premium_request_cas', (USER_ID,)),
+    ('complete_premium_purchase', '_complete_premium_purchase_fallback', ('pay-1',)),
+])
+def test_supabase_falls_back_only_without_rpc(method, fallback, args):
+    manager = SupabaseManager.__new__(SupabaseManager)
+    calls = []
+
+    async def record_fallback(*fallback_args):
+        calls.append(fallback_args)
+        return True
+
+    setattr(manager, fallback, record_fallback)
+
+    # Таймаут: запрос мог выполниться на сервере, повторять нельзя
+    manager.client = _FailingRpc(TimeoutError('read timeout'))
+    assert asyncio.run(getattr(manager, method)(*args)) is False
+    assert calls == []
+
+    # Функция не установлена: используется запасной путь
+    manager.client = _FailingRpc(_ApiError('Could not find the function', 'PGRST202'))
+    assert asyncio.run(getattr(manager, method)(*args)) is True
+    assert calls == [args]
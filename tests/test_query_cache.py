@@ -0,0 +1,380 @@
+"""
+Кэш чтения UniversalDatabaseManager: после записи через универсальный
+менеджер чтение возвращает новые данные.
+
+Каждый кэшируемый метод проверяется записью и повторным чтением на
+SQLite (где бэкенд реализует метод) и на менеджерах PostgreSQL/Supabase,
+замененных хранилищем в памяти. Отдельно проверяется, что у каждого тега
+@cached есть метод записи с @invalidates.
+"""
+import asyncio
+import copy
+import inspect
+
+import pytest
+
+from database.db_manager import DatabaseManager
+from database.query_cache import query_cache
+from database.universal_manager import UniversalDatabaseManager
+
+USER_ID = 42
+PASSAGE = dict(book_id=43, chapter_start=3, chapter_end=None, verse_start=16, verse_end=None)
+
+# Теги без метода записи в универсальном менеджере: планы чтения пишут только
+# скрипты импорта и миграции (bulk_import.py, migrate_backend.py) в другом
+# процессе, в боте записи живут не дольше TTL
+EXTERNALLY_WRITTEN_TAGS = {'reading_plans', 'reading_plan:{plan_id}'}
+
+
+class MemoryManager:
+    """Менеджер PostgreSQL/Supabase в памяти: те же методы, счетчик обращений"""
+
+    def __init__(self):
+        self.calls = 0
+        self.user_plans = {}
+        self.commentaries = {}
+        self.topics = {}
+        self.plans = [{'plan_id': 'gospel', 'title': 'Евангелие'}]
+        self.plan_days = {'gospel': [{'day': 1, 'reading': 'Мф 1'}]}
+
+    def _read(self, value):
+        self.calls += 1
+        return copy.deepcopy(value)
+
+    # --- Планы чтения пользователя ---
+
+    async def get_user_reading_plan(self, user_id, plan_id):
+        return self._read(self.user_plans.get((user_id, plan_id)))
+
+    async def get_user_reading_plans(self, user_id):
+        return self._read([plan for (owner, _), plan in sorted(self.user_plans.items()) if owner == user_id])
+
+    async def set_user_reading_plan(self, user_id, plan_id, day=1):
+        self.user_plans[(user_id, plan_id)] = {'plan_id': plan_id, 'current_day': day}
+        return True
+
+    async def update_reading_plan_day(self, user_id, plan_id, day):
+        self.user_plans[(user_id, plan_id)]['current_day'] = day
+        return True
+
+    # --- Планы чтения ---
+
+    async def get_reading_plans(self):
+        return self._read(self.plans)
+
+    async def get_reading_plan_days(self, plan_id):
+        return self._read(self.plan_days.get(plan_id, []))
+
+    async def get_reading_plan_by_id(self, plan_id):
+        return self._read(next((plan for plan in self.plans if plan['plan_id'] == plan_id), None))
+
+    # --- Толкования ---
+
+    @staticmethod
+    def _passage_key(user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, commentary_type):
+        return (user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, commentary_type)
+
+    async def save_commentary(self, user_id, book_id, chapter_start, chapter_end=None, verse_start=None,
+                              verse_end=None, reference_text="", commentary_text="", commentary_type="ai"):
+        key = self._passage_key(user_id, book_id, chapter_start, chapter_end,
+                                verse_start, verse_end, commentary_type)
+        previous = self.commentaries.get(key)
+        self.commentaries[key] = {
+            'id': previous['id'] if previous else len(self.commentaries) + 1,
+            'book_id': book_id, 'chapter_start': chapter_start, 'chapter_end': chapter_end,
+            'verse_start': verse_start, 'verse_end': verse_end, 'reference_text': reference_text,
+            'commentary_text': commentary_text, 'commentary_type': commentary_type,
+        }
+        return True
+
+    async def get_saved_commentary(self, user_id, book_id, chapter_start, chapter_end=None,
+                                   verse_start=None, verse_end=None, commentary_type="ai"):
+        entry = self.commentaries.get(self._passage_key(
+            user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, commentary_type))
+        return self._read(entry['commentary_text'] if entry else None)
+
+    async def delete_saved_commentary(self, user_id, book_id, chapter_start, chapter_end=None,
+                                      verse_start=None, verse_end=None, commentary_type="ai"):
+        return self.commentaries.pop(self._passage_key(
+            user_id, book_id, chapter_start, chapter_end, verse_start, verse_end, commentary_type), None) is not None
+
+    async def delete_commentary_by_id(self, user_id, commentary_id):
+        for key, entry in list(self.commentaries.items()):
+            if key[0] == user_id and entry['id'] == commentary_id:
+                del self.commentaries[key]
+                return True
+        return False
+
+    async def get_user_commentaries(self, user_id, limit=50):
+        return self._read([entry for key, entry in self.commentaries.items() if key[0] == user_id][:limit])
+
+    # --- Темы ---
+
+    async def get_bible_topics(self, search_query="", limit=50):
+        return self._read([topic for topic in self.topics.values()
+                           if search_query.lower() in topic['topic_name'].lower()][:limit])
+
+    async def get_topic_by_name(self, topic_name):
+        return self._read(next((topic for topic in self.topics.values()
+                                if topic['topic_name'] == topic_name), {}))
+
+    async def get_topic_by_id(self, topic_id):
+        return self._read(self.topics.get(topic_id, {}))
+
+    async def search_topics_fulltext(self, search_query, limit=20):
+        return await self.get_bible_topics(search_query, limit)
+
+    async def get_topics_count(self):
+        return self._read(len(self.topics))
+
+    async def add_bible_topic(self, topic_name, verses):
+        topic_id = max(self.topics, default=0) + 1
+        self.topics[topic_id] = {'id': topic_id, 'topic_name': topic_name, 'verses': verses}
+        return True
+
+    async def update_bible_topic(self, topic_id, topic_name=None, verses=None):
+        topic = self.topics[topic_id]
+        if topic_name is not None:
+            topic['topic_name'] = topic_name
+        if verses is not None:
+            topic['verses'] = verses
+        return True
+
+    async def delete_bible_topic(self, topic_id):
+        return self.topics.pop(topic_id, None) is not None
+
+
+@pytest.fixture(params=['sqlite', 'postgres', 'supabase'])
+def db(request, tmp_path):
+    query_cache.clear()
+    manager = UniversalDatabaseManager()
+    if request.param == 'sqlite':
+        manager.manager = DatabaseManager(str(tmp_path / 'cache.db'))
+    else:
+        manager.manager = MemoryManager()
+        manager.is_postgres = request.param == 'postgres'
+        manager.is_supabase = request.param == 'supabase'
+    yield manager
+    query_cache.clear()
+
+
+def _require(db, method: str):
+    if not hasattr(db.manager, method):
+        pytest.skip(f"{type(db.manager).__name__} не реализует {method}")
+
+
+def _run(coroutine):
+    return asyncio.run(coroutine)
+
+
+def _is_memory(db) -> bool:
+    return isinstance(db.manager, MemoryManager)
+
+
+# --- Что покрыто тестами ---
+
+TESTED_METHODS = {
+    'get_user_reading_plan', 'get_user_reading_plans',
+    'get_reading_plans', 'get_reading_plan_days', 'get_reading_plan_by_id',
+    'get_saved_commentary', 'get_user_commentaries',
+    'get_bible_topics', 'get_topic_by_name', 'get_topic_by_id',
+    'search_topics_fulltext', 'get_topics_count',
+}
+
+
+def _decorated(attribute: str):
+    return {name: getattr(member, attribute)
+            for name, member in inspect.getmembers(UniversalDatabaseManager)
+            if hasattr(member, attribute)}
+
+
+def test_every_cached_method_is_tested():
+    assert set(_decorated('cache_tags')) == TESTED_METHODS
+
+
+def test_every_cached_tag_has_writer():
+    writer_tags = {tag for tags in _decorated('invalidates_tags').values() for tag in tags}
+    for method, tags in _decorated('cache_tags').items():
+        for tag in tags:
+            assert tag in writer_tags or tag in EXTERNALLY_WRITTEN_TAGS, (method, tag)
+
+
+# --- Планы чтения пользователя ---
+
+def test_user_reading_plan_after_set_and_update(db):
+    _require(db, 'get_user_reading_plan')
+
+    async def scenario():
+        await db.set_user_reading_plan(USER_ID, 'gospel', 1)
+        first = await db.get_user_reading_plan(USER_ID, 'gospel')
+        assert (await db.get_user_reading_plans(USER_ID))[0]['current_day'] == 1
+        calls = db.manager.calls
+        assert await db.get_user_reading_plan(USER_ID, 'gospel') == first
+        assert db.manager.calls == calls
+
+        await db.update_reading_plan_day(USER_ID, 'gospel', 5)
+        assert (await db.get_user_reading_plan(USER_ID, 'gospel'))['current_day'] == 5
+        assert (await db.get_user_reading_plans(USER_ID))[0]['current_day'] == 5
+
+        await db.set_user_reading_plan(USER_ID, 'psalms', 2)
+        assert len(await db.get_user_reading_plans(USER_ID)) == 2
+
+    _run(scenario())
+
+
+# --- Планы чтения (пишутся вне бота) ---
+
+def test_reading_plans_refresh_on_tag(db):
+    if not _is_memory(db):
+        pytest.skip("SQLite берет планы из CSV, а не из БД")
+
+    async def scenario():
+        assert len(await db.get_reading_plans()) == 1
+        assert len(await db.get_reading_plan_days('gospel')) == 1
+        assert (await db.get_reading_plan_by_id('gospel'))['title'] == 'Евангелие'
+
+        db.manager.plans.append({'plan_id': 'psalms', 'title': 'Псалтирь'})
+        db.manager.plan_days['gospel'].append({'day': 2, 'reading': 'Мф 2'})
+        db.manager.plans[0]['title'] = 'Четвероевангелие'
+        query_cache.invalidate('reading_plans')
+
+        assert len(await db.get_reading_plans()) == 2
+        assert len(await db.get_reading_plan_days('gospel')) == 2
+        assert (await db.get_reading_plan_by_id('gospel'))['title'] == 'Четвероевангелие'
+
+    _run(scenario())
+
+
+# --- Толкования ---
+
+def test_saved_commentary_after_save_and_delete(db):
+    async def scenario():
+        assert await db.get_saved_commentary(USER_ID, **PASSAGE) is None
+        assert await db.save_commentary(USER_ID, **PASSAGE, reference_text='Ин 3:16',
+                                        commentary_text='первое')
+        assert await db.get_saved_commentary(USER_ID, **PASSAGE) == 'первое'
+        assert [c['commentary_text'] for c in await db.get_user_commentaries(USER_ID)] == ['первое']
+
+        assert await db.save_commentary(USER_ID, **PASSAGE, reference_text='Ин 3:16',
+                                        commentary_text='второе')
+        assert await db.get_saved_commentary(USER_ID, **PASSAGE) == 'второе'
+        assert [c['commentary_text'] for c in await db.get_user_commentaries(USER_ID)] == ['второе']
+
+        assert await db.delete_saved_commentary(USER_ID, **PASSAGE)
+        assert await db.get_saved_commentary(USER_ID, **PASSAGE) is None
+        assert await db.get_user_commentaries(USER_ID) == []
+
+    _run(scenario())
+
+
+def test_commentary_delete_by_id(db):
+    async def scenario():
+        await db.save_commentary(USER_ID, **PASSAGE, reference_text='Ин 3:16', commentary_text='текст')
+        commentaries = await db.get_user_commentaries(USER_ID)
+        assert await db.get_saved_commentary(USER_ID, **PASSAGE) == 'текст'
+
+        assert await db.delete_saved_commentary(USER_ID, commentary_id=commentaries[0]['id'])
+        assert await db.get_user_commentaries(USER_ID) == []
+        assert await db.get_saved_commentary(USER_ID, **PASSAGE) is None
+
+    _run(scenario())
+
+
+def test_commentaries_of_other_user_stay_cached(db):
+    async def scenario():
+        await db.save_commentary(USER_ID, **PASSAGE, reference_text='Ин 3:16', commentary_text='мое')
+        assert await db.get_saved_commentary(USER_ID, **PASSAGE) == 'мое'
+        await db.save_commentary(USER_ID + 1, **PASSAGE, reference_text='Ин 3:16', commentary_text='чужое')
+        hits = query_cache.stats['get_saved_commentary'].hits
+        assert await db.get_saved_commentary(USER_ID, **PASSAGE) == 'мое'
+        assert query_cache.stats['get_saved_commentary'].hits == hits + 1
+
+    _run(scenario())
+
+
+# --- Темы ---
+
+def test_topics_after_add_update_delete(db):
+    if not _is_memory(db):
+        pytest.skip("Темы в SQLite не хранятся")
+
+    async def scenario():
+        assert await db.get_topics_count() == 0
+        assert await db.add_bible_topic('Любовь', 'Ин 3:16')
+        assert await db.get_topics_count() == 1
+        topic = await db.get_topic_by_name('Любовь')
+        assert topic['verses'] == 'Ин 3:16'
+        assert (await db.get_topic_by_id(topic['id']))['topic_name'] == 'Любовь'
+        assert len(await db.get_bible_topics('люб')) == 1
+        assert len(await db.search_topics_fulltext('люб')) == 1
+
+        assert await db.update_bible_topic(topic['id'], 'Любовь Божия', 'Ин 3:16; 1 Ин 4:8')
+        assert await db.get_topic_by_name('Любовь') == {}
+        assert (await db.get_topic_by_id(topic['id']))['verses'] == 'Ин 3:16; 1 Ин 4:8'
+        assert (await db.get_bible_topics('люб'))[0]['topic_name'] == 'Любовь Божия'
+        assert (await db.search_topics_fulltext('люб'))[0]['topic_name'] == 'Любовь Божия'
+
+        assert await db.delete_bible_topic(topic['id'])
+        assert await db.get_topics_count() == 0
+        assert await db.get_topic_by_id(topic['id']) == {}
+        assert await db.get_bible_topics('люб') == []
+        assert await db.search_topics_fulltext('люб') == []
+
+    _run(scenario())
+
+
+# --- Гонка чтения и записи ---
+
+def test_read_started_before_write_is_not_cached(db):
+    if not _is_memory(db):
+        pytest.skip("Нужен управляемый бэкенд")
+
+    async def scenario():
+        await db.set_user_reading_plan(USER_ID, 'gospel', 1)
+        release = asyncio.Event()
+        original = db.manager.get_user_reading_plan
+
+        async def slow_read(user_id, plan_id):
+            value = await original(user_id, plan_id)
+            await release.wait()
+            return value
+
+        db.manager.get_user_reading_plan = slow_read
+        reader = asyncio.create_task(db.get_user_reading_plan(USER_ID, 'gospel'))
+        await asyncio.sleep(0)
+        await db.update_reading_plan_day(USER_ID, 'gospel', 7)
+        release.set()
+        assert (await reader)['current_day'] == 1
+
+        db.manager.get_user_reading_plan = original
+        assert (await db.get_user_reading_plan(USER_ID, 'gospel'))['current_day'] == 7
+
+    _run(scenario())
+
+
+def test_cancelled_read_does_not_fail_waiters(db):
+    if not _is_memory(db):
+        pytest.skip("Нужен управляемый бэкенд")
+
+    async def scenario():
+        await db.set_user_reading_plan(USER_ID, 'gospel', 3)
+        started = asyncio.Event()
+        original = db.manager.get_user_reading_plan
+
+        async def hanging_read(user_id, plan_id):
+            started.set()
+            await asyncio.Event().wait()
+
+        db.manager.get_user_reading_plan = hanging_read
+        leader = asyncio.create_task(db.get_user_reading_plan(USER_ID, 'gospel'))
+        await started.wait()
+        waiter = asyncio.create_task(db.get_user_reading_plan(USER_ID, 'gospel'))
+        await asyncio.sleep(0)
+
+        db.manager.get_user_reading_plan = original
+        leader.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await leader
+        assert (await waiter)['current_day'] == 3
+
+    _run(scenario())
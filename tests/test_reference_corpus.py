@@ -0,0 +1,32 @@
+"""
+Разбор ссылок reference_engine сверяется с эталоном data/reference_corpus.json.
+
+Формат эталона описан в benchmark_references.py: ссылка и ожидаемые части
+[ID книги, глава, первый стих, последняя глава, последний стих] или null,
+если ссылка не должна разбираться.
+"""
+import json
+import os
+
+import pytest
+
+from utils.reference_parser import reference_engine
+
+CORPUS_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                           'data', 'reference_corpus.json')
+
+with open(CORPUS_PATH, encoding='utf-8') as _f:
+    CORPUS = json.load(_f)
+
+
+def _spans(reference: str):
+    spans = reference_engine.parse(reference)
+    if spans is None:
+        return None
+    return [[span.book_id, span.chapter, span.verse_start, span.end_chapter, span.verse_end]
+            for span in spans]
+
+
+@pytest.mark.parametrize('reference, expected', CORPUS, ids=[reference for reference, _ in CORPUS])
+def test_reference_matches_corpus(reference, expected):
+    assert _spans(reference) == expected
@@ -0,0 +1,162 @@
+"""
+Поиск по темам в памяти (utils/topic_search.py) и обновление индекса
+services/topic_service.py при добавлении, изменении и удалении темы через
+универсальный менеджер БД.
+"""
+import asyncio
+
+import pytest
+
+from database.query_cache import query_cache
+from database.universal_manager import UniversalDatabaseManager
+from services.topic_service import TopicService
+from utils.api_client import bible_api
+from utils.topic_search import TopicSearchIndex
+
+
+def _names(results):
+    return [topic['topic'] for topic in results]
+
+
+@pytest.fixture
+def index():
+    index = TopicSearchIndex()
+    index.set_topic('Молитва', {'topic': 'Молитва'}, ['Непрестанно молитесь'])
+    index.set_topic('Надежда', {'topic': 'Надежда'}, ['Надежда не постыжает', 'Много может усиленная молитва праведного'])
+    index.set_topic('Твёрдость в вере', {'topic': 'Твёрдость в вере'}, ['Стойте в вере, будьте мужественны'])
+    index.set_topic('Вера и дела', {'topic': 'Вера и дела'}, ['Вера без дел мертва'])
+    return index
+
+
+def test_name_match_ranks_above_verse_match(index):
+    assert _names(index.search('молитва')) == ['Молитва', 'Надежда']
+
+
+def test_all_query_words_rank_first(index):
+    assert _names(index.search('вера дела'))[0] == 'Вера и дела'
+    # Вся фраза в названии темы дает бонус
+    results = index.search('твердость в вере')
+    assert results[0]['topic'] == 'Твёрдость в вере'
+    assert results[0]['score'] > results[1]['score']
+
+
+def test_prefix_match(index):
+    assert _names(index.search('молит'))[0] == 'Молитва'
+    assert _names(index.search('надеж')) == ['Надежда']
+
+
+def test_yo_is_e(index):
+    assert _names(index.search('твердость')) == ['Твёрдость в вере']
+    assert _names(index.search('твёрдость')) == ['Твёрдость в вере']
+    assert _names(index.search('Надёжда')) == ['Надежда']
+
+
+def test_similar_word(index):
+    assert _names(index.search('малитва'))[0] == 'Молитва'
+
+
+def test_replace_and_remove_topic(index):
+    index.set_topic('Молитва', {'topic': 'Молитва'}, ['Просите, и дано будет вам'])
+    assert _names(index.search('непрестанно')) == []
+    assert _names(index.search('просите')) == ['Молитва']
+
+    index.remove_topic('Молитва')
+    assert 'Молитва' not in index
+    assert len(index) == 3
+    assert _names(index.search('просите')) == []
+    assert index.search('   ') == []
+
+
+# --- Обновление индекса по изменениям тем в базе ---
+
+class TopicsManager:
+    """Темы бэкенда (Supabase/PostgreSQL) в памяти"""
+
+    def __init__(self):
+        self.topics = {1: {'id': 1, 'topic_name': 'Надежда', 'verses': 'Рим 8:28'}}
+
+    async def get_bible_topics(self, search_query="", limit=50):
+        return [dict(topic) for topic in self.topics.values()][:limit]
+
+    async def add_bible_topic(self, topic_name, verses):
+        topic_id = max(self.topics, default=0) + 1
+        self.topics[topic_id] = {'id': topic_id, 'topic_name': topic_name, 'verses': verses}
+        return True
+
+    async def update_bible_topic(self, topic_id, topic_name=None, verses=None):
+        topic = self.topics[topic_id]
+        if topic_name is not None:
+            topic['topic_name'] = topic_name
+        if verses is not None:
+            topic['verses'] = verses
+        return True
+
+    async def delete_bible_topic(self, topic_id):
+        return self.topics.pop(topic_id, None) is not None
+
+
+CHAPTERS = {
+    (52, 8): {"28": "любящим Бога все содействует ко благу"},
+    (43, 3): {"16": "Ибо так возлюбил Бог мир"},
+    (19, 22): {"1": "Господь - Пастырь мой"},
+}
+
+
+@pytest.fixture
+def db(monkeypatch):
+    async def get_chapter(book, chapter, translation="rst"):
+        return dict(CHAPTERS.get((book, chapter), {}), info={})
+
+    async def get_text(book, chapter, *args):
+        return f"{book}:{chapter}"
+
+    monkeypatch.setattr(bible_api, 'get_chapter', get_chapter)
+    monkeypatch.setattr(bible_api, 'get_verses', get_text)
+    monkeypatch.setattr(bible_api, 'get_formatted_chapter', get_text)
+
+    query_cache.clear()
+    manager = UniversalDatabaseManager()
+    manager.manager = TopicsManager()
+    manager.is_supabase = True
+    manager.is_postgres = False
+    monkeypatch.setattr('database.universal_manager.universal_db_manager', manager)
+    yield manager
+    query_cache.clear()
+
+
+def test_index_follows_topic_changes(db):
+    service = TopicService()
+
+    async def scenario():
+        try:
+            await service.ensure_loaded()
+            await service._render_task
+            found = {'loaded': _names(service.search('благу'))}
+
+            await db.add_bible_topic('Молитва', 'Пс 22')
+            await service._render_task
+            found['added'] = _names(service.search('пастырь'))
+
+            await db.update_bible_topic(1, topic_name='Упование', verses='Ин 3:16')
+            await service._render_task
+            found['renamed'] = (_names(service.search('надежда')), _names(service.search('упование')))
+            found['new verses'] = (_names(service.search('благу')), _names(service.search('возлюбил')))
+
+            # Добавленная тема еще без ID - удаление перечитывает темы из базы
+            await db.delete_bible_topic(2)
+            await service._reload_task
+            found['deleted'] = _names(service.search('молитва'))
+            return found
+        finally:
+            await service.stop()
+
+    found = asyncio.run(scenario())
+    assert found == {
+        'loaded': ['Надежда'],
+        'added': ['Молитва'],
+        'renamed': ([], ['Упование']),
+        'new verses': ([], ['Упование']),
+        'deleted': [],
+    }
+    assert service.topic_names() == ['Упование']
+    assert len(service.index) == 1
@@ -0,0 +1,113 @@
+"""
+Темы в памяти (services/topic_service.py): загрузка, поиск темы и ее стихов,
+тексты стихов; API запускает сервис без подготовки текстов.
+"""
+import asyncio
+
+import pytest
+
+from config.settings import AVAILABLE_TRANSLATIONS
+from database.universal_manager import universal_db_manager
+from services.topic_service import TopicService
+from utils.api_client import bible_api
+
+TOPICS = [
+    {'topic': 'Надежда', 'verses': ['Рим 8:28', 'Ин 3:16-18'], 'id': 1},
+    {'topic': 'Молитва', 'verses': ['Пс 22'], 'id': 2},
+]
+
+
+@pytest.fixture
+def bible(monkeypatch):
+    """Тексты стихов без сети; calls - запрошенные тексты (книга, глава, стихи, перевод)"""
+    calls = []
+
+    async def get_verses(book, chapter, verse_range, translation="rst"):
+        calls.append((book, chapter, verse_range, translation))
+        return f"{book}:{chapter}:{verse_range} ({translation})"
+
+    async def get_formatted_chapter(book, chapter, translation="rst"):
+        calls.append((book, chapter, None, translation))
+        return f"{book}:{chapter} ({translation})"
+
+    chapters = {
+        (43, 3): {"16": "Ибо так возлюбил Бог мир", "17": "", "18": ""},
+        (52, 8): {"28": "любящим Бога все содействует ко благу"},
+        (19, 22): {"1": "Господь - Пастырь мой"},
+    }
+
+    async def get_chapter(book, chapter, translation="rst"):
+        return dict(chapters[(book, chapter)], info={})
+
+    monkeypatch.setattr(bible_api, 'get_verses', get_verses)
+    monkeypatch.setattr(bible_api, 'get_formatted_chapter', get_formatted_chapter)
+    monkeypatch.setattr(bible_api, 'get_chapter', get_chapter)
+    return calls
+
+
+@pytest.fixture
+def service(monkeypatch):
+    async def load_topics():
+        return [dict(topic) for topic in TOPICS]
+
+    monkeypatch.setattr('utils.topics.load_topics_from_supabase', load_topics)
+    # Подписка тестового сервиса на изменения тем не переживает тест
+    monkeypatch.setattr(universal_db_manager, '_topic_listeners', [])
+    return TopicService()
+
+
+def _run(service, coro):
+    async def scenario():
+        try:
+            return await coro
+        finally:
+            await service.stop()
+    return asyncio.run(scenario())
+
+
+def test_load_and_lookup(service, bible):
+    async def scenario():
+        await service.ensure_loaded()
+        return service.topic_names()
+
+    assert _run(service, scenario()) == ['Надежда', 'Молитва']
+    assert service.is_topic(' Молитва ')
+    assert not service.is_topic('Радость')
+    assert service.verses('Надежда') == ['Рим 8:28', 'Ин 3:16-18']
+    assert service.verses('Радость') == []
+    assert service.reference('Ин 3:16-18') == (43, 3, 16, 18)
+    assert service.reference('Пс 22') == (19, 22, None, None)
+    assert service.reference('Ин 1:1') is None
+
+
+def test_verse_text_is_rendered_once(service, bible):
+    async def scenario():
+        await service.ensure_loaded()
+        await service._render_task
+        bible.clear()
+        first = await service.verse_text('Ин 3:16-18', 'rst')
+        second = await service.verse_text('Ин 3:16-18', 'rst')
+        return first, second, await service.verse_text('Ин 1:1')
+
+    first, second, unknown = _run(service, scenario())
+    assert first == second == ['43:3:(16, 18) (rst)']
+    # Текст подготовлен в фоне, повторно не запрашивается
+    assert bible == []
+    assert unknown is None
+    assert service.summary()['texts'] == len(set(service._references.values())) * len(AVAILABLE_TRANSLATIONS)
+
+
+def test_api_start_only_indexes(service, bible):
+    async def scenario():
+        await service.start(interval=3600, render=False)
+        await service._render_task
+        found = service.search('возлюбил')
+        # Текст по запросу готовится без предварительной подготовки
+        text = await service.verse_text('Пс 22', 'rbo')
+        return found, text
+
+    found, text = _run(service, scenario())
+    assert [topic['topic'] for topic in found] == ['Надежда']
+    assert text == ['19:22 (rbo)']
+    assert bible == [(19, 22, None, 'rbo')]
+    assert service.summary()['indexed'] == 2
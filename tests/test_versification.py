@@ -0,0 +1,53 @@
+"""
+Проверка ссылок по таблице стихов и без нее.
+
+Без таблицы глава проверяется по bible_data.max_chapters, стихи - по
+самой длинной главе Библии, поэтому модулю нужен bible_data (pandas).
+"""
+import json
+
+import pytest
+
+from utils.versification import MAX_CHAPTER_VERSES, Versification
+
+MATTHEW = 40
+
+
+@pytest.fixture
+def with_table(tmp_path):
+    # Мф: 28 глав, в 5-й главе 48 стихов
+    chapters = [25, 23, 17, 25, 48] + [30] * 23
+    path = tmp_path / 'versification.json'
+    path.write_text(json.dumps({'rst': {str(MATTHEW): chapters}}), encoding='utf-8')
+    return Versification(str(path))
+
+
+@pytest.fixture
+def without_table(tmp_path):
+    # Файла таблицы нет, локальных файлов Библии (LOCAL_FILES_PATH) в репозитории нет
+    return Versification(str(tmp_path / 'missing.json'))
+
+
+def test_table_bounds_chapter_and_verses(with_table):
+    assert with_table.is_valid_reference(MATTHEW, 5, 3, 12)
+    assert with_table.is_valid_reference(MATTHEW, 5, 48)
+    assert not with_table.is_valid_reference(MATTHEW, 5, 49)
+    assert not with_table.is_valid_reference(MATTHEW, 5, 3, 999)
+    assert not with_table.is_valid_reference(MATTHEW, 29)
+    assert not with_table.is_valid_reference(MATTHEW, 5, 12, 3)
+
+
+def test_without_table_falls_back_to_max_chapters(without_table):
+    assert without_table.is_valid_reference(MATTHEW, 28, 20)
+    assert not without_table.is_valid_reference(MATTHEW, 29)
+    assert not without_table.is_valid_reference(1, 99, 1)
+    assert not without_table.is_valid_reference(MATTHEW, 5, 3, MAX_CHAPTER_VERSES + 1)
+    assert without_table.is_valid_reference(19, 118, 1, MAX_CHAPTER_VERSES)
+
+
+def test_extracted_references_are_bounded(without_table, monkeypatch):
+    from utils import reference_extractor
+
+    monkeypatch.setattr(reference_extractor, 'versification', without_table)
+    found = reference_extractor.extract_references("Быт 99:1 Мф 5:999 Ин 3:16 Быт 1:1-51:2")
+    assert [found_reference.text for found_reference in found] == ["Ин 3:16"]
@@ -7,6 +7,7 @@ from typing import Dict, List, Tuple, Optional
 from datetime import datetime
 
 from config.settings import EXCEL_FILES
+from utils.versification import versification
 
 # Инициализация логгера
 logger = logging.getLogger(__name__)
@@ -262,11 +263,18 @@ class BibleData:
         return self.get_book_name(book_id)
 
     def get_book_id(self, abbr: str) -> Optional[int]:
-        """Возвращает ID книги по её сокращению."""
-        return self.book_abbr_dict.get(abbr)
+        """Возвращает ID книги по её сокращению (или названию с опечаткой)."""
+        book_id = self.book_abbr_dict.get(abbr)
+        if book_id is None and abbr:
+            from utils.reference_parser import reference_engine
+            book_id = reference_engine.resolve_book(abbr)
+        return book_id
 
     def is_valid_chapter(self, book_id: int, chapter: int) -> bool:
         """Проверяет, существует ли указанная глава в книге."""
+        chapters = versification.chapter_count(book_id)
+        if chapters is not None:
+            return 1 <= chapter <= chapters
         if book_id not in self.max_chapters:
             return False
         return 1 <= chapter <= self.max_chapters[book_id]
@@ -295,11 +303,17 @@ class BibleData:
 
     def normalize_book_name(self, name: str) -> str:
         """
-        Приводит название книги к стандартному сокращению (например, 'от иоанна' -> 'Ин').
+        Приводит название книги к стандартному сокращению (например, 'от иоанна' -> 'Ин',
+        с опечаткой 'матвея' -> 'Мф').
         Возвращает сокращение или исходное значение, если не найдено.
         """
         name = name.strip().lower()
-        return self.book_synonyms.get(name, name.capitalize())
+        abbr = self.book_synonyms.get(name)
+        if abbr is None and name:
+            from utils.reference_parser import reference_engine
+            book_id = reference_engine.resolve_book(name)
+            abbr = reference_engine.book_abbr(book_id) if book_id else None
+        return abbr or name.capitalize()
 
     def parse_reference(self, reference: str) -> Optional[Tuple[int, int, Optional[int], Optional[int]]]:
         """
@@ -311,39 +325,26 @@ class BibleData:
         Returns:
             Кортеж (book_id, chapter, start_verse, end_verse) или None при ошибке
         """
-        import re
+        from utils.reference_parser import reference_engine
 
-        # Пример: Ин 3:16-18 или от иоанна 3:16
-        match = re.match(
-            r'^([а-яА-ЯёЁ0-9\s]+)\s+(\d+)(?::(\d+)(?:-(\d+))?)?$', reference.strip(), re.IGNORECASE)
-        if not match:
+        # Пример: Ин 3:16-18 или от иоанна 3:16 (одна глава, без списков)
+        spans = reference_engine.parse(reference)
+        if not spans or len(spans) > 1:
             return None
-
-        book_raw = match.group(1).strip()
-        chapter = int(match.group(2))
-        verse = match.group(3)
-        verse_end = match.group(4)
-
-        # Нормализация названия книги
-        book_abbr = self.normalize_book_name(book_raw)
-        if not book_abbr:
-            return None
-
-        # Получаем ID книги
-        book_id = self.get_book_id(book_abbr)
-        if not book_id:
+        span = spans[0]
+        if span.end_chapter != span.chapter:
             return None
 
         # Проверяем корректность главы
-        if not self.is_valid_chapter(book_id, chapter):
+        if not self.is_valid_chapter(span.book_id, span.chapter):
             return None
 
-        if verse and verse_end:
-            return (book_id, chapter, int(verse), int(verse_end))
-        elif verse:
-            return (book_id, chapter, int(verse), None)
+        if span.verse_start is not None and span.verse_end != span.verse_start:
+            return (span.book_id, span.chapter, span.verse_start, span.verse_end)
+        elif span.verse_start is not None:
+            return (span.book_id, span.chapter, span.verse_start, None)
         else:
-            return (book_id, chapter, None, None)
+            return (span.book_id, span.chapter, None, None)
 
 
 # Создаем глобальный экземпляр класса для использования в других модулях
@@ -393,6 +394,45 @@ def get_english_book_abbreviation(book_id):
     return None
 
 
+async def get_chapter_cached_data(user_id, book_id, chapter, verse_start=None, verse_end=None, commentary_verses=None):
+    """
+    Получает данные пользователя для кнопок главы/стиха одним запросом к БД.
+
+    Args:
+        user_id: ID пользователя
+        book_id: ID книги
+        chapter: номер главы
+        verse_start: начальный стих (для закладки)
+        verse_end: конечный стих (для закладки)
+        commentary_verses: (chapter_end, verse_start, verse_end) для поиска толкований;
+            по умолчанию (chapter, verse_start или 0, verse_start или 0), как при сохранении из кнопок главы
+
+    Returns:
+        dict: cached_data для create_chapter_action_buttons
+            (is_bookmarked, ai_commentary, lopukhin_commentary)
+    """
+    from database.universal_manager import universal_db_manager
+
+    if commentary_verses is None:
+        verse_for_commentary = verse_start if verse_start else 0
+        commentary_verses = (chapter, verse_for_commentary, verse_for_commentary)
+    commentary_chapter_end, commentary_verse_start, commentary_verse_end = commentary_verses
+
+    try:
+        return await universal_db_manager.get_passage_user_context(
+            user_id,
+            {'book_id': book_id, 'chapter_start': chapter, 'chapter_end': None,
+             'verse_start': verse_start, 'verse_end': verse_end},
+            {'book_id': book_id, 'chapter_start': chapter, 'chapter_end': commentary_chapter_end,
+             'verse_start': commentary_verse_start, 'verse_end': commentary_verse_end}
+        )
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).error(
+            f"Ошибка при проверке сохраненных толкований: {e}")
+        return {'is_bookmarked': False, 'ai_commentary': None, 'lopukhin_commentary': None}
+
+
 async def create_chapter_action_buttons(book_id, chapter, en_book=None, exclude_ai=False, user_id=None, verse_start=None, verse_end=None, cached_data=None):
     """
     Создает кнопки действий для главы (Толкование Лопухина и Разбор от ИИ).
@@ -404,6 +444,7 @@ async def create_chapter_action_buttons(book_id, chapter, en_book=None, exclude_
         en_book: английское сокращение книги (если None, будет определено автоматически)
         exclude_ai: если True, исключает кнопку AI разбора
         user_id: ID пользователя для проверки сохраненных толкований
+        cached_data: результат get_chapter_cached_data (если уже получен)
 
     Returns:
         list: Список кнопок для использования в клавиатуре
@@ -429,58 +470,12 @@ async def create_chapter_action_buttons(book_id, chapter, en_book=None, exclude_
             saved_lopukhin_commentary = cached_data.get('lopukhin_commentary')
             is_bookmarked = cached_data.get('is_bookmarked', False)
         else:
-            # Выполняем запросы только если кэш не передан
-            try:
-                from database.universal_manager import universal_db_manager
-                import asyncio
-
-                # Определяем стих для проверки толкований
-                verse_for_commentary = verse_start if verse_start else 0
-
-                # ОПТИМИЗАЦИЯ: Выполняем только нужные проверки параллельно
-                tasks = []
-
-                # Проверяем ИИ толкования
-                tasks.append(universal_db_manager.get_saved_commentary(
-                    user_id, book_id, chapter, chapter, verse_for_commentary, verse_for_commentary, "ai"
-                ))
-
-                # Проверяем закладки
-                from handlers.bookmark_handlers import check_if_bookmarked
-                tasks.append(check_if_bookmarked(
-                    user_id, book_id, chapter,
-                    verse_start=verse_start, verse_end=verse_end
-                ))
-
-                # Добавляем проверку толкований Лопухина только если они включены
-                lopukhin_task_index = None
-                if ENABLE_LOPUKHIN_COMMENTARY:
-                    lopukhin_task_index = len(tasks)
-                    tasks.append(universal_db_manager.get_saved_commentary(
-                        user_id, book_id, chapter, chapter, verse_for_commentary, verse_for_commentary, "lopukhin"
-                    ))
-
-                # Выполняем все запросы параллельно
-                results = await asyncio.gather(*tasks, return_exceptions=True)
-
-                # Обрабатываем результаты
-                saved_ai_commentary = results[0] if not isinstance(
-                    results[0], Exception) else None
-                is_bookmarked = results[1] if not isinstance(
-                    results[1], Exception) else False
-
-                # Получаем результат толкований Лопухина только если запрос был сделан
-                if lopukhin_task_index is not None:
-                    saved_lopukhin_commentary = results[lopukhin_task_index] if not isinstance(
-                        results[lopukhin_task_index], Exception) else None
-                else:
-                    saved_lopukhin_commentary = None
-
-            except Exception as e:
-                import logging
-                logger = logging.getLogger(__name__)
-                logger.error(
-                    f"Ошибка при проверке сохраненных толкований: {e}")
+            # Один запрос к БД вместо отдельных проверок закладки и толкований
+            cached_data = await get_chapter_cached_data(
+                user_id, book_id, chapter, verse_start=verse_start, verse_end=verse_end)
+            saved_ai_commentary = cached_data['ai_commentary']
+            saved_lopukhin_commentary = cached_data['lopukhin_commentary']
+            is_bookmarked = cached_data['is_bookmarked']
 
     # Кнопка толкования Лопухина (только если есть en_book)
     if ENABLE_LOPUKHIN_COMMENTARY and en_book:
@@ -1,52 +1,120 @@
+"""
+Толковая Библия Лопухина (локальная SQLite база, только чтение).
+
+База открывается один раз на весь процесс: соединение только для чтения
+(immutable - SQLite не проверяет изменения файла и не берет блокировки)
+с отображением файла в память (mmap). Запросы выполняются в пуле потоков,
+поэтому не блокируют цикл событий бота.
+
+Толкования кэшируются целыми главами (LRU): первое обращение к главе
+загружает все ее стихи одним запросом, дальше толкование стиха и
+постраничный просмотр главы берутся из памяти.
+"""
+import asyncio
+import logging
+import os
 import sqlite3
-from typing import Optional
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Сколько глав держать в памяти и сколько байт файла отображать в память
+LOPUKHIN_CACHE_CHAPTERS = int(os.getenv('LOPUKHIN_CACHE_CHAPTERS', '128'))
+LOPUKHIN_MMAP_SIZE = int(os.getenv('LOPUKHIN_MMAP_SIZE', str(256 * 1024 * 1024)))
 
 
 class LopukhinCommentary:
-    def __init__(self, db_path='data/lopukhin_commentary_rag.sqlite'):
+    def __init__(self, db_path='data/lopukhin_commentary_rag.sqlite',
+                 cache_chapters: int = LOPUKHIN_CACHE_CHAPTERS):
         self.db_path = db_path
+        self.cache_chapters = cache_chapters
+        self._conn: Optional[sqlite3.Connection] = None
+        # Соединение используется из потоков пула - по одному запросу за раз
+        self._conn_lock = threading.Lock()
+        self._load_lock: Optional[asyncio.Lock] = None
+        # (книга, глава) -> [(стих, текст), ...] по возрастанию стиха
+        self._chapters: "OrderedDict[Tuple[str, int], List[Tuple[int, str]]]" = OrderedDict()
+        self._unavailable = False
+
+    def _connect(self) -> sqlite3.Connection:
+        """Долгоживущее соединение только для чтения"""
+        if self._conn is None:
+            if not os.path.exists(self.db_path):
+                raise FileNotFoundError(f"База толкований Лопухина не найдена: {self.db_path}")
+            uri = f"file:{os.path.abspath(self.db_path)}?mode=ro&immutable=1"
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size = {LOPUKHIN_MMAP_SIZE}")
+            self._conn = conn
+            logger.info(f"База толкований Лопухина открыта только для чтения: {self.db_path}")
+        return self._conn
+
+    def _load_chapter_sync(self, book: str, chapter: int) -> List[Tuple[int, str]]:
+        with self._conn_lock:
+            cursor = self._connect().execute(
+                "SELECT verse, text FROM commentary WHERE book=? AND chapter=? ORDER BY verse",
+                (book, chapter)
+            )
+            return cursor.fetchall()
 
-    def get_commentary(self, book: str, chapter: int, verse: int) -> Optional[str]:
+    async def get_chapter(self, book: str, chapter: int) -> List[Tuple[int, str]]:
+        """Все толкования главы (стих, текст); стих 0 - толкование на главу"""
+        key = (book, chapter)
+        rows = self._chapters.get(key)
+        if rows is not None:
+            self._chapters.move_to_end(key)
+            return rows
+        if self._unavailable:
+            return []
+
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            # Главу мог загрузить параллельный запрос, пока мы ждали
+            rows = self._chapters.get(key)
+            if rows is not None:
+                return rows
+            try:
+                rows = await asyncio.to_thread(self._load_chapter_sync, book, chapter)
+            except FileNotFoundError as e:
+                logger.error(str(e))
+                self._unavailable = True
+                return []
+            except Exception as e:
+                logger.error(f"Ошибка чтения толкований Лопухина {book} {chapter}: {e}")
+                return []
+
+            self._chapters[key] = rows
+            while len(self._chapters) > self.cache_chapters:
+                self._chapters.popitem(last=False)
+            return rows
+
+    async def get_commentary(self, book: str, chapter: int, verse: int) -> Optional[str]:
         """
         Получить толкование по книге (англ. сокращение), главе и стиху.
         Если не найдено точное совпадение по стиху, ищет по главе (verse=0), иначе None.
         """
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        # Сначала ищем точное совпадение
-        cursor.execute(
-            "SELECT text FROM commentary WHERE book=? AND chapter=? AND verse=?",
-            (book, chapter, verse)
-        )
-        row = cursor.fetchone()
-        if row:
-            conn.close()
-            return row[0]
-        # Если не найдено, ищем толкование на главу (verse=0)
-        cursor.execute(
-            "SELECT text FROM commentary WHERE book=? AND chapter=? AND verse=0",
-            (book, chapter)
-        )
-        row = cursor.fetchone()
-        conn.close()
-        if row:
-            return row[0]
-        return None
-
-    def get_all_commentaries_for_chapter(self, book: str, chapter: int) -> list:
+        chapter_text = None
+        for row_verse, text in await self.get_chapter(book, chapter):
+            if row_verse == verse:
+                return text
+            if row_verse == 0 and chapter_text is None:
+                chapter_text = text
+        return chapter_text
+
+    async def get_all_commentaries_for_chapter(self, book: str, chapter: int) -> list:
         """
         Получить все толкования для главы (book, chapter) — список (verse, text).
         """
-        import sqlite3
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute(
-            "SELECT verse, text FROM commentary WHERE book=? AND chapter=? ORDER BY verse",
-            (book, chapter)
-        )
-        rows = cursor.fetchall()
-        conn.close()
-        return rows
+        return list(await self.get_chapter(book, chapter))
+
+    def close(self):
+        """Закрывает соединение с базой"""
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
 
 
 lopukhin_commentary = LopukhinCommentary()
@@ -0,0 +1,255 @@
+"""
+Полнотекстовый поиск по Толковой Библии Лопухина (SQLite FTS5).
+
+Индекс строится один раз командой build_lopukhin_index.py в отдельный файл
+(основная база толкований открывается только для чтения и не меняется):
+
+    python build_lopukhin_index.py
+
+Русская морфология: токенизатор unicode61 приводит регистр, а слова запроса
+обрезаются до основы (stem) и ищутся по префиксу - «молитвы» находит
+«молитва», «молитвою», «молитвенный». Буква ё в индексе и запросе
+заменяется на е. Результаты ранжируются по BM25, для каждого возвращается
+фрагмент текста с выделенными совпадениями.
+
+Запросы выполняются через долгоживущее соединение только для чтения в пуле
+потоков, поэтому не зависят от размера корпуса и не блокируют бота.
+"""
+import asyncio
+import html
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+LOPUKHIN_DB_PATH = 'data/lopukhin_commentary_rag.sqlite'
+LOPUKHIN_FTS_PATH = os.getenv('LOPUKHIN_FTS_PATH', 'data/lopukhin_commentary_fts.sqlite')
+
+# Маркеры совпадений в snippet(): заменяются на теги после экранирования HTML
+_MARK_START = '\x02'
+_MARK_END = '\x03'
+
+_TAG_RE = re.compile(r'<[^>]*>')
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+# Окончания для отсечения (длинные проверяются первыми)
+_REFLEXIVE = ('ся', 'сь')
+_ENDINGS = tuple(sorted((
+    # прилагательные и причастия
+    'ейшими', 'ейшего', 'ейшему', 'ейшая', 'ейший', 'ейшие', 'ейших',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ая', 'яя', 'ое', 'ее', 'ые', 'ие',
+    'ый', 'ий', 'ой', 'ую', 'юю', 'ых', 'их', 'ым', 'им',
+    # глаголы
+    'ешь', 'ете', 'ите', 'ишь', 'ют', 'ят', 'ет', 'ит', 'ут', 'ла', 'ло', 'ли', 'ть', 'ти',
+    'вши',
+    # существительные
+    'иями', 'ями', 'ами', 'ией', 'ием', 'иях', 'ях', 'ах', 'ов', 'ев', 'ей', 'ам', 'ям',
+    'ом', 'ем', 'а', 'я', 'о', 'е', 'ы', 'и', 'у', 'ю', 'ь', 'й',
+), key=len, reverse=True))
+_MIN_STEM = 3
+
+_STOP_WORDS = frozenset((
+    'и', 'в', 'во', 'не', 'на', 'с', 'со', 'что', 'как', 'а', 'но', 'по', 'к', 'ко',
+    'у', 'же', 'за', 'из', 'от', 'о', 'об', 'для', 'до', 'то', 'ли', 'бы', 'его',
+    'ее', 'их', 'это', 'так', 'он', 'она', 'они', 'мы', 'вы', 'я', 'ты',
+))
+
+
+def normalize_text(text: str) -> str:
+    """Текст для индекса и запроса: без HTML-тегов, ё -> е"""
+    return _TAG_RE.sub('', text or '').replace('ё', 'е').replace('Ё', 'Е')
+
+
+def stem(word: str) -> str:
+    """Упрощенная основа русского слова (для поиска по префиксу)"""
+    word = word.lower().replace('ё', 'е')
+    if len(word) <= _MIN_STEM:
+        return word
+    for ending in _REFLEXIVE:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            word = word[:-len(ending)]
+            break
+    for ending in _ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= _MIN_STEM:
+            return word[:-len(ending)]
+    return word
+
+
+def words(text: str) -> List[str]:
+    """Значимые слова текста в нижнем регистре (без HTML, стоп-слов, ё -> е)"""
+    return [w for w in _WORD_RE.findall(normalize_text(text).lower()) if w not in _STOP_WORDS]
+
+
+def build_match_query(query: str, operator: str = 'AND') -> Optional[str]:
+    """
+    Запрос FTS5 из пользовательского текста: основы слов с поиском по префиксу.
+
+    Слова берутся в кавычки, поэтому синтаксис FTS5 в запросе пользователя
+    не интерпретируется. None, если значимых слов нет.
+    """
+    terms = []
+    for word in dict.fromkeys(words(query)):
+        base = stem(word)
+        terms.append(f'"{base}"*' if len(base) >= 2 else f'"{base}"')
+    if not terms:
+        return None
+    return f' {operator} '.join(terms)
+
+
+def _snippet_html(snippet: str) -> str:
+    """Фрагмент с выделением в безопасном HTML (<b>...</b>)"""
+    return html.escape(snippet, quote=False).replace(_MARK_START, '<b>').replace(_MARK_END, '</b>')
+
+
+def build_index(source_path: str = LOPUKHIN_DB_PATH, index_path: str = LOPUKHIN_FTS_PATH,
+                batch_size: int = 1000) -> int:
+    """
+    Строит индекс FTS5 по таблице commentary в отдельный файл.
+
+    Индекс пишется во временный файл и атомарно заменяет прежний, поэтому
+    работающий бот до перезапуска продолжает пользоваться старым индексом.
+
+    Returns:
+        количество проиндексированных толкований
+    """
+    if not os.path.exists(source_path):
+        raise FileNotFoundError(f"База толкований Лопухина не найдена: {source_path}")
+
+    started = time.perf_counter()
+    tmp_path = index_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(os.path.abspath(index_path)), exist_ok=True)
+
+    source = sqlite3.connect(f"file:{os.path.abspath(source_path)}?mode=ro", uri=True)
+    index = sqlite3.connect(tmp_path)
+    try:
+        index.execute("PRAGMA journal_mode = OFF")
+        index.execute("PRAGMA synchronous = OFF")
+        # prefix: индексы префиксов ускоряют поиск по основе слова
+        index.execute('''
+            CREATE VIRTUAL TABLE commentary_fts USING fts5(
+                text,
+                book UNINDEXED,
+                chapter UNINDEXED,
+                verse UNINDEXED,
+                tokenize = 'unicode61 remove_diacritics 2',
+                prefix = '2 3 4'
+            )
+        ''')
+        count = 0
+        rows = source.execute("SELECT book, chapter, verse, text FROM commentary ORDER BY book, chapter, verse")
+        while True:
+            batch = rows.fetchmany(batch_size)
+            if not batch:
+                break
+            index.executemany(
+                "INSERT INTO commentary_fts (text, book, chapter, verse) VALUES (?, ?, ?, ?)",
+                [(normalize_text(text), book, chapter, verse) for book, chapter, verse, text in batch])
+            count += len(batch)
+        # Сливаем сегменты индекса в один - быстрее запросы
+        index.execute("INSERT INTO commentary_fts (commentary_fts) VALUES ('optimize')")
+        index.commit()
+        index.execute("VACUUM")
+    finally:
+        index.close()
+        source.close()
+
+    os.replace(tmp_path, index_path)
+    logger.info(
+        f"Индекс толкований Лопухина построен: {count} записей за "
+        f"{time.perf_counter() - started:.1f}с -> {index_path}")
+    return count
+
+
+class LopukhinSearch:
+    """Поиск по индексу FTS5 через долгоживущее соединение только для чтения"""
+
+    def __init__(self, index_path: str = LOPUKHIN_FTS_PATH):
+        self.index_path = index_path
+        self._conn: Optional[sqlite3.Connection] = None
+        self._conn_lock = threading.Lock()
+        self._missing_logged = False
+
+    @property
+    def available(self) -> bool:
+        return self._conn is not None or os.path.exists(self.index_path)
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            uri = f"file:{os.path.abspath(self.index_path)}?mode=ro&immutable=1"
+            self._conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            logger.info(f"Индекс толкований Лопухина открыт: {self.index_path}")
+        return self._conn
+
+    def _search_sync(self, match: str, limit: int, offset: int, book: Optional[str]) -> List[Dict[str, Any]]:
+        book_filter = 'AND book = ?' if book else ''
+        params: Iterable[Any] = (match, book, limit, offset) if book else (match, limit, offset)
+        with self._conn_lock:
+            rows = self._connect().execute(f'''
+                SELECT book, chapter, verse,
+                       snippet(commentary_fts, 0, '{_MARK_START}', '{_MARK_END}', '…', 24),
+                       bm25(commentary_fts) AS rank
+                FROM commentary_fts
+                WHERE commentary_fts MATCH ? {book_filter}
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            ''', tuple(params)).fetchall()
+        return [
+            {
+                'book': row[0],
+                'chapter': row[1],
+                'verse': row[2],
+                'snippet': _snippet_html(row[3]),
+                'score': round(-row[4], 3),
+            }
+            for row in rows
+        ]
+
+    async def search(self, query: str, limit: int = 10, offset: int = 0,
+                     book: str = None) -> List[Dict[str, Any]]:
+        """
+        Ищет толкования по тексту запроса.
+
+        Сначала ищутся толкования со всеми словами запроса, если таких нет -
+        с любым из них.
+
+        Returns:
+            [{book, chapter, verse, snippet (HTML), score}, ...] по убыванию релевантности
+        """
+        if not self.available:
+            if not self._missing_logged:
+                logger.error(
+                    f"Индекс толкований не найден ({self.index_path}), "
+                    "постройте его: python build_lopukhin_index.py")
+                self._missing_logged = True
+            return []
+
+        match = build_match_query(query)
+        if not match:
+            return []
+        try:
+            results = await asyncio.to_thread(self._search_sync, match, limit, offset, book)
+            if not results and ' AND ' in match:
+                # Пустая страница выдачи "все слова" - либо выдача кончилась, либо ее нет вовсе
+                if offset == 0 or not await asyncio.to_thread(self._search_sync, match, 1, 0, book):
+                    results = await asyncio.to_thread(
+                        self._search_sync, build_match_query(query, 'OR'), limit, offset, book)
+            return results
+        except Exception as e:
+            logger.error(f"Ошибка поиска по толкованиям Лопухина '{query}': {e}")
+            return []
+
+    def close(self):
+        with self._conn_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+lopukhin_search = LopukhinSearch()
@@ -3,20 +3,38 @@
 Интеграция с Holy Trinity Orthodox Calendar API
 """
 import logging
+import os
 import re
 from datetime import datetime, timedelta
+from html import unescape
 from typing import Dict, List, Optional, Tuple, Any
 import aiohttp
 from utils.bible_data import bible_data
+from utils.paschalion import day_info
+from utils.reference_extractor import extract_references, format_span
+from utils.reference_parser import BOOK_FULL_NAMES, reference_engine
+from utils.versification import versification
 
 logger = logging.getLogger(__name__)
 
 
-def get_last_verse_in_chapter(book_name: str, chapter: int) -> int:
+# ID книги -> полное название, как в чтениях календаря ("Матфея", "Притчи")
+CALENDAR_BOOK_NAMES = {book_id: name for name, book_id in BOOK_FULL_NAMES.items()}
+
+
+def get_last_verse_in_chapter(book_name: str, chapter: int, book_id: int = None,
+                              verse_start: int = 1) -> int:
     """
-    Определяет последний стих в указанной главе книги Библии
-    Возвращает приблизительное значение на основе средних показателей
+    Определяет последний стих в указанной главе книги Библии.
+    Берется из таблицы стихов (utils/versification.py), а без нее -
+    приблизительное значение на основе средних показателей, но не меньше
+    verse_start (первого стиха ссылки), чтобы диапазон не получился обратным
     """
+    if book_id:
+        verses = versification.verse_count(book_id, chapter)
+        if verses:
+            return verses
+
     # Стандартные данные о примерном количестве стихов в главах
     # Это приблизительные значения для основных книг
     verse_counts = {
@@ -44,15 +62,158 @@ def get_last_verse_in_chapter(book_name: str, chapter: int) -> int:
 
     # Для некоторых конкретных случаев корректируем
     if book_name == 'Иоанна' and chapter == 15:
-        return 27  # Точно знаем что в Ин 15 - 27 стихов
+        estimated_verses = 27  # Точно знаем что в Ин 15 - 27 стихов
     elif book_name == 'Иоанна' and chapter == 16:
-        return 33  # Точно знаем что в Ин 16 - 33 стиха
+        estimated_verses = 33  # Точно знаем что в Ин 16 - 33 стиха
     elif book_name == '1 Коринфянам' and chapter == 13:
-        return 13  # 1 Кор 13 - 13 стихов
+        estimated_verses = 13  # 1 Кор 13 - 13 стихов
     elif book_name == '1 Коринфянам' and chapter == 14:
-        return 40  # 1 Кор 14 - 40 стихов
+        estimated_verses = 40  # 1 Кор 14 - 40 стихов
+
+    return max(estimated_verses, verse_start or 1)
+
+
+# --- Разбор HTML страницы календаря ---
+
+_TAG_RE = re.compile(r'<[^>]+>')
+_P_CLOSE_RE = re.compile(r'</p\s*>')
+_BLANK_LINES_RE = re.compile(r'\n\s*\n')
+_BULLET_RE = re.compile(r'^\s*[•*]\s*')
+_LEADING_DOTS_RE = re.compile(r'^\s*[.\s]*')
+_BR_TAGS = frozenset(('<br>', '<br/>', '<br />'))
+
+# Характерные начала записей о святых — используем для дополнительного деления по предложениям
+_SAINT_PATTERNS = [
+    r'Славного', r'Святого', r'Святой', r'Святых',
+    r'Преподобного', r'Преподобной', r'Преподобных',
+    r'Мученика', r'Мученицы', r'Мучеников',
+    r'Священномученика', r'Священномучеников',
+    r'Преставление', r'Обретение', r'Перенесение',
+    r'Память', r'Собор', r'Празднование',
+    r'Блаженного', r'Блаженной', r'Блаженных',
+    r'Праведного', r'Праведной', r'Праведных',
+    r'Пророка', r'Пророков',
+    r'Апостола', r'Апостолов',
+    r'Великомученика', r'Великомучеников', r'Великомученицы',
+    r'[А-ЯЁ][а-яё]*(\s+и\s+[А-ЯЁ][а-яё]*)*\s+(пресвитера|диакона|епископа|архиепископа|митрополита)'
+]
+# Делим по точке и пробелу перед характерным началом, НО сохраняем сокращения (напр. "еп.")
+_SAINT_SPLIT_RE = re.compile(r'\.\s+(?=' + '|'.join(_SAINT_PATTERNS) + ')')
+# Известные сокращения временно помечаются, чтобы точка в них не считалась разделителем.
+# "сщмч." после разбора остается "сщм." — так записи святых выглядели и раньше
+_ABBREVIATIONS = (
+    ('еп.', 'еп§'), ('епископа.', 'епископа§'), ('архиеп.', 'архиеп§'), ('митр.', 'митр§'),
+    ('сщмч.', 'сщм§'), ('прп.', 'прп§'), ('мч.', 'мч§'),
+)
+
+# Начала разделов страницы: дата, заголовок, чтения, тропари и память святых
+_SECTION_RE = re.compile(
+    r'<(?:p class="(pdataheader|pheaderheader|pscriptureheader|ptroparionheader)"'
+    r'|span class="(normaltext)")[^>]*>')
+_SECTIONS = frozenset(('pdataheader', 'pheaderheader', 'pscriptureheader', 'ptroparionheader', 'normaltext'))
+_P_TAG_RE = re.compile(r'</?p[^>]*>')
+
+
+def _text(fragment: str) -> str:
+    """Текст фрагмента HTML без тегов, с декодированными сущностями"""
+    return unescape(_TAG_RE.sub('', fragment))
+
+
+def _scan_calendar_page(html_content: str) -> Dict[str, Any]:
+    """
+    Находит разделы страницы календаря за один проход и извлекает их текст.
+
+    Регулярное выражение разделов проходит страницу один раз (до начала
+    последнего из разделов), дальше обрабатываются только фрагменты разделов:
+    дата (pdataheader), заголовок (pheaderheader), память святых (от
+    span.normaltext до заголовка чтений, None если нет), чтения дня (от
+    pscriptureheader до ptroparionheader, по строкам <br>) и тропари (от
+    ptroparionheader до </body>, None если нет).
+    """
+    # Раздел -> (начало тега, конец тега) первого вхождения
+    sections: Dict[str, Tuple[int, int]] = {}
+    for match in _SECTION_RE.finditer(html_content):
+        name = match.group(1) or match.group(2)
+        if name not in sections:
+            sections[name] = match.span()
+            if len(sections) == len(_SECTIONS):
+                break
+
+    def paragraph_body(name: str) -> Optional[int]:
+        """Начало содержимого после </p>, закрывающего заголовок раздела"""
+        if name not in sections:
+            return None
+        close = html_content.find('</p>', sections[name][1])
+        return None if close == -1 else close + 4
+
+    page = {'date': '', 'header': '', 'saints': None, 'scripture_readings': [], 'tropars': None}
+
+    for key, name in (('date', 'pdataheader'), ('header', 'pheaderheader')):
+        if name in sections:
+            start = sections[name][1]
+            end = html_content.find('</p>', start)
+            if end != -1:
+                page[key] = _text(html_content[start:end])
+
+    if 'normaltext' in sections:
+        start = sections['normaltext'][1]
+        end = html_content.find('<p class="pscriptureheader"', start)
+        if end != -1:
+            block = html_content[start:end]
+            # Сохраняем логические разделители перед удалением тегов
+            for br in _BR_TAGS:
+                block = block.replace(br, '\n')
+            page['saints'] = _text(_P_CLOSE_RE.sub('\n', block))
+
+    start = paragraph_body('pscriptureheader')
+    if start is not None:
+        end = html_content.find('<p class="ptroparionheader"', start)
+        block = html_content[start:] if end == -1 else html_content[start:end]
+        lines = (_text(line).strip() for line in block.split('<br>'))
+        page['scripture_readings'] = [line for line in lines if line]
+
+    start = paragraph_body('ptroparionheader')
+    if start is not None:
+        end = html_content.find('</body>', start)
+        block = html_content[start:] if end == -1 else html_content[start:end]
+        # Абзацы тропарей разделяются переносами строк
+        page['tropars'] = _text(_P_TAG_RE.sub('\n', block))
+
+    return page
+
+
+def _split_saints(saints_text: str) -> List[str]:
+    """Делит текст памяти святых на отдельные записи"""
+    saints = []
+    for raw in saints_text.replace('\r', '').split('\n'):
+        line = raw.strip()
+        if not line:
+            continue
+        # Удаляем маркерный символ в начале строки (только если он в начале)
+        line = _BULLET_RE.sub('', line)
+        for abbreviation, protected in _ABBREVIATIONS:
+            line = line.replace(abbreviation, protected)
+        # Дополнительное деление по предложениям, если в строке несколько святых
+        for piece in _SAINT_SPLIT_RE.split(line):
+            if piece is None:
+                continue
+            entry = piece.strip().replace('§', '.')
+            if not entry:
+                continue
+            # Убираем лишние символы в начале
+            entry = _LEADING_DOTS_RE.sub('', entry)
+            # Фильтр от технических строк и слишком коротких обрывков типа "Сщмч."
+            if (len(entry) > 10 and
+                not entry.startswith('Седмица') and
+                    not entry.startswith('Глас')):
+                if not entry.endswith('.'):
+                    entry += '.'
+                saints.append(entry)
+    return saints
+
 
-    return estimated_verses
+_MONTHS_GENITIVE = ('января', 'февраля', 'марта', 'апреля', 'мая', 'июня', 'июля',
+                    'августа', 'сентября', 'октября', 'ноября', 'декабря')
 
 
 # Базовый URL для православного календаря
@@ -73,7 +234,6 @@ class OrthodoxyCalendar:
 
     def __init__(self):
         self._session = None
-        self._cache = {}  # Простой кэш для календарных данных
 
     async def get_session(self) -> aiohttp.ClientSession:
         """Возвращает HTTP сессию"""
@@ -86,37 +246,16 @@ class OrthodoxyCalendar:
         if self._session and not self._session.closed:
             await self._session.close()
 
-    async def get_calendar_data(self,
-                                date: datetime = None,
-                                settings: Dict = None) -> Optional[str]:
+    def build_request_params(self, date: datetime, settings: Dict = None) -> Dict[str, int]:
         """
-        Получает данные православного календаря на указанную дату
+        Параметры запроса к календарю для даты и настроек отображения.
 
-        Args:
-            date: Дата для получения календаря (по умолчанию - сегодня)
-            settings: Настройки отображения календаря
-
-        Returns:
-            HTML-содержимое календаря или None при ошибке
+        Одинаковые по смыслу настройки (True и 1, '4' и 4) дают одинаковые
+        параметры, поэтому параметры без даты служат ключом профиля настроек.
         """
-        if date is None:
-            date = datetime.now()
-
         if settings is None:
             settings = DEFAULT_CALENDAR_SETTINGS
 
-        # Создаем ключ кэша
-        cache_key = f"calendar_{date.strftime('%Y_%m_%d')}_{hash(str(settings))}"
-
-        # Проверяем кэш
-        if cache_key in self._cache:
-            cached_data, cache_time = self._cache[cache_key]
-            # Кэш действителен 1 час
-            if (datetime.now() - cache_time).total_seconds() < 3600:
-                logger.debug(f"Календарь получен из кэша: {cache_key}")
-                return cached_data
-
-        # Формируем параметры запроса
         params = {
             'month': date.month,
             'today': date.day,
@@ -159,9 +298,79 @@ class OrthodoxyCalendar:
             params['scripture'] = int(scripture_setting) if scripture_setting in [
                 0, 1, 2] else 1
 
+        return params
+
+    def get_offline_content(self, date: datetime, params: Dict[str, int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Данные календаря без обращения к сайту: дата по новому и старому стилю,
+        седмица, праздники, глас и чтения дня по пасхалии (utils/paschalion.py).
+
+        Замена сайта, когда он недоступен: в таблицах нет житий, тропарей,
+        чтений святым дня и утреннего Евангелия.
+
+        Args:
+            date: Дата календаря
+            params: Параметры запроса (build_request_params): dt, header и
+                scripture включают дату, заголовок и чтения
+
+        Returns:
+            Словарь как у parse_calendar_content (без житий и тропарей) или None,
+            если чтений этого дня нет в таблицах пасхалии
+        """
+        if params is None:
+            params = self.build_request_params(date)
+        info = day_info(date)
+        if info['readings'] is None:
+            return None
+
+        day, julian = info['date'], info['julian_date']
+        header_parts = []
+        week = info['week_after_pentecost']
+        if week and not (day.weekday() == 6 and any(f.startswith('Неделя') for f in info['feasts'])):
+            header_parts.append(f"{'Неделя' if day.weekday() == 6 else 'Седмица'} {week}-я по Пятидесятнице")
+        header_parts.extend(info['feasts'])
+        if info['tone']:
+            header_parts.append(f"Глас {info['tone']}")
+
+        readings = list(info['readings']) if params['scripture'] else []
+        return {
+            'date': (f"{day.day} {_MONTHS_GENITIVE[day.month - 1]} {day.year} г. "
+                     f"({julian.day} {_MONTHS_GENITIVE[julian.month - 1]} ст.ст.)") if params['dt'] else '',
+            'header': '. '.join(header_parts) + '.' if header_parts and params['header'] else '',
+            'saints': [],
+            'tropars': '',
+            'scripture_readings': readings,
+            'scripture_references': self._parse_scripture_references(readings),
+            'offline': True,
+        }
+
+    async def get_calendar_data(self,
+                                date: datetime = None,
+                                settings: Dict = None) -> Optional[str]:
+        """
+        Загружает HTML православного календаря на указанную дату
+
+        Результат не кэшируется: разобранные данные календаря кэширует
+        services/calendar_service.py.
+
+        Args:
+            date: Дата для получения календаря (по умолчанию - сегодня)
+            settings: Настройки отображения календаря
+
+        Returns:
+            HTML-содержимое календаря или None при ошибке
+        """
+        if date is None:
+            date = datetime.now()
+
+        if settings is None:
+            settings = DEFAULT_CALENDAR_SETTINGS
+
+        params = self.build_request_params(date, settings)
+
         # Отладочный вывод (можно отключить переменной окружения CALENDAR_LOG_VERBOSE)
-        import os
-        if os.getenv('CALENDAR_LOG_VERBOSE', '0') in ('1', 'true', 'yes'):
+        verbose = os.getenv('CALENDAR_LOG_VERBOSE', '0') in ('1', 'true', 'yes')
+        if verbose:
             logger.info(
                 f"Настройки полученные в get_calendar_data: {settings}")
             logger.info(f"Параметры запроса к календарю: {params}")
@@ -172,10 +381,7 @@ class OrthodoxyCalendar:
                 if response.status == 200:
                     html_content = await response.text(encoding='windows-1251')
 
-                    # Сохраняем в кэш
-                    self._cache[cache_key] = (html_content, datetime.now())
-
-                    if os.getenv('CALENDAR_LOG_VERBOSE', '0') in ('1', 'true', 'yes'):
+                    if verbose:
                         logger.info(
                             f"Календарь успешно получен для {date.strftime('%Y-%m-%d')}")
                         logger.info(
@@ -194,6 +400,9 @@ class OrthodoxyCalendar:
         """
         Парсит HTML-содержимое календаря и извлекает структурированные данные
 
+        Страница просматривается один раз (_scan_calendar_page), затем
+        разбираются только найденные фрагменты.
+
         Args:
             html_content: HTML-содержимое календаря
 
@@ -203,155 +412,21 @@ class OrthodoxyCalendar:
         if not html_content:
             return {}
 
-        # Удаляем HTML теги, оставляя только <p>, </p> и <br>
-        # Аналогично примеру из документации
-        import re
-        from html import unescape
-
-        # Декодируем HTML entities
-        clean_content = unescape(html_content)
-
+        page = _scan_calendar_page(html_content)
         result = {
-            'date': '',
-            'header': '',
-            'saints': [],
+            'date': page['date'].strip(),
+            'header': page['header'].strip(),
+            'saints': _split_saints(page['saints']) if page['saints'] is not None else [],
             'tropars': '',
-            'scripture_readings': [],
-            'raw_content': clean_content
+            'scripture_readings': page['scripture_readings'],
         }
 
-        # Ищем дату
-        date_match = re.search(
-            r'<p class="pdataheader"[^>]*>(.*?)</p>', clean_content, re.DOTALL)
-        if date_match:
-            result['date'] = re.sub(
-                r'<[^>]+>', '', date_match.group(1)).strip()
-
-        # Ищем заголовок
-        header_match = re.search(
-            r'<p class="pheaderheader"[^>]*>(.*?)</p>', clean_content, re.DOTALL)
-        if header_match:
-            result['header'] = re.sub(
-                r'<[^>]+>', '', header_match.group(1)).strip()
-
-            # Ищем жития святых (только текст святых, не заголовки)
-        # Ищем между заголовком и чтениями дня
-        saints_pattern = r'<span class="normaltext"[^>]*>(.*?)\s*<p class="pscriptureheader"'
-        saints_match = re.search(saints_pattern, clean_content, re.DOTALL)
-
-        if saints_match:
-            saints_block = saints_match.group(1).strip()
-
-            # Сохраняем логические разделители перед удалением тегов
-            saints_block = saints_block.replace('<br>', '\n').replace(
-                '<br/>', '\n').replace('<br />', '\n')
-            saints_block = re.sub(r'</p\s*>', '\n', saints_block)
-
-            # Удаляем остальные теги и нормализуем переносы строк
-            saints_block = re.sub(r'<[^>]+>', '', saints_block)
-            saints_block = saints_block.replace('\r', '')
-            # Убираем последовательности пустых строк
-            saints_block = re.sub(r'\n\s*\n+', '\n', saints_block)
-
-            # Базовое разбиение: по строкам и по маркерам
-            raw_lines = []
-            for raw in saints_block.split('\n'):
-                s = raw.strip()
-                if not s:
-                    continue
-                # Удаляем маркерный символ в начале строки (только если он в начале)
-                s = re.sub(r'^\s*[•*]\s*', '', s)
-                raw_lines.append(s)
-
-            # Характерные начала записей о святых — используем для дополнительного деления по предложениям
-            saint_patterns = [
-                r'Славного', r'Святого', r'Святой', r'Святых',
-                r'Преподобного', r'Преподобной', r'Преподобных',
-                r'Мученика', r'Мученицы', r'Мучеников',
-                r'Священномученика', r'Священномучеников',
-                r'Преставление', r'Обретение', r'Перенесение',
-                r'Память', r'Собор', r'Празднование',
-                r'Блаженного', r'Блаженной', r'Блаженных',
-                r'Праведного', r'Праведной', r'Праведных',
-                r'Пророка', r'Пророков',
-                r'Апостола', r'Апостолов',
-                r'Великомученика', r'Великомучеников', r'Великомученицы',
-                r'[А-ЯЁ][а-яё]*(\s+и\s+[А-ЯЁ][а-яё]*)*\s+(пресвитера|диакона|епископа|архиепископа|митрополита)'
-            ]
-            # Делим по точке и пробелу перед характерным началом, НО сохраняем сокращения (напр. "еп.")
-            # Сначала временно помечаем известные сокращения, чтобы точка в них не считалась разделителем
-            protected = (
-                s
-                .replace('еп.', 'еп§')
-                .replace('епископа.', 'епископа§')
-                .replace('архиеп.', 'архиеп§')
-                .replace('митр.', 'митр§')
-                .replace('сщмч.', 'сщмч§')
-                .replace('прп.', 'прп§')
-                .replace('мч.', 'мч§')
-            )
-            # шаблон разделения
-            dot_split_pattern = r'\.\s+(?=' + '|'.join(saint_patterns) + ')'
-
-            for line in raw_lines:
-                # Дополнительное деление по предложениям, если в строке несколько святых
-                # Применяем к защищенному тексту для корректного сплита
-                protected_line = (
-                    line
-                    .replace('еп.', 'еп§')
-                    .replace('епископа.', 'епископа§')
-                    .replace('архиеп.', 'архиеп§')
-                    .replace('митр.', 'митр§')
-                    .replace('сщмч.', 'сщм§')
-                    .replace('прп.', 'прп§')
-                    .replace('мч.', 'мч§')
-                )
-                pieces = re.split(dot_split_pattern, protected_line)
-                for piece in pieces:
-                    if piece is None:
-                        continue
-                    entry = piece.strip().replace('§', '.')
-                    if not entry:
-                        continue
-                    # Убираем лишние символы в начале
-                    entry = re.sub(r'^\s*[.\s]*', '', entry)
-                    # Фильтр от технических строк и слишком коротких обрывков типа "Сщмч."
-                    if (len(entry) > 10 and
-                        not entry.startswith('Седмица') and
-                            not entry.startswith('Глас')):
-                        if not entry.endswith('.'):
-                            entry += '.'
-                        logger.info(f"Добавляем в saints: {entry}")
-                        result['saints'].append(entry)
-
-        # Ищем чтения дня
-        scripture_pattern = r'<p class="pscriptureheader"[^>]*>.*?</p>\s*(.*?)\s*(?:<p class="ptroparionheader"|$)'
-        scripture_match = re.search(
-            scripture_pattern, clean_content, re.DOTALL)
-        if scripture_match:
-            scripture_text = scripture_match.group(1).strip()
-            # Разделяем по <br> и очищаем
-            scripture_lines = scripture_text.split('<br>')
-            for line in scripture_lines:
-                clean_line = re.sub(r'<[^>]+>', '', line).strip()
-                if clean_line and not clean_line.isspace():
-                    result['scripture_readings'].append(clean_line)
-
         # Добавляем структурированные ссылки для кнопок
         result['scripture_references'] = self._parse_scripture_references(
             result['scripture_readings'])
 
-        # Ищем тропари
-        tropars_pattern = r'<p class="ptroparionheader"[^>]*>.*?</p>\s*(.*?)(?:</body>|$)'
-        tropars_match = re.search(tropars_pattern, clean_content, re.DOTALL)
-        if tropars_match:
-            tropars_text = tropars_match.group(1).strip()
-            # Очищаем от тегов, но оставляем структуру
-            result['tropars'] = re.sub(
-                r'</?p[^>]*>', '\n', tropars_text).strip()
-            result['tropars'] = re.sub(
-                r'<[^>]+>', '', result['tropars']).strip()
-            result['tropars'] = re.sub(r'\n\s*\n', '\n\n', result['tropars'])
+        if page['tropars'] is not None:
+            result['tropars'] = _BLANK_LINES_RE.sub('\n\n', page['tropars'].strip())
 
         logger.info(
             f"Результат парсинга календаря: saints={result['saints']}, scripture_readings={result['scripture_readings']}")
@@ -508,34 +583,28 @@ class OrthodoxyCalendar:
         if not calendar_data.get('scripture_readings'):
             return references
 
-        # Паттерн для поиска библейских ссылок
-        # Например: "Матфея 11:27-30", "Галатам 5:22-6:2", "Луки 6:17-23"
-        reference_pattern = r'([1-3]?\s*[А-Я][а-я]+[а-я]*)\s+(\d+):(\d+)(?:-(\d+))?'
-
+        # Ссылки в тексте чтений, например: "Матфея 11:27-30", "Галатам 5:22-6:2", "Луки 6:17-23"
         for reading in calendar_data['scripture_readings']:
-            matches = re.finditer(reference_pattern, reading)
-            for match in matches:
-                book_name = match.group(1).strip()
-                chapter = int(match.group(2))
-                verse_start = int(match.group(3))
-                verse_end = int(match.group(4)) if match.group(
-                    4) else verse_start
-
-                # Пытаемся найти соответствующую книгу в нашей базе
-                book_id = self._find_book_id_by_full_name(book_name)
-
-                if book_id:
+            for found in extract_references(reading):
+                for span in found.spans:
+                    # Кнопки подписываются полным названием книги, как в чтениях сайта
+                    span = span._replace(book=CALENDAR_BOOK_NAMES.get(span.book_id, span.book))
+                    verse_end = span.verse_end
+                    display_text = format_span(span)
+                    if span.end_chapter != span.chapter:
+                        # Через главы - кнопка на первую главу
+                        verse_end = get_last_verse_in_chapter(
+                            span.book, span.chapter, span.book_id, span.verse_start)
+                        display_text = f"{span.book} {span.chapter}:{span.verse_start}-{verse_end}"
                     references.append({
-                        'book_name': book_name,
-                        'book_id': book_id,
-                        'chapter': chapter,
-                        'verse_start': verse_start,
+                        'book_name': span.book,
+                        'book_id': span.book_id,
+                        'chapter': span.chapter,
+                        'verse_start': span.verse_start,
                         'verse_end': verse_end,
-                        'display_text': f"{book_name} {chapter}:{verse_start}" +
-                                      (f"-{verse_end}" if verse_end !=
-                                       verse_start else ""),
-                                      'original_text': reading
-                                      })
+                        'display_text': display_text,
+                        'original_text': reading
+                    })
 
         logger.info(
             f"Найдено {len(references)} Евангельских чтений: {[ref['display_text'] for ref in references]}")
@@ -583,28 +652,7 @@ class OrthodoxyCalendar:
         Returns:
             ID книги или None
         """
-        # Словарь соответствий полных названий (совпадает с нумерацией bible_data.py)
-        full_name_map = {
-            # Ветхий Завет
-            'Бытие': 1, 'Исход': 2, 'Левит': 3, 'Числа': 4, 'Второзаконие': 5,
-            'Иисуса Навина': 6, 'Судей': 7, 'Руфь': 8,
-            '1 Царств': 9, '2 Царств': 10, '3 Царств': 11, '4 Царств': 12,
-            '1 Паралипоменон': 13, '2 Паралипоменон': 14, 'Ездры': 15, 'Неемии': 16, 'Есфирь': 17,
-            'Иова': 18, 'Псалтирь': 19, 'Притчи': 20, 'Екклесиаст': 21, 'Песнь Песней': 22,
-            'Исаии': 23, 'Иеремии': 24, 'Плач Иеремии': 25, 'Иезекииля': 26, 'Даниила': 27,
-            'Осии': 28, 'Иоиля': 29, 'Амоса': 30, 'Авдия': 31, 'Ионы': 32,
-            'Михея': 33, 'Наума': 34, 'Аввакума': 35, 'Софонии': 36, 'Аггея': 37,
-            'Захарии': 38, 'Малахии': 39,
-            # Новый Завет (порядок как в bible_data.py)
-            'Матфея': 40, 'Марка': 41, 'Луки': 42, 'Иоанна': 43, 'Деяния': 44,
-            'Иакова': 45, '1 Петра': 46, '2 Петра': 47, '1 Иоанна': 48, '2 Иоанна': 49,
-            '3 Иоанна': 50, 'Иуды': 51, 'Римлянам': 52, '1 Коринфянам': 53, '2 Коринфянам': 54,
-            'Галатам': 55, 'Ефесянам': 56, 'Филиппийцам': 57, 'Колоссянам': 58, '1 Фессалоникийцам': 59,
-            '2 Фессалоникийцам': 60, '1 Тимофею': 61, '2 Тимофею': 62, 'Титу': 63, 'Филимону': 64,
-            'Евреям': 65, 'Откровение': 66
-        }
-
-        return full_name_map.get(name)
+        return reference_engine.book_id(name)
 
     def _parse_scripture_references(self, scripture_readings: List[str]) -> List[Dict[str, Any]]:
         """
@@ -619,9 +667,6 @@ class OrthodoxyCalendar:
         """
         references = []
 
-        # Импортируем bible_data для получения ID книг
-        from utils.bible_data import bible_data
-
         for reading in scripture_readings:
             if not reading.strip():
                 continue
@@ -640,11 +685,9 @@ class OrthodoxyCalendar:
                 verse_start = part['verse_start']
                 verse_end = part['verse_end']
 
-                # Получаем ID книги через bible_data
-                book_abbr = bible_data.normalize_book_name(book_name)
-                book_id = bible_data.get_book_id(book_abbr)
+                book_id = part['book_id']
                 logger.info(
-                    f"Парсинг части: '{book_name}' {chapter}:{verse_start}-{verse_end} -> '{book_abbr}' -> ID {book_id}")
+                    f"Парсинг части: '{book_name}' {chapter}:{verse_start}-{verse_end} -> ID {book_id}")
 
                 if book_id:
                     # Обычная логика отображения
@@ -673,145 +716,41 @@ class OrthodoxyCalendar:
         """
         Парсит сложную ссылку вида "Матфея 18:18-22; 19:1-2, 13-15"
 
+        Диапазон через главы ("15:17-16:2") делится на части по главам,
+        глава целиком - от первого до последнего стиха.
+
         Returns:
-            Список частей с book_name, chapter, verse_start, verse_end
+            Список частей с book_name, book_id, chapter, verse_start, verse_end
         """
         parts = []
 
-        # Сначала извлекаем название книги
-        # Ищем номер главы, чтобы отделить название книги
-        book_match = re.match(r'^(.+?)\s+(\d+[:\.]\d+.*)', reference)
-        if not book_match:
+        spans = reference_engine.parse(reference)
+        if not spans:
             logger.warning(
-                f"Не удалось извлечь название книги из: {reference}")
+                f"Не удалось распарсить чтение: {reference}")
             return parts
 
-        book_name = book_match.group(1).strip()
-        rest = book_match.group(2).strip()
-
-        logger.info(f"Книга: '{book_name}', остальная часть: '{rest}'")
-
-        # Разделяем по точке с запятой (разные главы)
-        chapter_parts = rest.split(';')
-
-        for chapter_part in chapter_parts:
-            chapter_part = chapter_part.strip()
-            logger.info(f"Обрабатываем часть главы: '{chapter_part}'")
-
-            # Парсим главу и стихи
-            chapter_match = re.match(r'^(\d+):(.+)', chapter_part)
-            if chapter_match:
-                chapter = int(chapter_match.group(1))
-                verses_part = chapter_match.group(2).strip()
-
-                # Разделяем стихи по запятой
-                verse_ranges = verses_part.split(',')
-
-                for verse_range in verse_ranges:
-                    verse_range = verse_range.strip()
-                    logger.info(
-                        f"Обрабатываем диапазон стихов: '{verse_range}'")
-
-                    # Парсим диапазон стихов
-                    try:
-                        if '-' in verse_range:
-                            verse_parts = verse_range.split('-')
-                            if len(verse_parts) == 2:
-                                # Проверяем формат глава:стих
-                                start_part = verse_parts[0].strip()
-                                end_part = verse_parts[1].strip()
-
-                                if ':' in start_part:
-                                    # Формат "глава:стих-стих" или "глава:стих-глава:стих"
-                                    chapter_verse = start_part.split(':')
-                                    chapter = int(chapter_verse[0])
-                                    verse_start = int(chapter_verse[1])
-
-                                    if ':' in end_part:
-                                        # Переход между главами: "15:17-16:2"
-                                        end_chapter_verse = end_part.split(':')
-                                        end_chapter = int(end_chapter_verse[0])
-                                        end_verse = int(end_chapter_verse[1])
-
-                                        # Добавляем первую часть (15:17 до конца главы)
-                                        last_verse = get_last_verse_in_chapter(
-                                            book_name, chapter)
-                                        parts.append({
-                                            'book_name': book_name,
-                                            'chapter': chapter,
-                                            'verse_start': verse_start,
-                                            'verse_end': last_verse  # До конца главы
-                                        })
-
-                                        # Добавляем вторую часть (начало новой главы до end_verse)
-                                        parts.append({
-                                            'book_name': book_name,
-                                            'chapter': end_chapter,
-                                            'verse_start': 1,
-                                            'verse_end': end_verse
-                                        })
-                                        continue  # Пропускаем добавление в конце цикла
-                                    else:
-                                        # Обычный формат "глава:стих-стих"
-                                        verse_end = int(end_part)
-                                else:
-                                    # Проверяем, есть ли в end_part двоеточие (межглавный переход)
-                                    if ':' in end_part:
-                                        # Формат "стих-глава:стих" (например "4-14:5")
-                                        end_chapter_verse = end_part.split(':')
-                                        end_chapter = int(end_chapter_verse[0])
-                                        end_verse = int(end_chapter_verse[1])
-
-                                        # Добавляем первую часть (от start_part до конца текущей главы)
-                                        last_verse = get_last_verse_in_chapter(
-                                            book_name, chapter)
-                                        parts.append({
-                                            'book_name': book_name,
-                                            'chapter': chapter,
-                                            'verse_start': int(start_part),
-                                            'verse_end': last_verse  # До конца главы
-                                        })
-
-                                        # Добавляем вторую часть (начало новой главы до end_verse)
-                                        parts.append({
-                                            'book_name': book_name,
-                                            'chapter': end_chapter,
-                                            'verse_start': 1,
-                                            'verse_end': end_verse
-                                        })
-                                        continue  # Пропускаем добавление в конце цикла
-                                    else:
-                                        # Обычный формат "стих-стих"
-                                        verse_start = int(start_part)
-                                        verse_end = int(end_part)
-                            else:
-                                verse_start = verse_end = int(verse_range)
-                        else:
-                            # Одиночный стих
-                            if ':' in verse_range:
-                                # Формат "глава:стих"
-                                chapter_verse = verse_range.split(':')
-                                chapter = int(chapter_verse[0])
-                                verse_start = verse_end = int(chapter_verse[1])
-                            else:
-                                # Просто номер стиха
-                                verse_start = verse_end = int(verse_range)
-                    except ValueError as e:
-                        logger.warning(
-                            f"Не удалось распарсить диапазон стихов '{verse_range}': {e}")
-                        continue
-
-                    parts.append({
-                        'book_name': book_name,
-                        'chapter': chapter,
-                        'verse_start': verse_start,
-                        'verse_end': verse_end
-                    })
-                    logger.info(
-                        f"Добавлена часть: {book_name} {chapter}:{verse_start}-{verse_end}")
-            else:
-                logger.warning(
-                    f"Не удалось распарсить часть главы: {chapter_part}")
+        for span in spans:
+            last_chapter = span.end_chapter if span.end_chapter >= span.chapter else span.chapter
+            for chapter in range(span.chapter, last_chapter + 1):
+                if chapter == span.chapter and span.verse_start is not None:
+                    verse_start = span.verse_start
+                else:
+                    verse_start = 1
+                if chapter == last_chapter and span.verse_end is not None:
+                    verse_end = span.verse_end
+                else:
+                    # До конца главы
+                    verse_end = get_last_verse_in_chapter(span.book, chapter, span.book_id, verse_start)
+                parts.append({
+                    'book_name': span.book,
+                    'book_id': span.book_id,
+                    'chapter': chapter,
+                    'verse_start': verse_start,
+                    'verse_end': verse_end
+                })
+                logger.info(
+                    f"Добавлена часть: {span.book} {chapter}:{verse_start}-{verse_end}")
 
         return parts
 
@@ -0,0 +1,309 @@
+"""
+Пасхалия и рядовые богослужебные чтения без обращения к сайту календаря.
+
+Дата Пасхи вычисляется по юлианской пасхалии (алгоритм Гаусса-Меёса) и
+переводится в григорианский календарь. От Пасхи отсчитываются переходящие
+праздники и положение дня в годовом круге чтений:
+
+- Триодь (от недели о Закхее до Великой субботы) - по дню до Пасхи;
+- Цветная Триодь (от Пасхи до Троицы) - по дню после Пасхи;
+- седмицы по Пятидесятнице - Апостол читается по номеру седмицы, Евангелие
+  с понедельника после Недели по Воздвижении переходит на Луку
+  («Лукинская преступка/отступка»), поэтому номер евангельской седмицы
+  считается отдельно.
+
+Чтения есть в таблицах для воскресных дней (с чтениями недель пред и по
+Воздвижении и недель святых отцов), Светлой седмицы, переходящих и
+двунадесятых праздников; чтений святым дня и утреннего Евангелия в таблицах
+нет. Для дня вне таблиц readings = None. Календарь берет дни с сайта, а
+таблицы подменяют его, когда сайт недоступен (services/calendar_service.py).
+
+day_info() описывает один день, days_info() - диапазон дней за один вызов
+(Пасха вычисляется один раз на год).
+"""
+from datetime import date, datetime, timedelta
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Переходящие дни: смещение от Пасхи -> название
+MOVEABLE_FEASTS = {
+    -77: 'Неделя о Закхее',
+    -70: 'Неделя о мытаре и фарисее',
+    -63: 'Неделя о блудном сыне',
+    -57: 'Вселенская родительская суббота',
+    -56: 'Неделя мясопустная, о Страшном суде',
+    -49: 'Неделя сыропустная. Воспоминание Адамова изгнания',
+    -48: 'Начало Великого поста',
+    -42: 'Неделя 1-я Великого поста. Торжество Православия',
+    -35: 'Неделя 2-я Великого поста, свт. Григория Паламы',
+    -28: 'Неделя 3-я Великого поста, Крестопоклонная',
+    -21: 'Неделя 4-я Великого поста, прп. Иоанна Лествичника',
+    -14: 'Неделя 5-я Великого поста, прп. Марии Египетской',
+    -8: 'Лазарева суббота',
+    -7: 'Вход Господень в Иерусалим',
+    -6: 'Великий понедельник',
+    -5: 'Великий вторник',
+    -4: 'Великая среда',
+    -3: 'Великий четверг',
+    -2: 'Великая пятница',
+    -1: 'Великая суббота',
+    0: 'Светлое Христово Воскресение. Пасха',
+    7: 'Антипасха. Неделя 2-я по Пасхе, апостола Фомы',
+    14: 'Неделя 3-я по Пасхе, святых жен-мироносиц',
+    21: 'Неделя 4-я по Пасхе, о расслабленном',
+    24: 'Преполовение Пятидесятницы',
+    28: 'Неделя 5-я по Пасхе, о самаряныне',
+    35: 'Неделя 6-я по Пасхе, о слепом',
+    39: 'Вознесение Господне',
+    42: 'Неделя 7-я по Пасхе, святых отцов I Вселенского Собора',
+    49: 'День Святой Троицы. Пятидесятница',
+    50: 'День Святого Духа',
+    56: 'Неделя 1-я по Пятидесятнице, Всех святых',
+    63: 'Неделя 2-я по Пятидесятнице, Всех святых, в земле Русской просиявших',
+}
+
+# Чтения переходящих дней (Апостол, Евангелие): смещение от Пасхи -> строки чтений
+MOVEABLE_READINGS: Dict[int, Tuple[str, ...]] = {
+    -77: ('1 Тимофею 4:9-15', 'Луки 19:1-10'),
+    -70: ('2 Тимофею 3:10-15', 'Луки 18:10-14'),
+    -63: ('1 Коринфянам 6:12-20', 'Луки 15:11-32'),
+    -57: ('1 Фессалоникийцам 4:13-17', 'Иоанна 5:24-30'),
+    -56: ('1 Коринфянам 8:8-9:2', 'Матфея 25:31-46'),
+    -49: ('Римлянам 13:11-14:4', 'Матфея 6:14-21'),
+    -42: ('Евреям 11:24-26, 32-12:2', 'Иоанна 1:43-51'),
+    -35: ('Евреям 1:10-2:3', 'Марка 2:1-12'),
+    -28: ('Евреям 4:14-5:6', 'Марка 8:34-9:1'),
+    -21: ('Евреям 6:13-20', 'Марка 9:17-31'),
+    -14: ('Евреям 9:11-14', 'Марка 10:32-45'),
+    -8: ('Евреям 12:28-13:8', 'Иоанна 11:1-45'),
+    -7: ('Филиппийцам 4:4-9', 'Иоанна 12:1-18'),
+    0: ('Деяния 1:1-8', 'Иоанна 1:1-17'),
+    1: ('Деяния 1:12-17, 21-26', 'Иоанна 1:18-28'),
+    2: ('Деяния 2:14-21', 'Луки 24:12-35'),
+    3: ('Деяния 2:22-36', 'Иоанна 1:35-51'),
+    4: ('Деяния 2:38-43', 'Иоанна 3:1-15'),
+    5: ('Деяния 3:1-8', 'Иоанна 2:12-22'),
+    6: ('Деяния 3:11-16', 'Иоанна 3:22-33'),
+    7: ('Деяния 5:12-20', 'Иоанна 20:19-31'),
+    14: ('Деяния 6:1-7', 'Марка 15:43-16:8'),
+    21: ('Деяния 9:32-42', 'Иоанна 5:1-15'),
+    24: ('Деяния 14:6-18', 'Иоанна 7:14-30'),
+    28: ('Деяния 11:19-26, 29-30', 'Иоанна 4:5-42'),
+    35: ('Деяния 16:16-34', 'Иоанна 9:1-38'),
+    39: ('Деяния 1:1-12', 'Луки 24:36-53'),
+    42: ('Деяния 20:16-18, 28-36', 'Иоанна 17:1-13'),
+    49: ('Деяния 2:1-11', 'Иоанна 7:37-52; 8:12'),
+    50: ('Ефесянам 5:9-19', 'Матфея 18:10-20'),
+}
+
+# Воскресные чтения по Пятидесятнице: Апостол по номеру седмицы
+SUNDAY_APOSTLE = {
+    1: 'Евреям 11:33-12:2', 2: 'Римлянам 2:10-16', 3: 'Римлянам 5:1-10',
+    4: 'Римлянам 6:18-23', 5: 'Римлянам 10:1-10', 6: 'Римлянам 12:6-14',
+    7: 'Римлянам 15:1-7', 8: '1 Коринфянам 1:10-18', 9: '1 Коринфянам 3:9-17',
+    10: '1 Коринфянам 4:9-16', 11: '1 Коринфянам 9:2-12', 12: '1 Коринфянам 15:1-11',
+    13: '1 Коринфянам 16:13-24', 14: '2 Коринфянам 1:21-2:4', 15: '2 Коринфянам 4:6-15',
+    16: '2 Коринфянам 6:1-10', 17: '2 Коринфянам 6:16-7:1', 18: '2 Коринфянам 9:6-11',
+    19: '2 Коринфянам 11:31-12:9', 20: 'Галатам 1:11-19', 21: 'Галатам 2:16-20',
+    22: 'Галатам 6:11-18', 23: 'Ефесянам 2:4-10', 24: 'Ефесянам 2:14-22',
+    25: 'Ефесянам 4:1-6', 26: 'Ефесянам 5:9-19', 27: 'Ефесянам 6:10-17',
+    28: 'Колоссянам 1:12-18', 29: 'Колоссянам 3:4-11', 30: 'Колоссянам 3:12-16',
+    31: '1 Тимофею 1:15-17', 32: '1 Тимофею 4:9-15',
+}
+
+# Евангелие по номеру евангельской седмицы: 1-17 от Матфея, 18-32 от Луки
+SUNDAY_GOSPEL = {
+    1: 'Матфея 10:32-33, 37-38; 19:27-30', 2: 'Матфея 4:18-23', 3: 'Матфея 6:22-33',
+    4: 'Матфея 8:5-13', 5: 'Матфея 8:28-9:1', 6: 'Матфея 9:1-8', 7: 'Матфея 9:27-35',
+    8: 'Матфея 14:14-22', 9: 'Матфея 14:22-34', 10: 'Матфея 17:14-23',
+    11: 'Матфея 18:23-35', 12: 'Матфея 19:16-26', 13: 'Матфея 21:33-42',
+    14: 'Матфея 22:2-14', 15: 'Матфея 22:35-46', 16: 'Матфея 25:14-30',
+    17: 'Матфея 15:21-28', 18: 'Луки 5:1-11', 19: 'Луки 6:31-36', 20: 'Луки 7:11-16',
+    21: 'Луки 8:5-15', 22: 'Луки 16:19-31', 23: 'Луки 8:26-39', 24: 'Луки 8:41-56',
+    25: 'Луки 10:25-37', 26: 'Луки 12:16-21', 27: 'Луки 13:10-17', 28: 'Луки 14:16-24',
+    29: 'Луки 17:12-19', 30: 'Луки 18:18-27', 31: 'Луки 18:35-43', 32: 'Луки 19:1-10',
+}
+
+# Воскресенья около Рождества и Богоявления со своими чтениями:
+# (месяц, первый день, последний день) по юлианскому календарю -> (название, чтения)
+SPECIAL_SUNDAYS = (
+    ((12, 11, 17), 'Неделя святых праотец', ('Колоссянам 3:4-11', 'Луки 14:16-24')),
+    ((12, 18, 24), 'Неделя пред Рождеством Христовым, святых отец',
+     ('Евреям 11:9-10, 17-23, 32-40', 'Матфея 1:1-25')),
+    ((12, 26, 31), 'Неделя по Рождестве Христовом', ('Галатам 1:11-19', 'Матфея 2:13-23')),
+    ((1, 2, 5), 'Неделя пред Богоявлением', ('2 Тимофею 4:5-8', 'Марка 1:1-8')),
+    ((1, 7, 13), 'Неделя по Богоявлении', ('Ефесянам 4:7-13', 'Матфея 4:12-17')),
+)
+
+# Воскресенья, чьи чтения читаются вместе с рядовыми воскресными:
+# (месяц, первый день, последний день) по юлианскому календарю -> (название, чтения)
+PROPER_SUNDAYS = (
+    ((7, 13, 19), 'Неделя святых отцов шести Вселенских Соборов',
+     ('Евреям 13:7-16', 'Иоанна 17:1-13')),
+    ((9, 7, 13), 'Неделя пред Воздвижением', ('Галатам 6:11-18', 'Иоанна 3:13-17')),
+    ((9, 15, 21), 'Неделя по Воздвижении', ('Галатам 2:16-20', 'Марка 8:34-9:1')),
+    ((10, 11, 17), 'Неделя святых отцов VII Вселенского Собора',
+     ('Евреям 13:7-16', 'Луки 8:5-15')),
+)
+
+# Непереходящие праздники: (месяц, день) по юлианскому календарю -> (название, вид, чтения)
+# Вид: lord - Господский (заменяет рядовые чтения), theotokos - Богородичный
+# двунадесятый (в воскресенье читается вместе с воскресным), great - великий
+# (читается вместе с рядовыми)
+FIXED_FEASTS = {
+    (9, 8): ('Рождество Пресвятой Богородицы', 'theotokos',
+             ('Филиппийцам 2:5-11', 'Луки 10:38-42; 11:27-28')),
+    (9, 14): ('Воздвижение Честного и Животворящего Креста Господня', 'lord',
+              ('1 Коринфянам 1:18-24', 'Иоанна 19:6-11, 13-20, 25-28, 30-35')),
+    (10, 1): ('Покров Пресвятой Богородицы', 'great',
+              ('Евреям 9:1-7', 'Луки 10:38-42; 11:27-28')),
+    (11, 21): ('Введение во храм Пресвятой Богородицы', 'theotokos',
+               ('Евреям 9:1-7', 'Луки 10:38-42; 11:27-28')),
+    (12, 25): ('Рождество Христово', 'lord', ('Галатам 4:4-7', 'Матфея 2:1-12')),
+    (1, 1): ('Обрезание Господне', 'lord', ('Колоссянам 2:8-12', 'Луки 2:20-21, 40-52')),
+    (1, 6): ('Святое Богоявление. Крещение Господне', 'lord',
+             ('Титу 2:11-14; 3:4-7', 'Матфея 3:13-17')),
+    (2, 2): ('Сретение Господне', 'lord', ('Евреям 7:7-17', 'Луки 2:22-40')),
+    (3, 25): ('Благовещение Пресвятой Богородицы', 'theotokos',
+              ('Евреям 2:11-18', 'Луки 1:24-38')),
+    (6, 24): ('Рождество Иоанна Предтечи', 'great',
+              ('Римлянам 13:11-14:4', 'Луки 1:1-25, 57-68, 76, 80')),
+    (6, 29): ('Первоверховных апостолов Петра и Павла', 'great',
+              ('2 Коринфянам 11:21-12:9', 'Матфея 16:13-19')),
+    (8, 6): ('Преображение Господне', 'lord', ('2 Петра 1:10-19', 'Матфея 17:1-9')),
+    (8, 15): ('Успение Пресвятой Богородицы', 'theotokos',
+              ('Филиппийцам 2:5-11', 'Луки 10:38-42; 11:27-28')),
+    (8, 29): ('Усекновение главы Иоанна Предтечи', 'great',
+              ('Деяния 13:25-32', 'Марка 6:14-30')),
+}
+
+# Смещение от Пасхи до начала Триоди (неделя о Закхее) и до конца Цветной Триоди (Троица)
+TRIODION_START = -77
+PENTECOST = 49
+
+
+def julian_offset(year: int) -> int:
+    """Разница между григорианским и юлианским календарями в днях (13 для 1900-2099)"""
+    return year // 100 - year // 400 - 2
+
+
+def to_julian(day: date) -> date:
+    """Юлианская дата (старый стиль) для григорианской даты"""
+    return day - timedelta(days=julian_offset(day.year))
+
+
+def from_julian(year: int, month: int, day: int) -> date:
+    """Григорианская дата для юлианской (month, day) года year"""
+    return date(year, month, day) + timedelta(days=julian_offset(year))
+
+
+@lru_cache(maxsize=512)
+def pascha(year: int) -> date:
+    """Дата православной Пасхи (по новому стилю)"""
+    a = year % 4
+    b = year % 7
+    c = year % 19
+    d = (19 * c + 15) % 30
+    e = (2 * a + 4 * b - d + 34) % 7
+    month, day = divmod(d + e + 114, 31)
+    # Юлианская дата Пасхи (март-апрель), затем перевод на новый стиль
+    return date(year, month, day + 1) + timedelta(days=julian_offset(year))
+
+
+@lru_cache(maxsize=512)
+def lukan_jump(year: int) -> date:
+    """Понедельник после Недели по Воздвижении - начало чтений от Луки"""
+    exaltation = from_julian(year, 9, 14)
+    # Неделя по Воздвижении - ближайшее воскресенье после праздника
+    sunday_after = exaltation + timedelta(days=(6 - exaltation.weekday()) or 7)
+    return sunday_after + timedelta(days=1)
+
+
+def _ordinary_readings(offset: int, week: Optional[int], gospel_week: Optional[int],
+                       weekday: int) -> Optional[List[str]]:
+    """Рядовые чтения дня по положению в круге или None, если их нет в таблицах"""
+    if offset in MOVEABLE_READINGS:
+        return list(MOVEABLE_READINGS[offset])
+    if week is not None and weekday == 6 and week in SUNDAY_APOSTLE and gospel_week in SUNDAY_GOSPEL:
+        return [SUNDAY_APOSTLE[week], SUNDAY_GOSPEL[gospel_week]]
+    return None
+
+
+def day_info(day) -> Dict[str, Any]:
+    """
+    Положение дня в годовом круге и чтения дня.
+
+    Returns:
+        {date, julian_date, pascha (Пасха текущего круга), days_from_pascha, week_after_pentecost,
+         gospel_week, tone, feasts, readings (None - нет в таблицах)}
+    """
+    if isinstance(day, datetime):
+        day = day.date()
+    julian = to_julian(day)
+    weekday = day.weekday()
+
+    # Пасха текущего круга: до недели о Закхее идет круг прошлого года
+    cycle_pascha = pascha(day.year)
+    offset = (day - cycle_pascha).days
+    if offset < TRIODION_START:
+        cycle_pascha = pascha(day.year - 1)
+        offset = (day - cycle_pascha).days
+
+    week = gospel_week = None
+    if offset > PENTECOST:
+        # Седмица 1-я по Пятидесятнице начинается в понедельник после Троицы
+        week = (offset - PENTECOST - 1) // 7 + 1
+        jump = lukan_jump(cycle_pascha.year)
+        gospel_week = week if day < jump else 18 + (day - jump).days // 7
+
+    # Глас седмицы: 1-й с Антипасхи, далее по кругу из восьми (в Триоди -
+    # продолжение круга прошлого года); на Страстной и Светлой седмицах нет
+    tone = None
+    if offset >= 7:
+        tone = (offset - 7) // 7 % 8 + 1
+    elif offset < -7:
+        tone = ((day - pascha(cycle_pascha.year - 1)).days - 7) // 7 % 8 + 1
+
+    feasts = [MOVEABLE_FEASTS[offset]] if offset in MOVEABLE_FEASTS else []
+
+    readings = _ordinary_readings(offset, week, gospel_week, weekday)
+
+    if weekday == 6:
+        for (month, first, last), name, special in SPECIAL_SUNDAYS:
+            if julian.month == month and first <= julian.day <= last:
+                feasts.append(name)
+                readings = list(special)
+        for (month, first, last), name, proper in PROPER_SUNDAYS:
+            if julian.month == month and first <= julian.day <= last:
+                feasts.append(name)
+                if readings is not None:
+                    # Евангелие недели может совпасть с рядовым (Лк 8:5-15)
+                    readings = readings + [reading for reading in proper if reading not in readings]
+
+    fixed = FIXED_FEASTS.get((julian.month, julian.day))
+    if fixed is not None:
+        name, kind, feast_readings = fixed
+        feasts.append(name)
+        if kind == 'lord' or (kind == 'theotokos' and weekday != 6):
+            readings = list(feast_readings)
+        elif readings is not None:
+            readings = readings + list(feast_readings)
+
+    return {
+        'date': day,
+        'julian_date': julian,
+        'pascha': cycle_pascha,
+        'days_from_pascha': offset,
+        'week_after_pentecost': week,
+        'gospel_week': gospel_week,
+        'tone': tone,
+        'feasts': feasts,
+        'readings': readings,
+    }
+
+
+def days_info(start, days: int) -> List[Dict[str, Any]]:
+    """day_info для days дней начиная со start (например, весь год одним вызовом)"""
+    if isinstance(start, datetime):
+        start = start.date()
+    return [day_info(start + timedelta(days=delta)) for delta in range(days)]
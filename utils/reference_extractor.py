@@ -0,0 +1,124 @@
+"""
+Поиск всех библейских ссылок в длинном тексте (ответы ИИ) за один проход.
+
+Текст просматривается один раз: в начале каждого слова книга ищется по
+дереву названий парсера ссылок (utils/reference_parser.py), после
+найденной ссылки поиск продолжается с ее конца. Для каждой ссылки
+возвращаются позиции в тексте (для выделения) и разобранные части с ID
+книги, главами и стихами (для загрузки текстов без повторного разбора).
+
+ReferenceStream принимает текст по кускам (потоковый ответ модели):
+ссылка отдается, когда следующий текст уже не может ее продолжить, а
+начала слов в последних STREAM_TAIL символах ждут следующего куска.
+"""
+import re
+from typing import List, NamedTuple
+
+from utils.reference_parser import ReferenceSpan, reference_engine
+from utils.versification import versification
+
+# Сколько последних символов куска ждут продолжения (длиннее любого названия книги)
+STREAM_TAIL = 64
+
+# Начало слова: буква или цифра, перед которой нет буквы или цифры
+_WORD_START_RE = re.compile(r'(?<!\w)[^\W_]')
+# Текст, которым ссылка может продолжиться в следующем куске ("Ин 3:16-" + "18")
+_CONTINUATION_RE = re.compile(r'[\s\d:.,;\-–—]*')
+
+
+class FoundReference(NamedTuple):
+    """Ссылка в тексте: text[start:end] и ее части"""
+    start: int
+    end: int
+    text: str
+    spans: List[ReferenceSpan]
+
+
+def _is_valid(span: ReferenceSpan) -> bool:
+    if span.end_chapter < span.chapter:
+        return False
+    if span.verse_start is None:
+        return (versification.is_valid_reference(span.book_id, span.chapter) and
+                versification.is_valid_reference(span.book_id, span.end_chapter))
+    if span.end_chapter == span.chapter:
+        return versification.is_valid_reference(span.book_id, span.chapter, span.verse_start, span.verse_end)
+    # Ссылка через главу: начало в первой главе, конец - стихи 1..verse_end последней
+    return (versification.is_valid_reference(span.book_id, span.chapter, span.verse_start) and
+            versification.is_valid_reference(span.book_id, span.end_chapter, 1, span.verse_end))
+
+
+def format_span(span: ReferenceSpan) -> str:
+    """Часть ссылки строкой в формате handlers/verse_reference.py ("Мф 6:25-34")"""
+    if span.verse_start is None:
+        if span.end_chapter != span.chapter:
+            return f"{span.book} {span.chapter}-{span.end_chapter}"
+        return f"{span.book} {span.chapter}"
+    if span.end_chapter != span.chapter:
+        return f"{span.book} {span.chapter}:{span.verse_start}-{span.end_chapter}:{span.verse_end}"
+    if span.verse_end != span.verse_start:
+        return f"{span.book} {span.chapter}:{span.verse_start}-{span.verse_end}"
+    return f"{span.book} {span.chapter}:{span.verse_start}"
+
+
+class ReferenceStream:
+    """Поиск ссылок в тексте, который приходит кусками"""
+
+    def __init__(self, require_verse: bool = True):
+        # Ссылки без стиха ("Мал 5") в обычном тексте чаще оказываются словами
+        self.require_verse = require_verse
+        self._buffer = ""
+        # Позиция начала буфера в тексте и позиция в буфере, с которой искать дальше
+        self._offset = 0
+        self._pos = 0
+
+    def feed(self, chunk: str) -> List[FoundReference]:
+        """Добавляет кусок текста, возвращает ссылки, которые уже не изменятся"""
+        self._buffer += chunk
+        return self._scan(final=False)
+
+    def close(self) -> List[FoundReference]:
+        """Конец текста: возвращает оставшиеся ссылки"""
+        return self._scan(final=True)
+
+    def _accept(self, spans: List[ReferenceSpan]) -> bool:
+        if self.require_verse and spans[0].verse_start is None:
+            return False
+        return all(_is_valid(span) for span in spans)
+
+    def _scan(self, final: bool) -> List[FoundReference]:
+        found = []
+        buffer = self._buffer
+        limit = len(buffer) if final else max(self._pos, len(buffer) - STREAM_TAIL)
+        pos = self._pos
+        while True:
+            match = _WORD_START_RE.search(buffer, pos, limit)
+            if match is None:
+                pos = max(pos, limit)
+                break
+            start = match.start()
+            result = reference_engine.match_at(buffer, start)
+            if result is None:
+                pos = start + 1
+                continue
+            spans, end = result
+            if not final and _CONTINUATION_RE.fullmatch(buffer, end) is not None:
+                # Ссылка может продолжиться в следующем куске
+                pos = start
+                break
+            if self._accept(spans):
+                found.append(FoundReference(self._offset + start, self._offset + end,
+                                            buffer[start:end], spans))
+            pos = end
+
+        # Просмотренный текст не нужен; один символ оставляем для границы слова
+        keep = max(pos - 1, 0)
+        self._buffer = buffer[keep:]
+        self._offset += keep
+        self._pos = pos - keep
+        return found
+
+
+def extract_references(text: str, require_verse: bool = True) -> List[FoundReference]:
+    """Все ссылки в тексте, по порядку"""
+    stream = ReferenceStream(require_verse)
+    return stream.feed(text) + stream.close()
@@ -1,9 +1,39 @@
 """
-Парсер библейских ссылок для планов чтения.
+Парсер библейских ссылок: один движок для всех мест, где разбираются ссылки.
+
+Названия книг (сокращения, синонимы из bible_data, полные названия в
+родительном падеже, английские сокращения) собираются в префиксное дерево
+по символам без учета регистра, «ё», пробелов и точек. Книга находится
+одним проходом по началу ссылки; если самое длинное название не подходит
+(«Петра 2:5» - не «петра 2»), пробуется более короткое. Номера глав и
+стихов разбираются одним проходом по лексемам. Поддерживаются формы:
+
+    Ин 3                         глава
+    Ин 3:16, Ин 3.16             стих
+    Ин 3:16-18                   диапазон стихов
+    Быт 1-3                      диапазон глав
+    Быт 1:1-2:25, Мф 4:25-5:12   диапазон через главы
+    Мф 18:18-22; 19:1-2, 13-15   списки через точку с запятой и запятую
+    Мф 1; Мк 2                   несколько книг
+
+Если в ссылке целиком (parse) название книги не найдено, оно ищется с
+опечатками («Матвея 5:3», «Откравение 1»): кандидаты берутся из словаря
+удалений букв из названий дерева, для них считается расстояние
+Левенштейна (с перестановкой соседних букв), ограниченное по длине
+названия. Из книг на одном расстоянии выбирается та, для которой
+написанное - начало названия, затем та, которую чаще запрашивали.
+Результаты поиска с опечатками кэшируются. В поиске ссылок в свободном тексте (match_at)
+опечатки не исправляются, чтобы обычные слова не становились книгами.
+
+Результат - список частей ReferenceSpan. Функции ниже (parse_reference и
+др.) - формат ссылок планов чтения; bible_data.parse_reference,
+handlers/verse_reference.py и календарь тоже используют reference_engine.
+Эталонные ссылки и тест скорости: benchmark_references.py.
 """
 import re
 import logging
-from typing import Dict, Optional, List
+from collections import Counter, OrderedDict
+from typing import Dict, Optional, List, NamedTuple, Tuple
 
 logger = logging.getLogger(__name__)
 
@@ -34,22 +64,489 @@ BOOK_ABBREVIATIONS = {
 }
 
 
+# Полные названия книг, как в чтениях календаря (родительный падеж)
+BOOK_FULL_NAMES = {
+    # Ветхий Завет
+    'Бытие': 1, 'Исход': 2, 'Левит': 3, 'Числа': 4, 'Второзаконие': 5,
+    'Иисуса Навина': 6, 'Судей': 7, 'Руфь': 8,
+    '1 Царств': 9, '2 Царств': 10, '3 Царств': 11, '4 Царств': 12,
+    '1 Паралипоменон': 13, '2 Паралипоменон': 14, 'Ездры': 15, 'Неемии': 16, 'Есфирь': 17,
+    'Иова': 18, 'Псалтирь': 19, 'Притчи': 20, 'Екклесиаст': 21, 'Песнь Песней': 22,
+    'Исаии': 23, 'Иеремии': 24, 'Плач Иеремии': 25, 'Иезекииля': 26, 'Даниила': 27,
+    'Осии': 28, 'Иоиля': 29, 'Амоса': 30, 'Авдия': 31, 'Ионы': 32,
+    'Михея': 33, 'Наума': 34, 'Аввакума': 35, 'Софонии': 36, 'Аггея': 37,
+    'Захарии': 38, 'Малахии': 39,
+    # Новый Завет (порядок как в bible_data.py)
+    'Матфея': 40, 'Марка': 41, 'Луки': 42, 'Иоанна': 43, 'Деяния': 44,
+    'Иакова': 45, '1 Петра': 46, '2 Петра': 47, '1 Иоанна': 48, '2 Иоанна': 49,
+    '3 Иоанна': 50, 'Иуды': 51, 'Римлянам': 52, '1 Коринфянам': 53, '2 Коринфянам': 54,
+    'Галатам': 55, 'Ефесянам': 56, 'Филиппийцам': 57, 'Колоссянам': 58, '1 Фессалоникийцам': 59,
+    '2 Фессалоникийцам': 60, '1 Тимофею': 61, '2 Тимофею': 62, 'Титу': 63, 'Филимону': 64,
+    'Евреям': 65, 'Откровение': 66
+}
+
+# Символы, которые не учитываются в названии книги ("1 Кор." = "1Кор")
+_SKIP_CHARS = frozenset(' \t.')
+
+# Лексемы числовой части: число, разделитель главы и стиха, тире, запятая и точка с запятой
+_TOKEN_RE = re.compile(r'\s*(?:(\d+)|([:.])|([-–—])|([,;]))')
+_SPACES_RE = re.compile(r'\s*')
+_TOKEN_KINDS = {2: ':', 3: '-'}
+
+# Название книги с опечаткой: номер книги и слова до номера главы ("1 Карнфянам 13";
+# "1. Ин" - пункт списка, как в BookTrie.match)
+_BOOK_NAME_RE = re.compile(r'(?:[1-4]\s*)?[^\W\d_]+(?:[\s.]+[^\W\d_]+)*')
+
+# Опечатки в названии книги: без опечаток для коротких названий ("Мф" и "Мк"
+# отличаются одной буквой), одна - до MIN_LENGTH_TWO_TYPOS символов, иначе MAX_TYPOS
+MIN_LENGTH_ONE_TYPO = 4
+MIN_LENGTH_TWO_TYPOS = 7
+MAX_TYPOS = 2
+# Сколько названий с опечатками помнить
+TYPO_CACHE_SIZE = 1024
+
+
+def _fold(char: str) -> str:
+    char = char.lower()
+    return 'е' if char == 'ё' else char
+
+
+def max_typos(length: int) -> int:
+    """Сколько опечаток допускается в названии книги длины length"""
+    if length < MIN_LENGTH_ONE_TYPO:
+        return 0
+    return 1 if length < MIN_LENGTH_TWO_TYPOS else MAX_TYPOS
+
+
+def _deletions(word: str, count: int) -> set:
+    """Слово и все его варианты без count букв и меньше"""
+    variants = {word}
+    layer = {word}
+    for _ in range(count):
+        layer = {item[:i] + item[i + 1:] for item in layer for i in range(len(item))}
+        variants |= layer
+    return variants
+
+
+def _edit_distance(first: str, second: str, limit: int) -> int:
+    """Расстояние Левенштейна с перестановкой соседних букв (больше limit - limit + 1)"""
+    if abs(len(first) - len(second)) > limit:
+        return limit + 1
+    previous = None
+    row = list(range(len(second) + 1))
+    for i in range(1, len(first) + 1):
+        current = [i]
+        for j in range(1, len(second) + 1):
+            value = min(current[j - 1] + 1, row[j] + 1,
+                        row[j - 1] + (first[i - 1] != second[j - 1]))
+            # Перестановка: "мафтея" -> "матфея"
+            if (previous is not None and j > 1 and first[i - 1] == second[j - 2]
+                    and first[i - 2] == second[j - 1] and previous[j - 2] + 1 < value):
+                value = previous[j - 2] + 1
+            current.append(value)
+        if min(current) > limit:
+            return limit + 1
+        previous, row = row, current
+    return min(row[-1], limit + 1)
+
+
+class ReferenceSpan(NamedTuple):
+    """
+    Часть ссылки: от chapter:verse_start до end_chapter:verse_end.
+
+    Для глав целиком verse_start и verse_end - None; book - название книги,
+    как оно написано в ссылке.
+    """
+    book_id: int
+    book: str
+    chapter: int
+    verse_start: Optional[int]
+    end_chapter: int
+    verse_end: Optional[int]
+
+
+class BookTrie:
+    """Префиксное дерево названий книг: символ -> узел, '' -> ID книги"""
+
+    def __init__(self):
+        self._root: Dict[str, dict] = {}
+        self.names = 0
+        # Ключ названия -> ID книги и словарь удалений для опечаток (строится при первой опечатке)
+        self._keys: Dict[str, int] = {}
+        self._deletes: Optional[Dict[str, List[str]]] = None
+
+    @staticmethod
+    def _key(name: str) -> str:
+        return ''.join(_fold(char) for char in name if char not in _SKIP_CHARS)
+
+    def add(self, name: str, book_id: int):
+        """Добавляет название; первое добавленное название с тем же ключом остается"""
+        key = self._key(name)
+        if not key:
+            return
+        node = self._root
+        for char in key:
+            node = node.setdefault(char, {})
+        if '' not in node:
+            node[''] = book_id
+            self._keys[key] = book_id
+            self._deletes = None
+            self.names += 1
+
+    def book_id(self, name: str) -> Optional[int]:
+        """ID книги по названию целиком или None"""
+        node = self._root
+        for char in self._key(name):
+            node = node.get(char)
+            if node is None:
+                return None
+        return node.get('')
+
+    def match(self, text: str, pos: int = 0) -> List[Tuple[int, int]]:
+        """
+        Названия книг в text с позиции pos: [(конец названия, ID книги)],
+        самые длинные первыми. Название должно кончаться на границе слова.
+        """
+        found = []
+        node = self._root
+        length = len(text)
+        i = pos
+        while i < length:
+            char = text[i]
+            if char in _SKIP_CHARS:
+                # "1. Ин 3:16" - пункт списка, а не 1 Ин
+                if char == '.' and i > pos and text[i - 1].isdigit():
+                    break
+                i += 1
+                continue
+            node = node.get(_fold(char))
+            if node is None:
+                break
+            i += 1
+            if '' in node and (i == length or not text[i].isalpha()):
+                found.append((i, node['']))
+        found.reverse()
+        return found
+
+    def similar(self, name: str, max_distance: int) -> List[Tuple[int, bool, int]]:
+        """
+        Книги с названием не дальше max_distance правок от name:
+        [(расстояние, не сокращение ли name, ID книги)], ближайшие первыми.
+
+        Кандидаты ищутся по заранее построенному словарю удалений (названия
+        без 1-2 букв): у названия и запроса на расстоянии d есть общий вариант
+        без d букв. Для кандидатов расстояние считается точно.
+        """
+        key = self._key(name)
+        if not key or max_distance > MAX_TYPOS:
+            return []
+        if self._deletes is None:
+            self._deletes = {}
+            for candidate in self._keys:
+                for variant in _deletions(candidate, MAX_TYPOS):
+                    self._deletes.setdefault(variant, []).append(candidate)
+
+        best: Dict[int, Tuple[int, bool]] = {}
+        checked = set()
+        for variant in _deletions(key, max_distance):
+            for candidate in self._deletes.get(variant, ()):
+                if candidate in checked:
+                    continue
+                checked.add(candidate)
+                distance = _edit_distance(key, candidate, max_distance)
+                if distance > max_distance:
+                    continue
+                book_id = self._keys[candidate]
+                # "Иоан" ближе к "Иоанн" (сокращение), чем к "Иона"
+                rank = (distance, not candidate.startswith(key))
+                if rank < best.get(book_id, (max_distance + 1, True)):
+                    best[book_id] = rank
+        return sorted(rank + (book_id,) for book_id, rank in best.items())
+
+
+class ReferenceEngine:
+    """Разбор ссылок по дереву названий книг (строится при первом обращении)"""
+
+    def __init__(self):
+        self._books: Optional[BookTrie] = None
+        # ID книги -> сокращение ('Ин') и полное название планов чтения ('Иоанн')
+        self._abbreviations: Dict[int, str] = {}
+        self._full_names: Dict[int, str] = {}
+        # Сколько раз разбирались ссылки на книгу (выбор среди опечаток)
+        self._hits: Counter = Counter()
+        # Ключ названия -> [(расстояние, не сокращение, ID книги)]
+        self._typos: "OrderedDict[str, List[Tuple[int, bool, int]]]" = OrderedDict()
+
+    @property
+    def books(self) -> BookTrie:
+        if self._books is None:
+            self._books = self._build()
+        return self._books
+
+    def _build(self) -> BookTrie:
+        from utils.bible_data import bible_data
+
+        books = BookTrie()
+        for abbr, book_id in bible_data.book_abbr_dict.items():
+            books.add(abbr, book_id)
+            self._abbreviations.setdefault(book_id, abbr)
+        for name, abbr in bible_data.book_synonyms.items():
+            book_id = bible_data.book_abbr_dict.get(abbr)
+            # Синонимы без номера книги ("царств" -> "Цар") не добавляются
+            if book_id:
+                books.add(name, book_id)
+        for name, book_id in BOOK_FULL_NAMES.items():
+            books.add(name, book_id)
+        for abbr, name in BOOK_ABBREVIATIONS.items():
+            book_id = books.book_id(abbr)
+            if book_id:
+                books.add(name, book_id)
+                self._full_names.setdefault(book_id, name)
+        for book_id, name in bible_data.book_dict.items():
+            if isinstance(name, str):
+                books.add(name, int(book_id))
+        logger.info(f"Парсер ссылок: {books.names} названий книг")
+        return books
+
+    def book_id(self, name: str) -> Optional[int]:
+        """ID книги по названию, сокращению или синониму"""
+        return self.books.book_id(name)
+
+    def _similar_books(self, name: str) -> List[Tuple[int, bool, int]]:
+        key = BookTrie._key(name)
+        candidates = self._typos.get(key)
+        if candidates is not None:
+            self._typos.move_to_end(key)
+            return candidates
+        candidates = self.books.similar(key, max_typos(len(key)))
+        self._typos[key] = candidates
+        if len(self._typos) > TYPO_CACHE_SIZE:
+            self._typos.popitem(last=False)
+        return candidates
+
+    def resolve_book(self, name: str) -> Optional[int]:
+        """
+        ID книги по названию с возможными опечатками ("Матвея" -> 40) или None.
+
+        Из книг на наименьшем расстоянии выбирается та, для которой name -
+        начало названия, затем чаще запрашиваемая.
+        """
+        book_id = self.books.book_id(name)
+        if book_id is not None:
+            return book_id
+        candidates = self._similar_books(name)
+        if not candidates:
+            return None
+        rank = candidates[0][:2]
+        return max((book_id for *typos, book_id in candidates if tuple(typos) == rank),
+                   key=lambda book_id: (self._hits[book_id], -book_id))
+
+    def book_abbr(self, book_id: int) -> Optional[str]:
+        """Стандартное сокращение книги ('Ин') по ID"""
+        return self._abbreviations.get(book_id) if self.books else None
+
+    def book_full_name(self, book_id: int) -> Optional[str]:
+        """Полное название книги для планов чтения ('Иоанн') по ID"""
+        return self._full_names.get(book_id) if self.books else None
+
+    def parse(self, reference: str) -> Optional[List[ReferenceSpan]]:
+        """Части ссылки или None, если ссылка (вся строка) не разобрана"""
+        text = reference.strip().rstrip('.')
+        if not text:
+            return None
+        result = self._parse_book(text, 0, strict=True)
+        if not result:
+            return None
+        self._hits[result[0][0].book_id] += 1
+        return result[0]
+
+    def match_at(self, text: str, pos: int) -> Optional[Tuple[List[ReferenceSpan], int]]:
+        """
+        Самая длинная ссылка, начинающаяся на позиции pos внутри текста:
+        (части, позиция конца ссылки) или None.
+
+        В отличие от parse, текст после ссылки не разбирается: "Ин 3:16, и далее"
+        дает Ин 3:16 и конец перед запятой.
+        """
+        return self._parse_book(text, pos, strict=False)
+
+    def _parse_book(self, text: str, pos: int,
+                    strict: bool) -> Optional[Tuple[List[ReferenceSpan], int]]:
+        """Ссылка, начинающаяся с названия книги на позиции pos (strict - до конца строки)"""
+        best = None
+        for end, book_id, book in self._book_candidates(text, pos, strict):
+            # Точка после сокращения ("Мф. 5") - не разделитель главы и стиха
+            start = end
+            while start < len(text) and text[start] in _SKIP_CHARS:
+                start += 1
+            result = self._parse_numbers(text, start, book_id, book, strict)
+            if result is not None and (best is None or result[1] > best[1]):
+                best = result
+                if strict:
+                    break
+        return best
+
+    def _book_candidates(self, text: str, pos: int, strict: bool) -> List[Tuple[int, int, str]]:
+        """Названия книг на позиции pos: [(конец, ID книги, книга)], в strict - и с опечатками"""
+        found = [(end, book_id, ' '.join(text[pos:end].split()))
+                 for end, book_id in self.books.match(text, pos)]
+        if found or not strict:
+            return found
+        match = _BOOK_NAME_RE.match(text, pos)
+        if match is None:
+            return found
+        book_id = self.resolve_book(match.group())
+        if book_id is None:
+            return found
+        # Вместо названия с опечаткой - стандартное сокращение
+        logger.debug(f"Книга с опечаткой: '{match.group()}' -> {self.book_abbr(book_id)}")
+        return [(match.end(), book_id, self.book_abbr(book_id))]
+
+    def _parse_numbers(self, text: str, pos: int, book_id: int, book: str,
+                       strict: bool) -> Optional[Tuple[List[ReferenceSpan], int]]:
+        """Главы и стихи после названия книги до первого символа, который не входит в ссылку"""
+        tokens: List[Tuple[str, int, int, int]] = []
+        length = len(text)
+        while pos < length:
+            match = _TOKEN_RE.match(text, pos)
+            if match is None:
+                break
+            pos = match.end()
+            kind = match.lastindex
+            start = match.start(kind)
+            if kind == 1:
+                tokens.append(('n', int(match.group(1)), start, pos))
+            else:
+                tokens.append((_TOKEN_KINDS.get(kind) or match.group(kind), 0, start, pos))
+        return self._read_tokens(text, tokens, book_id, book, strict)
+
+    def _read_tokens(self, text: str, tokens: List[Tuple[str, int, int, int]], book_id: int,
+                     book: str, strict: bool) -> Optional[Tuple[List[ReferenceSpan], int]]:
+        spans: List[ReferenceSpan] = []
+        index = 0
+        count = len(tokens)
+
+        def take(kind: str) -> Optional[int]:
+            nonlocal index
+            if index < count and tokens[index][0] == kind:
+                index += 1
+                return tokens[index - 1][1]
+            return None
+
+        failed = False
+        tail = None
+        while not failed:
+            chapter = take('n')
+            if chapter is None:
+                failed = True
+                break
+            if take(':') is not None:
+                verse = take('n')
+                if verse is None:
+                    failed = True
+                    break
+                while True:
+                    if take('-') is not None:
+                        end = take('n')
+                        if end is None:
+                            failed = True
+                            break
+                        if take(':') is not None:
+                            # Диапазон через главы: 1:1-2:25
+                            end_verse = take('n')
+                            if end_verse is None:
+                                failed = True
+                                break
+                            spans.append(ReferenceSpan(book_id, book, chapter, verse, end, end_verse))
+                            chapter = end
+                        else:
+                            spans.append(ReferenceSpan(book_id, book, chapter, verse, chapter, end))
+                    else:
+                        spans.append(ReferenceSpan(book_id, book, chapter, verse, chapter, verse))
+                    if take(',') is None:
+                        break
+                    # После запятой - стих той же главы или "глава:стих"
+                    value = take('n')
+                    if value is None:
+                        failed = True
+                        break
+                    if take(':') is not None:
+                        chapter = value
+                        verse = take('n')
+                        if verse is None:
+                            failed = True
+                            break
+                    else:
+                        verse = value
+            elif take('-') is not None:
+                end = take('n')
+                if end is None or (index < count and tokens[index][0] == ':'):
+                    failed = True
+                    break
+                spans.append(ReferenceSpan(book_id, book, chapter, None, end, None))
+            else:
+                spans.append(ReferenceSpan(book_id, book, chapter, None, chapter, None))
+
+            if failed or index == count:
+                break
+            if tokens[index][0] == ';':
+                # "Мф 1; Мк 2" или "Мф 1; 2 Пет 3": дальше ссылка на другую книгу
+                next_pos = _SPACES_RE.match(text, tokens[index][3]).end()
+                if self._book_candidates(text, next_pos, strict):
+                    tail = self._parse_book(text, next_pos, strict)
+                    if tail is None and strict:
+                        return None
+                    break
+            if take(';') is None and take(',') is None:
+                if strict:
+                    return None
+                break
+
+        if failed:
+            if strict:
+                return None
+            # Ссылка кончается на последнем числе перед ошибкой ("Ин 3:16-" -> Ин 3:16)
+            last = index
+            while last > 0 and tokens[last - 1][0] != 'n':
+                last -= 1
+            if last in (0, count):
+                return None
+            return self._read_tokens(text, tokens[:last], book_id, book, strict)
+
+        if tail is not None:
+            return spans + tail[0], tail[1]
+        end = tokens[index - 1][3]
+        if strict and end != len(text):
+            return None
+        return spans, end
+
+
+# Глобальный парсер ссылок
+reference_engine = ReferenceEngine()
+
+
 def normalize_book_name(book_abbr: str) -> str:
     """Нормализует сокращение книги к полному названию."""
-    # Убираем лишние пробелы
     book_abbr = book_abbr.strip()
+    book_id = reference_engine.book_id(book_abbr)
+    full_name = reference_engine.book_full_name(book_id) if book_id else None
 
-    # Проверяем прямое соответствие
-    if book_abbr in BOOK_ABBREVIATIONS:
-        return BOOK_ABBREVIATIONS[book_abbr]
+    # Если не найдено, возвращаем как есть
+    return full_name or book_abbr
 
-    # Проверяем без учета регистра
-    for abbr, full_name in BOOK_ABBREVIATIONS.items():
-        if abbr.lower() == book_abbr.lower():
-            return full_name
 
-    # Если не найдено, возвращаем как есть
-    return book_abbr
+def _span_to_dict(span: ReferenceSpan) -> Dict:
+    result = {
+        'book': normalize_book_name(span.book),
+        'book_id': span.book_id,
+        'chapter': span.chapter
+    }
+    if span.verse_start is not None:
+        result['verse_start'] = span.verse_start
+        result['verse_end'] = span.verse_end
+    if span.end_chapter != span.chapter:
+        result['end_chapter'] = span.end_chapter
+    return result
 
 
 def parse_reference(reference: str) -> Optional[Dict]:
@@ -57,64 +554,18 @@ def parse_reference(reference: str) -> Optional[Dict]:
     Парсит библейскую ссылку.
 
     Примеры:
-    - "Мф 1" -> {'book': 'Матфей', 'chapter': 1}
-    - "Мф 1:1" -> {'book': 'Матфей', 'chapter': 1, 'verse_start': 1, 'verse_end': 1}
-    - "Мф 1:1-5" -> {'book': 'Матфей', 'chapter': 1, 'verse_start': 1, 'verse_end': 5}
-    - "Лк 5:27-39" -> {'book': 'Лука', 'chapter': 5, 'verse_start': 27, 'verse_end': 39}
-    - "Быт 1:1-2:25" -> {'book': 'Бытие', 'chapter': 1, 'verse_start': 1, 'verse_end': 25, 'end_chapter': 2}
+    - "Мф 1" -> {'book': 'Матфей', 'book_id': 40, 'chapter': 1}
+    - "Мф 1:1" -> {'book': 'Матфей', 'book_id': 40, 'chapter': 1, 'verse_start': 1, 'verse_end': 1}
+    - "Лк 5:27-39" -> {'book': 'Лука', 'book_id': 42, 'chapter': 5, 'verse_start': 27, 'verse_end': 39}
+    - "Быт 1:1-2:25" -> {'book': 'Бытие', 'book_id': 1, 'chapter': 1, 'verse_start': 1, 'verse_end': 25, 'end_chapter': 2}
+    - "Быт 1-3" -> {'book': 'Бытие', 'book_id': 1, 'chapter': 1, 'end_chapter': 3}
     """
     try:
-        reference = reference.strip()
-
-        # Сначала пробуем сложный паттерн для межглавных диапазонов: "Быт 1:1-2:25"
-        complex_pattern = r'^(.+?)\s+(\d+):(\d+)-(\d+):(\d+)$'
-        complex_match = re.match(complex_pattern, reference)
-
-        if complex_match:
-            book_abbr = complex_match.group(1).strip()
-            chapter = int(complex_match.group(2))
-            verse_start = int(complex_match.group(3))
-            end_chapter = int(complex_match.group(4))
-            verse_end = int(complex_match.group(5))
-
-            book_name = normalize_book_name(book_abbr)
-
-            return {
-                'book': book_name,
-                'chapter': chapter,
-                'verse_start': verse_start,
-                'verse_end': verse_end,
-                'end_chapter': end_chapter
-            }
-
-        # Простой паттерн для обычных ссылок
-        simple_pattern = r'^(.+?)\s+(\d+)(?::(\d+)(?:-(\d+))?)?$'
-        simple_match = re.match(simple_pattern, reference)
-
-        if not simple_match:
+        spans = reference_engine.parse(reference)
+        if not spans or len(spans) > 1:
             logger.warning(f"Не удалось распарсить ссылку: {reference}")
             return None
-
-        book_abbr = simple_match.group(1).strip()
-        chapter = int(simple_match.group(2))
-        verse_start = int(simple_match.group(
-            3)) if simple_match.group(3) else None
-        verse_end = int(simple_match.group(
-            4)) if simple_match.group(4) else verse_start
-
-        # Нормализуем название книги
-        book_name = normalize_book_name(book_abbr)
-
-        result = {
-            'book': book_name,
-            'chapter': chapter
-        }
-
-        if verse_start is not None:
-            result['verse_start'] = verse_start
-            result['verse_end'] = verse_end
-
-        return result
+        return _span_to_dict(spans[0])
 
     except Exception as e:
         logger.error(f"Ошибка при парсинге ссылки '{reference}': {e}")
@@ -123,16 +574,18 @@ def parse_reference(reference: str) -> Optional[Dict]:
 
 def parse_multiple_references(references_text: str) -> List[Dict]:
     """
-    Парсит несколько ссылок, разделенных точкой с запятой.
+    Парсит несколько ссылок, разделенных точкой с запятой или запятой.
 
-    Пример: "Мф 1; Мф 2" -> [{'book': 'Матфей', 'chapter': 1}, {'book': 'Матфей', 'chapter': 2}]
+    Пример: "Мф 1; Мк 2" -> [{'book': 'Матфей', ...}, {'book': 'Марк', ...}]
     """
     references = []
 
-    # Разделяем по точке с запятой
-    parts = references_text.split(';')
+    # Ссылки, которые не разбираются вместе, разбираются по одной
+    spans = reference_engine.parse(references_text)
+    if spans is not None:
+        return [_span_to_dict(span) for span in spans]
 
-    for part in parts:
+    for part in references_text.split(';'):
         part = part.strip()
         if part:
             parsed = parse_reference(part)
@@ -149,14 +602,20 @@ def format_reference(parsed_ref: Dict) -> str:
     book = parsed_ref['book']
     chapter = parsed_ref['chapter']
 
+    end_chapter = parsed_ref.get('end_chapter', chapter)
+
     if 'verse_start' in parsed_ref:
         verse_start = parsed_ref['verse_start']
         verse_end = parsed_ref.get('verse_end', verse_start)
 
-        if verse_start == verse_end:
+        if end_chapter != chapter:
+            return f"{book} {chapter}:{verse_start}-{end_chapter}:{verse_end}"
+        elif verse_start == verse_end:
             return f"{book} {chapter}:{verse_start}"
         else:
             return f"{book} {chapter}:{verse_start}-{verse_end}"
+    elif end_chapter != chapter:
+        return f"{book} {chapter}-{end_chapter}"
     else:
         return f"{book} {chapter}"
 
@@ -0,0 +1,174 @@
+"""
+Поиск по библейским темам в памяти: названия тем и текст их стихов.
+
+Слова приводятся к основе так же, как в поиске по толкованиям
+(utils/lopukhin_search.py: регистр, ё -> е, отсечение окончаний). Слово
+запроса находит темы по точной основе, по префиксу основы («молит» ->
+«молитва», «молитвенный») и, если ни того ни другого нет, по похожим
+словам через триграммы («малитва» -> «молитва»). Совпадение в названии
+темы весит больше совпадения в тексте стихов.
+
+Индекс меняется по одной теме (set_topic/remove_topic), поэтому изменение
+темы в базе не требует перестроения всего индекса.
+"""
+import bisect
+import math
+from typing import Any, Dict, Hashable, Iterable, List, Set, Tuple
+
+from utils.lopukhin_search import normalize_text, stem, words
+
+# Вес совпадения в названии темы и в тексте стихов (для стихов растет
+# логарифмически от числа повторов, чтобы длинные темы не вытесняли названия)
+NAME_WEIGHT = 3.0
+VERSE_WEIGHT = 0.5
+# Вес совпадения по префиксу основы и максимальный вес похожего слова
+PREFIX_FACTOR = 0.8
+FUZZY_FACTOR = 0.6
+# Минимальное сходство триграмм (Жаккар) для похожего слова
+FUZZY_THRESHOLD = 0.3
+# Сколько слов словаря проверять на одно слово запроса
+MAX_PREFIX_TERMS = 50
+MAX_FUZZY_TERMS = 5
+
+
+def _trigrams(term: str) -> Set[str]:
+    padded = f"_{term}_"
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TopicSearchIndex:
+    """Инвертированный индекс тем с поиском по префиксу и триграммам"""
+
+    def __init__(self):
+        self._topics: Dict[Hashable, Dict[str, Any]] = {}
+        # Нормализованное название темы (для бонуса за вхождение всей фразы)
+        self._names: Dict[Hashable, str] = {}
+        # Тема -> {основа: вес}, нужно для удаления темы из индекса
+        self._doc_terms: Dict[Hashable, Dict[str, float]] = {}
+        # Основа -> {тема: вес}
+        self._postings: Dict[str, Dict[Hashable, float]] = {}
+        # Отсортированный словарь основ (поиск по префиксу) и триграммы основ
+        self._vocabulary: List[str] = []
+        self._trigram_terms: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._topics)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._topics
+
+    # --- Изменение индекса ---
+
+    def _add_term(self, term: str):
+        bisect.insort(self._vocabulary, term)
+        for trigram in _trigrams(term):
+            self._trigram_terms.setdefault(trigram, set()).add(term)
+
+    def _drop_term(self, term: str):
+        index = bisect.bisect_left(self._vocabulary, term)
+        if index < len(self._vocabulary) and self._vocabulary[index] == term:
+            del self._vocabulary[index]
+        for trigram in _trigrams(term):
+            terms = self._trigram_terms.get(trigram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self._trigram_terms[trigram]
+
+    def remove_topic(self, key: Hashable):
+        """Удаляет тему из индекса"""
+        self._topics.pop(key, None)
+        self._names.pop(key, None)
+        for term in self._doc_terms.pop(key, {}):
+            postings = self._postings.get(term)
+            if postings is None:
+                continue
+            postings.pop(key, None)
+            if not postings:
+                del self._postings[term]
+                self._drop_term(term)
+
+    def set_topic(self, key: Hashable, topic: Dict[str, Any], verse_texts: Iterable[str] = ()):
+        """Добавляет или заменяет тему: название topic['topic'] и тексты стихов"""
+        self.remove_topic(key)
+        weights: Dict[str, float] = {}
+        for word in words(topic['topic']):
+            term = stem(word)
+            weights[term] = weights.get(term, 0.0) + NAME_WEIGHT
+        counts: Dict[str, int] = {}
+        for text in verse_texts:
+            for word in words(text):
+                term = stem(word)
+                counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            weights[term] = weights.get(term, 0.0) + VERSE_WEIGHT * (1 + math.log(count))
+
+        self._topics[key] = topic
+        self._names[key] = normalize_text(topic['topic']).lower()
+        self._doc_terms[key] = weights
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                self._add_term(term)
+            postings[key] = weight
+
+    # --- Поиск ---
+
+    def _expand(self, term: str) -> List[Tuple[str, float]]:
+        """Основы словаря для основы запроса с множителем веса"""
+        matches = []
+        if term in self._postings:
+            matches.append((term, 1.0))
+        start = bisect.bisect_left(self._vocabulary, term)
+        for candidate in self._vocabulary[start:start + MAX_PREFIX_TERMS]:
+            if not candidate.startswith(term):
+                break
+            if candidate != term:
+                matches.append((candidate, PREFIX_FACTOR))
+        if matches or len(term) < 3:
+            return matches
+
+        query_trigrams = _trigrams(term)
+        shared: Dict[str, int] = {}
+        for trigram in query_trigrams:
+            for candidate in self._trigram_terms.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+        fuzzy = []
+        for candidate, common in shared.items():
+            similarity = common / (len(query_trigrams) + len(_trigrams(candidate)) - common)
+            if similarity >= FUZZY_THRESHOLD:
+                fuzzy.append((candidate, FUZZY_FACTOR * similarity))
+        fuzzy.sort(key=lambda item: item[1], reverse=True)
+        return fuzzy[:MAX_FUZZY_TERMS]
+
+    def search(self, query: str, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Темы по запросу, лучшие первыми: {'topic', 'verses', 'id', 'score'}.
+
+        Сначала темы, где нашлись все слова запроса, затем по весу совпадений.
+        """
+        terms = list(dict.fromkeys(stem(word) for word in words(query)))
+        if not terms:
+            return []
+
+        scores: Dict[Hashable, float] = {}
+        matched: Dict[Hashable, int] = {}
+        for term in terms:
+            best: Dict[Hashable, float] = {}
+            for candidate, factor in self._expand(term):
+                for key, weight in self._postings[candidate].items():
+                    score = weight * factor
+                    if score > best.get(key, 0.0):
+                        best[key] = score
+            for key, score in best.items():
+                scores[key] = scores.get(key, 0.0) + score
+                matched[key] = matched.get(key, 0) + 1
+
+        phrase = normalize_text(query).lower().strip()
+        for key in scores:
+            if phrase and phrase in self._names[key]:
+                scores[key] += NAME_WEIGHT * len(terms)
+
+        ranked = sorted(scores, key=lambda key: (matched[key], scores[key]), reverse=True)
+        return [dict(self._topics[key], score=round(scores[key], 3)) for key in ranked[:limit]]
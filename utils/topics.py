@@ -1,9 +1,9 @@
 """
 Модуль для работы с библейскими темами.
-Теперь использует Supabase вместо CSV файла.
+Теперь использует Supabase вместо CSV файла; загруженные темы хранит
+services/topic_service.py.
 """
 
-import asyncio
 import logging
 from typing import List, Dict, Optional
 from pathlib import Path
@@ -18,6 +18,11 @@ _topics_cache = None
 _cache_timestamp = 0
 
 
+def split_verses(verses_str: str) -> List[str]:
+    """Разбивает строку стихов темы ("Ин 3:16; Рим 8:28") на список ссылок"""
+    return [v.strip() for v in (verses_str or '').split(';') if v.strip()]
+
+
 async def load_topics_from_supabase() -> List[Dict]:
     """Загружает темы из Supabase"""
     try:
@@ -37,7 +42,7 @@ async def load_topics_from_supabase() -> List[Dict]:
             verses_str = topic_data.get('verses', '')
 
             # Разбиваем строку стихов на список
-            verses = [v.strip() for v in verses_str.split(';') if v.strip()]
+            verses = split_verses(verses_str)
 
             topics.append({
                 "topic": topic_name,
@@ -80,9 +85,16 @@ def load_topics_from_csv() -> List[Dict]:
 
 
 def load_topics() -> List[Dict]:
-    """Загружает темы (синхронная обёртка для async функции)"""
+    """
+    Возвращает темы без ожидания: загруженные сервисом тем
+    (services/topic_service.py), а до его запуска - из CSV
+    """
     global _topics_cache, _cache_timestamp
 
+    from services.topic_service import topic_service
+    if topic_service.loaded:
+        return topic_service.topics()
+
     import time
     current_time = time.time()
 
@@ -90,23 +102,7 @@ def load_topics() -> List[Dict]:
     if _topics_cache and (current_time - _cache_timestamp) < 300:
         return _topics_cache
 
-    try:
-        # Проверяем, есть ли активный event loop
-        try:
-            loop = asyncio.get_running_loop()
-            # Если event loop уже запущен, используем create_task
-            import asyncio
-            task = asyncio.create_task(load_topics_from_supabase())
-            # Но поскольку мы в синхронной функции, используем fallback к CSV
-            logger.warning("Event loop уже запущен, используем fallback к CSV")
-            topics = load_topics_from_csv()
-        except RuntimeError:
-            # Нет активного event loop, можем создать новый
-            topics = asyncio.run(load_topics_from_supabase())
-    except Exception as e:
-        logger.error(f"Ошибка при загрузке тем: {e}")
-        # Последний fallback к CSV
-        topics = load_topics_from_csv()
+    topics = load_topics_from_csv()
 
     # Обновляем кэш
     _topics_cache = topics
@@ -117,10 +113,10 @@ def load_topics() -> List[Dict]:
 
 async def get_topics_list_async() -> List[str]:
     """Возвращает список названий тем (асинхронная версия)"""
-    topics = await load_topics_from_supabase()
-    if not topics:
-        topics = load_topics_from_csv()
-    return [t["topic"] for t in topics]
+    from services.topic_service import topic_service
+    await topic_service.ensure_loaded()
+    return topic_service.topic_names()
+
 
 def get_topics_list() -> List[str]:
     """Возвращает список названий тем"""
@@ -130,13 +126,10 @@ def get_topics_list() -> List[str]:
 
 async def get_verses_for_topic_async(topic_name: str) -> List[str]:
     """Возвращает список стихов для указанной темы (асинхронная версия)"""
-    topics = await load_topics_from_supabase()
-    if not topics:
-        topics = load_topics_from_csv()
-    for topic_data in topics:
-        if topic_data["topic"] == topic_name:
-            return topic_data["verses"]
-    return []
+    from services.topic_service import topic_service
+    await topic_service.ensure_loaded()
+    return topic_service.verses(topic_name)
+
 
 def get_verses_for_topic(topic_name: str) -> List[str]:
     """Возвращает список стихов для указанной темы"""
@@ -149,6 +142,12 @@ def get_verses_for_topic(topic_name: str) -> List[str]:
 
 async def search_topics(query: str, limit: int = 20) -> List[Dict]:
     """Поиск тем по запросу (асинхронная функция для продвинутого поиска)"""
+    from services.topic_service import topic_service
+    await topic_service.ensure_loaded()
+    if topic_service.topics():
+        # Индекс в памяти: основы слов, префиксы и похожие слова
+        return topic_service.search(query, limit)
+
     try:
         from database.universal_manager import universal_db_manager
 
@@ -164,7 +163,7 @@ async def search_topics(query: str, limit: int = 20) -> List[Dict]:
         for topic_data in topics_data:
             topic_name = topic_data.get('topic_name', '')
             verses_str = topic_data.get('verses', '')
-            verses = [v.strip() for v in verses_str.split(';') if v.strip()]
+            verses = split_verses(verses_str)
 
             topics.append({
                 "topic": topic_name,
@@ -0,0 +1,167 @@
+"""
+Таблица стихов: сколько стихов в каждой главе каждой книги по переводам.
+
+Таблица строится из локальных JSON-файлов Библии (LOCAL_FILES_PATH)
+скриптом build_versification.py и хранится в VERSIFICATION_FILE. Если
+файла нет, таблица перевода строится из локального файла при первом
+обращении. В памяти перевод - два массива: смещение глав книги
+(array('I'), индекс - ID книги) и число стихов всех глав подряд
+(array('H')), поэтому проверка ссылки не загружает текст главы.
+"""
+import json
+import logging
+import os
+from array import array
+from typing import Dict, List, Optional, Set, Tuple
+
+from config.settings import LOCAL_FILES_PATH, VERSIFICATION_FILE
+
+logger = logging.getLogger(__name__)
+
+# Книги Библии: ID 1-66
+BOOKS_COUNT = 66
+DEFAULT_TRANSLATION = "rst"
+# Самая длинная глава - Пс 118 (176 стихов): граница стихов, когда таблицы нет
+MAX_CHAPTER_VERSES = 176
+
+# (смещение первой главы книги, число стихов глав подряд)
+Table = Tuple[array, array]
+
+
+def count_verses(translation: str) -> Dict[int, List[int]]:
+    """Число стихов в главах по локальному файлу перевода: ID книги -> [стихов в главе 1, ...]"""
+    from services.local_bible import local_bible_service
+
+    data = local_bible_service._load_translation(translation)
+    books = {}
+    for book_id in range(1, BOOKS_COUNT + 1):
+        book_key = local_bible_service._find_book_in_data(data, book_id)
+        if not book_key:
+            continue
+        chapters = {}
+        for chapter, verses in data[book_key].items():
+            numbers = [int(verse) for verse in verses if verse.isdigit()]
+            if chapter.isdigit() and numbers:
+                # Последний номер стиха: в некоторых главах номера пропущены
+                chapters[int(chapter)] = max(numbers)
+        if chapters:
+            books[book_id] = [chapters.get(number, 0) for number in range(1, max(chapters) + 1)]
+    return books
+
+
+def _make_table(books: Dict[int, List[int]]) -> Table:
+    offsets = array('I', [0] * (BOOKS_COUNT + 2))
+    counts = array('H')
+    for book_id in range(1, BOOKS_COUNT + 1):
+        offsets[book_id] = len(counts)
+        counts.extend(books.get(book_id, ()))
+    offsets[BOOKS_COUNT + 1] = len(counts)
+    return offsets, counts
+
+
+class Versification:
+    """Число стихов в главах по переводам (загружается один раз)"""
+
+    def __init__(self, path: str = VERSIFICATION_FILE):
+        self.path = path
+        self._tables: Dict[str, Table] = {}
+        # Переводы без таблицы и без локального файла
+        self._missing: Set[str] = set()
+        self._loaded = False
+
+    def load(self) -> int:
+        """Загружает таблицу из файла, возвращает число переводов"""
+        self._loaded = True
+        if not os.path.exists(self.path):
+            return 0
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+            for translation, books in data.items():
+                self._tables[translation] = _make_table(
+                    {int(book_id): chapters for book_id, chapters in books.items()})
+            logger.info(f"Таблица стихов загружена: {', '.join(self._tables)}")
+        except Exception as e:
+            logger.error(f"Ошибка загрузки таблицы стихов {self.path}: {e}")
+        return len(self._tables)
+
+    def _table(self, translation: str) -> Optional[Table]:
+        if not self._loaded:
+            self.load()
+        table = self._tables.get(translation)
+        if table is None and translation not in self._missing:
+            if os.path.exists(os.path.join(LOCAL_FILES_PATH, f"{translation}.json")):
+                try:
+                    table = _make_table(count_verses(translation))
+                    self._tables[translation] = table
+                    logger.info(f"Таблица стихов {translation} построена по локальному файлу")
+                except Exception as e:
+                    logger.error(f"Ошибка построения таблицы стихов {translation}: {e}")
+            if table is None:
+                self._missing.add(translation)
+        if table is None and translation != DEFAULT_TRANSLATION:
+            # Нумерация переводов почти совпадает - лучше синодальная, чем никакой
+            return self._table(DEFAULT_TRANSLATION)
+        return table
+
+    def _book(self, book_id: int, translation: str) -> Optional[Tuple[array, int, int]]:
+        """(числа стихов, смещение первой главы, число глав) книги или None"""
+        table = self._table(translation)
+        if table is None or not 1 <= book_id <= BOOKS_COUNT:
+            return None
+        offsets, counts = table
+        chapters = offsets[book_id + 1] - offsets[book_id]
+        return (counts, offsets[book_id], chapters) if chapters else None
+
+    def chapter_count(self, book_id: int, translation: str = DEFAULT_TRANSLATION) -> Optional[int]:
+        """Число глав в книге или None, если таблицы нет"""
+        book = self._book(book_id, translation)
+        return book[2] if book else None
+
+    def verse_count(self, book_id: int, chapter: int, translation: str = DEFAULT_TRANSLATION) -> Optional[int]:
+        """Число стихов (номер последнего стиха) в главе или None, если неизвестно"""
+        book = self._book(book_id, translation)
+        if book is None or not 1 <= chapter <= book[2]:
+            return None
+        counts, offset, _ = book
+        return counts[offset + chapter - 1] or None
+
+    def is_valid_reference(self, book_id: int, chapter: int, verse_start: int = None,
+                           verse_end: int = None, translation: str = DEFAULT_TRANSLATION) -> bool:
+        """
+        Проверяет главу и стихи ссылки без загрузки текста.
+
+        Если таблицы для книги нет, глава проверяется по числу глав из
+        bible_data, а стихи - по самой длинной главе Библии.
+        """
+        chapters = self.chapter_count(book_id, translation)
+        if chapters is None:
+            # Импорт здесь: bible_data сам использует таблицу стихов
+            from utils.bible_data import bible_data
+            chapters = bible_data.max_chapters.get(book_id, 0)
+        if not 1 <= chapter <= chapters:
+            return False
+        if verse_start is None:
+            return True
+        if verse_end is None:
+            verse_end = verse_start
+        if verse_start < 1 or verse_end < verse_start:
+            return False
+        verses = self.verse_count(book_id, chapter, translation) or MAX_CHAPTER_VERSES
+        return verse_end <= verses
+
+    def save(self, translations: List[str], path: str = None) -> Dict[str, int]:
+        """Строит таблицу по локальным файлам и сохраняет, возвращает число глав по переводам"""
+        path = path or self.path
+        data = {translation: count_verses(translation) for translation in translations}
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+        self._tables.update({translation: _make_table(books) for translation, books in data.items()})
+        self._missing.difference_update(data)
+        return {translation: sum(len(chapters) for chapters in books.values())
+                for translation, books in data.items()}
+
+
+# Глобальная таблица стихов
+versification = Versification()